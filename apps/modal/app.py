@@ -34,6 +34,10 @@ from handlers.z_image import setup_z_image_endpoints
 app = modal.App(name="ryla-comfyui", image=image)
 
 
+# Concurrent inputs per container (also sizes the handler worker pool)
+MAX_CONCURRENT_INPUTS = 5
+
+
 @app.cls(
     scaledown_window=300,  # 5 minute container keep alive
     # Note: min_containers=1 removed - the monolithic image is too heavy
@@ -43,26 +47,29 @@ app = modal.App(name="ryla-comfyui", image=image)
     secrets=[huggingface_secret],
     timeout=1800,  # 30 minutes for long-running workflows
 )
-@modal.concurrent(max_inputs=5)
+@modal.concurrent(max_inputs=MAX_CONCURRENT_INPUTS)
 class ComfyUI:
     """ComfyUI server class with all workflow endpoints."""
     
     port: int = COMFYUI_PORT
+    max_concurrent_inputs = MAX_CONCURRENT_INPUTS
+    gpu_type = GPU_TYPE
 
     @modal.enter()
     def launch_comfy_background(self):
         """Launch the ComfyUI server exactly once when the container starts."""
         from utils.comfyui import launch_comfy_server
-        launch_comfy_server(self.port)
+        from utils.startup import StartupTimer
         
-        # Wait a bit for server to fully start and load nodes
-        import time
-        time.sleep(5)
+        self.startup_timer = StartupTimer("comfyui")
+        with self.startup_timer.phase("launch_server"):
+            launch_comfy_server(self.port)
         
         # Verify nodes are loaded
         from utils.comfyui import verify_nodes_available
         instantid_nodes = ["InsightFaceLoader", "InstantIDModelLoader", "InstantIDControlNetLoader", "ApplyInstantID"]
-        node_status = verify_nodes_available(instantid_nodes, port=self.port)
+        with self.startup_timer.phase("verify_instantid_nodes"):
+            node_status = verify_nodes_available(instantid_nodes, port=self.port)
         missing = [node for node, available in node_status.items() if not available]
         if missing:
             print(f"⚠️  Warning: InstantID nodes not loaded at startup: {', '.join(missing)}")
@@ -70,12 +77,20 @@ class ComfyUI:
             print(f"✅ All InstantID nodes loaded successfully")
         
         seedvr2_nodes = ["SeedVR2VideoUpscaler", "SeedVR2LoadDiTModel", "SeedVR2LoadVAEModel"]
-        seedvr2_status = verify_nodes_available(seedvr2_nodes, port=self.port)
+        with self.startup_timer.phase("verify_seedvr2_nodes"):
+            seedvr2_status = verify_nodes_available(seedvr2_nodes, port=self.port)
         missing_seedvr2 = [node for node, available in seedvr2_status.items() if not available]
         if missing_seedvr2:
             print(f"⚠️  Warning: SeedVR2 nodes not loaded at startup: {', '.join(missing_seedvr2)}")
         else:
             print(f"✅ All SeedVR2 nodes loaded successfully")
+        
+        # Prefetch hot LoRAs to local disk; other LoRAs are copied on first request
+        from utils.lora_cache import get_lora_cache
+        with self.startup_timer.phase("lora_warm"):
+            get_lora_cache(self).warm()
+        
+        self.startup_timer.report()
 
     @modal.method()
     def test_node_imports(self):
@@ -200,6 +215,38 @@ class ComfyUI:
         # Execute workflow using utility
         return execute_workflow(workflow_path)
     
+    def infer_workflow(self, workflow: dict, on_event=None) -> bytes:
+        """Run inference on an in-memory API-format workflow (no temp file).
+        
+        on_event optionally receives ComfyUI progress/preview events (see utils.progress).
+        """
+        from utils.comfyui import poll_server_health as check_health, execute_workflow_via_api
+        from utils.output_cache import cached_output
+        check_health(self.port)
+        return cached_output(
+            self,
+            workflow,
+            lambda: execute_workflow_via_api(workflow, port=self.port, on_event=on_event),
+            on_event=on_event,
+        )
+    
+    def infer_workflow_images(self, workflow: dict, cache: bool = True) -> list:
+        """Run inference on an in-memory workflow and return every output image."""
+        from utils.comfyui import poll_server_health as check_health, execute_workflow_images
+        from utils.output_cache import cached_output
+        check_health(self.port)
+        
+        def run():
+            images = execute_workflow_images(workflow, port=self.port)
+            return [image for node_images in images.values() for image in node_images]
+        
+        return cached_output(self, workflow, run, kind="all", cache=cache)
+    
+    def infer_batched(self, workflow: dict) -> bytes:
+        """Run single-image inference, batching identical concurrent unseeded requests into one latent."""
+        from utils.batching import get_batcher
+        return get_batcher(self).submit(workflow, lambda: self.infer_workflow(workflow))
+    
     def poll_server_health(self):
         """Poll server health (for use in handlers)."""
         from utils.comfyui import poll_server_health as check_health
@@ -211,6 +258,12 @@ class ComfyUI:
         handler = WorkflowHandler(self)
         return handler._workflow_impl(item)
 
+    @modal.method()
+    async def run_job(self, record: dict, payload: dict) -> dict:
+        """Run an async job (spawned by POST /jobs, so Modal counts it as load)."""
+        from utils.jobs import run_spawned_job
+        return await run_spawned_job(self, record, payload)
+
     @modal.asgi_app()
     def fastapi_app(self):
         """Single FastAPI app with all routes."""
@@ -302,33 +355,62 @@ class ComfyUI:
                 
                 # Check ComfyUI loaded nodes
                 port = getattr(self, 'port', 8000)
-                try:
-                    import requests
-                    response = requests.get(f"http://127.0.0.1:{port}/object_info", timeout=5)
-                    if response.status_code == 200:
-                        object_info = response.json()
-                        diagnostics["comfyui_loaded_node_count"] = len(object_info)
-                        diagnostics["comfyui_loaded_nodes"] = list(object_info.keys())[:50]  # First 50
-                        
-                        # Check InstantID nodes
-                        instantid_nodes = ["InsightFaceLoader", "InstantIDModelLoader", "InstantIDControlNetLoader", "ApplyInstantID"]
-                        diagnostics["instantid_nodes_available"] = {
-                            node: node in object_info for node in instantid_nodes
-                        }
-                        
-                        # Check SeedVR2 nodes
-                        seedvr2_nodes = ["SeedVR2VideoUpscaler", "SeedVR2LoadDiTModel", "SeedVR2LoadVAEModel"]
-                        diagnostics["seedvr2_nodes_available"] = {
-                            node: node in object_info for node in seedvr2_nodes
-                        }
-                except Exception as e:
-                    diagnostics["comfyui_check_error"] = str(e)
+                from utils.comfyui import get_object_info
+                object_info = get_object_info(port)
+                if object_info is not None:
+                    diagnostics["comfyui_loaded_node_count"] = len(object_info)
+                    diagnostics["comfyui_loaded_nodes"] = list(object_info.keys())[:50]  # First 50
+                    
+                    # Check InstantID nodes
+                    instantid_nodes = ["InsightFaceLoader", "InstantIDModelLoader", "InstantIDControlNetLoader", "ApplyInstantID"]
+                    diagnostics["instantid_nodes_available"] = {
+                        node: node in object_info for node in instantid_nodes
+                    }
+                    
+                    # Check SeedVR2 nodes
+                    seedvr2_nodes = ["SeedVR2VideoUpscaler", "SeedVR2LoadDiTModel", "SeedVR2LoadVAEModel"]
+                    diagnostics["seedvr2_nodes_available"] = {
+                        node: node in object_info for node in seedvr2_nodes
+                    }
+                else:
+                    diagnostics["comfyui_check_error"] = "object_info unavailable"
                 
             except Exception as e:
                 diagnostics["error"] = str(e)
                 diagnostics["traceback"] = traceback.format_exc()
             
             return JSONResponse(content=diagnostics)
+
+        # Worker pool stats (queue depth, rejections)
+        from utils.executor import setup_executor_endpoints
+        setup_executor_endpoints(fastapi, comfyui_instance)
+        
+        # Startup phase timings (cold start)
+        from utils.startup import setup_startup_endpoints
+        setup_startup_endpoints(fastapi, comfyui_instance)
+        
+        # Async jobs: submit, poll or webhook, fetch result from the volume
+        from utils.jobs import setup_job_endpoints
+        setup_job_endpoints(fastapi, comfyui_instance)
+        
+        # Content-addressed output cache (X-Cache header, /cache/stats)
+        from utils.output_cache import setup_output_cache_endpoints
+        setup_output_cache_endpoints(fastapi, comfyui_instance)
+        
+        # LoRA hot cache on local disk (/lora-cache/stats)
+        from utils.lora_cache import setup_lora_cache_endpoints
+        setup_lora_cache_endpoints(fastapi, comfyui_instance)
+        
+        # Model-switch admission: delay requests whose model would (by size
+        # estimate) evict a family that is still running; ComfyUI still
+        # manages VRAM itself
+        from utils.residency import setup_residency_middleware
+        setup_residency_middleware(fastapi, comfyui_instance)
+        
+        # Live render progress (SSE) with early cancel; previews are off here
+        # since this container mostly serves image routes
+        from utils.progress import setup_progress_endpoints
+        setup_progress_endpoints(fastapi, comfyui_instance)
         
         # Register all endpoints from handlers
         setup_flux_endpoints(fastapi, comfyui_instance)
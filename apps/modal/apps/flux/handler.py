@@ -8,7 +8,7 @@ Isolated handler for Flux app - no dependencies on other handlers.
 import json
 import uuid
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional
 from fastapi import Response
 
 # Import from shared utils
@@ -34,6 +34,8 @@ if "/root/utils" not in sys.path:
     sys.path.insert(0, "/root/utils")
 
 from cost_tracker import CostTracker, get_cost_summary
+from lora_cache import get_lora_cache
+from lora_stack import lora_chain_nodes, prepend_trigger_words, resolve_lora_stack
 
 
 def build_flux_workflow(item: dict) -> dict:
@@ -199,22 +201,37 @@ def build_flux_dev_workflow(item: dict) -> dict:
     }
 
 
-def build_flux_dev_lora_workflow(item: dict, lora_filename: str) -> dict:
+def build_flux_dev_lora_workflow(item: dict, lora_filename: str, lora_stack: Optional[list] = None) -> dict:
     """
     Build Flux Dev + LoRA workflow JSON.
     
+    Extra LoRAs (realism, style) are chained after the character LoRA.
+    
     Args:
         item: Request payload with prompt, lora_id, trigger_word, etc.
         lora_filename: LoRA filename (e.g., "character-123.safetensors")
+        lora_stack: Extra (lora_filename, strength, trigger_word) tuples (optional)
     
     Returns:
-        ComfyUI workflow dictionary with LoRA loader
+        ComfyUI workflow dictionary with LoRA loaders
     """
-    # Build prompt with trigger word if provided
+    lora_stack = lora_stack or []
+    
+    # Build prompt with trigger words if provided
     prompt = item["prompt"]
     trigger_word = item.get("trigger_word", "")
     if trigger_word:
         prompt = f"{trigger_word} {prompt}"
+    prompt = prepend_trigger_words(prompt, lora_stack)
+    
+    # LoRA chain - applies LoRAs to model and CLIP: character LoRA, then the stack
+    lora_strength = item.get("lora_strength", 1.0)
+    lora_nodes, lora_model, lora_clip = lora_chain_nodes(
+        [(lora_filename, lora_strength)] + [(name, strength) for name, strength, _ in lora_stack],
+        model=["1", 0],  # UNETLoader output
+        clip=["2", 0],   # DualCLIPLoader output
+        first_node_id=10,
+    )
     
     return {
         # Model loaders (Flux Dev - separate loaders)
@@ -240,30 +257,20 @@ def build_flux_dev_lora_workflow(item: dict, lora_filename: str) -> dict:
                 "vae_name": "ae.safetensors",
             },
         },
-        # LoRA loader - applies LoRA to model and CLIP
-        "10": {
-            "class_type": "LoraLoader",
-            "inputs": {
-                "model": ["1", 0],  # UNETLoader output
-                "clip": ["2", 0],   # DualCLIPLoader output
-                "lora_name": lora_filename,
-                "strength_model": item.get("lora_strength", 1.0),
-                "strength_clip": item.get("lora_strength", 1.0),
-            },
-        },
+        **lora_nodes,
         # Prompt encoding (using LoRA-modified CLIP)
         "4": {
             "class_type": "CLIPTextEncode",
             "inputs": {
                 "text": prompt,
-                "clip": ["10", 1],  # LoRA-modified CLIP
+                "clip": lora_clip,  # LoRA-modified CLIP
             },
         },
         "5": {
             "class_type": "CLIPTextEncode",
             "inputs": {
                 "text": item.get("negative_prompt", ""),
-                "clip": ["10", 1],
+                "clip": lora_clip,
             },
         },
         # Latent image
@@ -285,7 +292,7 @@ def build_flux_dev_lora_workflow(item: dict, lora_filename: str) -> dict:
                 "sampler_name": "euler",
                 "scheduler": "simple",
                 "denoise": 1.0,
-                "model": ["10", 0],  # LoRA-modified model
+                "model": lora_model,  # LoRA-modified model
                 "positive": ["4", 0],
                 "negative": ["5", 0],
                 "latent_image": ["6", 0],
@@ -309,36 +316,6 @@ def build_flux_dev_lora_workflow(item: dict, lora_filename: str) -> dict:
     }
 
 
-import subprocess
-
-
-def ensure_lora_symlink(lora_filename: str) -> bool:
-    """
-    Ensure LoRA file is symlinked from volume to ComfyUI directory.
-    
-    Args:
-        lora_filename: LoRA filename (e.g., "character-123.safetensors")
-    
-    Returns:
-        True if LoRA is available, False otherwise
-    """
-    comfy_lora_path = Path(f"/root/comfy/ComfyUI/models/loras/{lora_filename}")
-    volume_lora_path = Path(f"/root/models/loras/{lora_filename}")
-    
-    # Already exists in ComfyUI directory
-    if comfy_lora_path.exists():
-        return True
-    
-    # Exists in volume - create symlink
-    if volume_lora_path.exists():
-        comfy_lora_path.parent.mkdir(parents=True, exist_ok=True)
-        subprocess.run(f"ln -s {volume_lora_path} {comfy_lora_path}", shell=True, check=True)
-        print(f"✅ Symlinked LoRA: {lora_filename}")
-        return True
-    
-    return False
-
-
 class FluxHandler:
     """Handler for Flux workflows."""
     
@@ -425,18 +402,27 @@ class FluxHandler:
             lora_filename = f"character-{lora_id}.safetensors"
         
         # Ensure LoRA is available
-        if not ensure_lora_symlink(lora_filename):
+        if not get_lora_cache(self.comfyui).ensure(lora_filename):
             raise HTTPException(
                 status_code=404,
                 detail=f"LoRA not found: {lora_filename}. Train it first using /train-lora endpoint."
             )
         
+        # Realism/style LoRAs stacked on the character LoRA
+        try:
+            lora_stack = resolve_lora_stack(item, base_model="flux")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        for stack_filename, _, _ in lora_stack:
+            if not get_lora_cache(self.comfyui).ensure(stack_filename):
+                raise HTTPException(status_code=404, detail=f"LoRA not found: {stack_filename}")
+        
         # Start cost tracking
         tracker = CostTracker(gpu_type="L40S")
         tracker.start()
         
-        # Build workflow with LoRA
-        workflow = build_flux_dev_lora_workflow(item, lora_filename)
+        # Build workflow with LoRA stack
+        workflow = build_flux_dev_lora_workflow(item, lora_filename, lora_stack)
         
         # Save workflow to temp file
         client_id = uuid.uuid4().hex
@@ -42,6 +42,10 @@ from handlers.ipadapter_faceid import setup_ipadapter_faceid_endpoints
 app = modal.App(name="ryla-instantid", image=instantid_image)
 
 
+# Concurrent inputs per container (also sizes the handler worker pool)
+MAX_CONCURRENT_INPUTS = 5
+
+
 @app.cls(
     scaledown_window=300,
     gpu=GPU_TYPE,
@@ -49,29 +53,34 @@ app = modal.App(name="ryla-instantid", image=instantid_image)
     secrets=[huggingface_secret],
     timeout=1800,
 )
-@modal.concurrent(max_inputs=5)
+@modal.concurrent(max_inputs=MAX_CONCURRENT_INPUTS)
 class ComfyUI:
     """ComfyUI server class for InstantID workflows."""
     
     port: int = COMFYUI_PORT
+    max_concurrent_inputs = MAX_CONCURRENT_INPUTS
+    gpu_type = GPU_TYPE
 
     @modal.enter()
     def launch_comfy_background(self):
         """Launch the ComfyUI server exactly once when the container starts."""
         from utils.comfyui import launch_comfy_server, verify_nodes_available
-        launch_comfy_server(self.port)
+        from utils.startup import StartupTimer
         
-        import time
-        time.sleep(5)
+        self.startup_timer = StartupTimer("instantid")
+        with self.startup_timer.phase("launch_server"):
+            launch_comfy_server(self.port)
         
         # Verify InstantID nodes are loaded
         instantid_nodes = ["InsightFaceLoader", "InstantIDModelLoader", "InstantIDControlNetLoader", "ApplyInstantID"]
-        node_status = verify_nodes_available(instantid_nodes, port=self.port)
+        with self.startup_timer.phase("verify_nodes"):
+            node_status = verify_nodes_available(instantid_nodes, port=self.port)
         missing = [node for node, available in node_status.items() if not available]
         if missing:
             print(f"⚠️  Warning: InstantID nodes not loaded at startup: {', '.join(missing)}")
         else:
             print(f"✅ All InstantID nodes loaded successfully")
+        self.startup_timer.report()
         print("✅ ComfyUI server started for InstantID app")
 
     @modal.method()
@@ -81,6 +90,21 @@ class ComfyUI:
         check_health(self.port)
         return execute_workflow(workflow_path)
 
+    def infer_workflow(self, workflow: dict) -> bytes:
+        """Run inference on an in-memory API-format workflow (no temp file)."""
+        from utils.comfyui import poll_server_health as check_health, execute_workflow_via_api
+        from utils.output_cache import cached_output
+        check_health(self.port)
+        return cached_output(
+            self, workflow, lambda: execute_workflow_via_api(workflow, port=self.port)
+        )
+
+    @modal.method()
+    async def run_job(self, record: dict, payload: dict) -> dict:
+        """Run an async job (spawned by POST /jobs, so Modal counts it as load)."""
+        from utils.jobs import run_spawned_job
+        return await run_spawned_job(self, record, payload)
+
     @modal.asgi_app()
     def fastapi_app(self):
         """FastAPI endpoint for InstantID workflows."""
@@ -115,6 +139,22 @@ class ComfyUI:
         @fastapi.get("/health")
         async def health():
             return {"status": "healthy", "app": "ryla-instantid"}
+
+        # Worker pool stats (queue depth, rejections)
+        from utils.executor import setup_executor_endpoints
+        setup_executor_endpoints(fastapi, self)
+        
+        # Startup phase timings (cold start)
+        from utils.startup import setup_startup_endpoints
+        setup_startup_endpoints(fastapi, self)
+        
+        # Async jobs: submit, poll or webhook, fetch result from the volume
+        from utils.jobs import setup_job_endpoints
+        setup_job_endpoints(fastapi, self)
+        
+        # Content-addressed output cache (X-Cache header, /cache/stats)
+        from utils.output_cache import setup_output_cache_endpoints
+        setup_output_cache_endpoints(fastapi, self)
         
         setup_instantid_endpoints(fastapi, self)
         setup_pulid_flux_endpoints(fastapi, self)
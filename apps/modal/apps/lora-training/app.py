@@ -73,6 +73,9 @@ flux_training_image = (
         "pip install -r /root/diffusers/examples/dreambooth/requirements_flux.txt || true",
     )
     .env({"HF_XET_HIGH_PERFORMANCE": "1"})
+    .add_local_file("apps/modal/apps/lora-training/bucketing.py", "/root/bucketing.py", copy=True)
+    .add_local_file("apps/modal/apps/lora-training/media_download.py", "/root/media_download.py", copy=True)
+    .add_local_file("apps/modal/apps/lora-training/r2_upload.py", "/root/r2_upload.py", copy=True)
 )
 
 # Qwen-Image training image
@@ -106,6 +109,9 @@ qwen_training_image = (
         "git clone --depth=1 https://github.com/FlyMyAI/flymyai-lora-trainer /root/flymyai-trainer",
     )
     .env({"HF_XET_HIGH_PERFORMANCE": "1"})
+    .add_local_file("apps/modal/apps/lora-training/bucketing.py", "/root/bucketing.py", copy=True)
+    .add_local_file("apps/modal/apps/lora-training/media_download.py", "/root/media_download.py", copy=True)
+    .add_local_file("apps/modal/apps/lora-training/r2_upload.py", "/root/r2_upload.py", copy=True)
 )
 
 # Wan video training image
@@ -134,6 +140,9 @@ wan_training_image = (
         "boto3",
     )
     .env({"HF_HOME": "/cache", "TRANSFORMERS_CACHE": "/cache", "HF_XET_HIGH_PERFORMANCE": "1"})
+    .add_local_file("apps/modal/apps/lora-training/bucketing.py", "/root/bucketing.py", copy=True)
+    .add_local_file("apps/modal/apps/lora-training/media_download.py", "/root/media_download.py", copy=True)
+    .add_local_file("apps/modal/apps/lora-training/r2_upload.py", "/root/r2_upload.py", copy=True)
 )
 
 # ============================================================================
@@ -157,6 +166,7 @@ class FluxTrainingConfig:
     checkpointing_steps: int = 250
     seed: int = 42
     mixed_precision: str = "bf16"
+    bucketing: bool = True  # Aspect-ratio buckets (see bucketing.py)
 
 
 @dataclass
@@ -176,6 +186,8 @@ class QwenTrainingConfig:
     seed: int = 42
     mixed_precision: str = "bf16"
     gradient_checkpointing: bool = True
+    flip_augment: bool = False  # Also train on mirrored copies (pre-encoded once)
+    bucketing: bool = True  # Aspect-ratio buckets (see bucketing.py)
 
 
 class WanModelSize(str, Enum):
@@ -208,6 +220,8 @@ class WanTrainingConfig:
     seed: int = 42
     mixed_precision: str = "bf16"
     gradient_checkpointing: bool = True
+    dataloader_workers: int = 4  # Clip decoding and cache streaming workers
+    bucketing: bool = True  # Aspect-ratio buckets (see bucketing.py)
     target_modules: list = field(default_factory=lambda: [
         "to_q", "to_k", "to_v", "to_out.0",
         "proj_in", "proj_out",
@@ -226,65 +240,28 @@ class WanTrainingConfig:
 
 
 def download_images(image_urls: list[str], data_dir: Path) -> int:
-    """Download training images from URLs."""
-    import requests
-    from PIL import Image
-    from io import BytesIO
-    
-    data_dir.mkdir(parents=True, exist_ok=True)
-    downloaded = 0
-    
-    for i, url in enumerate(image_urls):
-        try:
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            img = Image.open(BytesIO(response.content)).convert("RGB")
-            img.save(data_dir / f"{i:04d}.png")
-            print(f"   Downloaded image {i+1}/{len(image_urls)}")
-            downloaded += 1
-        except Exception as e:
-            print(f"   ⚠️ Failed to download image {i}: {e}")
+    """Download training images from URLs (concurrently, duplicates dropped)."""
+    from media_download import download_media
     
-    return downloaded
+    return len(download_media(image_urls, data_dir, kind="image").paths)
 
 
-def upload_to_r2(local_path: Path, s3_key: str) -> tuple[str | None, str | None]:
-    """Upload file to Cloudflare R2 and return (s3_key, public_url)."""
-    import os
-    import boto3
-    
-    r2_account_id = os.environ.get("CLOUDFLARE_R2_ACCOUNT_ID")
-    r2_access_key = os.environ.get("CLOUDFLARE_R2_ACCESS_KEY_ID")
-    r2_secret_key = os.environ.get("CLOUDFLARE_R2_SECRET_ACCESS_KEY")
-    r2_bucket = os.environ.get("CLOUDFLARE_R2_BUCKET", "ryla-storage")
-    r2_public_url = os.environ.get("CLOUDFLARE_R2_PUBLIC_URL", "")
-    
-    if not (r2_account_id and r2_access_key and r2_secret_key):
-        print("⚠️ S3/R2 credentials not configured, skipping upload")
-        return None, None
-    
-    try:
-        s3_client = boto3.client(
-            "s3",
-            endpoint_url=f"https://{r2_account_id}.r2.cloudflarestorage.com",
-            aws_access_key_id=r2_access_key,
-            aws_secret_access_key=r2_secret_key,
-        )
-        
-        print(f"📤 Uploading to S3: {s3_key}")
-        s3_client.upload_file(
-            str(local_path),
-            r2_bucket,
-            s3_key,
-            ExtraArgs={"ContentType": "application/octet-stream"}
-        )
-        
-        s3_url = f"{r2_public_url.rstrip('/')}/{s3_key}" if r2_public_url else None
-        print(f"✅ Uploaded to S3: {s3_key}")
-        return s3_key, s3_url
-    except Exception as e:
-        print(f"⚠️ Failed to upload to S3: {e}")
-        return None, None
+def _flux_buckets(data_dir: Path, cfg: FluxTrainingConfig) -> str:
+    """Buckets for the diffusers Flux script, logging how the images spread over them."""
+    from PIL import Image
+    from bucketing import BucketBatchSampler, format_buckets_arg, format_utilization, make_buckets, nearest_bucket
+    
+    buckets = make_buckets(cfg.resolution * cfg.resolution, step=32)
+    bucket_ids = []
+    for image_path in sorted(data_dir.glob("*.png")):
+        with Image.open(image_path) as image:
+            bucket_ids.append(nearest_bucket(buckets, image.height, image.width))
+    
+    # Only pass the buckets in use; the script builds one batch pool per bucket
+    used = sorted(set(bucket_ids))
+    sampler = BucketBatchSampler([used.index(b) for b in bucket_ids], cfg.train_batch_size)
+    print(f"   {format_utilization(sampler.utilization([buckets[b] for b in used]))}")
+    return format_buckets_arg([buckets[b] for b in used])
 
 
 # ============================================================================
@@ -321,6 +298,7 @@ def train_flux_lora(
     """
     import subprocess
     from accelerate.utils import write_basic_config
+    from r2_upload import R2Uploader
     
     print(f"🚀 Starting Flux LoRA training job: {job_id}")
     print(f"   Character: {character_id}")
@@ -362,10 +340,16 @@ def train_flux_lora(
         f"--mixed_precision={cfg.mixed_precision}",
         "--cache_dir=/cache",
     ]
+    if cfg.bucketing:
+        cmd.append(f"--aspect_ratio_buckets={_flux_buckets(data_dir, cfg)}")
     
     print(f"🏋️ Starting training with {cfg.max_train_steps} steps...")
     start_time = time.time()
     
+    s3_prefix = f"loras/flux-character-{character_id}/{job_id}"
+    uploader = R2Uploader()
+    uploader.watch_checkpoints(output_dir, s3_prefix)
+    
     process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
     for line in iter(process.stdout.readline, ""):
         print(line, end="")
@@ -373,14 +357,19 @@ def train_flux_lora(
     training_time = time.time() - start_time
     
     if exit_code != 0:
+        uploader.close()
         raise RuntimeError(f"Training failed with exit code {exit_code}")
     
     # Find LoRA file
     lora_files = list(output_dir.glob("*.safetensors"))
     lora_file = lora_files[0] if lora_files else output_dir / "pytorch_lora_weights.safetensors"
     if not lora_file.exists():
+        uploader.close()
         raise FileNotFoundError(f"No LoRA file found in {output_dir}")
     
+    # Upload while the LoRA is copied and the volume commits
+    final_upload = uploader.upload_final(lora_file, f"{s3_prefix}.safetensors")
+    
     final_lora_path = Path(f"/root/models/loras/flux-character-{character_id}.safetensors")
     if lora_file != final_lora_path:
         import shutil
@@ -391,10 +380,8 @@ def train_flux_lora(
     print(f"✅ Training complete! Duration: {training_time/60:.1f} minutes")
     print(f"   LoRA saved to: {final_lora_path}")
     
-    s3_key, s3_url = upload_to_r2(
-        final_lora_path,
-        f"loras/flux-character-{character_id}/{job_id}.safetensors"
-    )
+    s3_key, s3_url = final_upload.result()
+    uploader.close()
     
     return {
         "status": "completed",
@@ -420,6 +407,7 @@ def train_flux_lora(
 def _create_qwen_training_script():
     """Create the Qwen-Image LoRA training script using flow-matching."""
     return '''
+import gc
 import os
 import sys
 import copy
@@ -446,10 +434,14 @@ from torch.utils.data import Dataset, DataLoader
 from accelerate import Accelerator
 from accelerate.utils import set_seed
 import torchvision.transforms as T
+import torchvision.transforms.functional as TF
+
+sys.path.insert(0, "/root")  # bucketing.py is added to the training images
+from bucketing import BucketBatchSampler, ThroughputMeter, cover_and_crop, format_utilization, make_buckets, nearest_bucket
 
 
 class QwenImageDataset(Dataset):
-    def __init__(self, data_dir: str, resolution: int = 1024, trigger_word: str = ""):
+    def __init__(self, data_dir: str, resolution: int = 1024, trigger_word: str = "", bucketing: bool = True):
         self.data_dir = Path(data_dir)
         self.resolution = resolution
         self.trigger_word = trigger_word
@@ -463,8 +455,15 @@ class QwenImageDataset(Dataset):
         
         print(f"Found {len(self.images)} training images")
         
+        # Same pixel count as resolution x resolution, closest aspect ratio per image
+        self.buckets = make_buckets(resolution * resolution, step=32) if bucketing else [(resolution, resolution)]
+        self.bucket_ids = []
+        for img_path in self.images:
+            with Image.open(img_path) as image:
+                width, height = image.size
+            self.bucket_ids.append(nearest_bucket(self.buckets, height, width))
+        
         self.transform = T.Compose([
-            T.Resize((resolution, resolution)),
             T.ToTensor(),
             T.Normalize([0.5, 0.5, 0.5], [0.5, 0.5, 0.5]),
         ])
@@ -475,6 +474,9 @@ class QwenImageDataset(Dataset):
     def __getitem__(self, idx):
         img_path = self.images[idx]
         image = Image.open(img_path).convert("RGB")
+        bucket = self.buckets[self.bucket_ids[idx]]
+        resized, (top, left) = cover_and_crop(image.height, image.width, bucket)
+        image = TF.crop(TF.resize(image, list(resized)), top, left, bucket[0], bucket[1])
         pixel_values = self.transform(image)
         
         caption_path = img_path.with_suffix(".txt")
@@ -499,6 +501,82 @@ def get_sigmas(timesteps, scheduler, device, n_dim=5, dtype=torch.bfloat16):
     return sigma
 
 
+class CachedLatentDataset(Dataset):
+    """Pre-encoded samples: VAE posterior (mean, std) and a caption index."""
+    
+    def __init__(self, cache):
+        self.samples = cache["samples"]
+        self.prompt_embeds = cache["prompt_embeds"]
+        self.prompt_masks = cache["prompt_masks"]
+        self.buckets = cache["buckets"]
+        self.bucket_ids = [sample["bucket"] for sample in self.samples]
+    
+    def __len__(self):
+        return len(self.samples)
+    
+    def __getitem__(self, idx):
+        sample = self.samples[idx]
+        caption = sample["caption"]
+        return sample["mean"], sample["std"], self.prompt_embeds[caption], self.prompt_masks[caption]
+
+
+def collate_cached(batch):
+    """Stack latents and right-pad prompt embeddings to the longest in the batch."""
+    means, stds, embeds, masks = zip(*batch)
+    max_len = max(e.shape[0] for e in embeds)
+    padded_embeds = torch.zeros(len(embeds), max_len, embeds[0].shape[-1], dtype=embeds[0].dtype)
+    padded_masks = torch.zeros(len(masks), max_len, dtype=torch.bool)
+    for i, (e, m) in enumerate(zip(embeds, masks)):
+        padded_embeds[i, : e.shape[0]] = e
+        padded_masks[i, : m.shape[0]] = m
+    return torch.stack(means), torch.stack(stds), padded_embeds, padded_masks
+
+
+@torch.no_grad()
+def build_training_cache(dataset, vae, text_encoding_pipeline, device, dtype, flip_augment=False):
+    """
+    Encode every image (and its mirror) through the VAE and every distinct
+    caption through the text encoder, once. Latents are stored as the
+    normalized posterior mean/std so each step can still draw a fresh sample.
+    """
+    latents_mean = torch.tensor(vae.config.latents_mean).view(1, 1, vae.config.z_dim, 1, 1).to(device, dtype)
+    latents_std_inv = 1.0 / torch.tensor(vae.config.latents_std).view(1, 1, vae.config.z_dim, 1, 1).to(device, dtype)
+    
+    captions, samples = [], []
+    for idx in tqdm(range(len(dataset)), desc="Pre-encoding"):
+        pixel_values, caption = dataset[idx]
+        if caption not in captions:
+            captions.append(caption)
+        variants = [pixel_values, pixel_values.flip(-1)] if flip_augment else [pixel_values]
+        for variant in variants:
+            pixel_batch = variant.unsqueeze(0).unsqueeze(2).to(device, dtype)
+            posterior = vae.encode(pixel_batch).latent_dist
+            mean = (posterior.mean.permute(0, 2, 1, 3, 4) - latents_mean) * latents_std_inv
+            std = posterior.std.permute(0, 2, 1, 3, 4) * latents_std_inv
+            samples.append({
+                "mean": mean[0].cpu(), "std": std[0].cpu(),
+                "caption": captions.index(caption), "bucket": dataset.bucket_ids[idx],
+            })
+    
+    prompt_embeds, prompt_masks = [], []
+    for caption in captions:
+        encode_result = text_encoding_pipeline.encode_prompt(
+            prompt=[caption], device=device, num_images_per_prompt=1, max_sequence_length=1024,
+        )
+        if isinstance(encode_result, tuple):
+            embeds = encode_result[0]
+            mask = encode_result[1] if len(encode_result) > 1 else None
+        else:
+            embeds, mask = encode_result, None
+        if mask is None:
+            mask = torch.ones(embeds.shape[:2], dtype=torch.bool, device=embeds.device)
+        prompt_embeds.append(embeds[0].to(dtype).cpu())
+        prompt_masks.append(mask[0].bool().cpu())
+    
+    print(f"Cached {len(samples)} latents and {len(captions)} prompt embeddings")
+    return {"samples": samples, "prompt_embeds": prompt_embeds, "prompt_masks": prompt_masks, "buckets": dataset.buckets}
+
+
 def train_qwen_lora(args):
     accelerator = Accelerator(
         gradient_accumulation_steps=args.gradient_accumulation_steps,
@@ -510,12 +588,39 @@ def train_qwen_lora(args):
     
     print(f"Loading Qwen-Image model: {args.model_path}")
     
-    text_encoding_pipeline = QwenImagePipeline.from_pretrained(
-        args.model_path, transformer=None, vae=None, torch_dtype=weight_dtype,
-    )
-    
-    vae = AutoencoderKLQwenImage.from_pretrained(args.model_path, subfolder="vae")
-    vae.requires_grad_(False)
+    # Pre-encode stage: the frozen VAE and text encoder run once per job, on
+    # the GPU before the transformer is loaded, then are released
+    cache_name = f"qwen-{args.resolution}-flip{int(args.flip_augment)}-bucket{int(args.bucketing)}.pt"
+    cache_path = Path(args.cache_dir) / cache_name if args.cache_dir else None
+    if cache_path is not None and cache_path.exists():
+        cache = torch.load(cache_path, weights_only=False)
+        vae_scale_factor = cache["vae_scale_factor"]
+        print(f"Loaded pre-encoded cache from {cache_path}")
+    else:
+        text_encoding_pipeline = QwenImagePipeline.from_pretrained(
+            args.model_path, transformer=None, vae=None, torch_dtype=weight_dtype,
+        )
+        vae = AutoencoderKLQwenImage.from_pretrained(args.model_path, subfolder="vae")
+        vae.requires_grad_(False)
+        vae_scale_factor = 2 ** len(vae.temperal_downsample)
+        
+        text_encoding_pipeline.to(accelerator.device)
+        vae.to(accelerator.device, dtype=weight_dtype)
+        
+        dataset = QwenImageDataset(
+            args.data_dir, resolution=args.resolution, trigger_word=args.trigger_word, bucketing=args.bucketing,
+        )
+        cache = build_training_cache(
+            dataset, vae, text_encoding_pipeline, accelerator.device, weight_dtype, flip_augment=args.flip_augment,
+        )
+        cache["vae_scale_factor"] = vae_scale_factor
+        if cache_path is not None and accelerator.is_main_process:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            torch.save(cache, cache_path)
+        
+        del text_encoding_pipeline, vae
+        gc.collect()
+        torch.cuda.empty_cache()
     
     transformer = QwenImageTransformer2DModel.from_pretrained(
         args.model_path, subfolder="transformer",
@@ -533,7 +638,6 @@ def train_qwen_lora(args):
     
     transformer.to(accelerator.device, dtype=weight_dtype)
     transformer.add_adapter(lora_config)
-    text_encoding_pipeline.to(accelerator.device)
     
     transformer.requires_grad_(False)
     for n, param in transformer.named_parameters():
@@ -545,8 +649,12 @@ def train_qwen_lora(args):
     
     transformer.enable_gradient_checkpointing()
     
-    dataset = QwenImageDataset(args.data_dir, resolution=args.resolution, trigger_word=args.trigger_word)
-    dataloader = DataLoader(dataset, batch_size=args.train_batch_size, shuffle=True, num_workers=0)
+    dataset = CachedLatentDataset(cache)
+    batch_sampler = BucketBatchSampler(dataset.bucket_ids, args.train_batch_size, seed=args.seed)
+    print(format_utilization(batch_sampler.utilization(dataset.buckets)))
+    dataloader = DataLoader(
+        dataset, batch_sampler=batch_sampler, num_workers=0, collate_fn=collate_cached, pin_memory=True,
+    )
     
     lora_layers = [p for p in transformer.parameters() if p.requires_grad]
     optimizer = torch.optim.AdamW(lora_layers, lr=args.learning_rate, betas=(0.9, 0.999), weight_decay=0.01, eps=1e-8)
@@ -556,32 +664,30 @@ def train_qwen_lora(args):
         num_warmup_steps=args.lr_warmup_steps, num_training_steps=args.max_train_steps,
     )
     
-    vae.to(accelerator.device, dtype=weight_dtype)
     transformer, optimizer, dataloader, lr_scheduler = accelerator.prepare(
         transformer, optimizer, dataloader, lr_scheduler
     )
     
-    vae_scale_factor = 2 ** len(vae.temperal_downsample)
-    
     global_step = 0
     progress_bar = tqdm(range(args.max_train_steps), desc="Training", disable=not accelerator.is_local_main_process)
+    throughput = ThroughputMeter()
     
     transformer.train()
     
     for epoch in range(1000):
         for batch in dataloader:
             with accelerator.accumulate(transformer):
-                pixel_values, prompts = batch
-                pixel_values = pixel_values.to(dtype=weight_dtype, device=accelerator.device).unsqueeze(2)
+                latent_mean, latent_std, prompt_embeds, prompt_embeds_mask = batch
+                latent_mean = latent_mean.to(dtype=weight_dtype, device=accelerator.device)
+                latent_std = latent_std.to(dtype=weight_dtype, device=accelerator.device)
+                prompt_embeds = prompt_embeds.to(dtype=weight_dtype, device=accelerator.device)
+                prompt_embeds_mask = prompt_embeds_mask.to(device=accelerator.device)
                 
-                with torch.no_grad():
-                    pixel_latents = vae.encode(pixel_values).latent_dist.sample()
-                    pixel_latents = pixel_latents.permute(0, 2, 1, 3, 4)
-                    latents_mean = torch.tensor(vae.config.latents_mean).view(1, 1, vae.config.z_dim, 1, 1).to(pixel_latents.device, pixel_latents.dtype)
-                    latents_std = 1.0 / torch.tensor(vae.config.latents_std).view(1, 1, vae.config.z_dim, 1, 1).to(pixel_latents.device, pixel_latents.dtype)
-                    pixel_latents = (pixel_latents - latents_mean) * latents_std
+                # Fresh posterior sample each step, as vae.encode().latent_dist.sample() did
+                pixel_latents = latent_mean + latent_std * torch.randn_like(latent_mean)
                 
                 bsz = pixel_latents.shape[0]
+                throughput.update(bsz * accelerator.num_processes)
                 noise = torch.randn_like(pixel_latents, device=accelerator.device, dtype=weight_dtype)
                 
                 u = compute_density_for_timestep_sampling(weighting_scheme="none", batch_size=bsz, logit_mean=0.0, logit_std=1.0, mode_scale=1.29)
@@ -596,21 +702,6 @@ def train_qwen_lora(args):
                 )
                 img_shapes = [(1, noisy_model_input.shape[3] // 2, noisy_model_input.shape[4] // 2)] * bsz
                 
-                with torch.no_grad():
-                    prompt_list = list(prompts) if isinstance(prompts, tuple) else prompts
-                    encode_result = text_encoding_pipeline.encode_prompt(
-                        prompt=prompt_list, device=packed_noisy_model_input.device, num_images_per_prompt=1, max_sequence_length=1024,
-                    )
-                    if isinstance(encode_result, tuple):
-                        prompt_embeds = encode_result[0]
-                        prompt_embeds_mask = encode_result[1] if len(encode_result) > 1 else None
-                    else:
-                        prompt_embeds = encode_result
-                        prompt_embeds_mask = None
-                    
-                    if prompt_embeds_mask is None:
-                        prompt_embeds_mask = torch.ones(prompt_embeds.shape[:2], dtype=torch.bool, device=prompt_embeds.device)
-                
                 txt_seq_lens = prompt_embeds_mask.sum(dim=1).tolist()
                 
                 model_pred = transformer(
@@ -642,7 +733,7 @@ def train_qwen_lora(args):
                 global_step += 1
                 
                 if global_step % 10 == 0:
-                    print(f"Step {global_step}: loss={loss.item():.4f}")
+                    print(f"Step {global_step}: loss={loss.item():.4f}, {throughput.window():.2f} samples/s")
                 
                 if global_step % args.checkpointing_steps == 0 and accelerator.is_main_process:
                     save_path = Path(args.output_dir) / f"checkpoint-{global_step}"
@@ -664,6 +755,7 @@ def train_qwen_lora(args):
         lora_state_dict = convert_state_dict_to_diffusers(get_peft_model_state_dict(unwrapped))
         QwenImagePipeline.save_lora_weights(args.output_dir, lora_state_dict, safe_serialization=True)
         print(f"Training complete! LoRA saved to {args.output_dir}")
+        print(f"Throughput: {throughput.overall():.2f} samples/s ({throughput.samples} samples)")
     
     return args.output_dir
 
@@ -687,6 +779,9 @@ if __name__ == "__main__":
     parser.add_argument("--seed", type=int, default=42)
     parser.add_argument("--mixed_precision", type=str, default="bf16")
     parser.add_argument("--gradient_checkpointing", action="store_true")
+    parser.add_argument("--flip_augment", action="store_true")
+    parser.add_argument("--no_bucketing", dest="bucketing", action="store_false")
+    parser.add_argument("--cache_dir", type=str, default="")
     args = parser.parse_args()
     train_qwen_lora(args)
 '''
@@ -721,6 +816,7 @@ def train_qwen_lora(
     """
     import subprocess
     from accelerate.utils import write_basic_config
+    from r2_upload import R2Uploader
     
     print(f"🚀 Starting Qwen-Image LoRA training job: {job_id}")
     print(f"   Character: {character_id}")
@@ -768,13 +864,22 @@ def train_qwen_lora(
         f"--checkpointing_steps={cfg.checkpointing_steps}",
         f"--seed={cfg.seed}",
         f"--mixed_precision={cfg.mixed_precision}",
+        f"--cache_dir=/tmp/training/{job_id}/cache",
     ]
     if cfg.gradient_checkpointing:
         cmd.append("--gradient_checkpointing")
+    if cfg.flip_augment:
+        cmd.append("--flip_augment")
+    if not cfg.bucketing:
+        cmd.append("--no_bucketing")
     
     print(f"🏋️ Starting training with {cfg.max_train_steps} steps...")
     start_time = time.time()
     
+    s3_prefix = f"loras/qwen-character-{character_id}/{job_id}"
+    uploader = R2Uploader()
+    uploader.watch_checkpoints(output_dir, s3_prefix)
+    
     import os
     env = {**os.environ, "HF_HOME": "/cache", "TRANSFORMERS_CACHE": "/cache"}
     process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, env=env)
@@ -784,13 +889,18 @@ def train_qwen_lora(
     training_time = time.time() - start_time
     
     if exit_code != 0:
+        uploader.close()
         raise RuntimeError(f"Training failed with exit code {exit_code}")
     
     lora_files = list(output_dir.glob("*.safetensors"))
     lora_file = lora_files[0] if lora_files else output_dir / "adapter_model.safetensors"
     if not lora_file.exists():
+        uploader.close()
         raise FileNotFoundError(f"No LoRA file found in {output_dir}")
     
+    # Upload while the LoRA is copied and the volume commits
+    final_upload = uploader.upload_final(lora_file, f"{s3_prefix}.safetensors")
+    
     final_lora_path = Path(f"/root/models/qwen-loras/qwen-character-{character_id}.safetensors")
     if lora_file != final_lora_path:
         import shutil
@@ -800,10 +910,8 @@ def train_qwen_lora(
     
     print(f"✅ Training complete! Duration: {training_time/60:.1f} minutes")
     
-    s3_key, s3_url = upload_to_r2(
-        final_lora_path,
-        f"loras/qwen-character-{character_id}/{job_id}.safetensors"
-    )
+    s3_key, s3_url = final_upload.result()
+    uploader.close()
     
     return {
         "status": "completed",
@@ -829,12 +937,14 @@ def train_qwen_lora(
 def _create_wan_training_script():
     """Create the Wan LoRA training script."""
     return '''
+import gc
 import os
 import sys
 import copy
 import json
 import torch
 import argparse
+import torch.nn.functional as F
 from pathlib import Path
 from PIL import Image
 from tqdm import tqdm
@@ -853,7 +963,9 @@ from diffusers.utils import convert_state_dict_to_diffusers
 from torch.utils.data import Dataset, DataLoader
 from accelerate import Accelerator
 from accelerate.utils import set_seed
-import torchvision.transforms as T
+
+sys.path.insert(0, "/root")  # bucketing.py is added to the training images
+from bucketing import BucketBatchSampler, ThroughputMeter, cover_and_crop, format_utilization, make_buckets, nearest_bucket
 
 try:
     from decord import VideoReader, cpu
@@ -864,7 +976,7 @@ except ImportError:
 
 
 class WanVideoDataset(Dataset):
-    def __init__(self, data_dir: str, resolution: int = 480, num_frames: int = 17, trigger_word: str = ""):
+    def __init__(self, data_dir: str, resolution: int = 480, num_frames: int = 17, trigger_word: str = "", bucketing: bool = True):
         self.data_dir = Path(data_dir)
         self.resolution = resolution
         self.num_frames = num_frames
@@ -886,58 +998,88 @@ class WanVideoDataset(Dataset):
         
         print(f"Found {len(self.videos)} training videos")
         
-        self.transform = T.Compose([
-            T.Resize((resolution, self.width)),
-            T.CenterCrop((resolution, self.width)),
-            T.ToTensor(),
-            T.Normalize([0.5, 0.5, 0.5], [0.5, 0.5, 0.5]),
-        ])
+        # Same pixel count as the 16:9 resolution, closest aspect ratio per clip
+        self.buckets = make_buckets(resolution * self.width, step=16) if bucketing else [(resolution, self.width)]
+        self.bucket_ids = [nearest_bucket(self.buckets, *self._frame_size(video)) for video in self.videos]
     
     def __len__(self):
         return len(self.videos)
     
-    def _load_video_decord(self, video_path: Path) -> torch.Tensor:
+    def _frame_size(self, video_path: Path) -> tuple[int, int]:
+        """(height, width) of a clip, read from headers where possible."""
+        if video_path.is_dir():
+            first = sorted(list(video_path.glob("*.png")) + list(video_path.glob("*.jpg")))[0]
+            with Image.open(first) as image:
+                return image.height, image.width
+        if HAS_DECORD:
+            height, width, _ = VideoReader(str(video_path), ctx=cpu(0))[0].shape
+            return height, width
+        reader = imageio.get_reader(str(video_path))
+        try:
+            width, height = reader.get_meta_data()["size"]
+        finally:
+            reader.close()
+        return height, width
+    
+    def _to_tensor(self, frames, bucket) -> torch.Tensor:
+        """(F, H, W, 3) uint8 frames -> (3, F, h, w) bucket-sized crop in [-1, 1], resized as one batch."""
+        video = torch.from_numpy(np.ascontiguousarray(frames)).permute(0, 3, 1, 2).float().div_(255.0)
+        (resized_h, resized_w), (top, left) = cover_and_crop(video.shape[2], video.shape[3], bucket)
+        video = F.interpolate(video, size=(resized_h, resized_w), mode="bilinear", antialias=True, align_corners=False)
+        video = video[:, :, top:top + bucket[0], left:left + bucket[1]]
+        return video.clamp_(0.0, 1.0).mul_(2.0).sub_(1.0).permute(1, 0, 2, 3).contiguous()
+    
+    def _sample_indices(self, total_frames: int) -> np.ndarray:
+        return np.linspace(0, total_frames - 1, self.num_frames, dtype=int)
+    
+    def _load_video_decord(self, video_path: Path) -> np.ndarray:
         vr = VideoReader(str(video_path), ctx=cpu(0))
-        total_frames = len(vr)
-        indices = np.linspace(0, total_frames - 1, self.num_frames, dtype=int)
-        frames = vr.get_batch(indices).asnumpy()
-        processed_frames = []
-        for frame in frames:
-            pil_frame = Image.fromarray(frame)
-            processed_frames.append(self.transform(pil_frame))
-        return torch.stack(processed_frames, dim=1)
-    
-    def _load_video_imageio(self, video_path: Path) -> torch.Tensor:
+        return vr.get_batch(self._sample_indices(len(vr))).asnumpy()
+    
+    def _load_video_imageio(self, video_path: Path) -> np.ndarray:
+        # Stream the file and keep only the sampled frames instead of
+        # materializing every decoded frame
         reader = imageio.get_reader(str(video_path))
-        frames = list(reader)
-        total_frames = len(frames)
-        indices = np.linspace(0, total_frames - 1, self.num_frames, dtype=int)
-        processed_frames = []
-        for idx in indices:
-            pil_frame = Image.fromarray(frames[int(idx)])
-            processed_frames.append(self.transform(pil_frame))
-        reader.close()
-        return torch.stack(processed_frames, dim=1)
-    
-    def _load_image_sequence(self, folder: Path) -> torch.Tensor:
+        try:
+            try:
+                total_frames = reader.count_frames()
+            except Exception:
+                total_frames = sum(1 for _ in reader)
+                reader.close()
+                reader = imageio.get_reader(str(video_path))
+            indices = self._sample_indices(total_frames)
+            wanted = {}
+            for position, idx in enumerate(indices):
+                wanted.setdefault(int(idx), []).append(position)
+            frames = [None] * len(indices)
+            last = int(indices[-1])
+            for frame_idx, frame in enumerate(reader):
+                for position in wanted.get(frame_idx, ()):
+                    frames[position] = frame
+                if frame_idx >= last:
+                    break
+        finally:
+            reader.close()
+        # Metadata can overcount; repeat the last decoded frame
+        decoded = [frame for frame in frames if frame is not None]
+        frames = [frame if frame is not None else decoded[-1] for frame in frames]
+        return np.stack(frames)
+    
+    def _load_image_sequence(self, folder: Path) -> np.ndarray:
         images = sorted(list(folder.glob("*.png")) + list(folder.glob("*.jpg")))
-        total_frames = len(images)
-        indices = np.linspace(0, total_frames - 1, self.num_frames, dtype=int)
-        processed_frames = []
-        for idx in indices:
-            pil_frame = Image.open(images[int(idx)]).convert("RGB")
-            processed_frames.append(self.transform(pil_frame))
-        return torch.stack(processed_frames, dim=1)
+        indices = self._sample_indices(len(images))
+        return np.stack([np.asarray(Image.open(images[int(idx)]).convert("RGB")) for idx in indices])
     
     def __getitem__(self, idx):
         video_path = self.videos[idx]
         
         if video_path.is_dir():
-            pixel_values = self._load_image_sequence(video_path)
+            frames = self._load_image_sequence(video_path)
         elif HAS_DECORD:
-            pixel_values = self._load_video_decord(video_path)
+            frames = self._load_video_decord(video_path)
         else:
-            pixel_values = self._load_video_imageio(video_path)
+            frames = self._load_video_imageio(video_path)
+        pixel_values = self._to_tensor(frames, self.buckets[self.bucket_ids[idx]])
         
         caption_path = video_path.with_suffix(".txt") if video_path.is_file() else video_path / "caption.txt"
         if caption_path.exists():
@@ -950,6 +1092,64 @@ class WanVideoDataset(Dataset):
         return pixel_values, caption
 
 
+class CachedClipDataset(Dataset):
+    """Streams pre-encoded clips (VAE posterior mean/std + umT5 embeddings) from disk."""
+    
+    def __init__(self, paths, bucket_ids):
+        self.paths = paths
+        self.bucket_ids = bucket_ids
+    
+    def __len__(self):
+        return len(self.paths)
+    
+    def __getitem__(self, idx):
+        entry = torch.load(self.paths[idx], weights_only=True)
+        return entry["mean"], entry["std"], entry["prompt_embeds"]
+
+
+@torch.no_grad()
+def build_clip_cache(dataset, vae, tokenizer, text_encoder, device, dtype, cache_dir: Path, num_workers: int):
+    """
+    Decode, VAE-encode and text-encode every clip once, one file per clip.
+    
+    Decoding runs in DataLoader workers so the next clip is ready while the
+    GPU encodes the current one. Clips already in cache_dir are reused.
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    paths = [
+        cache_dir / f"{Path(video).stem}-{idx:04d}-{dataset.buckets[bucket_id][0]}x{dataset.buckets[bucket_id][1]}.pt"
+        for idx, (video, bucket_id) in enumerate(zip(dataset.videos, dataset.bucket_ids))
+    ]
+    missing = [idx for idx, path in enumerate(paths) if not path.exists()]
+    if not missing:
+        print(f"Reusing {len(paths)} pre-encoded clips from {cache_dir}")
+        return paths
+    
+    loader = DataLoader(
+        torch.utils.data.Subset(dataset, missing), batch_size=None, shuffle=False,
+        num_workers=num_workers, pin_memory=True,
+    )
+    prompt_cache = {}
+    for idx, (pixel_values, caption) in zip(missing, tqdm(loader, desc="Pre-encoding clips")):
+        pixel_values = pixel_values.unsqueeze(0).to(device, dtype=torch.float32, non_blocking=True)
+        posterior = vae.encode(pixel_values).latent_dist
+        scaling = vae.config.scaling_factor
+        if caption not in prompt_cache:
+            text_inputs = tokenizer([caption], padding="max_length", max_length=256, truncation=True, return_tensors="pt").to(device)
+            prompt_cache[caption] = text_encoder(**text_inputs).last_hidden_state[0].to(dtype).cpu()
+        entry = {
+            "mean": (posterior.mean[0] * scaling).to(dtype).cpu(),
+            "std": (posterior.std[0] * scaling).to(dtype).cpu(),
+            "prompt_embeds": prompt_cache[caption],
+        }
+        tmp_path = paths[idx].with_suffix(".tmp")
+        torch.save(entry, tmp_path)
+        os.replace(tmp_path, paths[idx])
+    
+    print(f"Cached {len(missing)} clips ({len(prompt_cache)} distinct captions) in {cache_dir}")
+    return paths
+
+
 def get_sigmas(timesteps, scheduler, device, n_dim=5, dtype=torch.bfloat16):
     sigmas = scheduler.sigmas.to(device=device, dtype=dtype)
     schedule_timesteps = scheduler.timesteps.to(device)
@@ -972,10 +1172,10 @@ def train_wan_lora(args):
     
     print(f"Loading Wan model: {args.model_path}")
     
+    # Pre-encode stage: the VAE and umT5 run once per clip before the
+    # transformer is loaded, then are released
     vae = AutoencoderKLWan.from_pretrained(args.model_path, subfolder="vae", torch_dtype=torch.float32)
-    transformer = WanTransformer3DModel.from_pretrained(args.model_path, subfolder="transformer", torch_dtype=weight_dtype)
-    
-    pipe = WanPipeline.from_pretrained(args.model_path, vae=vae, transformer=transformer, torch_dtype=weight_dtype)
+    pipe = WanPipeline.from_pretrained(args.model_path, vae=vae, transformer=None, torch_dtype=weight_dtype)
     
     tokenizer = pipe.tokenizer
     text_encoder = pipe.text_encoder
@@ -983,6 +1183,25 @@ def train_wan_lora(args):
     
     vae.requires_grad_(False)
     text_encoder.requires_grad_(False)
+    vae.to(accelerator.device)
+    text_encoder.to(accelerator.device, dtype=weight_dtype)
+    
+    dataset = WanVideoDataset(
+        args.data_dir, resolution=args.resolution, num_frames=args.num_frames,
+        trigger_word=args.trigger_word, bucketing=args.bucketing,
+    )
+    buckets, bucket_ids = dataset.buckets, dataset.bucket_ids
+    cache_dir = Path(args.cache_dir or Path(args.output_dir) / ".cache") / f"{args.resolution}x{args.num_frames}"
+    with accelerator.main_process_first():
+        cache_paths = build_clip_cache(
+            dataset, vae, tokenizer, text_encoder, accelerator.device, weight_dtype, cache_dir, args.dataloader_workers,
+        )
+    
+    del pipe, tokenizer, text_encoder, vae
+    gc.collect()
+    torch.cuda.empty_cache()
+    
+    transformer = WanTransformer3DModel.from_pretrained(args.model_path, subfolder="transformer", torch_dtype=weight_dtype)
     
     target_modules = args.target_modules.split(",") if args.target_modules else ["to_q", "to_k", "to_v", "to_out.0", "proj_in", "proj_out"]
     
@@ -992,8 +1211,6 @@ def train_wan_lora(args):
     
     transformer.to(accelerator.device, dtype=weight_dtype)
     transformer.add_adapter(lora_config)
-    vae.to(accelerator.device)
-    text_encoder.to(accelerator.device, dtype=weight_dtype)
     
     transformer.requires_grad_(False)
     for n, param in transformer.named_parameters():
@@ -1006,8 +1223,14 @@ def train_wan_lora(args):
     if args.gradient_checkpointing:
         transformer.enable_gradient_checkpointing()
     
-    dataset = WanVideoDataset(args.data_dir, resolution=args.resolution, num_frames=args.num_frames, trigger_word=args.trigger_word)
-    dataloader = DataLoader(dataset, batch_size=args.train_batch_size, shuffle=True, num_workers=0)
+    dataset = CachedClipDataset(cache_paths, bucket_ids)
+    batch_sampler = BucketBatchSampler(bucket_ids, args.train_batch_size, seed=args.seed)
+    bucket_report = batch_sampler.utilization(buckets)
+    print(format_utilization(bucket_report))
+    dataloader = DataLoader(
+        dataset, batch_sampler=batch_sampler, num_workers=args.dataloader_workers,
+        pin_memory=True, persistent_workers=args.dataloader_workers > 0,
+    )
     
     lora_layers = [p for p in transformer.parameters() if p.requires_grad]
     optimizer = torch.optim.AdamW(lora_layers, lr=args.learning_rate, betas=(0.9, 0.999), weight_decay=0.01, eps=1e-8)
@@ -1018,21 +1241,23 @@ def train_wan_lora(args):
     
     global_step = 0
     progress_bar = tqdm(range(args.max_train_steps), desc="Training", disable=not accelerator.is_local_main_process)
+    throughput = ThroughputMeter()
     
     transformer.train()
     
     for epoch in range(1000):
         for batch in dataloader:
             with accelerator.accumulate(transformer):
-                pixel_values, prompts = batch
-                pixel_values = pixel_values.to(dtype=torch.float32, device=accelerator.device)
+                latent_mean, latent_std, prompt_embeds = batch
+                latent_mean = latent_mean.to(dtype=weight_dtype, device=accelerator.device, non_blocking=True)
+                latent_std = latent_std.to(dtype=weight_dtype, device=accelerator.device, non_blocking=True)
+                prompt_embeds = prompt_embeds.to(dtype=weight_dtype, device=accelerator.device, non_blocking=True)
                 
-                with torch.no_grad():
-                    latents = vae.encode(pixel_values).latent_dist.sample()
-                    latents = latents * vae.config.scaling_factor
-                    latents = latents.to(weight_dtype)
+                # Fresh posterior sample each step, as vae.encode().latent_dist.sample() did
+                latents = latent_mean + latent_std * torch.randn_like(latent_mean)
                 
                 bsz = latents.shape[0]
+                throughput.update(bsz * accelerator.num_processes)
                 noise = torch.randn_like(latents, device=accelerator.device, dtype=weight_dtype)
                 
                 u = compute_density_for_timestep_sampling(weighting_scheme="none", batch_size=bsz, logit_mean=0.0, logit_std=1.0, mode_scale=1.29)
@@ -1042,11 +1267,6 @@ def train_wan_lora(args):
                 sigmas = get_sigmas(timesteps, noise_scheduler_copy, accelerator.device, n_dim=latents.ndim, dtype=latents.dtype)
                 noisy_latents = (1.0 - sigmas) * latents + sigmas * noise
                 
-                with torch.no_grad():
-                    prompt_list = list(prompts) if isinstance(prompts, tuple) else prompts
-                    text_inputs = tokenizer(prompt_list, padding="max_length", max_length=256, truncation=True, return_tensors="pt").to(accelerator.device)
-                    prompt_embeds = text_encoder(**text_inputs).last_hidden_state
-                
                 model_pred = transformer(hidden_states=noisy_latents, timestep=timesteps, encoder_hidden_states=prompt_embeds, return_dict=False)[0]
                 
                 weighting = compute_loss_weighting_for_sd3(weighting_scheme="none", sigmas=sigmas)
@@ -1066,7 +1286,7 @@ def train_wan_lora(args):
                 global_step += 1
                 
                 if global_step % 10 == 0:
-                    print(f"Step {global_step}: loss={loss.item():.4f}")
+                    print(f"Step {global_step}: loss={loss.item():.4f}, {throughput.window():.2f} samples/s")
                 
                 if global_step % args.checkpointing_steps == 0 and accelerator.is_main_process:
                     save_path = Path(args.output_dir) / f"checkpoint-{global_step}"
@@ -1089,11 +1309,13 @@ def train_wan_lora(args):
         output_path = Path(args.output_dir) / "adapter_model.safetensors"
         save_file(lora_state_dict, output_path)
         print(f"Training complete! LoRA saved to {output_path}")
+        print(f"Throughput: {throughput.overall():.2f} samples/s ({throughput.samples} samples)")
         
         metadata = {
             "base_model": args.model_path, "trigger_word": args.trigger_word, "rank": args.rank,
             "lora_alpha": args.lora_alpha, "resolution": args.resolution, "num_frames": args.num_frames,
             "training_steps": args.max_train_steps, "target_modules": target_modules,
+            "buckets": bucket_report, "samples_per_second": throughput.overall(),
         }
         with open(Path(args.output_dir) / "metadata.json", "w") as f:
             json.dump(metadata, f, indent=2)
@@ -1122,6 +1344,9 @@ if __name__ == "__main__":
     parser.add_argument("--seed", type=int, default=42)
     parser.add_argument("--mixed_precision", type=str, default="bf16")
     parser.add_argument("--gradient_checkpointing", action="store_true")
+    parser.add_argument("--cache_dir", type=str, default="")
+    parser.add_argument("--dataloader_workers", type=int, default=4)
+    parser.add_argument("--no_bucketing", dest="bucketing", action="store_false")
     args = parser.parse_args()
     train_wan_lora(args)
 '''
@@ -1155,7 +1380,8 @@ def train_wan_lora(
         dict with training results and LoRA path
     """
     import subprocess
-    import requests
+    from media_download import download_media
+    from r2_upload import R2Uploader
     
     start_time = time.time()
     
@@ -1166,28 +1392,10 @@ def train_wan_lora(
     videos_dir.mkdir(parents=True, exist_ok=True)
     
     print(f"📥 Downloading {len(video_urls)} training videos...")
-    downloaded_count = 0
-    for i, url in enumerate(video_urls):
-        try:
-            response = requests.get(url, timeout=300)
-            response.raise_for_status()
-            
-            ext = ".mp4"
-            if "webm" in url.lower():
-                ext = ".webm"
-            elif "mov" in url.lower():
-                ext = ".mov"
-            
-            video_path = videos_dir / f"video_{i:03d}{ext}"
-            video_path.write_bytes(response.content)
-            
-            caption_path = video_path.with_suffix(".txt")
-            caption_path.write_text(trigger_word)
-            
-            print(f"  ✓ Downloaded: {video_path.name} ({len(response.content) / 1024 / 1024:.1f} MB)")
-            downloaded_count += 1
-        except Exception as e:
-            print(f"  ⚠️ Failed to download {url}: {e}")
+    video_paths = download_media(video_urls, videos_dir, kind="video", prefix="video_", timeout=300).paths
+    for video_path in video_paths:
+        video_path.with_suffix(".txt").write_text(trigger_word)
+    downloaded_count = len(video_paths)
     
     if downloaded_count == 0:
         raise RuntimeError("No videos could be downloaded")
@@ -1218,9 +1426,13 @@ def train_wan_lora(
         "--checkpointing_steps", str(cfg.checkpointing_steps),
         "--seed", str(cfg.seed),
         "--mixed_precision", cfg.mixed_precision,
+        "--cache_dir", str(train_dir / "cache"),
+        "--dataloader_workers", str(cfg.dataloader_workers),
     ]
     if cfg.gradient_checkpointing:
         cmd.append("--gradient_checkpointing")
+    if not cfg.bucketing:
+        cmd.append("--no_bucketing")
     
     print(f"\n🚀 Starting Wan LoRA training...")
     print(f"  Model: {cfg.base_model}")
@@ -1228,13 +1440,21 @@ def train_wan_lora(
     print(f"  Trigger word: {trigger_word}")
     print(f"  Steps: {cfg.max_train_steps}")
     
+    s3_prefix = f"loras/wan-character-{character_id}/{job_id}"
+    uploader = R2Uploader()
+    uploader.watch_checkpoints(output_dir, s3_prefix)
+    
     result = subprocess.run(cmd, capture_output=False)
     
     if result.returncode != 0:
+        uploader.close()
         raise RuntimeError(f"Training failed with exit code {result.returncode}")
     
     final_lora = output_dir / "adapter_model.safetensors"
     if final_lora.exists():
+        # Upload while the LoRA is copied and the volume commits
+        final_upload = uploader.upload_final(final_lora, f"{s3_prefix}.safetensors")
+        
         import shutil
         dest_path = Path(f"/root/models/wan-loras/wan-character-{character_id}.safetensors")
         shutil.copy(final_lora, dest_path)
@@ -1248,10 +1468,8 @@ def train_wan_lora(
         training_time = time.time() - start_time
         print(f"\n✅ Training complete! Duration: {training_time/60:.1f} minutes")
         
-        s3_key, s3_url = upload_to_r2(
-            dest_path,
-            f"loras/wan-character-{character_id}/{job_id}.safetensors"
-        )
+        s3_key, s3_url = final_upload.result()
+        uploader.close()
         
         return {
             "status": "completed",
@@ -1270,6 +1488,7 @@ def train_wan_lora(
             "compatible_endpoints": ["/wan2.6-lora"],
         }
     else:
+        uploader.close()
         raise RuntimeError("Training completed but LoRA file not found")
 
 
@@ -0,0 +1,172 @@
+"""
+Aspect-ratio bucketing for the LoRA trainers.
+
+Training images and clips are assigned to the resolution bucket closest to
+their aspect ratio. Every bucket has about the same pixel count as the
+configured square (or 16:9 for video) resolution, so each step costs the
+same and nothing is stretched. Batches are drawn from a single bucket, so
+``train_batch_size`` > 1 works without padding.
+
+Shipped into the training images as /root/bucketing.py. It is imported by
+the generated Qwen and Wan training scripts, and by the Flux function to
+build ``--aspect_ratio_buckets``. Pure Python, no torch dependency.
+"""
+
+import math
+import random
+import time
+from typing import Iterator, Optional
+
+Bucket = tuple[int, int]  # (height, width)
+
+# Widest/tallest aspect ratio a bucket may have
+MAX_ASPECT_RATIO = 2.0
+
+
+def make_buckets(
+    target_area: int,
+    step: int = 32,
+    max_aspect_ratio: float = MAX_ASPECT_RATIO,
+) -> list[Bucket]:
+    """
+    Buckets whose sides are multiples of ``step`` and whose area is close to
+    (never above) ``target_area``, from tallest to widest.
+
+    Args:
+        target_area: Pixel budget per sample (e.g. 1024 * 1024)
+        step: Side granularity (VAE downscale x patch size)
+        max_aspect_ratio: Largest long/short side ratio
+
+    Returns:
+        List of (height, width) buckets
+    """
+    buckets = set()
+    side = step
+    while side * side <= target_area * max_aspect_ratio:
+        other = (target_area // side) // step * step
+        if other >= step and max(side, other) / min(side, other) <= max_aspect_ratio:
+            buckets.add((side, other))
+            buckets.add((other, side))
+        side += step
+    return sorted(buckets, key=lambda bucket: bucket[0] / bucket[1], reverse=True)
+
+
+def nearest_bucket(buckets: list[Bucket], height: int, width: int) -> int:
+    """Index of the bucket with the closest aspect ratio (in log space)."""
+    aspect = math.log(height / width)
+    return min(range(len(buckets)), key=lambda i: abs(math.log(buckets[i][0] / buckets[i][1]) - aspect))
+
+
+def cover_and_crop(height: int, width: int, bucket: Bucket) -> tuple[tuple[int, int], tuple[int, int]]:
+    """
+    Resize size that covers ``bucket`` while keeping the aspect ratio, and
+    the (top, left) offset of the centered bucket-sized crop.
+    """
+    target_h, target_w = bucket
+    scale = max(target_h / height, target_w / width)
+    resized_h = max(target_h, round(height * scale))
+    resized_w = max(target_w, round(width * scale))
+    return (resized_h, resized_w), ((resized_h - target_h) // 2, (resized_w - target_w) // 2)
+
+
+def format_buckets_arg(buckets: list[Bucket]) -> str:
+    """Buckets as diffusers' ``--aspect_ratio_buckets`` string ("h1,w1;h2,w2")."""
+    return ";".join(f"{h},{w}" for h, w in buckets)
+
+
+class BucketBatchSampler:
+    """
+    Batch sampler yielding index batches that share a bucket.
+
+    Batches are shuffled within and across buckets each epoch. A bucket's
+    last batch may be short unless ``drop_last`` is set (then buckets
+    smaller than one batch are still used, as a single short batch, so no
+    sample is ever skipped entirely).
+    """
+
+    def __init__(self, bucket_ids: list[int], batch_size: int, seed: int = 42, drop_last: bool = False):
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be >= 1, got {batch_size}")
+        self.bucket_ids = list(bucket_ids)
+        self.batch_size = batch_size
+        self.drop_last = drop_last
+        self.seed = seed
+        self.epoch = 0
+        self._members: dict[int, list[int]] = {}
+        for index, bucket_id in enumerate(self.bucket_ids):
+            self._members.setdefault(bucket_id, []).append(index)
+
+    def _batches(self, rng: Optional[random.Random] = None) -> list[list[int]]:
+        batches = []
+        for bucket_id in sorted(self._members):
+            members = list(self._members[bucket_id])
+            if rng is not None:
+                rng.shuffle(members)
+            full = len(members) // self.batch_size * self.batch_size
+            batches.extend(members[i:i + self.batch_size] for i in range(0, full, self.batch_size))
+            if full < len(members) and (not self.drop_last or full == 0):
+                batches.append(members[full:])
+        if rng is not None:
+            rng.shuffle(batches)
+        return batches
+
+    def __iter__(self) -> Iterator[list[int]]:
+        rng = random.Random(self.seed + self.epoch)
+        self.epoch += 1
+        yield from self._batches(rng)
+
+    def __len__(self) -> int:
+        return len(self._batches())
+
+    def utilization(self, buckets: Optional[list[Bucket]] = None) -> dict:
+        """
+        Bucket usage: samples per bucket, and how full the batches are
+        (samples / (batches * batch_size)).
+        """
+        batches = self._batches()
+        samples = sum(len(batch) for batch in batches)
+        per_bucket = {}
+        for bucket_id in sorted(self._members):
+            label = "x".join(map(str, buckets[bucket_id])) if buckets else str(bucket_id)
+            per_bucket[label] = len(self._members[bucket_id])
+        return {
+            "buckets_used": len(self._members),
+            "buckets_total": len(buckets) if buckets else len(self._members),
+            "samples_per_bucket": per_bucket,
+            "batches": len(batches),
+            "batch_fill": samples / (len(batches) * self.batch_size) if batches else 0.0,
+        }
+
+
+def format_utilization(report: dict) -> str:
+    per_bucket = ", ".join(f"{label}: {count}" for label, count in report["samples_per_bucket"].items())
+    return (
+        f"Buckets: {report['buckets_used']}/{report['buckets_total']} used, "
+        f"{report['batches']} batches/epoch, {report['batch_fill']:.0%} batch fill ({per_bucket})"
+    )
+
+
+class ThroughputMeter:
+    """Training throughput in samples/sec, overall and since the last report."""
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.samples = 0
+        self._window_start = self.start
+        self._window_samples = 0
+
+    def update(self, samples: int):
+        self.samples += samples
+        self._window_samples += samples
+
+    def overall(self) -> float:
+        elapsed = time.monotonic() - self.start
+        return self.samples / elapsed if elapsed > 0 else 0.0
+
+    def window(self) -> float:
+        """Samples/sec since the previous call."""
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        rate = self._window_samples / elapsed if elapsed > 0 else 0.0
+        self._window_start, self._window_samples = now, 0
+        return rate
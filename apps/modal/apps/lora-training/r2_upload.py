@@ -0,0 +1,268 @@
+"""
+Cloudflare R2 uploads for trained LoRAs.
+
+``upload_to_r2`` used to build a boto3 client per call and upload the final
+``.safetensors`` in one stream after training and the volume commit,
+leaving the GPU container idle. ``R2Uploader``:
+
+- reuses one client (pooled connections, adaptive retries) per process;
+- sends large files as parallel multipart uploads (boto3 TransferConfig);
+- watches the training output dir and uploads each ``checkpoint-N`` dir in
+  the background once its files stop changing;
+- lets the caller start the final upload before the volume commit, and
+  return as soon as the last part lands (queued checkpoint uploads are
+  dropped then and running ones aborted; the final LoRA supersedes them).
+
+Credentials come from the CLOUDFLARE_R2_* env vars (cloudflare-r2 secret).
+Set R2_ENDPOINT_URL to point at any S3-compatible store instead, e.g. a
+local MinIO for testing. Shipped into the training images as
+/root/r2_upload.py.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+# Files above this size use multipart uploads, in parts of this size
+MULTIPART_THRESHOLD = 16 * 1024 * 1024
+MULTIPART_CHUNKSIZE = 16 * 1024 * 1024
+
+# Parts in flight per file
+MULTIPART_CONCURRENCY = 10
+
+# Seconds between scans of the training output dir
+CHECKPOINT_POLL_SECONDS = 15
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_r2_client():
+    """Shared S3 client for R2 (or R2_ENDPOINT_URL), or None without credentials."""
+    global _client
+    account_id = os.environ.get("CLOUDFLARE_R2_ACCOUNT_ID")
+    access_key = os.environ.get("CLOUDFLARE_R2_ACCESS_KEY_ID")
+    secret_key = os.environ.get("CLOUDFLARE_R2_SECRET_ACCESS_KEY")
+    endpoint_url = os.environ.get("R2_ENDPOINT_URL") or (
+        f"https://{account_id}.r2.cloudflarestorage.com" if account_id else None
+    )
+    if not (endpoint_url and access_key and secret_key):
+        return None
+
+    with _client_lock:
+        if _client is None:
+            import boto3
+            from botocore.config import Config
+
+            _client = boto3.client(
+                "s3",
+                endpoint_url=endpoint_url,
+                aws_access_key_id=access_key,
+                aws_secret_access_key=secret_key,
+                region_name=os.environ.get("R2_REGION", "auto"),
+                config=Config(
+                    max_pool_connections=4 * MULTIPART_CONCURRENCY,
+                    retries={"max_attempts": 5, "mode": "adaptive"},
+                ),
+            )
+        return _client
+
+
+def default_transfer_config():
+    from boto3.s3.transfer import TransferConfig
+
+    return TransferConfig(
+        multipart_threshold=MULTIPART_THRESHOLD,
+        multipart_chunksize=MULTIPART_CHUNKSIZE,
+        max_concurrency=MULTIPART_CONCURRENCY,
+        use_threads=True,
+    )
+
+
+class R2Uploader:
+    """Reused-client R2 uploader with background checkpoint uploads."""
+
+    def __init__(
+        self,
+        client=None,
+        bucket: Optional[str] = None,
+        public_url: Optional[str] = None,
+        transfer_config=None,
+        max_workers: int = 2,
+    ):
+        self.client = client if client is not None else get_r2_client()
+        self.bucket = bucket or os.environ.get("CLOUDFLARE_R2_BUCKET", "ryla-storage")
+        self.public_url = public_url if public_url is not None else os.environ.get("CLOUDFLARE_R2_PUBLIC_URL", "")
+        if transfer_config is None and client is None and self.client is not None:
+            transfer_config = default_transfer_config()
+        self.transfer_config = transfer_config
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="r2-upload")
+        self._lock = threading.Lock()
+        self._watch_stop = threading.Event()
+        self._closing = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self._snapshots: dict[Path, tuple] = {}
+        self._watch_started = 0.0
+        self.checkpoint_futures: dict[str, Future] = {}
+        self._checkpoint_prefixes: dict[str, str] = {}
+        self.counters = {"files": 0, "bytes": 0, "seconds": 0.0, "failed": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.client is not None
+
+    def url_for(self, key: str) -> Optional[str]:
+        return f"{self.public_url.rstrip('/')}/{key}" if self.public_url else None
+
+    def upload(self, local_path: Path, key: str) -> tuple[Optional[str], Optional[str]]:
+        """Upload one file now; returns (key, public_url), or (None, None) on failure."""
+        if not self.enabled:
+            print("⚠️ S3/R2 credentials not configured, skipping upload")
+            return None, None
+        extra = {"ContentType": "application/octet-stream"}
+        start = time.monotonic()
+        try:
+            if self.transfer_config is not None:
+                self.client.upload_file(str(local_path), self.bucket, key, ExtraArgs=extra, Config=self.transfer_config)
+            else:
+                self.client.upload_file(str(local_path), self.bucket, key, ExtraArgs=extra)
+        except Exception as e:
+            with self._lock:
+                self.counters["failed"] += 1
+            print(f"⚠️ Failed to upload to S3: {key}: {e}")
+            return None, None
+        elapsed = time.monotonic() - start
+        size = Path(local_path).stat().st_size
+        with self._lock:
+            self.counters["files"] += 1
+            self.counters["bytes"] += size
+            self.counters["seconds"] += elapsed
+        print(f"✅ Uploaded to S3: {key} ({size / 1024 / 1024:.1f} MB, {size / 1024 / 1024 / max(elapsed, 1e-6):.1f} MB/s)")
+        return key, self.url_for(key)
+
+    def submit(self, local_path: Path, key: str) -> Future:
+        """Upload in the background; the future resolves to (key, public_url)."""
+        return self._pool.submit(self.upload, local_path, key)
+
+    # ------------------------------------------------------------------
+    # Checkpoints
+    # ------------------------------------------------------------------
+
+    def _upload_dir(self, directory: Path, key_prefix: str) -> list[str]:
+        keys = []
+        for path in sorted(p for p in directory.rglob("*") if p.is_file()):
+            if self._closing.is_set():
+                break
+            key, _ = self.upload(path, f"{key_prefix}/{path.relative_to(directory).as_posix()}")
+            if key:
+                keys.append(key)
+        return keys
+
+    def scan_checkpoints(self, output_dir: Path, key_prefix: str):
+        """
+        Queue uploads for checkpoint dirs whose files did not change since
+        the previous scan (so a checkpoint still being written is skipped).
+        Dirs last written before watching started (an earlier job's) are ignored.
+        """
+        for directory in sorted(Path(output_dir).glob("checkpoint-*")):
+            if not directory.is_dir() or directory.name in self.checkpoint_futures:
+                continue
+            files = sorted(p for p in directory.rglob("*") if p.is_file())
+            snapshot = tuple((p.relative_to(directory).as_posix(), p.stat().st_size, p.stat().st_mtime_ns) for p in files)
+            if not snapshot or max(entry[2] for entry in snapshot) < self._watch_started * 1e9:
+                continue
+            previous = self._snapshots.get(directory)
+            self._snapshots[directory] = snapshot
+            if snapshot == previous:
+                print(f"📤 Uploading {directory.name} in the background")
+                prefix = f"{key_prefix}/{directory.name}"
+                future = self._pool.submit(self._upload_dir, directory, prefix)
+                with self._lock:
+                    self.checkpoint_futures[directory.name] = future
+                    self._checkpoint_prefixes[directory.name] = prefix
+
+    def watch_checkpoints(self, output_dir: Path, key_prefix: str, poll_seconds: float = CHECKPOINT_POLL_SECONDS):
+        """Upload checkpoint-N dirs from ``output_dir`` as training writes them."""
+        if not self.enabled:
+            return
+        self._watch_started = time.time()
+
+        def loop():
+            while not self._watch_stop.wait(poll_seconds):
+                try:
+                    self.scan_checkpoints(output_dir, key_prefix)
+                except Exception as e:  # keep training going if a scan fails
+                    print(f"⚠️ Checkpoint scan failed: {e}")
+
+        self._watcher = threading.Thread(target=loop, name="r2-checkpoint-watch", daemon=True)
+        self._watcher.start()
+
+    def upload_final(self, local_path: Path, key: str) -> Future:
+        """
+        Upload the trained LoRA on its own thread, ahead of checkpoint
+        uploads: watching stops and checkpoints not yet started are dropped.
+        """
+        self._watch_stop.set()
+        with self._lock:
+            for future in self.checkpoint_futures.values():
+                future.cancel()
+        final = ThreadPoolExecutor(max_workers=1, thread_name_prefix="r2-final")
+        future = final.submit(self.upload, local_path, key)
+        final.shutdown(wait=False)
+        return future
+
+    def _abort_multipart_uploads(self, prefixes: list[str]) -> int:
+        """Abort incomplete multipart uploads under ``prefixes`` (R2 keeps their parts until aborted)."""
+        aborted = 0
+        for prefix in prefixes:
+            try:
+                response = self.client.list_multipart_uploads(Bucket=self.bucket, Prefix=f"{prefix}/")
+                for upload in response.get("Uploads", []):
+                    self.client.abort_multipart_upload(Bucket=self.bucket, Key=upload["Key"], UploadId=upload["UploadId"])
+                    aborted += 1
+            except Exception as e:
+                print(f"⚠️ Failed to abort multipart uploads under {prefix}: {e}")
+        return aborted
+
+    def close(self, wait: bool = False):
+        """
+        Stop watching and shut the pool down. With ``wait``, queued and
+        running checkpoint uploads finish. Without it, queued ones are
+        dropped and running ones are stopped: their multipart uploads are
+        aborted so the upload threads fail fast, the threads are joined, and
+        anything they started meanwhile is aborted too. Nothing is left
+        half-uploaded on R2 when this returns.
+        """
+        self._watch_stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+        if wait:
+            self._pool.shutdown(wait=True)
+            return
+
+        self._closing.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            running = [
+                self._checkpoint_prefixes[name] for name, future in self.checkpoint_futures.items() if not future.done()
+            ]
+        if not running:
+            self._pool.shutdown(wait=True)
+            return
+        print(f"🛑 Stopping {len(running)} checkpoint upload(s)")
+        aborted = self._abort_multipart_uploads(running)
+        self._pool.shutdown(wait=True)
+        aborted += self._abort_multipart_uploads(running)
+        if aborted:
+            print(f"   Aborted {aborted} incomplete multipart upload(s)")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.counters,
+                "checkpoints_queued": len(self.checkpoint_futures),
+                "checkpoints_uploaded": sum(1 for f in self.checkpoint_futures.values() if f.done() and not f.cancelled()),
+            }
@@ -39,6 +39,10 @@ from handlers.lora import setup_lora_endpoints
 app = modal.App(name="ryla-lora", image=lora_image)
 
 
+# Concurrent inputs per container (also sizes the handler worker pool)
+MAX_CONCURRENT_INPUTS = 5
+
+
 @app.cls(
     scaledown_window=300,
     gpu=GPU_TYPE,
@@ -46,42 +50,32 @@ app = modal.App(name="ryla-lora", image=lora_image)
     secrets=[huggingface_secret],
     timeout=1800,
 )
-@modal.concurrent(max_inputs=5)
+@modal.concurrent(max_inputs=MAX_CONCURRENT_INPUTS)
 class ComfyUI:
     """ComfyUI server class for LoRA workflows."""
     
     port: int = COMFYUI_PORT
+    max_concurrent_inputs = MAX_CONCURRENT_INPUTS
+    gpu_type = GPU_TYPE
 
     @modal.enter()
     def launch_comfy_background(self):
         """Launch the ComfyUI server exactly once when the container starts."""
         from utils.comfyui import launch_comfy_server
-        launch_comfy_server(self.port)
+        from utils.startup import StartupTimer
         
-        import time
-        time.sleep(5)
+        self.startup_timer = StartupTimer("lora")
+        with self.startup_timer.phase("launch_server"):
+            launch_comfy_server(self.port)
         
-        # Symlink LoRA files from volume to ComfyUI
-        self._setup_lora_symlinks()
+        # Prefetch hot LoRAs to local disk; other LoRAs are copied on first request
+        from utils.lora_cache import get_lora_cache
+        with self.startup_timer.phase("lora_warm"):
+            get_lora_cache(self).warm()
         
+        self.startup_timer.report()
         print("✅ ComfyUI server started for LoRA app")
     
-    def _setup_lora_symlinks(self):
-        """Symlink LoRA files from volume to ComfyUI."""
-        import os
-        from pathlib import Path
-        
-        volume_loras = Path("/root/models/loras")
-        comfy_loras = Path("/root/comfy/ComfyUI/models/loras")
-        
-        if volume_loras.exists():
-            comfy_loras.mkdir(parents=True, exist_ok=True)
-            for lora_file in volume_loras.glob("*.safetensors"):
-                target = comfy_loras / lora_file.name
-                if not target.exists():
-                    os.symlink(str(lora_file), str(target))
-                    print(f"✅ Symlinked LoRA: {lora_file.name}")
-
     @modal.method()
     def infer(self, workflow_path: str = "/root/workflow_api.json"):
         """Run inference on a workflow."""
@@ -89,6 +83,21 @@ class ComfyUI:
         check_health(self.port)
         return execute_workflow(workflow_path)
 
+    def infer_workflow(self, workflow: dict) -> bytes:
+        """Run inference on an in-memory API-format workflow (no temp file)."""
+        from utils.comfyui import poll_server_health as check_health, execute_workflow_via_api
+        from utils.output_cache import cached_output
+        check_health(self.port)
+        return cached_output(
+            self, workflow, lambda: execute_workflow_via_api(workflow, port=self.port)
+        )
+
+    @modal.method()
+    async def run_job(self, record: dict, payload: dict) -> dict:
+        """Run an async job (spawned by POST /jobs, so Modal counts it as load)."""
+        from utils.jobs import run_spawned_job
+        return await run_spawned_job(self, record, payload)
+
     @modal.asgi_app()
     def fastapi_app(self):
         """FastAPI endpoint for LoRA workflows."""
@@ -135,6 +144,26 @@ class ComfyUI:
                         if f.name not in [l["name"] for l in loras]:
                             loras.append({"name": f.name, "path": str(f)})
             return {"loras": loras}
+
+        # Worker pool stats (queue depth, rejections)
+        from utils.executor import setup_executor_endpoints
+        setup_executor_endpoints(fastapi, self)
+        
+        # Startup phase timings (cold start)
+        from utils.startup import setup_startup_endpoints
+        setup_startup_endpoints(fastapi, self)
+        
+        # Async jobs: submit, poll or webhook, fetch result from the volume
+        from utils.jobs import setup_job_endpoints
+        setup_job_endpoints(fastapi, self)
+        
+        # Content-addressed output cache (X-Cache header, /cache/stats)
+        from utils.output_cache import setup_output_cache_endpoints
+        setup_output_cache_endpoints(fastapi, self)
+        
+        # LoRA hot cache on local disk (/lora-cache/stats)
+        from utils.lora_cache import setup_lora_cache_endpoints
+        setup_lora_cache_endpoints(fastapi, self)
         
         setup_lora_endpoints(fastapi, self)
         
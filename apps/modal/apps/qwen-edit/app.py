@@ -47,6 +47,10 @@ from handlers.qwen_edit import setup_qwen_edit_endpoints
 app = modal.App(name="ryla-qwen-edit", image=qwen_edit_image)
 
 
+# Concurrent inputs per container (also sizes the handler worker pool)
+MAX_CONCURRENT_INPUTS = 5
+
+
 @app.cls(
     scaledown_window=300,
     gpu=GPU_TYPE,
@@ -54,20 +58,24 @@ app = modal.App(name="ryla-qwen-edit", image=qwen_edit_image)
     secrets=[huggingface_secret],
     timeout=1800,
 )
-@modal.concurrent(max_inputs=5)
+@modal.concurrent(max_inputs=MAX_CONCURRENT_INPUTS)
 class ComfyUI:
     """ComfyUI server class for Qwen-Edit workflows."""
     
     port: int = COMFYUI_PORT
+    max_concurrent_inputs = MAX_CONCURRENT_INPUTS
+    gpu_type = GPU_TYPE
 
     @modal.enter()
     def launch_comfy_background(self):
         """Launch the ComfyUI server exactly once when the container starts."""
         from utils.comfyui import launch_comfy_server
-        launch_comfy_server(self.port)
+        from utils.startup import StartupTimer
         
-        import time
-        time.sleep(5)
+        self.startup_timer = StartupTimer("qwen-edit")
+        with self.startup_timer.phase("launch_server"):
+            launch_comfy_server(self.port)
+        self.startup_timer.report()
         print("✅ ComfyUI server started for Qwen-Edit app")
 
     @modal.method()
@@ -77,6 +85,21 @@ class ComfyUI:
         check_health(self.port)
         return execute_workflow(workflow_path)
 
+    def infer_workflow(self, workflow: dict) -> bytes:
+        """Run inference on an in-memory API-format workflow (no temp file)."""
+        from utils.comfyui import poll_server_health as check_health, execute_workflow_via_api
+        from utils.output_cache import cached_output
+        check_health(self.port)
+        return cached_output(
+            self, workflow, lambda: execute_workflow_via_api(workflow, port=self.port)
+        )
+
+    @modal.method()
+    async def run_job(self, record: dict, payload: dict) -> dict:
+        """Run an async job (spawned by POST /jobs, so Modal counts it as load)."""
+        from utils.jobs import run_spawned_job
+        return await run_spawned_job(self, record, payload)
+
     @modal.asgi_app()
     def fastapi_app(self):
         """FastAPI endpoint for Qwen-Edit workflows."""
@@ -111,6 +134,22 @@ class ComfyUI:
         @fastapi.get("/health")
         async def health():
             return {"status": "healthy", "app": "ryla-qwen-edit"}
+
+        # Worker pool stats (queue depth, rejections)
+        from utils.executor import setup_executor_endpoints
+        setup_executor_endpoints(fastapi, self)
+        
+        # Startup phase timings (cold start)
+        from utils.startup import setup_startup_endpoints
+        setup_startup_endpoints(fastapi, self)
+        
+        # Async jobs: submit, poll or webhook, fetch result from the volume
+        from utils.jobs import setup_job_endpoints
+        setup_job_endpoints(fastapi, self)
+        
+        # Content-addressed output cache (X-Cache header, /cache/stats)
+        from utils.output_cache import setup_output_cache_endpoints
+        setup_output_cache_endpoints(fastapi, self)
         
         setup_qwen_edit_endpoints(fastapi, self)
         
@@ -51,6 +51,10 @@ app = modal.App(name="ryla-wan22-i2v", image=wan22_i2v_image)
 GPU_TYPE = "A100-80GB"
 
 
+# Concurrent inputs per container (also sizes the handler worker pool)
+MAX_CONCURRENT_INPUTS = 3
+
+
 @app.cls(
     scaledown_window=300,  # 5 minute container keep alive
     gpu=GPU_TYPE,
@@ -58,21 +62,25 @@ GPU_TYPE = "A100-80GB"
     secrets=[huggingface_secret],
     timeout=1800,  # 30 minutes for long-running video + face swap
 )
-@modal.concurrent(max_inputs=3)  # Limit concurrent due to memory requirements
+@modal.concurrent(max_inputs=MAX_CONCURRENT_INPUTS)  # Limit concurrent due to memory requirements
 class ComfyUI:
     """ComfyUI server class for WAN 2.2 I2V workflows."""
     
     port: int = COMFYUI_PORT
+    max_concurrent_inputs = MAX_CONCURRENT_INPUTS
+    gpu_type = GPU_TYPE
 
     @modal.enter()
     def launch_comfy_background(self):
         """Launch the ComfyUI server exactly once when the container starts."""
         from utils.comfyui import launch_comfy_server
-        launch_comfy_server(self.port)
+        from utils.startup import StartupTimer
         
-        import time
-        time.sleep(10)  # Extra time for GGUF model loading
+        self.startup_timer = StartupTimer("wan22-i2v")
+        with self.startup_timer.phase("launch_server"):
+            launch_comfy_server(self.port, preview_method="latent2rgb")
         
+        self.startup_timer.report()
         print("✅ ComfyUI server started for WAN 2.2 I2V app")
 
     @modal.method()
@@ -82,6 +90,27 @@ class ComfyUI:
         check_health(self.port)
         return execute_workflow(workflow_path)
 
+    def infer_workflow(self, workflow: dict, on_event=None) -> bytes:
+        """Run inference on an in-memory API-format workflow (no temp file).
+        
+        on_event optionally receives ComfyUI progress/preview events (see utils.progress).
+        """
+        from utils.comfyui import poll_server_health as check_health, execute_workflow_via_api
+        from utils.output_cache import cached_output
+        check_health(self.port)
+        return cached_output(
+            self,
+            workflow,
+            lambda: execute_workflow_via_api(workflow, port=self.port, on_event=on_event),
+            on_event=on_event,
+        )
+
+    @modal.method()
+    async def run_job(self, record: dict, payload: dict) -> dict:
+        """Run an async job (spawned by POST /jobs, so Modal counts it as load)."""
+        from utils.jobs import run_spawned_job
+        return await run_spawned_job(self, record, payload)
+
     @modal.asgi_app()
     def fastapi_app(self):
         """FastAPI endpoint for WAN 2.2 I2V workflows."""
@@ -116,6 +145,26 @@ class ComfyUI:
         @fastapi.get("/health")
         async def health():
             return {"status": "healthy", "app": "ryla-wan22-i2v", "version": "v2"}
+
+        # Worker pool stats (queue depth, rejections)
+        from utils.executor import setup_executor_endpoints
+        setup_executor_endpoints(fastapi, self)
+        
+        # Startup phase timings (cold start)
+        from utils.startup import setup_startup_endpoints
+        setup_startup_endpoints(fastapi, self)
+        
+        # Async jobs: submit, poll or webhook, fetch result from the volume
+        from utils.jobs import setup_job_endpoints
+        setup_job_endpoints(fastapi, self)
+        
+        # Content-addressed output cache (X-Cache header, /cache/stats)
+        from utils.output_cache import setup_output_cache_endpoints
+        setup_output_cache_endpoints(fastapi, self)
+        
+        # Live render progress and previews (SSE) with early cancel
+        from utils.progress import setup_progress_endpoints
+        setup_progress_endpoints(fastapi, self)
         
         setup_wan22_i2v_endpoints(fastapi, self)
         
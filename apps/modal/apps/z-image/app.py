@@ -36,35 +36,63 @@ from config import volume, hf_cache_vol, huggingface_secret, GPU_TYPE, COMFYUI_P
 from image import z_image_image
 
 # Import handlers
-from handlers.z_image import setup_z_image_endpoints
+from handlers.z_image import setup_z_image_endpoints, build_z_image_simple_workflow
 
 # Create Modal app
 app = modal.App(name="ryla-z-image", image=z_image_image)
 
 
+# Concurrent inputs per container (also sizes the handler worker pool)
+MAX_CONCURRENT_INPUTS = 5
+
+
 @app.cls(
     scaledown_window=300,
     gpu=GPU_TYPE,
     volumes={"/cache": hf_cache_vol, "/root/models": volume},
     secrets=[huggingface_secret],
     timeout=1800,
+    enable_memory_snapshot=True,  # New replicas restore a booted, pre-warmed server
+    experimental_options={"enable_gpu_snapshot": True},  # Snapshot includes pre-warmed VRAM
 )
-@modal.concurrent(max_inputs=5)
+@modal.concurrent(max_inputs=MAX_CONCURRENT_INPUTS)
 class ComfyUI:
     """ComfyUI server class for Z-Image workflows."""
     
     port: int = COMFYUI_PORT
+    max_concurrent_inputs = MAX_CONCURRENT_INPUTS
+    gpu_type = GPU_TYPE
 
-    @modal.enter()
+    @modal.enter(snap=True)
     def launch_comfy_background(self):
-        """Launch the ComfyUI server exactly once when the container starts."""
+        """Launch ComfyUI and pre-warm default models before the memory snapshot is taken."""
         from utils.comfyui import launch_comfy_server
-        launch_comfy_server(self.port)
+        from utils.startup import StartupTimer, WARMUP_ITEM, prewarm_models
+        
+        self.startup_timer = StartupTimer("z-image")
+        with self.startup_timer.phase("launch_server"):
+            launch_comfy_server(self.port)
         
-        import time
-        time.sleep(5)
+        with self.startup_timer.phase("prewarm_models"):
+            prewarm_models(self, build_z_image_simple_workflow(WARMUP_ITEM))
+        
+        self.startup_timer.mark_snapshot()
         print("✅ ComfyUI server started for Z-Image app")
 
+    @modal.enter(snap=False)
+    def restore_comfy_background(self):
+        """Per-replica setup, run after a fresh boot or a snapshot restore."""
+        from utils.comfyui import poll_server_health as check_health
+        self.startup_timer.mark_restored()
+        with self.startup_timer.phase("restore_health_check"):
+            check_health(self.port)
+        
+        # Prefetch hot LoRAs to local disk; other LoRAs are copied on first request
+        from utils.lora_cache import get_lora_cache
+        with self.startup_timer.phase("lora_warm"):
+            get_lora_cache(self).warm()
+        self.startup_timer.report()
+
     @modal.method()
     def infer(self, workflow_path: str = "/root/workflow_api.json"):
         """Run inference on a workflow."""
@@ -72,6 +100,38 @@ class ComfyUI:
         check_health(self.port)
         return execute_workflow(workflow_path)
 
+    def infer_workflow(self, workflow: dict) -> bytes:
+        """Run inference on an in-memory API-format workflow (no temp file)."""
+        from utils.comfyui import poll_server_health as check_health, execute_workflow_via_api
+        from utils.output_cache import cached_output
+        check_health(self.port)
+        return cached_output(
+            self, workflow, lambda: execute_workflow_via_api(workflow, port=self.port)
+        )
+
+    def infer_workflow_images(self, workflow: dict, cache: bool = True) -> list:
+        """Run inference on an in-memory workflow and return every output image."""
+        from utils.comfyui import poll_server_health as check_health, execute_workflow_images
+        from utils.output_cache import cached_output
+        check_health(self.port)
+        
+        def run():
+            images = execute_workflow_images(workflow, port=self.port)
+            return [image for node_images in images.values() for image in node_images]
+        
+        return cached_output(self, workflow, run, kind="all", cache=cache)
+
+    def infer_batched(self, workflow: dict) -> bytes:
+        """Run single-image inference, batching identical concurrent unseeded requests into one latent."""
+        from utils.batching import get_batcher
+        return get_batcher(self).submit(workflow, lambda: self.infer_workflow(workflow))
+
+    @modal.method()
+    async def run_job(self, record: dict, payload: dict) -> dict:
+        """Run an async job (spawned by POST /jobs, so Modal counts it as load)."""
+        from utils.jobs import run_spawned_job
+        return await run_spawned_job(self, record, payload)
+
     @modal.asgi_app()
     def fastapi_app(self):
         """FastAPI endpoint for Z-Image workflows."""
@@ -106,6 +166,26 @@ class ComfyUI:
         @fastapi.get("/health")
         async def health():
             return {"status": "healthy", "app": "ryla-z-image"}
+
+        # Worker pool stats (queue depth, rejections)
+        from utils.executor import setup_executor_endpoints
+        setup_executor_endpoints(fastapi, self)
+        
+        # Startup phase timings (cold start / snapshot restore)
+        from utils.startup import setup_startup_endpoints
+        setup_startup_endpoints(fastapi, self)
+        
+        # Async jobs: submit, poll or webhook, fetch result from the volume
+        from utils.jobs import setup_job_endpoints
+        setup_job_endpoints(fastapi, self)
+        
+        # Content-addressed output cache (X-Cache header, /cache/stats)
+        from utils.output_cache import setup_output_cache_endpoints
+        setup_output_cache_endpoints(fastapi, self)
+        
+        # LoRA hot cache on local disk (/lora-cache/stats)
+        from utils.lora_cache import setup_lora_cache_endpoints
+        setup_lora_cache_endpoints(fastapi, self)
         
         setup_z_image_endpoints(fastapi, self)
         
@@ -12,7 +12,6 @@ Handles Z-Image-Turbo text-to-image generation with multiple workflow variants:
 import json
 import uuid
 import os
-import subprocess
 from pathlib import Path
 from typing import Dict, Optional
 from fastapi import Response, HTTPException
@@ -23,43 +22,24 @@ import sys
 sys.path.insert(0, "/root/utils")
 
 from cost_tracker import CostTracker, get_cost_summary
+from image_utils import save_reference_image
+from lora_cache import get_lora_cache
+from lora_stack import lora_chain_nodes, prepend_trigger_words, resolve_lora_stack
 
 
 def _save_reference_image(reference_image: str) -> str:
     """
     Save reference image from base64 data URL to ComfyUI input folder.
     
+    Files are named by content, so a repeated reference reuses the same file.
+    
     Args:
         reference_image: Base64 data URL (e.g., "data:image/jpeg;base64,...")
     
     Returns:
         Filename in ComfyUI input folder
     """
-    import base64
-    import os
-    
-    # Parse data URL
-    if reference_image.startswith("data:"):
-        header, encoded = reference_image.split(",", 1)
-        # Extract MIME type and extension
-        mime_type = header.split(";")[0].split(":")[1]
-        ext = "jpg" if "jpeg" in mime_type else "png" if "png" in mime_type else "webp"
-    else:
-        # Assume it's already base64 encoded
-        encoded = reference_image
-        ext = "png"
-    
-    # Decode and save
-    image_bytes = base64.b64decode(encoded)
-    filename = f"{uuid.uuid4().hex}.{ext}"
-    input_dir = "/root/comfy/ComfyUI/input"
-    os.makedirs(input_dir, exist_ok=True)
-    filepath = os.path.join(input_dir, filename)
-    
-    with open(filepath, "wb") as f:
-        f.write(image_bytes)
-    
-    return filename
+    return save_reference_image(reference_image, "z_image_ref", as_jpeg=False)
 
 
 def build_z_image_simple_workflow(item: dict) -> dict:
@@ -507,11 +487,13 @@ def build_z_image_lora_workflow(
     negative_prompt: str = "",
     lora_strength: float = 1.0,
     trigger_word: Optional[str] = None,
+    lora_stack: Optional[list] = None,
 ) -> dict:
     """
     Build Z-Image Simple workflow with custom LoRA.
     
     Uses the simple workflow (built-in nodes only) with LoRA applied.
+    Extra LoRAs (realism, style) are chained after the character LoRA.
     
     Args:
         prompt: Text prompt for image generation
@@ -524,6 +506,7 @@ def build_z_image_lora_workflow(
         negative_prompt: Negative prompt (default: "")
         lora_strength: LoRA strength (default: 1.0)
         trigger_word: Trigger word to prepend to prompt (optional)
+        lora_stack: Extra (lora_filename, strength, trigger_word) tuples (optional)
     
     Returns:
         ComfyUI workflow dictionary
@@ -531,9 +514,17 @@ def build_z_image_lora_workflow(
     import random
     if seed is None:
         seed = random.randint(0, 2**32 - 1)
+    lora_stack = lora_stack or []
     
-    # Prepend trigger word if provided
+    # Prepend trigger words if provided
     full_prompt = f"{trigger_word} {prompt}".strip() if trigger_word else prompt
+    full_prompt = prepend_trigger_words(full_prompt, lora_stack)
+    
+    # LoRA chain (applied to model only): character LoRA, then the stack
+    lora_nodes, lora_model, _ = lora_chain_nodes(
+        [(lora_filename, lora_strength)] + [(name, strength) for name, strength, _ in lora_stack],
+        model=["1", 0],
+    )
     
     return {
         # Model Loaders
@@ -544,15 +535,7 @@ def build_z_image_lora_workflow(
                 "weight_dtype": "default",
             },
         },
-        # LoRA Loader (applied to model only)
-        "50": {
-            "class_type": "LoraLoaderModelOnly",
-            "inputs": {
-                "model": ["1", 0],
-                "lora_name": lora_filename,
-                "strength_model": lora_strength,
-            },
-        },
+        **lora_nodes,
         "2": {
             "class_type": "CLIPLoader",
             "inputs": {
@@ -595,7 +578,7 @@ def build_z_image_lora_workflow(
         "7": {
             "class_type": "KSampler",
             "inputs": {
-                "model": ["50", 0],  # Use LoRA-modified model
+                "model": lora_model,  # Use LoRA-modified model
                 "positive": ["4", 0],
                 "negative": ["5", 0],
                 "latent_image": ["6", 0],
@@ -937,17 +920,8 @@ class ZImageHandler:
             lora_id = item["lora_id"]
             lora_filename = f"character-{lora_id}.safetensors"
         
-        # Check LoRA in ComfyUI loras directory
-        comfy_lora_path = Path(f"/root/comfy/ComfyUI/models/loras/{lora_filename}")
-        volume_lora_path = Path(f"/root/models/loras/{lora_filename}")
-        
-        # If LoRA exists in volume but not in ComfyUI directory, symlink it
-        if volume_lora_path.exists() and not comfy_lora_path.exists():
-            comfy_lora_path.parent.mkdir(parents=True, exist_ok=True)
-            subprocess.run(f"ln -s {volume_lora_path} {comfy_lora_path}", shell=True, check=False)
-        
-        # Check if LoRA exists
-        if not comfy_lora_path.exists() and not volume_lora_path.exists():
+        # Copy the LoRA to local disk (hot cache) and link it for ComfyUI
+        if not get_lora_cache(self.comfyui).ensure(lora_filename):
             raise HTTPException(status_code=404, detail=f"LoRA not found: {lora_filename}")
         
         if "prompt" not in item:
@@ -992,21 +966,8 @@ class ZImageHandler:
             lora_id = item["lora_id"]
             lora_filename = f"character-{lora_id}.safetensors"
         
-        # Check LoRA in ComfyUI loras directory
-        comfy_lora_path = Path(f"/root/comfy/ComfyUI/models/loras/{lora_filename}")
-        volume_lora_path = Path(f"/root/models/loras/{lora_filename}")
-        
-        # If LoRA exists in volume but not in ComfyUI directory, symlink it
-        if volume_lora_path.exists() and not comfy_lora_path.exists():
-            comfy_lora_path.parent.mkdir(parents=True, exist_ok=True)
-            subprocess.run(
-                f"ln -s {volume_lora_path} {comfy_lora_path}",
-                shell=True,
-                check=False,
-            )
-        
-        # Check if LoRA exists
-        if not comfy_lora_path.exists() and not volume_lora_path.exists():
+        # Copy the LoRA to local disk (hot cache) and link it for ComfyUI
+        if not get_lora_cache(self.comfyui).ensure(lora_filename):
             raise HTTPException(
                 status_code=404,
                 detail=f"LoRA not found: {lora_filename}. Upload to /root/models/loras/"
@@ -1015,6 +976,15 @@ class ZImageHandler:
         if "prompt" not in item:
             raise HTTPException(status_code=400, detail="prompt is required")
         
+        # Realism/style LoRAs stacked on the character LoRA
+        try:
+            lora_stack = resolve_lora_stack(item, base_model="zit")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        for stack_filename, _, _ in lora_stack:
+            if not get_lora_cache(self.comfyui).ensure(stack_filename):
+                raise HTTPException(status_code=404, detail=f"LoRA not found: {stack_filename}")
+        
         tracker = CostTracker(gpu_type="L40S")
         tracker.start()
         
@@ -1029,6 +999,7 @@ class ZImageHandler:
             negative_prompt=item.get("negative_prompt", ""),
             lora_strength=item.get("lora_strength", 1.0),
             trigger_word=item.get("trigger_word"),
+            lora_stack=lora_stack,
         )
         
         client_id = uuid.uuid4().hex
@@ -0,0 +1,41 @@
+"""
+RYLA custom ComfyUI nodes (installed as custom_nodes/ryla_nodes).
+"""
+
+from .face_analysis_cache import FACE_ANALYSIS_CACHE, RylaCachedFaceAnalysis
+from .lora_cache import LORA_RAM_CACHE, RylaCachedLoraLoader, RylaCachedLoraLoaderModelOnly, RylaCachedLoraStack
+from .text_encode_cache import TEXT_ENCODE_CACHE, RylaCachedCLIPTextEncode
+
+NODE_CLASS_MAPPINGS = {
+    "RylaCachedCLIPTextEncode": RylaCachedCLIPTextEncode,
+    "RylaCachedFaceAnalysis": RylaCachedFaceAnalysis,
+    "RylaCachedLoraLoader": RylaCachedLoraLoader,
+    "RylaCachedLoraLoaderModelOnly": RylaCachedLoraLoaderModelOnly,
+    "RylaCachedLoraStack": RylaCachedLoraStack,
+}
+
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "RylaCachedCLIPTextEncode": "CLIP Text Encode (cached)",
+    "RylaCachedFaceAnalysis": "Face Analysis (cached)",
+    "RylaCachedLoraLoader": "Load LoRA (cached)",
+    "RylaCachedLoraLoaderModelOnly": "LoraLoaderModelOnly (cached)",
+    "RylaCachedLoraStack": "Load LoRA Stack (cached)",
+}
+
+try:
+    from aiohttp import web
+    from server import PromptServer
+
+    @PromptServer.instance.routes.get("/ryla/text_encode_cache/stats")
+    async def text_encode_cache_stats(request):
+        return web.json_response(TEXT_ENCODE_CACHE.stats())
+
+    @PromptServer.instance.routes.get("/ryla/face_cache/stats")
+    async def face_cache_stats(request):
+        return web.json_response(FACE_ANALYSIS_CACHE.stats())
+
+    @PromptServer.instance.routes.get("/ryla/lora_cache/stats")
+    async def lora_cache_stats(request):
+        return web.json_response(LORA_RAM_CACHE.stats())
+except Exception as e:  # server not running (e.g. node import check at build time)
+    print(f"⚠️  RYLA cache stats routes not registered: {e}")
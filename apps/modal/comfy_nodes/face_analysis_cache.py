@@ -0,0 +1,139 @@
+"""
+Cached InsightFace analysis.
+
+InstantID and PuLID run InsightFace (antelopev2) detection and embedding on
+the reference image of every request, on CPU by default, although our most
+used character flows send the same reference face again and again.
+``RylaCachedFaceAnalysis`` wraps the FACEANALYSIS model from
+``InstantIDFaceAnalysis`` / ``InsightFaceLoader`` / ``PulidFluxInsightFaceLoader``
+and memoizes ``get(image)`` on a hash of the image pixels and detector size.
+Results (bounding boxes, keypoints, embeddings) are kept in a RAM LRU and
+written to the ``ryla-models`` volume so other containers reuse them.
+
+The API inserts the node after each face analysis loader (see
+``utils.comfyui.to_cached_face_analysis``); consumers receive the wrapper
+instead of the raw model and never see the difference.
+"""
+
+import copy
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+# Reference faces kept in RAM (a handful of KB each)
+MAX_RAM_ENTRIES = int(os.environ.get("RYLA_FACE_CACHE_ENTRIES", "1024"))
+
+# Volume directory shared by all containers (set RYLA_FACE_CACHE_DIR="" to disable)
+VOLUME_DIR = os.environ.get("RYLA_FACE_CACHE_DIR", "/root/models/face-embeddings")
+
+
+class FaceAnalysisCache:
+    """RAM LRU of InsightFace results with write-through to the volume."""
+
+    def __init__(self, max_entries: int = MAX_RAM_ENTRIES, volume_dir: str = VOLUME_DIR):
+        self.max_entries = max_entries
+        self.volume_dir = volume_dir if volume_dir and os.path.isdir(os.path.dirname(volume_dir)) else None
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"hits_ram": 0, "hits_volume": 0, "misses": 0}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.volume_dir, key[:2], f"{key}.pkl")
+
+    def get(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.counters["hits_ram"] += 1
+                return self._entries[key]
+        if self.volume_dir and os.path.exists(self._path(key)):
+            try:
+                with open(self._path(key), "rb") as f:
+                    faces = pickle.load(f)
+            except Exception as e:
+                print(f"⚠️  Failed to load cached faces {key[:12]}: {e}")
+                return None
+            self.counters["hits_volume"] += 1
+            self._remember(key, faces)
+            return faces
+        return None
+
+    def put(self, key: str, faces):
+        self._remember(key, faces)
+        if not self.volume_dir:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(faces, f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"⚠️  Failed to store faces {key[:12]} on volume: {e}")
+
+    def _remember(self, key: str, faces):
+        with self._lock:
+            self._entries[key] = faces
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counters, "ram_entries": len(self._entries), "max_ram_entries": self.max_entries}
+
+
+FACE_ANALYSIS_CACHE = FaceAnalysisCache()
+
+
+class CachedFaceAnalysis:
+    """InsightFace FaceAnalysis proxy whose get() is served from the cache."""
+
+    def __init__(self, analysis, loader_key: str):
+        self._analysis = analysis
+        self._loader_key = loader_key
+
+    def get(self, img, *args, **kwargs):
+        det_model = getattr(self._analysis, "det_model", None)
+        det_size = getattr(det_model, "input_size", None)
+        digest = hashlib.sha256()
+        digest.update(f"{self._loader_key}|{det_size}|{img.shape}|{img.dtype}|{args}|{sorted(kwargs.items())}".encode())
+        digest.update(img.tobytes())
+        key = digest.hexdigest()
+
+        faces = FACE_ANALYSIS_CACHE.get(key)
+        if faces is None:
+            FACE_ANALYSIS_CACHE.counters["misses"] += 1
+            faces = self._analysis.get(img, *args, **kwargs)
+            FACE_ANALYSIS_CACHE.put(key, faces)
+        # Consumers may edit the returned faces (e.g. sort, crop); keep the cache intact
+        return copy.deepcopy(faces)
+
+    def __getattr__(self, name):
+        # det_model, models, prepare(), ... come from the wrapped model
+        return getattr(self._analysis, name)
+
+
+class RylaCachedFaceAnalysis:
+    """Wraps a FACEANALYSIS model so reference-face analysis is cached across requests."""
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "insightface": ("FACEANALYSIS",),
+                "loader_key": ("STRING", {"default": ""}),
+            },
+        }
+
+    RETURN_TYPES = ("FACEANALYSIS",)
+    FUNCTION = "wrap"
+    CATEGORY = "InstantID"
+
+    def wrap(self, insightface, loader_key):
+        if isinstance(insightface, CachedFaceAnalysis):
+            return (insightface,)
+        return (CachedFaceAnalysis(insightface, loader_key),)
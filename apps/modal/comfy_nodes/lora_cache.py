@@ -0,0 +1,213 @@
+"""
+Cached LoRA loaders.
+
+``LoraLoader`` keeps only the last LoRA file it read, so alternating
+character requests re-read and re-parse a LoRA from disk every time, and
+each request gets a fresh patched model clone whose weights ComfyUI
+re-patches on the GPU. ``RylaCachedLoraLoader`` and
+``RylaCachedLoraLoaderModelOnly`` are drop-in replacements that keep:
+
+- LoRA state dicts in a RAM LRU bounded by bytes, keyed on the file;
+- the patched MODEL/CLIP keyed on (base model, lora file, strength), so a
+  repeat request hands ComfyUI the same patcher and its patched weights are
+  reused, until the LoRA file changes (size or mtime).
+
+``RylaCachedLoraStack`` applies a whole stack (character + realism + style
+LoRAs) in one node. All deltas land on a single patcher, which ComfyUI
+merges into each weight in one pass, and the result is cached per stack
+signature, so a repeated stack costs one lookup instead of N loads.
+
+Patched entries hold a weak reference to the base model; once ComfyUI
+drops the base (e.g. a different checkpoint was loaded) they are discarded.
+The API swaps the node classes, and collapses LoraLoader chains into a
+stack node, at queue time (see ``utils.comfyui.to_cached_lora_loaders``).
+"""
+
+import json
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+import comfy.sd
+import comfy.utils
+import folder_paths
+
+# LoRA state dicts kept in RAM
+MAX_RAM_BYTES = int(float(os.environ.get("RYLA_LORA_RAM_GB", "8")) * 1024**3)
+
+# Patched models kept (each shares the base weights; only patches are extra)
+MAX_PATCHED_ENTRIES = int(os.environ.get("RYLA_LORA_PATCHED_ENTRIES", "8"))
+
+
+def _state_dict_bytes(lora: dict) -> int:
+    return sum(t.numel() * t.element_size() for t in lora.values() if hasattr(t, "numel"))
+
+
+class LoraRamCache:
+    """RAM LRU of LoRA state dicts and patched models."""
+
+    def __init__(self, max_bytes: int = MAX_RAM_BYTES, max_patched: int = MAX_PATCHED_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_patched = max_patched
+        self._loras: "OrderedDict[tuple, tuple]" = OrderedDict()  # file key -> (state dict, bytes)
+        self._patched: "OrderedDict[tuple, tuple]" = OrderedDict()  # patch key -> (base refs, outputs)
+        self._lock = threading.Lock()
+        self.counters = {"lora_hits": 0, "lora_loads": 0, "patched_hits": 0, "patched_misses": 0}
+
+    @staticmethod
+    def file_key(lora_name: str) -> tuple:
+        """(real path, size, mtime) of a LoRA file."""
+        lora_path = folder_paths.get_full_path("loras", lora_name)
+        if lora_path is None:
+            raise FileNotFoundError(f"LoRA not found: {lora_name}")
+        stat = os.stat(lora_path)
+        return (os.path.realpath(lora_path), stat.st_size, stat.st_mtime)
+
+    def load_lora(self, lora_name: str) -> dict:
+        """Read a LoRA file, from RAM when its path, size and mtime are unchanged."""
+        key = self.file_key(lora_name)
+        lora_path = key[0]
+        with self._lock:
+            if key in self._loras:
+                self._loras.move_to_end(key)
+                self.counters["lora_hits"] += 1
+                return self._loras[key][0]
+        lora = comfy.utils.load_torch_file(lora_path, safe_load=True)
+        size = _state_dict_bytes(lora)
+        with self._lock:
+            self.counters["lora_loads"] += 1
+            self._loras[key] = (lora, size)
+            while len(self._loras) > 1 and sum(entry[1] for entry in self._loras.values()) > self.max_bytes:
+                self._loras.popitem(last=False)
+        return lora
+
+    def patched(self, model, clip, stack: tuple):
+        """
+        Patched (model, clip) for a LoRA stack, reused while the base objects are alive.
+
+        Args:
+            model: Base MODEL
+            clip: Base CLIP (None for model-only)
+            stack: Tuple of (lora_name, strength_model, strength_clip)
+        """
+        # A LoRA retrained under the same name must not reuse the old patches
+        files = tuple(
+            self.file_key(lora_name) if strength_model != 0 or strength_clip != 0 else None
+            for lora_name, strength_model, strength_clip in stack
+        )
+        key = (id(model), id(clip), stack, files)
+        with self._lock:
+            # Drop entries whose base model or CLIP is gone (ids may be reused)
+            for stale in [k for k, (refs, _) in self._patched.items() if any(ref() is None for ref in refs)]:
+                del self._patched[stale]
+            entry = self._patched.get(key)
+            if entry is not None and entry[0][0]() is model and (clip is None or entry[0][1]() is clip):
+                self._patched.move_to_end(key)
+                self.counters["patched_hits"] += 1
+                return entry[1]
+
+        outputs = (model, clip)
+        for lora_name, strength_model, strength_clip in stack:
+            if strength_model == 0 and strength_clip == 0:
+                continue
+            lora = self.load_lora(lora_name)
+            outputs = comfy.sd.load_lora_for_models(outputs[0], outputs[1], lora, strength_model, strength_clip)
+        refs = (weakref.ref(model),) + ((weakref.ref(clip),) if clip is not None else ())
+        with self._lock:
+            self.counters["patched_misses"] += 1
+            self._patched[key] = (refs, outputs)
+            while len(self._patched) > self.max_patched:
+                self._patched.popitem(last=False)
+        return outputs
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.counters,
+                "ram_loras": len(self._loras),
+                "ram_bytes": sum(entry[1] for entry in self._loras.values()),
+                "max_ram_bytes": self.max_bytes,
+                "patched_entries": len(self._patched),
+            }
+
+
+LORA_RAM_CACHE = LoraRamCache()
+
+
+class RylaCachedLoraLoader:
+    """LoraLoader with cross-request LoRA and patched model caching."""
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "model": ("MODEL",),
+                "clip": ("CLIP",),
+                "lora_name": (folder_paths.get_filename_list("loras"),),
+                "strength_model": ("FLOAT", {"default": 1.0, "min": -100.0, "max": 100.0, "step": 0.01}),
+                "strength_clip": ("FLOAT", {"default": 1.0, "min": -100.0, "max": 100.0, "step": 0.01}),
+            },
+        }
+
+    RETURN_TYPES = ("MODEL", "CLIP")
+    FUNCTION = "load_lora"
+    CATEGORY = "loaders"
+
+    def load_lora(self, model, clip, lora_name, strength_model, strength_clip):
+        if strength_model == 0 and strength_clip == 0:
+            return (model, clip)
+        return LORA_RAM_CACHE.patched(model, clip, ((lora_name, strength_model, strength_clip),))
+
+
+class RylaCachedLoraLoaderModelOnly:
+    """LoraLoaderModelOnly with cross-request LoRA and patched model caching."""
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "model": ("MODEL",),
+                "lora_name": (folder_paths.get_filename_list("loras"),),
+                "strength_model": ("FLOAT", {"default": 1.0, "min": -100.0, "max": 100.0, "step": 0.01}),
+            },
+        }
+
+    RETURN_TYPES = ("MODEL",)
+    FUNCTION = "load_lora_model_only"
+    CATEGORY = "loaders"
+
+    def load_lora_model_only(self, model, lora_name, strength_model):
+        if strength_model == 0:
+            return (model,)
+        return (LORA_RAM_CACHE.patched(model, None, ((lora_name, strength_model, 0),))[0],)
+
+
+class RylaCachedLoraStack:
+    """Applies a stack of LoRAs in one node, cached per stack signature."""
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "model": ("MODEL",),
+                # JSON list of [lora_name, strength_model, strength_clip]
+                "stack": ("STRING", {"multiline": True, "default": "[]"}),
+            },
+            "optional": {
+                "clip": ("CLIP",),
+            },
+        }
+
+    RETURN_TYPES = ("MODEL", "CLIP")
+    FUNCTION = "load_stack"
+    CATEGORY = "loaders"
+
+    def load_stack(self, model, stack, clip=None):
+        entries = tuple(
+            (str(name), float(strength_model), float(strength_clip) if clip is not None else 0.0)
+            for name, strength_model, strength_clip in json.loads(stack)
+        )
+        if not entries:
+            return (model, clip)
+        return LORA_RAM_CACHE.patched(model, clip, entries)
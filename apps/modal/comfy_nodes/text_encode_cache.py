@@ -0,0 +1,145 @@
+"""
+Cached CLIPTextEncode.
+
+Every Flux Dev, Z-Image and Qwen request re-encodes its prompt and the
+constant default negative prompt through a large text encoder (T5-XXL,
+Qwen2.5-VL). ``RylaCachedCLIPTextEncode`` is a drop-in replacement for
+``CLIPTextEncode`` that keeps conditioning in a RAM LRU keyed on
+(encoder, text) and spills evicted entries to local disk, so repeated
+prompts skip the encoder entirely.
+
+``encoder_key`` identifies the text encoder: the API rewrites each
+CLIPTextEncode node with a hash of the loader/LoRA chain feeding its
+``clip`` input (see ``utils.comfyui.to_cached_text_encoders``). Nodes
+without a key encode normally.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import torch
+
+import nodes
+
+# Conditionings kept in RAM (a T5-XXL conditioning is ~2 MB)
+MAX_RAM_ENTRIES = int(os.environ.get("RYLA_TEXT_CACHE_ENTRIES", "256"))
+
+# Evicted entries are written here (set RYLA_TEXT_CACHE_DIR="" to disable)
+SPILL_DIR = os.environ.get("RYLA_TEXT_CACHE_DIR", "/tmp/ryla-text-encode-cache")
+SPILL_MAX_BYTES = int(os.environ.get("RYLA_TEXT_CACHE_SPILL_BYTES", str(2 * 1024**3)))
+
+
+class TextEncodeCache:
+    """RAM LRU of conditionings with spill-to-disk."""
+
+    def __init__(self, max_entries: int = MAX_RAM_ENTRIES, spill_dir: str = SPILL_DIR):
+        self.max_entries = max_entries
+        self.spill_dir = spill_dir or None
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"hits_ram": 0, "hits_disk": 0, "misses": 0, "spilled": 0}
+
+    @staticmethod
+    def key(encoder_key: str, text: str) -> str:
+        return hashlib.sha256(f"{encoder_key}\0{text}".encode("utf-8")).hexdigest()
+
+    def _spill_path(self, key: str) -> str:
+        return os.path.join(self.spill_dir, f"{key}.pt")
+
+    def get(self, key: str):
+        """Get a conditioning from RAM, then disk (promoting it back to RAM)."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.counters["hits_ram"] += 1
+                return self._entries[key]
+        if self.spill_dir and os.path.exists(self._spill_path(key)):
+            try:
+                conditioning = torch.load(self._spill_path(key), map_location="cpu", weights_only=False)
+            except Exception as e:
+                print(f"⚠️  Failed to load cached conditioning {key[:12]}: {e}")
+                return None
+            os.utime(self._spill_path(key))
+            self.counters["hits_disk"] += 1
+            self.put(key, conditioning)
+            return conditioning
+        return None
+
+    def put(self, key: str, conditioning):
+        """Store a conditioning, spilling the least recently used entries."""
+        with self._lock:
+            self._entries[key] = conditioning
+            self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False))
+        for evicted_key, evicted_conditioning in evicted:
+            self._spill(evicted_key, evicted_conditioning)
+
+    def _spill(self, key: str, conditioning):
+        if not self.spill_dir:
+            return
+        path = self._spill_path(key)
+        if os.path.exists(path):
+            return
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            torch.save(conditioning, tmp_path)
+            os.replace(tmp_path, path)
+            self.counters["spilled"] += 1
+            self._prune_spill()
+        except Exception as e:
+            print(f"⚠️  Failed to spill conditioning {key[:12]}: {e}")
+
+    def _prune_spill(self):
+        """Delete the least recently used spill files beyond SPILL_MAX_BYTES."""
+        files = [entry for entry in os.scandir(self.spill_dir) if entry.name.endswith(".pt")]
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        total = sum(entry.stat().st_size for entry in files)
+        for entry in files:
+            if total <= SPILL_MAX_BYTES:
+                break
+            total -= entry.stat().st_size
+            os.remove(entry.path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counters, "ram_entries": len(self._entries), "max_ram_entries": self.max_entries}
+
+
+TEXT_ENCODE_CACHE = TextEncodeCache()
+
+
+class RylaCachedCLIPTextEncode:
+    """CLIPTextEncode with a cross-request conditioning cache."""
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "text": ("STRING", {"multiline": True, "dynamicPrompts": True}),
+                "clip": ("CLIP",),
+            },
+            "optional": {
+                "encoder_key": ("STRING", {"default": ""}),
+            },
+        }
+
+    RETURN_TYPES = ("CONDITIONING",)
+    FUNCTION = "encode"
+    CATEGORY = "conditioning"
+
+    def encode(self, clip, text, encoder_key=""):
+        if not encoder_key:
+            return nodes.CLIPTextEncode().encode(clip, text)
+
+        key = TEXT_ENCODE_CACHE.key(encoder_key, text)
+        conditioning = TEXT_ENCODE_CACHE.get(key)
+        if conditioning is None:
+            TEXT_ENCODE_CACHE.counters["misses"] += 1
+            conditioning = nodes.CLIPTextEncode().encode(clip, text)[0]
+            TEXT_ENCODE_CACHE.put(key, conditioning)
+        return (conditioning,)
@@ -5,45 +5,20 @@ Handles Flux Schnell, Flux Dev, and Flux Dev + LoRA text-to-image generation.
 """
 
 import json
-import subprocess
 import uuid
-from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional
 from fastapi import Response, HTTPException
 
 from utils.cost_tracker import CostTracker, get_cost_summary
+from utils.executor import run_impl
+from utils.image_utils import build_images_response, parse_num_images
+from utils.lora_cache import get_lora_cache
+from utils.lora_stack import lora_chain_nodes, prepend_trigger_words, resolve_lora_stack
 
 # Default negative prompt for quality (use if none provided)
 DEFAULT_NEGATIVE_PROMPT = "ugly, deformed, disfigured, bad anatomy, poorly drawn hands, poorly drawn face, blurry, low quality, cartoon, anime, 3d render, illustration"
 
 
-def ensure_lora_symlink(lora_filename: str) -> bool:
-    """
-    Ensure LoRA file is symlinked from volume to ComfyUI directory.
-    
-    Args:
-        lora_filename: LoRA filename (e.g., "character-123.safetensors")
-    
-    Returns:
-        True if LoRA is available, False otherwise
-    """
-    comfy_lora_path = Path(f"/root/comfy/ComfyUI/models/loras/{lora_filename}")
-    volume_lora_path = Path(f"/root/models/loras/{lora_filename}")
-    
-    # Already exists in ComfyUI directory
-    if comfy_lora_path.exists():
-        return True
-    
-    # Exists in volume - create symlink
-    if volume_lora_path.exists():
-        comfy_lora_path.parent.mkdir(parents=True, exist_ok=True)
-        subprocess.run(f"ln -s {volume_lora_path} {comfy_lora_path}", shell=True, check=True)
-        print(f"✅ Symlinked LoRA: {lora_filename}")
-        return True
-    
-    return False
-
-
 def build_flux_workflow(item: dict) -> dict:
     """
     Build Flux Schnell workflow JSON.
@@ -109,7 +84,7 @@ def build_flux_workflow(item: dict) -> dict:
             "inputs": {
                 "width": item.get("width", 1024),
                 "height": item.get("height", 1024),
-                "batch_size": 1,
+                "batch_size": parse_num_images(item),
             },
         },
     }
@@ -170,7 +145,7 @@ def build_flux_dev_workflow(item: dict) -> dict:
             "inputs": {
                 "width": item.get("width", 1024),
                 "height": item.get("height", 1024),
-                "batch_size": 1,
+                "batch_size": parse_num_images(item),
             },
         },
         # Sampling
@@ -207,22 +182,37 @@ def build_flux_dev_workflow(item: dict) -> dict:
     }
 
 
-def build_flux_dev_lora_workflow(item: dict, lora_filename: str) -> dict:
+def build_flux_dev_lora_workflow(item: dict, lora_filename: str, lora_stack: Optional[list] = None) -> dict:
     """
     Build Flux Dev + LoRA workflow JSON.
     
+    Extra LoRAs (realism, style) are chained after the character LoRA.
+    
     Args:
         item: Request payload with prompt, lora_id, trigger_word, etc.
         lora_filename: LoRA filename (e.g., "character-123.safetensors")
+        lora_stack: Extra (lora_filename, strength, trigger_word) tuples (optional)
     
     Returns:
-        ComfyUI workflow dictionary with LoRA loader
+        ComfyUI workflow dictionary with LoRA loaders
     """
-    # Build prompt with trigger word if provided
+    lora_stack = lora_stack or []
+    
+    # Build prompt with trigger words if provided
     prompt = item["prompt"]
     trigger_word = item.get("trigger_word", "")
     if trigger_word:
         prompt = f"{trigger_word} {prompt}"
+    prompt = prepend_trigger_words(prompt, lora_stack)
+    
+    # LoRA chain - applies LoRAs to model and CLIP: character LoRA, then the stack
+    lora_strength = item.get("lora_strength", 1.0)
+    lora_nodes, lora_model, lora_clip = lora_chain_nodes(
+        [(lora_filename, lora_strength)] + [(name, strength) for name, strength, _ in lora_stack],
+        model=["1", 0],  # UNETLoader output
+        clip=["2", 0],   # DualCLIPLoader output
+        first_node_id=10,
+    )
     
     return {
         # Model loaders (Flux Dev - separate loaders)
@@ -248,30 +238,20 @@ def build_flux_dev_lora_workflow(item: dict, lora_filename: str) -> dict:
                 "vae_name": "ae.safetensors",
             },
         },
-        # LoRA loader - applies LoRA to model and CLIP
-        "10": {
-            "class_type": "LoraLoader",
-            "inputs": {
-                "model": ["1", 0],  # UNETLoader output
-                "clip": ["2", 0],   # DualCLIPLoader output
-                "lora_name": lora_filename,
-                "strength_model": item.get("lora_strength", 1.0),
-                "strength_clip": item.get("lora_strength", 1.0),
-            },
-        },
+        **lora_nodes,
         # Prompt encoding (using LoRA-modified CLIP)
         "4": {
             "class_type": "CLIPTextEncode",
             "inputs": {
                 "text": prompt,
-                "clip": ["10", 1],  # LoRA-modified CLIP
+                "clip": lora_clip,  # LoRA-modified CLIP
             },
         },
         "5": {
             "class_type": "CLIPTextEncode",
             "inputs": {
                 "text": item.get("negative_prompt") or DEFAULT_NEGATIVE_PROMPT,
-                "clip": ["10", 1],
+                "clip": lora_clip,
             },
         },
         # Latent image
@@ -293,7 +273,7 @@ def build_flux_dev_lora_workflow(item: dict, lora_filename: str) -> dict:
                 "sampler_name": "euler",
                 "scheduler": "simple",
                 "denoise": 1.0,
-                "model": ["10", 0],  # LoRA-modified model
+                "model": lora_model,  # LoRA-modified model
                 "positive": ["4", 0],
                 "negative": ["5", 0],
                 "latent_image": ["6", 0],
@@ -329,16 +309,22 @@ class FluxHandler:
         tracker = CostTracker(gpu_type="L40S")
         tracker.start()
         
+        try:
+            num_images = parse_num_images(item)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
         # Build workflow
         workflow = build_flux_workflow(item)
         
-        # Save workflow to temp file
-        client_id = uuid.uuid4().hex
-        workflow_file = f"/tmp/{client_id}.json"
-        json.dump(workflow, Path(workflow_file).open("w"))
-        
         # Execute
-        img_bytes = self.comfyui.infer.local(workflow_file)  # Use local since we're in the same container
+        if num_images > 1:
+            images = self.comfyui.infer_workflow_images(workflow)
+        elif "seed" not in item:
+            # No seed requested: may share one latent batch with identical requests
+            img_bytes = self.comfyui.infer_batched(workflow)
+        else:
+            img_bytes = self.comfyui.infer_workflow(workflow)
         
         # Calculate cost
         execution_time = tracker.stop()
@@ -348,7 +334,10 @@ class FluxHandler:
         print(f"💰 {get_cost_summary(cost_metrics)}")
         
         # Return response with cost headers
-        response = Response(img_bytes, media_type="image/jpeg")
+        if num_images > 1:
+            response = build_images_response(images)
+        else:
+            response = Response(img_bytes, media_type="image/jpeg")
         response.headers["X-Cost-USD"] = f"{cost_metrics.total_cost:.6f}"
         response.headers["X-Execution-Time-Sec"] = f"{execution_time:.3f}"
         response.headers["X-GPU-Type"] = cost_metrics.gpu_type
@@ -360,16 +349,22 @@ class FluxHandler:
         tracker = CostTracker(gpu_type="L40S")
         tracker.start()
         
+        try:
+            num_images = parse_num_images(item)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
         # Build workflow
         workflow = build_flux_dev_workflow(item)
         
-        # Save workflow to temp file
-        client_id = uuid.uuid4().hex
-        workflow_file = f"/tmp/{client_id}.json"
-        json.dump(workflow, Path(workflow_file).open("w"))
-        
         # Execute
-        img_bytes = self.comfyui.infer.local(workflow_file)  # Use local since we're in the same container
+        if num_images > 1:
+            images = self.comfyui.infer_workflow_images(workflow)
+        elif "seed" not in item:
+            # No seed requested: may share one latent batch with identical requests
+            img_bytes = self.comfyui.infer_batched(workflow)
+        else:
+            img_bytes = self.comfyui.infer_workflow(workflow)
         
         # Calculate cost
         execution_time = tracker.stop()
@@ -379,7 +374,10 @@ class FluxHandler:
         print(f"💰 {get_cost_summary(cost_metrics)}")
         
         # Return response with cost headers
-        response = Response(img_bytes, media_type="image/jpeg")
+        if num_images > 1:
+            response = build_images_response(images)
+        else:
+            response = Response(img_bytes, media_type="image/jpeg")
         response.headers["X-Cost-USD"] = f"{cost_metrics.total_cost:.6f}"
         response.headers["X-Execution-Time-Sec"] = f"{execution_time:.3f}"
         response.headers["X-GPU-Type"] = cost_metrics.gpu_type
@@ -401,26 +399,30 @@ class FluxHandler:
             lora_filename = f"character-{lora_id}.safetensors"
         
         # Ensure LoRA is available
-        if not ensure_lora_symlink(lora_filename):
+        if not get_lora_cache(self.comfyui).ensure(lora_filename):
             raise HTTPException(
                 status_code=404,
                 detail=f"LoRA not found: {lora_filename}. Train it first using the LoRA training endpoint."
             )
         
+        # Realism/style LoRAs stacked on the character LoRA
+        try:
+            lora_stack = resolve_lora_stack(item, base_model="flux")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        for stack_filename, _, _ in lora_stack:
+            if not get_lora_cache(self.comfyui).ensure(stack_filename):
+                raise HTTPException(status_code=404, detail=f"LoRA not found: {stack_filename}")
+        
         # Start cost tracking
         tracker = CostTracker(gpu_type="L40S")
         tracker.start()
         
-        # Build workflow with LoRA
-        workflow = build_flux_dev_lora_workflow(item, lora_filename)
-        
-        # Save workflow to temp file
-        client_id = uuid.uuid4().hex
-        workflow_file = f"/tmp/{client_id}.json"
-        json.dump(workflow, Path(workflow_file).open("w"))
+        # Build workflow with LoRA stack
+        workflow = build_flux_dev_lora_workflow(item, lora_filename, lora_stack)
         
         # Execute
-        img_bytes = self.comfyui.infer.local(workflow_file)
+        img_bytes = self.comfyui.infer_workflow(workflow)
         
         # Calculate cost
         execution_time = tracker.stop()
@@ -454,7 +456,7 @@ def setup_flux_endpoints(fastapi, comfyui_instance):
     @fastapi.post("/flux")
     async def flux_route(request: Request):
         item = await request.json()
-        result = handler._flux_impl(item)
+        result = await run_impl(comfyui_instance, handler._flux_impl, item)
         # Preserve cost headers
         response = FastAPIResponse(
             content=result.body,
@@ -468,7 +470,7 @@ def setup_flux_endpoints(fastapi, comfyui_instance):
     @fastapi.post("/flux-dev")
     async def flux_dev_route(request: Request):
         item = await request.json()
-        result = handler._flux_dev_impl(item)
+        result = await run_impl(comfyui_instance, handler._flux_dev_impl, item)
         # Preserve cost headers
         response = FastAPIResponse(
             content=result.body,
@@ -493,7 +495,7 @@ def setup_flux_endpoints(fastapi, comfyui_instance):
         - width, height, steps, cfg, seed: Standard generation params
         """
         item = await request.json()
-        result = handler._flux_dev_lora_impl(item)
+        result = await run_impl(comfyui_instance, handler._flux_dev_lora_impl, item)
         # Preserve cost and LoRA headers
         response = FastAPIResponse(
             content=result.body,
@@ -534,7 +536,7 @@ def setup_flux_endpoints(fastapi, comfyui_instance):
         if "ultra realistic" not in prompt.lower():
             item["prompt"] = f"Ultra realistic, {prompt}"
         
-        result = handler._flux_dev_lora_impl(item)
+        result = await run_impl(comfyui_instance, handler._flux_dev_lora_impl, item)
         response = FastAPIResponse(
             content=result.body,
             media_type=result.media_type,
@@ -14,6 +14,8 @@ from typing import Dict
 from fastapi import Response, HTTPException
 
 from utils.cost_tracker import CostTracker, get_cost_summary
+from utils.cancellation import RequestCancelled
+from utils.executor import run_impl
 from utils.image_utils import save_base64_to_file
 
 
@@ -190,6 +192,8 @@ def _save_reference_image(reference_image: str) -> str:
     """
     Save reference image from base64 data URL to ComfyUI input directory.
     
+    Files are named by content, so a repeated reference reuses the same file.
+    
     Args:
         reference_image: Base64 data URL or file path
         
@@ -200,28 +204,9 @@ def _save_reference_image(reference_image: str) -> str:
         # Already a file path
         return reference_image
     
-    # Base64 data URL - save to ComfyUI input directory
-    from utils.image_utils import decode_base64
-    import io
-    from PIL import Image
-    
-    image_bytes = decode_base64(reference_image)
-    comfy_dir = Path("/root/comfy/ComfyUI")
-    input_dir = comfy_dir / "input"
-    input_dir.mkdir(parents=True, exist_ok=True)
-    image_filename = f"instantid_ref_{uuid.uuid4().hex[:8]}.jpg"
-    image_path = input_dir / image_filename
+    from utils.image_utils import save_reference_image
     
-    # Validate and save image
-    try:
-        img = Image.open(io.BytesIO(image_bytes))
-        if img.mode != "RGB":
-            img = img.convert("RGB")
-        img.save(image_path, "JPEG")
-        print(f"✅ Saved reference image: {image_filename}")
-        return image_filename
-    except Exception as e:
-        raise ValueError(f"Invalid image format: {e}")
+    return save_reference_image(reference_image, "instantid_ref")
 
 
 def build_sdxl_instantid_workflow(item: dict) -> dict:
@@ -404,6 +389,8 @@ class InstantIDHandler:
         try:
             from utils.comfyui import execute_workflow_via_api
             img_bytes = execute_workflow_via_api(workflow, port=port, timeout=600)
+        except RequestCancelled:
+            raise  # a cancelled render must not be re-run via infer
         except Exception as e:
             # Store the API error for better error reporting
             api_error = str(e)
@@ -440,22 +427,7 @@ class InstantIDHandler:
                 if Path(workflow_file).exists():
                     Path(workflow_file).unlink()
         
-        # Clean up reference image if it was saved
-        # Get the reference image filename from the workflow
-        reference_image_filename = None
-        for node in workflow.values():
-            if node.get("class_type") == "LoadImage":
-                ref_img = node.get("inputs", {}).get("image", "")
-                if ref_img and not ref_img.startswith("/") and not ref_img.startswith("data:"):
-                    reference_image_filename = ref_img
-                    break
-        
-        if reference_image_filename:
-            input_dir = Path("/root/comfy/ComfyUI/input")
-            image_path = input_dir / reference_image_filename
-            if image_path.exists():
-                image_path.unlink()
-                print(f"✅ Cleaned up reference image: {reference_image_filename}")
+        # Reference images are named by content and reused by later requests
         
         # Calculate cost
         execution_time = tracker.stop()
@@ -518,6 +490,8 @@ class InstantIDHandler:
         try:
             from utils.comfyui import execute_workflow_via_api
             img_bytes = execute_workflow_via_api(workflow, port=port, timeout=600)
+        except RequestCancelled:
+            raise  # a cancelled render must not be re-run via infer
         except Exception as e:
             # Store the API error for better error reporting
             api_error = str(e)
@@ -554,21 +528,7 @@ class InstantIDHandler:
                 if Path(workflow_file).exists():
                     Path(workflow_file).unlink()
         
-        # Clean up reference image if it was saved
-        reference_image_filename = None
-        for node in workflow.values():
-            if node.get("class_type") == "LoadImage":
-                ref_img = node.get("inputs", {}).get("image", "")
-                if ref_img and not ref_img.startswith("/") and not ref_img.startswith("data:"):
-                    reference_image_filename = ref_img
-                    break
-        
-        if reference_image_filename:
-            input_dir = Path("/root/comfy/ComfyUI/input")
-            image_path = input_dir / reference_image_filename
-            if image_path.exists():
-                image_path.unlink()
-                print(f"✅ Cleaned up reference image: {reference_image_filename}")
+        # Reference images are named by content and reused by later requests
         
         # Calculate cost
         execution_time = tracker.stop()
@@ -602,7 +562,7 @@ def setup_instantid_endpoints(fastapi, comfyui_instance):
     async def flux_instantid_route(request: Request):
         try:
             item = await request.json()
-            result = handler._flux_instantid_impl(item)
+            result = await run_impl(comfyui_instance, handler._flux_instantid_impl, item)
             # Preserve cost headers
             response = FastAPIResponse(
                 content=result.body,
@@ -660,7 +620,7 @@ def setup_instantid_endpoints(fastapi, comfyui_instance):
         """
         try:
             item = await request.json()
-            result = handler._sdxl_instantid_impl(item)
+            result = await run_impl(comfyui_instance, handler._sdxl_instantid_impl, item)
             # Preserve cost headers
             response = FastAPIResponse(
                 content=result.body,
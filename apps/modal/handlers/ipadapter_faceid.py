@@ -13,6 +13,8 @@ from typing import Dict
 from fastapi import Response, HTTPException
 
 from utils.cost_tracker import CostTracker, get_cost_summary
+from utils.cancellation import RequestCancelled
+from utils.executor import run_impl
 from utils.image_utils import save_base64_to_file
 
 # Default negative prompt for quality (use if none provided)
@@ -23,6 +25,8 @@ def _save_reference_image(reference_image: str) -> str:
     """
     Save reference image from base64 data URL to ComfyUI input directory.
     
+    Files are named by content, so a repeated reference reuses the same file.
+    
     Args:
         reference_image: Base64 data URL or file path
         
@@ -33,28 +37,9 @@ def _save_reference_image(reference_image: str) -> str:
         # Already a file path
         return reference_image
     
-    # Base64 data URL - save to ComfyUI input directory
-    from utils.image_utils import decode_base64
-    import io
-    from PIL import Image
-    
-    image_bytes = decode_base64(reference_image)
-    comfy_dir = Path("/root/comfy/ComfyUI")
-    input_dir = comfy_dir / "input"
-    input_dir.mkdir(parents=True, exist_ok=True)
-    image_filename = f"ipadapter_ref_{uuid.uuid4().hex[:8]}.jpg"
-    image_path = input_dir / image_filename
+    from utils.image_utils import save_reference_image
     
-    # Validate and save image
-    try:
-        img = Image.open(io.BytesIO(image_bytes))
-        if img.mode != "RGB":
-            img = img.convert("RGB")
-        img.save(image_path, "JPEG")
-        print(f"✅ Saved reference image: {image_filename}")
-        return image_filename
-    except Exception as e:
-        raise ValueError(f"Invalid image format: {e}")
+    return save_reference_image(reference_image, "ipadapter_ref")
 
 
 def build_flux_ipadapter_faceid_workflow(item: dict) -> dict:
@@ -228,6 +213,8 @@ class IPAdapterFaceIDHandler:
         try:
             from utils.comfyui import execute_workflow_via_api
             img_bytes = execute_workflow_via_api(workflow, port=port, timeout=600)
+        except RequestCancelled:
+            raise  # a cancelled render must not be re-run via infer
         except Exception as e:
             # Store the API error for better error reporting
             api_error = str(e)
@@ -264,21 +251,7 @@ class IPAdapterFaceIDHandler:
                 if Path(workflow_file).exists():
                     Path(workflow_file).unlink()
         
-        # Clean up reference image if it was saved
-        reference_image_filename = None
-        for node in workflow.values():
-            if node.get("class_type") == "LoadImage":
-                ref_img = node.get("inputs", {}).get("image", "")
-                if ref_img and not ref_img.startswith("/") and not ref_img.startswith("data:"):
-                    reference_image_filename = ref_img
-                    break
-        
-        if reference_image_filename:
-            input_dir = Path("/root/comfy/ComfyUI/input")
-            image_path = input_dir / reference_image_filename
-            if image_path.exists():
-                image_path.unlink()
-                print(f"✅ Cleaned up reference image: {reference_image_filename}")
+        # Reference images are named by content and reused by later requests
         
         # Calculate cost
         execution_time = tracker.stop()
@@ -318,7 +291,7 @@ def setup_ipadapter_faceid_endpoints(fastapi, comfyui_instance):
         """
         try:
             item = await request.json()
-            result = handler._flux_ipadapter_faceid_impl(item)
+            result = await run_impl(comfyui_instance, handler._flux_ipadapter_faceid_impl, item)
             # Preserve cost headers
             response = FastAPIResponse(
                 content=result.body,
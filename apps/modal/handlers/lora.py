@@ -6,12 +6,12 @@ Handles Flux Dev + LoRA character-specific generation.
 
 import json
 import uuid
-import subprocess
-from pathlib import Path
 from typing import Dict
 from fastapi import Response, HTTPException
 
 from utils.cost_tracker import CostTracker, get_cost_summary
+from utils.executor import run_impl
+from utils.lora_cache import get_lora_cache
 
 
 def build_flux_lora_workflow(item: dict, lora_filename: str) -> dict:
@@ -138,21 +138,8 @@ class LoRAHandler:
             lora_id = item["lora_id"]
             lora_filename = f"character-{lora_id}.safetensors"
         
-        # Check LoRA in ComfyUI loras directory (models should be symlinked there from volume)
-        comfy_lora_path = Path(f"/root/comfy/ComfyUI/models/loras/{lora_filename}")
-        volume_lora_path = Path(f"/root/models/loras/{lora_filename}")
-        
-        # If LoRA exists in volume but not in ComfyUI directory, symlink it
-        if volume_lora_path.exists() and not comfy_lora_path.exists():
-            comfy_lora_path.parent.mkdir(parents=True, exist_ok=True)
-            subprocess.run(
-                f"ln -s {volume_lora_path} {comfy_lora_path}",
-                shell=True,
-                check=False,
-            )
-        
-        # Check if LoRA exists (in ComfyUI directory or volume)
-        if not comfy_lora_path.exists() and not volume_lora_path.exists():
+        # Copy the LoRA to local disk (hot cache) and link it for ComfyUI
+        if not get_lora_cache(self.comfyui).ensure(lora_filename):
             raise HTTPException(
                 status_code=404,
                 detail=f"LoRA not found. Expected: {lora_filename} in /root/models/loras/ or /root/comfy/ComfyUI/models/loras/"
@@ -203,7 +190,7 @@ def setup_lora_endpoints(fastapi, comfyui_instance):
     @fastapi.post("/flux-lora")
     async def flux_lora_route(request: Request):
         item = await request.json()
-        result = handler._flux_lora_impl(item)
+        result = await run_impl(comfyui_instance, handler._flux_lora_impl, item)
         # Preserve cost headers
         response = FastAPIResponse(
             content=result.body,
@@ -12,6 +12,7 @@ from typing import Dict
 from fastapi import Response, HTTPException
 
 from utils.cost_tracker import CostTracker, get_cost_summary
+from utils.executor import run_impl
 from utils.image_utils import save_base64_to_file
 
 # Default negative prompt for quality (use if none provided)
@@ -22,6 +23,8 @@ def _save_reference_image(reference_image: str) -> str:
     """
     Save reference image from base64 data URL to ComfyUI input directory.
     
+    Files are named by content, so a repeated reference reuses the same file.
+    
     Args:
         reference_image: Base64 data URL or file path
         
@@ -32,28 +35,9 @@ def _save_reference_image(reference_image: str) -> str:
         # Already a file path
         return reference_image
     
-    # Base64 data URL - save to ComfyUI input directory
-    from utils.image_utils import decode_base64
-    import io
-    from PIL import Image
-    
-    image_bytes = decode_base64(reference_image)
-    comfy_dir = Path("/root/comfy/ComfyUI")
-    input_dir = comfy_dir / "input"
-    input_dir.mkdir(parents=True, exist_ok=True)
-    image_filename = f"pulid_ref_{uuid.uuid4().hex[:8]}.jpg"
-    image_path = input_dir / image_filename
+    from utils.image_utils import save_reference_image
     
-    # Validate and save image
-    try:
-        img = Image.open(io.BytesIO(image_bytes))
-        if img.mode != "RGB":
-            img = img.convert("RGB")
-        img.save(image_path, "JPEG")
-        print(f"✅ Saved reference image: {image_filename}")
-        return image_filename
-    except Exception as e:
-        raise ValueError(f"Invalid image format: {e}")
+    return save_reference_image(reference_image, "pulid_ref")
 
 
 def build_pulid_flux_workflow(item: dict) -> dict:
@@ -268,6 +252,6 @@ def setup_pulid_flux_endpoints(fastapi, comfyui_instance):
         }
         """
         item = await request.json()
-        return handler._pulid_flux_impl(item)
+        return await run_impl(comfyui_instance, handler._pulid_flux_impl, item)
     
     print("✅ PuLID Flux endpoints registered: /flux-pulid")
@@ -26,6 +26,7 @@ import sys
 sys.path.insert(0, "/root/utils")
 
 from cost_tracker import CostTracker, get_cost_summary
+from executor import run_impl
 
 
 # Default negative prompt for editing
@@ -370,13 +371,8 @@ class QwenEditHandler:
             denoise=denoise,
         )
         
-        # Save workflow to temp file
-        workflow_file = f"/tmp/{uuid.uuid4().hex}.json"
-        with open(workflow_file, "w") as f:
-            json.dump(workflow, f)
-        
         # Execute workflow
-        output_bytes = self.comfyui.infer.local(workflow_file)
+        output_bytes = self.comfyui.infer_workflow(workflow)
         
         # Calculate cost
         execution_time = tracker.stop()
@@ -454,13 +450,8 @@ class QwenEditHandler:
             seed=seed,
         )
         
-        # Save workflow to temp file
-        workflow_file = f"/tmp/{uuid.uuid4().hex}.json"
-        with open(workflow_file, "w") as f:
-            json.dump(workflow, f)
-        
         # Execute workflow - get fully edited image
-        edited_bytes = self.comfyui.infer.local(workflow_file)
+        edited_bytes = self.comfyui.infer_workflow(workflow)
         edited_pil = Image.open(io.BytesIO(edited_bytes)).convert("RGBA")
         
         # Resize edited to match source if needed
@@ -517,7 +508,7 @@ def setup_qwen_edit_endpoints(fastapi, comfyui_instance):
         - image/jpeg with cost headers
         """
         item = await request.json()
-        result = handler._edit_impl(item)
+        result = await run_impl(comfyui_instance, handler._edit_impl, item)
         
         response = FastAPIResponse(
             content=result.body,
@@ -549,7 +540,7 @@ def setup_qwen_edit_endpoints(fastapi, comfyui_instance):
         - image/jpeg with cost headers
         """
         item = await request.json()
-        result = handler._inpaint_impl(item)
+        result = await run_impl(comfyui_instance, handler._inpaint_impl, item)
         
         response = FastAPIResponse(
             content=result.body,
@@ -30,6 +30,9 @@ import sys
 sys.path.insert(0, "/root/utils")
 
 from cost_tracker import CostTracker, get_cost_summary
+from executor import run_impl
+from image_utils import build_images_response, parse_num_images
+from video_io import close_uploads, read_video_request, save_video_to_input, stream_file_response
 
 
 # Aspect ratio presets for Qwen-Image 2512
@@ -47,36 +50,20 @@ ASPECT_RATIOS = {
 DEFAULT_NEGATIVE_PROMPT = "低分辨率，低画质，肢体畸形，手指畸形，画面过饱和，蜡像感，人脸无细节，过度光滑，画面具有AI感。构图混乱。文字模糊，扭曲"
 
 
-def _save_video_to_input(video_data: str) -> str:
+def _save_video_to_input(video_data) -> str:
     """
-    Save base64 video data to ComfyUI input folder.
+    Save video data to ComfyUI input folder.
+    
+    Decoded/copied to disk in chunks (see video_io.save_video_to_input).
     
     Args:
-        video_data: Base64 data URL (e.g., "data:video/mp4;base64,...")
+        video_data: Base64 data URL (e.g., "data:video/mp4;base64,...";
+            mp4, webm and animated WebP from WAN I2V) or a multipart upload
     
     Returns:
         Filename in ComfyUI input folder
     """
-    # Parse data URL (supports mp4, webm, webp for animated WebP from WAN I2V)
-    if video_data.startswith("data:"):
-        header, encoded = video_data.split(",", 1)
-        mime_type = header.split(";")[0].split(":")[1]
-        ext = "mp4" if "mp4" in mime_type else "webm" if "webm" in mime_type else "webp" if "webp" in mime_type else "mp4"
-    else:
-        encoded = video_data
-        ext = "mp4"
-    
-    # Decode and save
-    video_bytes = base64.b64decode(encoded)
-    filename = f"{uuid.uuid4().hex}.{ext}"
-    input_dir = "/root/comfy/ComfyUI/input"
-    os.makedirs(input_dir, exist_ok=True)
-    filepath = os.path.join(input_dir, filename)
-    
-    with open(filepath, "wb") as f:
-        f.write(video_bytes)
-    
-    return filename
+    return save_video_to_input(video_data)
 
 
 def _save_image_to_input(image_data: str) -> str:
@@ -279,6 +266,95 @@ def build_image_faceswap_workflow(
     return workflow
 
 
+def build_frame_batch_faceswap_workflow(
+    frames_filename: str,
+    face_image_filename: str,
+    restore_face: bool = True,
+    face_restore_visibility: float = 1.0,
+    codeformer_weight: float = 0.5,
+) -> dict:
+    """
+    Build ReActor face swap workflow for a batch of video frames.
+    
+    Pipeline:
+    1. LoadImage - Load frame batch (multi-frame TIFF -> IMAGE batch)
+    2. LoadImage - Load reference face image
+    3. ReActorBuildFaceModel - Detect and embed the reference face
+    4. ReActorFaceSwap - Swap face on every frame using the face model
+    5. SaveImage - Return swapped frames (in batch order)
+    
+    Nodes 2-3 have the same inputs for every batch of a video, so ComfyUI
+    serves them from its execution cache and the reference face is only
+    detected and embedded for the first batch.
+    
+    Args:
+        frames_filename: Multi-frame image filename in ComfyUI input folder
+        face_image_filename: Face image filename in ComfyUI input folder
+        restore_face: Apply GFPGAN face restoration (default: True)
+        face_restore_visibility: Face restore blend (default: 1.0)
+        codeformer_weight: CodeFormer weight for restoration (default: 0.5)
+    
+    Returns:
+        ComfyUI workflow dictionary
+    """
+    workflow = {
+        # Load frame batch
+        "1": {
+            "class_type": "LoadImage",
+            "inputs": {
+                "image": frames_filename,
+            },
+        },
+        # Load reference face image
+        "2": {
+            "class_type": "LoadImage",
+            "inputs": {
+                "image": face_image_filename,
+            },
+        },
+        # Reference face embedding (kept in memory, not saved)
+        "3": {
+            "class_type": "ReActorBuildFaceModel",
+            "inputs": {
+                "save_mode": False,
+                "send_only": True,
+                "face_model_name": face_image_filename.rsplit(".", 1)[0],
+                "compute_method": "Mean",
+                "images": ["2", 0],
+            },
+        },
+        # ReActor face swap on every frame of the batch
+        "4": {
+            "class_type": "ReActorFaceSwap",
+            "inputs": {
+                "enabled": True,
+                "input_image": ["1", 0],  # Frame batch
+                "face_model": ["3", 0],  # Face embedding
+                "swap_model": "inswapper_128.onnx",
+                "facedetection": "retinaface_resnet50",
+                "face_restore_model": "GFPGANv1.4.pth" if restore_face else "none",
+                "face_restore_visibility": face_restore_visibility,
+                "codeformer_weight": codeformer_weight,
+                "detect_gender_input": "no",
+                "detect_gender_source": "no",
+                "input_faces_index": "0",
+                "source_faces_index": "0",
+                "console_log_level": 1,
+            },
+        },
+        # Save swapped frames
+        "5": {
+            "class_type": "SaveImage",
+            "inputs": {
+                "images": ["4", 0],
+                "filename_prefix": uuid.uuid4().hex,
+            },
+        },
+    }
+    
+    return workflow
+
+
 def build_qwen_image_2512_workflow(
     prompt: str,
     width: int = 1328,
@@ -288,6 +364,7 @@ def build_qwen_image_2512_workflow(
     seed: Optional[int] = None,
     negative_prompt: Optional[str] = None,
     use_lightning_lora: bool = False,
+    num_images: int = 1,
 ) -> dict:
     """
     Build Qwen-Image 2512 workflow JSON.
@@ -301,6 +378,7 @@ def build_qwen_image_2512_workflow(
         seed: Random seed (None for random)
         negative_prompt: Negative prompt (uses Chinese default if None)
         use_lightning_lora: Whether to use Lightning 4-step LoRA
+        num_images: Images generated in one sampler pass (latent batch size)
     
     Returns:
         ComfyUI workflow dictionary
@@ -390,7 +468,7 @@ def build_qwen_image_2512_workflow(
             "inputs": {
                 "width": width,
                 "height": height,
-                "batch_size": 1,
+                "batch_size": num_images,
             },
         },
         # KSampler
@@ -441,6 +519,7 @@ def build_qwen_image_2512_lora_workflow(
     negative_prompt: Optional[str] = None,
     lora_strength: float = 1.0,
     trigger_word: Optional[str] = None,
+    num_images: int = 1,
 ) -> dict:
     """
     Build Qwen-Image 2512 workflow with custom LoRA.
@@ -456,6 +535,7 @@ def build_qwen_image_2512_lora_workflow(
         negative_prompt: Negative prompt (uses Chinese default if None)
         lora_strength: LoRA strength (default: 1.0)
         trigger_word: Trigger word to prepend to prompt (optional)
+        num_images: Images generated in one sampler pass (latent batch size)
     
     Returns:
         ComfyUI workflow dictionary
@@ -531,7 +611,7 @@ def build_qwen_image_2512_lora_workflow(
             "inputs": {
                 "width": width,
                 "height": height,
-                "batch_size": 1,
+                "batch_size": num_images,
             },
         },
         # KSampler
@@ -607,6 +687,10 @@ class QwenImageHandler:
         width, height = self._parse_dimensions(item)
         seed = item.get("seed")
         negative_prompt = item.get("negative_prompt")
+        try:
+            num_images = parse_num_images(item)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         # Fast mode uses Lightning LoRA with 4 steps
         if fast_mode:
@@ -628,15 +712,14 @@ class QwenImageHandler:
             seed=seed,
             negative_prompt=negative_prompt,
             use_lightning_lora=use_lora,
+            num_images=num_images,
         )
         
-        # Save workflow to temp file
-        workflow_file = f"/tmp/{uuid.uuid4().hex}.json"
-        with open(workflow_file, "w") as f:
-            json.dump(workflow, f)
-        
         # Execute workflow
-        output_bytes = self.comfyui.infer.local(workflow_file)
+        if num_images > 1:
+            images = self.comfyui.infer_workflow_images(workflow)
+        else:
+            output_bytes = self.comfyui.infer_workflow(workflow)
         
         # Calculate cost
         execution_time = tracker.stop()
@@ -644,7 +727,10 @@ class QwenImageHandler:
         cost_metrics = tracker.calculate_cost(endpoint, execution_time)
         
         # Build response
-        response = Response(output_bytes, media_type="image/jpeg")
+        if num_images > 1:
+            response = build_images_response(images)
+        else:
+            response = Response(output_bytes, media_type="image/jpeg")
         response.headers["X-Cost-USD"] = f"{cost_metrics.total_cost:.6f}"
         response.headers["X-Execution-Time-Sec"] = f"{execution_time:.3f}"
         response.headers["X-GPU-Type"] = cost_metrics.gpu_type
@@ -731,6 +817,10 @@ class QwenImageHandler:
         width, height = self._parse_dimensions(item)
         seed = item.get("seed")
         negative_prompt = item.get("negative_prompt")
+        try:
+            num_images = parse_num_images(item)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         steps = item.get("steps", 50)
         cfg = item.get("cfg", 4.0)
         lora_strength = item.get("lora_strength", 1.0)
@@ -748,22 +838,24 @@ class QwenImageHandler:
             negative_prompt=negative_prompt,
             lora_strength=lora_strength,
             trigger_word=trigger_word,
+            num_images=num_images,
         )
         
-        # Save workflow to temp file
-        workflow_file = f"/tmp/{uuid.uuid4().hex}.json"
-        with open(workflow_file, "w") as f:
-            json.dump(workflow, f)
-        
         # Execute workflow
-        output_bytes = self.comfyui.infer.local(workflow_file)
+        if num_images > 1:
+            images = self.comfyui.infer_workflow_images(workflow)
+        else:
+            output_bytes = self.comfyui.infer_workflow(workflow)
         
         # Calculate cost
         execution_time = tracker.stop()
         cost_metrics = tracker.calculate_cost("qwen-image-2512-lora", execution_time)
         
         # Build response
-        response = Response(output_bytes, media_type="image/jpeg")
+        if num_images > 1:
+            response = build_images_response(images)
+        else:
+            response = Response(output_bytes, media_type="image/jpeg")
         response.headers["X-Cost-USD"] = f"{cost_metrics.total_cost:.6f}"
         response.headers["X-Execution-Time-Sec"] = f"{execution_time:.3f}"
         response.headers["X-GPU-Type"] = cost_metrics.gpu_type
@@ -886,23 +978,14 @@ class QwenImageHandler:
             if not video_files:
                 raise Exception(f"Output video not found. Searched for: {output_prefix}*.mp4")
             
-            # Read the output video
             output_video_path = video_files[0]
-            with open(output_video_path, "rb") as f:
-                output_bytes = f.read()
-            
-            # Cleanup output video
-            try:
-                os.remove(output_video_path)
-            except Exception:
-                pass
             
             # Calculate cost (video processing is more expensive)
             execution_time = tracker.stop()
             cost_metrics = tracker.calculate_cost("video-faceswap", execution_time)
             
-            # Build response
-            response = Response(output_bytes, media_type="video/mp4")
+            # Stream the output video from disk (deleted once sent)
+            response = stream_file_response(output_video_path, "video/mp4", cleanup=[output_video_path])
             response.headers["X-Cost-USD"] = f"{cost_metrics.total_cost:.6f}"
             response.headers["X-Execution-Time-Sec"] = f"{execution_time:.3f}"
             response.headers["X-GPU-Type"] = cost_metrics.gpu_type
@@ -975,13 +1058,8 @@ class QwenImageHandler:
             # Override the output prefix
             workflow["4"]["inputs"]["filename_prefix"] = output_prefix
             
-            # Save workflow and execute
-            client_id = uuid.uuid4().hex
-            workflow_file = f"/tmp/{client_id}.json"
-            json.dump(workflow, Path(workflow_file).open("w"))
-            
             # Execute via ComfyUI
-            image_bytes = self.comfyui.infer.local(workflow_file)
+            image_bytes = self.comfyui.infer_workflow(workflow)
             
             # Calculate cost
             execution_time = tracker.stop()
@@ -1012,12 +1090,15 @@ class QwenImageHandler:
     
     def _batch_video_faceswap_impl(self, item: dict) -> Response:
         """
-        Apply face swap to video using batch frame processing.
+        Apply face swap to video using batched frame processing.
+        
+        Pipeline:
+        1. Decode frames with ffmpeg to raw RGB on a pipe (PIL for animated WebP)
+        2. Send frames to ReActor in batches (one ComfyUI prompt per batch);
+           the reference face is detected and embedded once
+        3. Pipe swapped frames into ffmpeg and re-encode with the original audio
         
-        More reliable than VHS workflow approach:
-        1. Extract frames using ffmpeg
-        2. Process each frame with ReActor image faceswap
-        3. Recombine frames to video with ffmpeg
+        No per-frame image files are written.
         
         Args:
             item: Request payload with source_video, reference_image, etc.
@@ -1025,10 +1106,18 @@ class QwenImageHandler:
         Returns:
             Response with face-swapped video (MP4)
         """
-        print("🎥 BATCH VIDEO FACESWAP v2 - Starting...")  # Version marker
-        import glob
         import shutil
         import tempfile
+        from contextlib import nullcontext
+        from video_frames import (
+            FrameDecoder,
+            FrameEncoder,
+            iter_batches,
+            iter_image_frames,
+            pack_frames,
+            parse_frame_batch_size,
+            unpack_frame,
+        )
         
         # Validate required parameters
         if "source_video" not in item:
@@ -1036,161 +1125,91 @@ class QwenImageHandler:
         if "reference_image" not in item:
             raise HTTPException(status_code=400, detail="reference_image is required (base64 data URL)")
         
+        try:
+            batch_size = parse_frame_batch_size(item)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        if shutil.which("ffmpeg") is None:
+            raise Exception("ffmpeg not found in container. Contact support.")
+        
         tracker = CostTracker(gpu_type="L40S")
         tracker.start()
         
-        # Create temp directory for frames
         temp_dir = tempfile.mkdtemp(prefix="faceswap_")
-        frames_dir = os.path.join(temp_dir, "frames")
-        output_dir = os.path.join(temp_dir, "output")
-        os.makedirs(frames_dir, exist_ok=True)
-        os.makedirs(output_dir, exist_ok=True)
+        input_dir = "/root/comfy/ComfyUI/input"
+        video_filename = None
+        face_filename = None
         
         try:
             # Save video and face image
             video_filename = _save_video_to_input(item["source_video"])
             face_filename = _save_image_to_input(item["reference_image"])
+            video_path = f"{input_dir}/{video_filename}"
+            print(f"📁 Video saved: {video_path} ({os.path.getsize(video_path) / 1024:.1f} KB)")
             
-            video_path = f"/root/comfy/ComfyUI/input/{video_filename}"
-            face_path = f"/root/comfy/ComfyUI/input/{face_filename}"
-            
-            # Verify video was saved correctly
-            if not os.path.exists(video_path):
-                raise Exception(f"Video file not saved: {video_path}")
-            video_size = os.path.getsize(video_path)
-            print(f"📁 Video saved: {video_path} ({video_size / 1024:.1f} KB)")
-            
-            if not os.path.exists(face_path):
-                raise Exception(f"Face image not saved: {face_path}")
-            
-            # Get video info
+            # Parse options
             fps = item.get("fps", 24)
+            restore_face = item.get("restore_face", True)
+            face_restore_visibility = item.get("face_restore_visibility", 1.0)
+            codeformer_weight = item.get("codeformer_weight", 0.5)
             
-            # Extract frames using ffmpeg
-            print(f"📹 Extracting frames from video at {fps} fps...")
-            
-            # Check if ffmpeg is available
-            ffmpeg_check = subprocess.run("which ffmpeg", shell=True, capture_output=True, text=True)
-            if ffmpeg_check.returncode != 0:
-                raise Exception("ffmpeg not found in container. Contact support.")
-            
-            # Detect file type by reading magic bytes
-            print(f"   DEBUG: Opening {video_path} for magic detection")
-            with open(video_path, 'rb') as vf:
-                magic = vf.read(16)
-            
-            print(f"   DEBUG: Magic bytes: {magic[:12].hex()}")
-            is_riff = magic[:4] == b'RIFF'
-            is_webp_marker = magic[8:12] == b'WEBP'
-            is_webp = is_riff and is_webp_marker
-            print(f"   DEBUG: is_riff={is_riff}, is_webp_marker={is_webp_marker}, is_webp={is_webp}")
+            # Animated WebP (RIFF....WEBP) is not decodable by ffmpeg - use PIL
+            with open(video_path, "rb") as vf:
+                magic = vf.read(12)
+            is_webp = magic[:4] == b"RIFF" and magic[8:12] == b"WEBP"
             
             if is_webp:
-                # Animated WebP - use convert or imagemagick
-                print(f"   Using ImageMagick for WebP extraction...")
-                # First try with PIL/Pillow
-                try:
-                    from PIL import Image
-                    img = Image.open(video_path)
-                    frame_idx = 0
-                    while True:
-                        img.seek(frame_idx)
-                        frame_path = f"{frames_dir}/frame_{frame_idx:04d}.png"
-                        img.save(frame_path, 'PNG')
-                        frame_idx += 1
-                except EOFError:
-                    print(f"   Extracted {frame_idx} frames from WebP")
-                except Exception as webp_err:
-                    raise Exception(f"Failed to extract WebP frames: {webp_err}")
+                decoder = nullcontext()
+                (width, height), frames = iter_image_frames(video_path)
+                audio_source = None
             else:
-                # Standard video - use ffmpeg
-                extract_cmd = f'ffmpeg -y -i "{video_path}" -vf "fps={fps}" "{frames_dir}/frame_%04d.png"'
-                print(f"   Command: {extract_cmd}")
-                result = subprocess.run(extract_cmd, shell=True, capture_output=True, text=True, timeout=300)
-                print(f"   Return code: {result.returncode}")
-                
-                if result.returncode != 0:
-                    print(f"   First attempt failed.")
-                    print(f"   stdout: {result.stdout[:300] if result.stdout else 'N/A'}")
-                    print(f"   stderr: {result.stderr[:300] if result.stderr else 'N/A'}")
-                    
-                    # Try simpler extraction without fps filter
-                    print(f"   Retrying without fps filter...")
-                    extract_cmd2 = f'ffmpeg -y -i "{video_path}" "{frames_dir}/frame_%04d.png"'
-                    result = subprocess.run(extract_cmd2, shell=True, capture_output=True, text=True, timeout=300)
-                    print(f"   Retry return code: {result.returncode}")
-                    
-                    if result.returncode != 0:
-                        err_msg = result.stderr if result.stderr else result.stdout
-                        raise Exception(f"Failed to extract frames. RC: {result.returncode}. Err: {err_msg[-400:]}")
-            
-            # Get frame list
-            frame_files = sorted(glob.glob(f"{frames_dir}/frame_*.png"))
-            total_frames = len(frame_files)
-            print(f"   Extracted {total_frames} frames")
+                decoder = FrameDecoder(video_path, fps)
+                width, height = decoder.width, decoder.height
+                audio_source = video_path
             
-            if total_frames == 0:
-                raise Exception("No frames extracted from video")
-            
-            # Parse options
-            restore_face = item.get("restore_face", True)
-            face_restore_visibility = item.get("face_restore_visibility", 1.0)
-            codeformer_weight = item.get("codeformer_weight", 0.5)
+            output_video = f"{temp_dir}/output.mp4"
+            print(f"🎥 Batch video faceswap: {width}x{height} @ {fps} fps, {batch_size} frames per batch")
             
-            # Process each frame with ReActor
-            print(f"🔄 Processing {total_frames} frames with ReActor...")
-            for i, frame_path in enumerate(frame_files):
-                # Build workflow for this frame
-                frame_filename = os.path.basename(frame_path)
-                
-                # Copy frame to ComfyUI input
-                comfy_frame_path = f"/root/comfy/ComfyUI/input/{frame_filename}"
-                shutil.copy(frame_path, comfy_frame_path)
+            total_frames = 0
+            with decoder, FrameEncoder(output_video, width, height, fps, audio_source) as encoder:
+                if not is_webp:
+                    frames = decoder.frames()
                 
-                output_prefix = f"faceswap_{i:04d}"
-                
-                workflow = build_image_faceswap_workflow(
-                    source_image_filename=frame_filename,
-                    face_image_filename=face_filename,
-                    restore_face=restore_face,
-                    face_restore_visibility=face_restore_visibility,
-                    codeformer_weight=codeformer_weight,
-                )
-                workflow["4"]["inputs"]["filename_prefix"] = output_prefix
-                
-                # Execute workflow
-                client_id = uuid.uuid4().hex
-                workflow_file = f"/tmp/{client_id}.json"
-                json.dump(workflow, Path(workflow_file).open("w"))
-                
-                try:
-                    image_bytes = self.comfyui.infer.local(workflow_file)
+                for batch_index, batch in enumerate(iter_batches(frames, batch_size)):
+                    # One multi-frame file per batch; LoadImage returns it as an IMAGE batch
+                    batch_filename = f"{uuid.uuid4().hex}.tiff"
+                    batch_path = f"{input_dir}/{batch_filename}"
+                    with open(batch_path, "wb") as f:
+                        f.write(pack_frames(batch, width, height))
                     
-                    # Save output frame
-                    output_frame = f"{output_dir}/frame_{i:04d}.png"
-                    with open(output_frame, "wb") as f:
-                        f.write(image_bytes)
+                    try:
+                        workflow = build_frame_batch_faceswap_workflow(
+                            frames_filename=batch_filename,
+                            face_image_filename=face_filename,
+                            restore_face=restore_face,
+                            face_restore_visibility=face_restore_visibility,
+                            codeformer_weight=codeformer_weight,
+                        )
+                        swapped = self.comfyui.infer_workflow_images(workflow, cache=False)
+                    finally:
+                        if os.path.exists(batch_path):
+                            os.remove(batch_path)
                     
-                    if (i + 1) % 10 == 0:
-                        print(f"   Processed {i + 1}/{total_frames} frames")
-                finally:
-                    # Cleanup
-                    if os.path.exists(comfy_frame_path):
-                        os.remove(comfy_frame_path)
-            
-            print(f"✅ All frames processed")
-            
-            # Recombine frames to video using ffmpeg
-            print(f"🎬 Combining frames to video...")
-            output_video = f"{temp_dir}/output.mp4"
-            combine_cmd = f"ffmpeg -framerate {fps} -i {output_dir}/frame_%04d.png -c:v libx264 -pix_fmt yuv420p -crf 18 {output_video} -y"
-            result = subprocess.run(combine_cmd, shell=True, capture_output=True, text=True)
-            if result.returncode != 0:
-                raise Exception(f"Failed to combine frames: {result.stderr}")
+                    if len(swapped) != len(batch):
+                        raise Exception(f"ReActor returned {len(swapped)} frames for a batch of {len(batch)}")
+                    for image_bytes in swapped:
+                        encoder.write(unpack_frame(image_bytes, width, height))
+                    
+                    total_frames += len(batch)
+                    print(f"   Processed {total_frames} frames ({batch_index + 1} batches)")
+                
+                if total_frames == 0:
+                    raise Exception("No frames extracted from video")
+                
+                encoder.finish()
             
-            # Read output video
-            with open(output_video, "rb") as f:
-                output_bytes = f.read()
+            print(f"✅ All {total_frames} frames processed")
             
             # Calculate cost
             execution_time = tracker.stop()
@@ -1198,31 +1217,31 @@ class QwenImageHandler:
             
             print(f"💰 Batch video faceswap: {cost_metrics.total_cost:.6f} USD in {execution_time:.1f}s ({total_frames} frames)")
             
-            # Build response
-            response = Response(output_bytes, media_type="video/mp4")
+            # Stream the output video from disk (temp dir deleted once sent)
+            response = stream_file_response(output_video, "video/mp4", cleanup=[temp_dir])
             response.headers["X-Cost-USD"] = f"{cost_metrics.total_cost:.6f}"
             response.headers["X-Execution-Time-Sec"] = f"{execution_time:.3f}"
             response.headers["X-GPU-Type"] = cost_metrics.gpu_type
             response.headers["X-Model"] = "reactor-batch-faceswap"
             response.headers["X-FPS"] = str(fps)
             response.headers["X-Frame-Count"] = str(total_frames)
+            response.headers["X-Frame-Batch-Size"] = str(batch_size)
             
             return response
             
+        except Exception:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+        
         finally:
-            # Cleanup temp directory
+            # Cleanup input files
             try:
-                shutil.rmtree(temp_dir)
-                video_path = f"/root/comfy/ComfyUI/input/{video_filename}"
-                face_path = f"/root/comfy/ComfyUI/input/{face_filename}"
-                if os.path.exists(video_path):
-                    os.remove(video_path)
-                if os.path.exists(face_path):
-                    os.remove(face_path)
+                for filename in (video_filename, face_filename):
+                    if filename and os.path.exists(f"{input_dir}/{filename}"):
+                        os.remove(f"{input_dir}/{filename}")
             except Exception as e:
                 print(f"Warning: Failed to cleanup: {e}")
 
-
 def setup_qwen_image_endpoints(fastapi, comfyui_instance):
     """Set up Qwen-Image API endpoints."""
     from fastapi import Request
@@ -1245,12 +1264,14 @@ def setup_qwen_image_endpoints(fastapi, comfyui_instance):
         - seed: int - Random seed (optional)
         - negative_prompt: str - Negative prompt (optional, uses Chinese default)
         - use_lightning_lora: bool - Use 4-step Lightning LoRA (default: false)
+        - num_images: int - Images from one sampler pass (default: 1, max: 8)
         
         Returns:
-        - image/jpeg with cost headers
+        - image/jpeg with cost headers, or JSON {"images": [...], "count": N}
+          when num_images > 1
         """
         item = await request.json()
-        result = handler._qwen_image_2512_impl(item, fast_mode=False)
+        result = await run_impl(comfyui_instance, handler._qwen_image_2512_impl, item, fast_mode=False)
         
         response = FastAPIResponse(
             content=result.body,
@@ -1274,7 +1295,7 @@ def setup_qwen_image_endpoints(fastapi, comfyui_instance):
         ~10x faster than standard, slightly lower quality.
         """
         item = await request.json()
-        result = handler._qwen_image_2512_impl(item, fast_mode=True)
+        result = await run_impl(comfyui_instance, handler._qwen_image_2512_impl, item, fast_mode=True)
         
         response = FastAPIResponse(
             content=result.body,
@@ -1303,15 +1324,17 @@ def setup_qwen_image_endpoints(fastapi, comfyui_instance):
         - cfg: float - CFG scale (default: 4.0)
         - seed: int - Random seed (optional)
         - negative_prompt: str - Negative prompt (optional)
+        - num_images: int - Images from one sampler pass (default: 1, max: 8)
         
         Returns:
-        - image/jpeg with cost headers
+        - image/jpeg with cost headers, or JSON {"images": [...], "count": N}
+          when num_images > 1
         
         Note: LoRA must be uploaded to /root/models/loras/ on the Modal volume.
         Use lora_id for character LoRAs (auto-prefixed) or lora_name for direct filename.
         """
         item = await request.json()
-        result = handler._qwen_image_2512_lora_impl(item)
+        result = await run_impl(comfyui_instance, handler._qwen_image_2512_lora_impl, item)
         
         response = FastAPIResponse(
             content=result.body,
@@ -1331,7 +1354,8 @@ def setup_qwen_image_endpoints(fastapi, comfyui_instance):
         Processes frame-by-frame with optional face restoration.
         
         Request body:
-        - source_video: str - Base64 data URL of source video (required)
+        - source_video: str - Base64 data URL of source video (required);
+          with multipart/form-data, a file upload (other fields as JSON literals)
         - reference_image: str - Base64 data URL of face to swap in (required)
         - fps: int - Output video FPS (default: 30)
         - restore_face: bool - Apply GFPGAN face restoration (default: true)
@@ -1344,17 +1368,12 @@ def setup_qwen_image_endpoints(fastapi, comfyui_instance):
         Note: Processing time depends on video length. Expect ~1-2 seconds per frame.
         Short clips (< 10 seconds) recommended for optimal performance.
         """
-        item = await request.json()
-        result = handler._video_faceswap_impl(item)
-        
-        response = FastAPIResponse(
-            content=result.body,
-            media_type=result.media_type,
-        )
-        for key, value in result.headers.items():
-            if key.startswith("X-"):
-                response.headers[key] = value
-        return response
+        item = await read_video_request(request)
+        try:
+            # StreamingResponse from disk, already carries the X- headers
+            return await run_impl(comfyui_instance, handler._video_faceswap_impl, item)
+        finally:
+            await close_uploads(item)
     
     @fastapi.post("/image-faceswap")
     async def image_faceswap_route(request: Request):
@@ -1380,7 +1399,7 @@ def setup_qwen_image_endpoints(fastapi, comfyui_instance):
         - Character consistency across images
         """
         item = await request.json()
-        result = handler._image_faceswap_impl(item)
+        result = await run_impl(comfyui_instance, handler._image_faceswap_impl, item)
         
         response = FastAPIResponse(
             content=result.body,
@@ -1394,18 +1413,21 @@ def setup_qwen_image_endpoints(fastapi, comfyui_instance):
     @fastapi.post("/batch-video-faceswap")
     async def batch_video_faceswap_route(request: Request):
         """
-        Apply face swap to video using reliable batch processing.
+        Apply face swap to video using batched frame processing.
         
-        Extracts frames, processes each with ReActor, then recombines.
-        More reliable than the streaming VHS workflow approach.
+        Decodes frames over an ffmpeg pipe, swaps faces in batches of frames
+        per ComfyUI prompt (reference face embedded once), then re-encodes
+        with the original audio. No per-frame files are written.
         
         Request body:
-        - source_video: str - Base64 data URL of source video (required)
+        - source_video: str - Base64 data URL of source video (required);
+          with multipart/form-data, a file upload (other fields as JSON literals)
         - reference_image: str - Base64 data URL of face to swap in (required)
         - fps: int - Processing FPS (default: 24, lower = faster)
         - restore_face: bool - Apply GFPGAN face restoration (default: true)
         - face_restore_visibility: float - Face restore blend 0-1 (default: 1.0)
         - codeformer_weight: float - CodeFormer weight for restoration (default: 0.5)
+        - batch_size: int - Frames per ComfyUI prompt (default: 16, max: 64)
         
         Returns:
         - video/mp4 with cost headers
@@ -1415,14 +1437,9 @@ def setup_qwen_image_endpoints(fastapi, comfyui_instance):
         - 24 fps video = ~48-72 seconds per second of video
         - Recommended: Use 12-16 fps for faster processing
         """
-        item = await request.json()
-        result = handler._batch_video_faceswap_impl(item)
-        
-        response = FastAPIResponse(
-            content=result.body,
-            media_type=result.media_type,
-        )
-        for key, value in result.headers.items():
-            if key.startswith("X-"):
-                response.headers[key] = value
-        return response
\ No newline at end of file
+        item = await read_video_request(request)
+        try:
+            # StreamingResponse from disk, already carries the X- headers
+            return await run_impl(comfyui_instance, handler._batch_video_faceswap_impl, item)
+        finally:
+            await close_uploads(item)
\ No newline at end of file
@@ -17,6 +17,8 @@ import io
 from fastapi import Response, HTTPException
 
 from utils.cost_tracker import CostTracker, get_cost_summary
+from utils.cancellation import RequestCancelled
+from utils.executor import run_impl
 from utils.image_utils import decode_base64
 
 
@@ -255,6 +257,8 @@ class SeedVR2Handler:
                 print(f"   Workflow nodes: {list(workflow_api.keys())}")
                 output_bytes = execute_workflow_via_api(workflow_api, port=port, timeout=600)
                 print(f"✅ SeedVR2 workflow completed successfully")
+            except RequestCancelled:
+                raise  # a cancelled render must not be re-run via infer
             except Exception as e:
                 # Capture full error details
                 error_msg = str(e)
@@ -268,15 +272,10 @@ class SeedVR2Handler:
                 
                 # Try to get more details from ComfyUI if it's a node error
                 if "node" in error_msg.lower() or "workflow" in error_msg.lower():
-                    try:
-                        import requests
-                        response = requests.get(f"http://127.0.0.1:{port}/object_info", timeout=5)
-                        if response.status_code == 200:
-                            object_info = response.json()
-                            seedvr2_nodes = [k for k in object_info.keys() if "seedvr2" in k.lower()]
-                            print(f"   Available SeedVR2 nodes: {seedvr2_nodes}")
-                    except:
-                        pass
+                    from utils.comfyui import get_object_info
+                    object_info = get_object_info(port) or {}
+                    seedvr2_nodes = [k for k in object_info.keys() if "seedvr2" in k.lower()]
+                    print(f"   Available SeedVR2 nodes: {seedvr2_nodes}")
                 
                 # Fallback to infer method
                 print(f"   Attempting infer method fallback...")
@@ -334,7 +333,7 @@ def setup_seedvr2_endpoints(fastapi, comfyui_instance):
     async def seedvr2_route(request: Request):
         try:
             item = await request.json()
-            result = handler._seedvr2_impl(item)
+            result = await run_impl(comfyui_instance, handler._seedvr2_impl, item)
             # Preserve cost headers
             response = FastAPIResponse(
                 content=result.body,
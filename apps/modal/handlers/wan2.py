@@ -11,6 +11,8 @@ from typing import Dict
 from fastapi import Response
 
 from utils.cost_tracker import CostTracker, get_cost_summary
+from utils.executor import run_impl
+from utils.progress import progress_listener, track_progress
 
 
 def build_wan2_workflow(item: dict) -> dict:
@@ -126,13 +128,8 @@ class Wan2Handler:
         # Build workflow
         workflow = build_wan2_workflow(item)
         
-        # Save workflow to temp file
-        client_id = uuid.uuid4().hex
-        workflow_file = f"/tmp/{client_id}.json"
-        json.dump(workflow, Path(workflow_file).open("w"))
-        
         # Execute
-        video_bytes = self.comfyui.infer.local(workflow_file)
+        video_bytes = self.comfyui.infer_workflow(workflow, on_event=progress_listener(self.comfyui, item))
         
         # Calculate cost
         execution_time = tracker.stop()
@@ -165,7 +162,8 @@ def setup_wan2_endpoints(fastapi, comfyui_instance):
     @fastapi.post("/wan2")
     async def wan2_route(request: Request):
         item = await request.json()
-        result = handler._wan2_impl(item)
+        with track_progress(comfyui_instance, item):
+            result = await run_impl(comfyui_instance, handler._wan2_impl, item)
         # Preserve cost headers
         response = FastAPIResponse(
             content=result.body,
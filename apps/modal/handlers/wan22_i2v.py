@@ -18,6 +18,7 @@ Handler v8: 2026-02-05 - FaceSwap via Qwen batch-video-faceswap (no in-container
 import base64
 import json
 import os
+import shutil
 import tempfile
 import uuid
 from pathlib import Path
@@ -31,6 +32,9 @@ import sys
 sys.path.insert(0, "/root/utils")
 
 from cost_tracker import CostTracker
+from executor import run_impl
+from progress import progress_listener, track_progress
+from video_io import post_video_to_file, stream_file_response
 
 # Qwen batch-video-faceswap URL (face swap runs there to avoid OOM with 14B model here)
 BATCH_FACESWAP_URL = os.environ.get(
@@ -373,11 +377,7 @@ class Wan22I2VHandler:
         print(f"   Workflow nodes: {node_types}")
         
         # Execute workflow
-        workflow_file = f"/tmp/{uuid.uuid4().hex}.json"
-        with open(workflow_file, "w") as f:
-            json.dump(workflow, f)
-        
-        output_bytes = self.comfyui.infer.local(workflow_file)
+        output_bytes = self.comfyui.infer_workflow(workflow, on_event=progress_listener(self.comfyui, item))
         
         # Cleanup
         try:
@@ -451,34 +451,34 @@ class Wan22I2VHandler:
             cfg=cfg,
             seed=seed,
         )
-        workflow_file = f"/tmp/{uuid.uuid4().hex}.json"
-        with open(workflow_file, "w") as f:
-            json.dump(workflow, f)
         
         try:
-            output_bytes = self.comfyui.infer.local(workflow_file)
+            output_bytes = self.comfyui.infer_workflow(workflow, on_event=progress_listener(self.comfyui, item))
         finally:
             try:
                 os.remove(f"/root/comfy/ComfyUI/input/{source_filename}")
             except Exception:
                 pass
         
-        video_b64 = base64.b64encode(output_bytes).decode("utf-8")
-        source_video_data_url = f"data:image/webp;base64,{video_b64}"
-        
-        # Step 2: Face swap via Qwen batch-video-faceswap (avoids OOM here)
+        # Step 2: Face swap via Qwen batch-video-faceswap (avoids OOM here).
+        # The WebP goes as a multipart upload and the MP4 streams back to disk.
         print("   Step 2: Face swap (Qwen batch-video-faceswap)...")
-        payload = {
-            "source_video": source_video_data_url,
+        fields = {
             "reference_image": face_image_data,
             "fps": fps,
             "restore_face": item.get("restore_face", True),
         }
+        temp_dir = tempfile.mkdtemp(prefix="wan22_faceswap_")
+        output_path = os.path.join(temp_dir, "output.mp4")
         try:
-            r = requests.post(BATCH_FACESWAP_URL, json=payload, timeout=1200)
-            r.raise_for_status()
-            final_video_bytes = r.content
+            post_video_to_file(
+                BATCH_FACESWAP_URL,
+                fields,
+                {"source_video": ("source.webp", output_bytes, "image/webp")},
+                output_path,
+            )
         except requests.exceptions.RequestException as e:
+            shutil.rmtree(temp_dir, ignore_errors=True)
             print(f"   ❌ Qwen batch-video-faceswap failed: {e}")
             if hasattr(e, "response") and e.response is not None:
                 try:
@@ -494,7 +494,7 @@ class Wan22I2VHandler:
         execution_time = tracker.stop()
         cost_metrics = tracker.calculate_cost("wan22-i2v-faceswap", execution_time)
         
-        response = Response(final_video_bytes, media_type="video/mp4")
+        response = stream_file_response(output_path, "video/mp4", cleanup=[temp_dir])
         response.headers["X-Cost-USD"] = f"{cost_metrics.total_cost:.6f}"
         response.headers["X-Execution-Time-Sec"] = f"{execution_time:.3f}"
         response.headers["X-GPU-Type"] = cost_metrics.gpu_type
@@ -526,12 +526,14 @@ def setup_wan22_i2v_endpoints(fastapi, comfyui_instance):
         - steps: int - Sampling steps (default: 20)
         - cfg: float - CFG scale (default: 3.5)
         - seed: int - Random seed (optional)
+        - progress_id: str - Live progress/previews at GET /progress/{progress_id} (optional)
         
         Returns:
         - image/webp (animated WEBP) with cost headers
         """
         item = await request.json()
-        result = handler._wan22_i2v_impl(item)
+        with track_progress(comfyui_instance, item):
+            result = await run_impl(comfyui_instance, handler._wan22_i2v_impl, item)
         
         response = FastAPIResponse(
             content=result.body,
@@ -562,6 +564,7 @@ def setup_wan22_i2v_endpoints(fastapi, comfyui_instance):
         - steps: int - Sampling steps (default: 20)
         - cfg: float - CFG scale (default: 3.5)
         - seed: int - Random seed (optional)
+        - progress_id: str - Live progress/previews at GET /progress/{progress_id} (optional)
         
         Returns:
         - video/mp4 with cost headers
@@ -572,13 +575,6 @@ def setup_wan22_i2v_endpoints(fastapi, comfyui_instance):
         - Identity-preserving video generation
         """
         item = await request.json()
-        result = handler._wan22_i2v_faceswap_impl(item)
-        
-        response = FastAPIResponse(
-            content=result.body,
-            media_type=result.media_type,
-        )
-        for key, value in result.headers.items():
-            if key.startswith("X-"):
-                response.headers[key] = value
-        return response
+        # StreamingResponse from disk, already carries the X- headers
+        with track_progress(comfyui_instance, item):
+            return await run_impl(comfyui_instance, handler._wan22_i2v_faceswap_impl, item)
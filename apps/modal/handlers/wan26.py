@@ -21,7 +21,9 @@ import json
 import uuid
 import base64
 import os
+import shutil
 import subprocess
+import tempfile
 from pathlib import Path
 from typing import Dict, Optional, List
 
@@ -33,6 +35,9 @@ import sys
 sys.path.insert(0, "/root/utils")
 
 from cost_tracker import CostTracker, get_cost_summary
+from executor import run_impl
+from progress import progress_listener, track_progress
+from video_io import close_uploads, post_video_to_file, read_video_request, save_video_to_input, stream_file_response
 
 BATCH_FACESWAP_URL = os.environ.get(
     "BATCH_VIDEO_FACESWAP_URL",
@@ -72,36 +77,19 @@ def _save_image_to_input(image_data: str) -> str:
     return filename
 
 
-def _save_video_to_input(video_data: str) -> str:
+def _save_video_to_input(video_data) -> str:
     """
-    Save base64 video data to ComfyUI input folder.
+    Save video data to ComfyUI input folder.
+    
+    Decoded/copied to disk in chunks (see video_io.save_video_to_input).
     
     Args:
-        video_data: Base64 data URL (e.g., "data:video/mp4;base64,...")
+        video_data: Base64 data URL (e.g., "data:video/mp4;base64,...") or a multipart upload
     
     Returns:
         Filename in ComfyUI input folder
     """
-    # Parse data URL
-    if video_data.startswith("data:"):
-        header, encoded = video_data.split(",", 1)
-        mime_type = header.split(";")[0].split(":")[1]
-        ext = "mp4" if "mp4" in mime_type else "webm" if "webm" in mime_type else "mp4"
-    else:
-        encoded = video_data
-        ext = "mp4"
-    
-    # Decode and save
-    video_bytes = base64.b64decode(encoded)
-    filename = f"{uuid.uuid4().hex}.{ext}"
-    input_dir = "/root/comfy/ComfyUI/input"
-    os.makedirs(input_dir, exist_ok=True)
-    filepath = os.path.join(input_dir, filename)
-    
-    with open(filepath, "wb") as f:
-        f.write(video_bytes)
-    
-    return filename
+    return save_video_to_input(video_data)
 
 
 def build_wan26_workflow(
@@ -755,13 +743,8 @@ class Wan26Handler:
             negative_prompt=negative_prompt,
         )
         
-        # Save workflow to temp file
-        workflow_file = f"/tmp/{uuid.uuid4().hex}.json"
-        with open(workflow_file, "w") as f:
-            json.dump(workflow, f)
-        
         # Execute workflow
-        output_bytes = self.comfyui.infer.local(workflow_file)
+        output_bytes = self.comfyui.infer_workflow(workflow, on_event=progress_listener(self.comfyui, item))
         
         # Calculate cost
         execution_time = tracker.stop()
@@ -828,13 +811,8 @@ class Wan26Handler:
             negative_prompt=negative_prompt,
         )
         
-        # Save workflow to temp file
-        workflow_file = f"/tmp/{uuid.uuid4().hex}.json"
-        with open(workflow_file, "w") as f:
-            json.dump(workflow, f)
-        
         # Execute workflow
-        output_bytes = self.comfyui.infer.local(workflow_file)
+        output_bytes = self.comfyui.infer_workflow(workflow, on_event=progress_listener(self.comfyui, item))
         
         # Calculate cost
         execution_time = tracker.stop()
@@ -904,11 +882,7 @@ class Wan26Handler:
         print(f"   Workflow nodes: {node_types}")
         
         # Execute workflow
-        client_id = uuid.uuid4().hex
-        workflow_file = f"/tmp/{client_id}.json"
-        json.dump(workflow, Path(workflow_file).open("w"))
-        
-        output_bytes = self.comfyui.infer.local(workflow_file)
+        output_bytes = self.comfyui.infer_workflow(workflow, on_event=progress_listener(self.comfyui, item))
         
         # Cleanup reference image
         try:
@@ -950,20 +924,23 @@ class Wan26Handler:
         length = int(i2v_result.headers.get("X-Frames", "33"))
         fps = item.get("fps", 16)
         
-        video_b64 = base64.b64encode(output_bytes).decode("utf-8")
-        source_video_data_url = f"data:image/webp;base64,{video_b64}"
-        
-        payload = {
-            "source_video": source_video_data_url,
+        # Send the WebP as a multipart upload and stream the MP4 back to disk
+        fields = {
             "reference_image": face_image_data,
             "fps": fps,
             "restore_face": item.get("restore_face", True),
         }
+        temp_dir = tempfile.mkdtemp(prefix="wan26_faceswap_")
+        output_path = os.path.join(temp_dir, "output.mp4")
         try:
-            r = requests.post(BATCH_FACESWAP_URL, json=payload, timeout=1200)
-            r.raise_for_status()
-            final_video_bytes = r.content
+            post_video_to_file(
+                BATCH_FACESWAP_URL,
+                fields,
+                {"source_video": ("source.webp", output_bytes, "image/webp")},
+                output_path,
+            )
         except requests.exceptions.RequestException as e:
+            shutil.rmtree(temp_dir, ignore_errors=True)
             if getattr(e, "response", None) is not None:
                 err_body = (e.response.text or "")[:500]
                 raise HTTPException(
@@ -972,7 +949,7 @@ class Wan26Handler:
                 ) from e
             raise HTTPException(status_code=502, detail=f"Face swap service failed: {e}") from e
         
-        response = Response(final_video_bytes, media_type="video/mp4")
+        response = stream_file_response(output_path, "video/mp4", cleanup=[temp_dir])
         response.headers["X-Model"] = "wan2.6-i2v-faceswap"
         response.headers["X-Frames"] = str(length)
         if "X-Cost-USD" in i2v_result.headers:
@@ -1089,13 +1066,8 @@ class Wan26Handler:
             trigger_word=trigger_word,
         )
         
-        # Save workflow to temp file
-        workflow_file = f"/tmp/{uuid.uuid4().hex}.json"
-        with open(workflow_file, "w") as f:
-            json.dump(workflow, f)
-        
         # Execute workflow
-        output_bytes = self.comfyui.infer.local(workflow_file)
+        output_bytes = self.comfyui.infer_workflow(workflow, on_event=progress_listener(self.comfyui, item))
         
         # Calculate cost
         execution_time = tracker.stop()
@@ -1135,12 +1107,14 @@ def setup_wan26_endpoints(fastapi, comfyui_instance):
         - fps: int - Frames per second (default: 16)
         - seed: int - Random seed (optional)
         - negative_prompt: str - Negative prompt (default: "")
+        - progress_id: str - Live progress/previews at GET /progress/{progress_id} (optional)
         
         Returns:
         - image/webp (animated WEBP) with cost headers
         """
         item = await request.json()
-        result = handler._wan26_impl(item)
+        with track_progress(comfyui_instance, item):
+            result = await run_impl(comfyui_instance, handler._wan26_impl, item)
         
         response = FastAPIResponse(
             content=result.body,
@@ -1161,7 +1135,8 @@ def setup_wan26_endpoints(fastapi, comfyui_instance):
         
         Request body:
         - prompt: str - Text prompt (required)
-        - reference_videos: List[str] - List of base64 video data URLs (1-3 videos, required)
+        - reference_videos: List[str] - List of base64 video data URLs (1-3 videos, required);
+          with multipart/form-data, repeated file uploads (other fields as JSON literals)
         - width: int - Video width (default: 832)
         - height: int - Video height (default: 480)
         - length: int - Number of frames (default: 33)
@@ -1170,12 +1145,17 @@ def setup_wan26_endpoints(fastapi, comfyui_instance):
         - fps: int - Frames per second (default: 16)
         - seed: int - Random seed (optional)
         - negative_prompt: str - Negative prompt (default: "")
+        - progress_id: str - Live progress/previews at GET /progress/{progress_id} (optional)
         
         Returns:
         - image/webp (animated WEBP) with cost headers
         """
-        item = await request.json()
-        result = handler._wan26_r2v_impl(item)
+        item = await read_video_request(request, list_fields=("reference_videos",))
+        try:
+            with track_progress(comfyui_instance, item):
+                result = await run_impl(comfyui_instance, handler._wan26_r2v_impl, item)
+        finally:
+            await close_uploads(item)
         
         response = FastAPIResponse(
             content=result.body,
@@ -1205,6 +1185,7 @@ def setup_wan26_endpoints(fastapi, comfyui_instance):
         - fps: int - Frames per second (default: 16)
         - seed: int - Random seed (optional)
         - negative_prompt: str - Negative prompt (optional)
+        - progress_id: str - Live progress/previews at GET /progress/{progress_id} (optional)
         
         Returns:
         - video/mp4 with cost headers
@@ -1215,7 +1196,8 @@ def setup_wan26_endpoints(fastapi, comfyui_instance):
         - Create video variants with same subject
         """
         item = await request.json()
-        result = handler._wan26_i2v_impl(item)
+        with track_progress(comfyui_instance, item):
+            result = await run_impl(comfyui_instance, handler._wan26_i2v_impl, item)
         
         response = FastAPIResponse(
             content=result.body,
@@ -1233,15 +1215,9 @@ def setup_wan26_endpoints(fastapi, comfyui_instance):
         Same as wan2.6-i2v plus face_image/reference_face; returns MP4.
         """
         item = await request.json()
-        result = handler._wan26_i2v_faceswap_impl(item)
-        response = FastAPIResponse(
-            content=result.body,
-            media_type=result.media_type,
-        )
-        for key, value in result.headers.items():
-            if key.startswith("X-"):
-                response.headers[key] = value
-        return response
+        # StreamingResponse from disk, already carries the X- headers
+        with track_progress(comfyui_instance, item):
+            return await run_impl(comfyui_instance, handler._wan26_i2v_faceswap_impl, item)
     
     @fastapi.post("/wan2.6-lora")
     async def wan26_lora_route(request: Request):
@@ -1262,6 +1238,7 @@ def setup_wan26_endpoints(fastapi, comfyui_instance):
         - fps: int - Frames per second (default: 16)
         - seed: int - Random seed (optional)
         - negative_prompt: str - Negative prompt (default: "")
+        - progress_id: str - Live progress/previews at GET /progress/{progress_id} (optional)
         
         Returns:
         - image/webp (animated WEBP) with cost headers
@@ -1270,7 +1247,8 @@ def setup_wan26_endpoints(fastapi, comfyui_instance):
         WAN LoRAs typically use higher strength (1.0-2.0) than image models.
         """
         item = await request.json()
-        result = handler._wan26_lora_impl(item)
+        with track_progress(comfyui_instance, item):
+            result = await run_impl(comfyui_instance, handler._wan26_lora_impl, item)
         
         response = FastAPIResponse(
             content=result.body,
@@ -11,6 +11,7 @@ from typing import Dict
 from fastapi import Response
 
 from utils.cost_tracker import CostTracker, get_cost_summary
+from utils.executor import run_impl
 
 
 class WorkflowHandler:
@@ -61,13 +62,17 @@ class WorkflowHandler:
                         if "text" in node.get("inputs", {}):
                             node["inputs"]["text"] = item["prompt"]
         
-        # Save workflow to temp file
-        client_id = uuid.uuid4().hex
-        workflow_file = f"/tmp/{client_id}.json"
-        json.dump(workflow_data, Path(workflow_file).open("w"))
-        
-        # Execute
-        output_bytes = self.comfyui.infer.local(workflow_file)
+        # Execute - API format goes straight to ComfyUI; UI format needs comfy run via a file
+        from utils.comfyui import is_api_format
+        if is_api_format(workflow_data):
+            output_bytes = self.comfyui.infer_workflow(workflow_data)
+        else:
+            workflow_file = Path(f"/tmp/{uuid.uuid4().hex}.json")
+            json.dump(workflow_data, workflow_file.open("w"))
+            try:
+                output_bytes = self.comfyui.infer.local(str(workflow_file))
+            finally:
+                workflow_file.unlink(missing_ok=True)
         
         # Determine content type based on file extension or workflow
         content_type = "application/octet-stream"
@@ -107,7 +112,7 @@ def setup_workflow_endpoints(fastapi, comfyui_instance):
     @fastapi.post("/workflow")
     async def workflow_route(request: Request):
         item = await request.json()
-        result = handler._workflow_impl(item)
+        result = await run_impl(comfyui_instance, handler._workflow_impl, item)
         # Preserve cost headers
         response = FastAPIResponse(
             content=result.body,
@@ -12,8 +12,6 @@ Handles Z-Image-Turbo text-to-image generation with multiple workflow variants:
 import json
 import uuid
 import os
-import subprocess
-from pathlib import Path
 from typing import Dict, Optional
 from fastapi import Response, HTTPException
 
@@ -23,43 +21,25 @@ import sys
 sys.path.insert(0, "/root/utils")
 
 from cost_tracker import CostTracker, get_cost_summary
+from executor import run_impl
+from image_utils import build_images_response, parse_num_images, save_reference_image
+from lora_cache import get_lora_cache
+from lora_stack import lora_chain_nodes, prepend_trigger_words, resolve_lora_stack
 
 
 def _save_reference_image(reference_image: str) -> str:
     """
     Save reference image from base64 data URL to ComfyUI input folder.
     
+    Files are named by content, so a repeated reference reuses the same file.
+    
     Args:
         reference_image: Base64 data URL (e.g., "data:image/jpeg;base64,...")
     
     Returns:
         Filename in ComfyUI input folder
     """
-    import base64
-    import os
-    
-    # Parse data URL
-    if reference_image.startswith("data:"):
-        header, encoded = reference_image.split(",", 1)
-        # Extract MIME type and extension
-        mime_type = header.split(";")[0].split(":")[1]
-        ext = "jpg" if "jpeg" in mime_type else "png" if "png" in mime_type else "webp"
-    else:
-        # Assume it's already base64 encoded
-        encoded = reference_image
-        ext = "png"
-    
-    # Decode and save
-    image_bytes = base64.b64decode(encoded)
-    filename = f"{uuid.uuid4().hex}.{ext}"
-    input_dir = "/root/comfy/ComfyUI/input"
-    os.makedirs(input_dir, exist_ok=True)
-    filepath = os.path.join(input_dir, filename)
-    
-    with open(filepath, "wb") as f:
-        f.write(image_bytes)
-    
-    return filename
+    return save_reference_image(reference_image, "z_image_ref", as_jpeg=False)
 
 
 def build_z_image_simple_workflow(item: dict) -> dict:
@@ -97,7 +77,7 @@ def build_z_image_simple_workflow(item: dict) -> dict:
                 "guidance_scale": item.get("cfg", 0.0),  # Turbo often uses 0
                 "seed": item.get("seed", 42),
                 "negative_prompt": item.get("negative_prompt", ""),
-                "batch_size": 1,
+                "batch_size": parse_num_images(item),
                 "max_sequence_length": 512,
                 "cfg_normalization": False,
                 "cfg_truncation": 1.0,
@@ -149,7 +129,7 @@ def build_z_image_danrisi_workflow(item: dict) -> dict:
                 "guidance_scale": item.get("cfg", 0.0),
                 "seed": item.get("seed", 42),
                 "negative_prompt": item.get("negative_prompt", ""),
-                "batch_size": 1,
+                "batch_size": parse_num_images(item),
                 "max_sequence_length": 512,
                 "cfg_normalization": True,  # Enable for better quality
                 "cfg_truncation": 1.0,
@@ -507,11 +487,13 @@ def build_z_image_lora_workflow(
     negative_prompt: str = "",
     lora_strength: float = 1.0,
     trigger_word: Optional[str] = None,
+    lora_stack: Optional[list] = None,
 ) -> dict:
     """
     Build Z-Image Simple workflow with custom LoRA.
     
     Uses the simple workflow (built-in nodes only) with LoRA applied.
+    Extra LoRAs (realism, style) are chained after the character LoRA.
     
     Args:
         prompt: Text prompt for image generation
@@ -524,6 +506,7 @@ def build_z_image_lora_workflow(
         negative_prompt: Negative prompt (default: "")
         lora_strength: LoRA strength (default: 1.0)
         trigger_word: Trigger word to prepend to prompt (optional)
+        lora_stack: Extra (lora_filename, strength, trigger_word) tuples (optional)
     
     Returns:
         ComfyUI workflow dictionary
@@ -531,9 +514,17 @@ def build_z_image_lora_workflow(
     import random
     if seed is None:
         seed = random.randint(0, 2**32 - 1)
+    lora_stack = lora_stack or []
     
-    # Prepend trigger word if provided
+    # Prepend trigger words if provided
     full_prompt = f"{trigger_word} {prompt}".strip() if trigger_word else prompt
+    full_prompt = prepend_trigger_words(full_prompt, lora_stack)
+    
+    # LoRA chain (applied to model only): character LoRA, then the stack
+    lora_nodes, lora_model, _ = lora_chain_nodes(
+        [(lora_filename, lora_strength)] + [(name, strength) for name, strength, _ in lora_stack],
+        model=["1", 0],
+    )
     
     return {
         # Model Loaders
@@ -544,15 +535,7 @@ def build_z_image_lora_workflow(
                 "weight_dtype": "default",
             },
         },
-        # LoRA Loader (applied to model only)
-        "50": {
-            "class_type": "LoraLoaderModelOnly",
-            "inputs": {
-                "model": ["1", 0],
-                "lora_name": lora_filename,
-                "strength_model": lora_strength,
-            },
-        },
+        **lora_nodes,
         "2": {
             "class_type": "CLIPLoader",
             "inputs": {
@@ -595,7 +578,7 @@ def build_z_image_lora_workflow(
         "7": {
             "class_type": "KSampler",
             "inputs": {
-                "model": ["50", 0],  # Use LoRA-modified model
+                "model": lora_model,  # Use LoRA-modified model
                 "positive": ["4", 0],
                 "negative": ["5", 0],
                 "latent_image": ["6", 0],
@@ -820,20 +803,30 @@ class ZImageHandler:
         tracker = CostTracker(gpu_type="L40S")
         tracker.start()
         
-        workflow = build_z_image_simple_workflow(item)
+        try:
+            num_images = parse_num_images(item)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        client_id = uuid.uuid4().hex
-        workflow_file = f"/tmp/{client_id}.json"
-        json.dump(workflow, Path(workflow_file).open("w"))
+        workflow = build_z_image_simple_workflow(item)
         
-        image_bytes = self.comfyui.infer.local(workflow_file)
+        if num_images > 1:
+            images = self.comfyui.infer_workflow_images(workflow)
+        elif "seed" not in item:
+            # No seed requested: may share one latent batch with identical requests
+            image_bytes = self.comfyui.infer_batched(workflow)
+        else:
+            image_bytes = self.comfyui.infer_workflow(workflow)
         
         execution_time = tracker.stop()
         cost_metrics = tracker.calculate_cost("z-image-simple", execution_time)
         
         print(f"💰 {get_cost_summary(cost_metrics)}")
         
-        response = Response(image_bytes, media_type="image/jpeg")
+        if num_images > 1:
+            response = build_images_response(images)
+        else:
+            response = Response(image_bytes, media_type="image/jpeg")
         response.headers["X-Cost-USD"] = f"{cost_metrics.total_cost:.6f}"
         response.headers["X-Execution-Time-Sec"] = f"{execution_time:.3f}"
         response.headers["X-GPU-Type"] = cost_metrics.gpu_type
@@ -844,20 +837,30 @@ class ZImageHandler:
         tracker = CostTracker(gpu_type="L40S")
         tracker.start()
         
-        workflow = build_z_image_danrisi_workflow(item)
+        try:
+            num_images = parse_num_images(item)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        client_id = uuid.uuid4().hex
-        workflow_file = f"/tmp/{client_id}.json"
-        json.dump(workflow, Path(workflow_file).open("w"))
+        workflow = build_z_image_danrisi_workflow(item)
         
-        image_bytes = self.comfyui.infer.local(workflow_file)
+        if num_images > 1:
+            images = self.comfyui.infer_workflow_images(workflow)
+        elif "seed" not in item:
+            # No seed requested: may share one latent batch with identical requests
+            image_bytes = self.comfyui.infer_batched(workflow)
+        else:
+            image_bytes = self.comfyui.infer_workflow(workflow)
         
         execution_time = tracker.stop()
         cost_metrics = tracker.calculate_cost("z-image-danrisi", execution_time)
         
         print(f"💰 {get_cost_summary(cost_metrics)}")
         
-        response = Response(image_bytes, media_type="image/jpeg")
+        if num_images > 1:
+            response = build_images_response(images)
+        else:
+            response = Response(image_bytes, media_type="image/jpeg")
         response.headers["X-Cost-USD"] = f"{cost_metrics.total_cost:.6f}"
         response.headers["X-Execution-Time-Sec"] = f"{execution_time:.3f}"
         response.headers["X-GPU-Type"] = cost_metrics.gpu_type
@@ -874,11 +877,7 @@ class ZImageHandler:
         
         workflow = build_z_image_instantid_workflow(item)
         
-        client_id = uuid.uuid4().hex
-        workflow_file = f"/tmp/{client_id}.json"
-        json.dump(workflow, Path(workflow_file).open("w"))
-        
-        image_bytes = self.comfyui.infer.local(workflow_file)
+        image_bytes = self.comfyui.infer_workflow(workflow)
         
         execution_time = tracker.stop()
         cost_metrics = tracker.calculate_cost("z-image-instantid", execution_time)
@@ -902,11 +901,7 @@ class ZImageHandler:
         
         workflow = build_z_image_pulid_workflow(item)
         
-        client_id = uuid.uuid4().hex
-        workflow_file = f"/tmp/{client_id}.json"
-        json.dump(workflow, Path(workflow_file).open("w"))
-        
-        image_bytes = self.comfyui.infer.local(workflow_file)
+        image_bytes = self.comfyui.infer_workflow(workflow)
         
         execution_time = tracker.stop()
         cost_metrics = tracker.calculate_cost("z-image-pulid", execution_time)
@@ -937,17 +932,8 @@ class ZImageHandler:
             lora_id = item["lora_id"]
             lora_filename = f"character-{lora_id}.safetensors"
         
-        # Check LoRA in ComfyUI loras directory
-        comfy_lora_path = Path(f"/root/comfy/ComfyUI/models/loras/{lora_filename}")
-        volume_lora_path = Path(f"/root/models/loras/{lora_filename}")
-        
-        # If LoRA exists in volume but not in ComfyUI directory, symlink it
-        if volume_lora_path.exists() and not comfy_lora_path.exists():
-            comfy_lora_path.parent.mkdir(parents=True, exist_ok=True)
-            subprocess.run(f"ln -s {volume_lora_path} {comfy_lora_path}", shell=True, check=False)
-        
-        # Check if LoRA exists
-        if not comfy_lora_path.exists() and not volume_lora_path.exists():
+        # Copy the LoRA to local disk (hot cache) and link it for ComfyUI
+        if not get_lora_cache(self.comfyui).ensure(lora_filename):
             raise HTTPException(status_code=404, detail=f"LoRA not found: {lora_filename}")
         
         if "prompt" not in item:
@@ -958,11 +944,7 @@ class ZImageHandler:
         
         workflow = build_z_image_pulid_lora_workflow(item, lora_filename)
         
-        client_id = uuid.uuid4().hex
-        workflow_file = f"/tmp/{client_id}.json"
-        json.dump(workflow, Path(workflow_file).open("w"))
-        
-        image_bytes = self.comfyui.infer.local(workflow_file)
+        image_bytes = self.comfyui.infer_workflow(workflow)
         
         execution_time = tracker.stop()
         cost_metrics = tracker.calculate_cost("z-image-pulid-lora", execution_time)
@@ -992,21 +974,8 @@ class ZImageHandler:
             lora_id = item["lora_id"]
             lora_filename = f"character-{lora_id}.safetensors"
         
-        # Check LoRA in ComfyUI loras directory
-        comfy_lora_path = Path(f"/root/comfy/ComfyUI/models/loras/{lora_filename}")
-        volume_lora_path = Path(f"/root/models/loras/{lora_filename}")
-        
-        # If LoRA exists in volume but not in ComfyUI directory, symlink it
-        if volume_lora_path.exists() and not comfy_lora_path.exists():
-            comfy_lora_path.parent.mkdir(parents=True, exist_ok=True)
-            subprocess.run(
-                f"ln -s {volume_lora_path} {comfy_lora_path}",
-                shell=True,
-                check=False,
-            )
-        
-        # Check if LoRA exists
-        if not comfy_lora_path.exists() and not volume_lora_path.exists():
+        # Copy the LoRA to local disk (hot cache) and link it for ComfyUI
+        if not get_lora_cache(self.comfyui).ensure(lora_filename):
             raise HTTPException(
                 status_code=404,
                 detail=f"LoRA not found: {lora_filename}. Upload to /root/models/loras/"
@@ -1015,6 +984,15 @@ class ZImageHandler:
         if "prompt" not in item:
             raise HTTPException(status_code=400, detail="prompt is required")
         
+        # Realism/style LoRAs stacked on the character LoRA
+        try:
+            lora_stack = resolve_lora_stack(item, base_model="zit")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        for stack_filename, _, _ in lora_stack:
+            if not get_lora_cache(self.comfyui).ensure(stack_filename):
+                raise HTTPException(status_code=404, detail=f"LoRA not found: {stack_filename}")
+        
         tracker = CostTracker(gpu_type="L40S")
         tracker.start()
         
@@ -1029,13 +1007,10 @@ class ZImageHandler:
             negative_prompt=item.get("negative_prompt", ""),
             lora_strength=item.get("lora_strength", 1.0),
             trigger_word=item.get("trigger_word"),
+            lora_stack=lora_stack,
         )
         
-        client_id = uuid.uuid4().hex
-        workflow_file = f"/tmp/{client_id}.json"
-        json.dump(workflow, Path(workflow_file).open("w"))
-        
-        image_bytes = self.comfyui.infer.local(workflow_file)
+        image_bytes = self.comfyui.infer_workflow(workflow)
         
         execution_time = tracker.stop()
         cost_metrics = tracker.calculate_cost("z-image-lora", execution_time)
@@ -1066,7 +1041,7 @@ def setup_z_image_endpoints(fastapi, comfyui_instance):
     @fastapi.post("/z-image-simple")
     async def z_image_simple_route(request: Request):
         item = await request.json()
-        result = handler._z_image_simple_impl(item)
+        result = await run_impl(comfyui_instance, handler._z_image_simple_impl, item)
         response = FastAPIResponse(
             content=result.body,
             media_type=result.media_type,
@@ -1079,7 +1054,7 @@ def setup_z_image_endpoints(fastapi, comfyui_instance):
     @fastapi.post("/z-image-danrisi")
     async def z_image_danrisi_route(request: Request):
         item = await request.json()
-        result = handler._z_image_danrisi_impl(item)
+        result = await run_impl(comfyui_instance, handler._z_image_danrisi_impl, item)
         response = FastAPIResponse(
             content=result.body,
             media_type=result.media_type,
@@ -1092,7 +1067,7 @@ def setup_z_image_endpoints(fastapi, comfyui_instance):
     @fastapi.post("/z-image-instantid")
     async def z_image_instantid_route(request: Request):
         item = await request.json()
-        result = handler._z_image_instantid_impl(item)
+        result = await run_impl(comfyui_instance, handler._z_image_instantid_impl, item)
         response = FastAPIResponse(
             content=result.body,
             media_type=result.media_type,
@@ -1105,7 +1080,7 @@ def setup_z_image_endpoints(fastapi, comfyui_instance):
     @fastapi.post("/z-image-pulid")
     async def z_image_pulid_route(request: Request):
         item = await request.json()
-        result = handler._z_image_pulid_impl(item)
+        result = await run_impl(comfyui_instance, handler._z_image_pulid_impl, item)
         response = FastAPIResponse(
             content=result.body,
             media_type=result.media_type,
@@ -1154,7 +1129,7 @@ def setup_z_image_endpoints(fastapi, comfyui_instance):
         if nsfw_mode:
             print(f"🔞 NSFW mode enabled for Z-Image LoRA request")
         
-        result = handler._z_image_lora_impl(item)
+        result = await run_impl(comfyui_instance, handler._z_image_lora_impl, item)
         response = FastAPIResponse(
             content=result.body,
             media_type=result.media_type,
@@ -1203,7 +1178,7 @@ def setup_z_image_endpoints(fastapi, comfyui_instance):
         
         print(f"📸 Z-Image Realism - Style: {style}")
         
-        result = handler._z_image_simple_impl(item)
+        result = await run_impl(comfyui_instance, handler._z_image_simple_impl, item)
         response = FastAPIResponse(
             content=result.body,
             media_type=result.media_type,
@@ -1236,7 +1211,7 @@ def setup_z_image_endpoints(fastapi, comfyui_instance):
         
         print(f"🔞 Z-Image NSFW endpoint called")
         
-        result = handler._z_image_simple_impl(item)
+        result = await run_impl(comfyui_instance, handler._z_image_simple_impl, item)
         response = FastAPIResponse(
             content=result.body,
             media_type=result.media_type,
@@ -570,9 +570,21 @@ image = (
     .apt_install(["git", "wget", "curl", "libgl1", "libglib2.0-0"])  # libGL for OpenCV/cv2
     .uv_pip_install(f"fastapi[standard]=={FASTAPI_VERSION}")
     .uv_pip_install(f"comfy-cli=={COMFY_CLI_VERSION}")
+    .uv_pip_install("websocket-client>=1.6.0")  # ComfyUI /ws completion events
     .add_local_file("apps/modal/utils/cost_tracker.py", "/root/utils/cost_tracker.py", copy=True)
     .add_local_file("apps/modal/utils/comfyui.py", "/root/utils/comfyui.py", copy=True)
     .add_local_file("apps/modal/utils/image_utils.py", "/root/utils/image_utils.py", copy=True)
+    .add_local_file("apps/modal/utils/executor.py", "/root/utils/executor.py", copy=True)
+    .add_local_file("apps/modal/utils/cancellation.py", "/root/utils/cancellation.py", copy=True)
+    .add_local_file("apps/modal/utils/batching.py", "/root/utils/batching.py", copy=True)
+    .add_local_file("apps/modal/utils/startup.py", "/root/utils/startup.py", copy=True)
+    .add_local_file("apps/modal/utils/residency.py", "/root/utils/residency.py", copy=True)
+    .add_local_file("apps/modal/utils/progress.py", "/root/utils/progress.py", copy=True)
+    .add_local_file("apps/modal/utils/jobs.py", "/root/utils/jobs.py", copy=True)
+    .add_local_file("apps/modal/utils/output_cache.py", "/root/utils/output_cache.py", copy=True)
+    .add_local_file("apps/modal/utils/lora_cache.py", "/root/utils/lora_cache.py", copy=True)
+    .add_local_file("apps/modal/utils/lora_stack.py", "/root/utils/lora_stack.py", copy=True)
+    .add_local_file("apps/modal/shared/civitai_models.py", "/root/shared/civitai_models.py", copy=True)
     # Add workflow files (from project root workflows directory)
     .add_local_file("workflows/seedvr2.json", "/root/workflows/seedvr2.json", copy=True)
     .add_local_file("workflows/seedvr2_api.json", "/root/workflows/seedvr2_api.json", copy=True)
@@ -652,6 +664,8 @@ image = (
         "cd /root/comfy/ComfyUI/custom_nodes/comfyui-workflow-to-api-converter-endpoint && "
         "(pip install -r requirements.txt || true) || echo 'No requirements.txt'"
     )
+    # RYLA custom nodes (cached text encoder)
+    .add_local_dir("apps/modal/comfy_nodes", "/root/comfy/ComfyUI/custom_nodes/ryla_nodes", copy=True)
     .uv_pip_install("huggingface-hub>=0.20.0")  # Updated to support is_offline_mode
     .env({"HF_XET_HIGH_PERFORMANCE": "1"})
     .add_local_file("apps/modal/config.py", "/root/config.py", copy=True)  # Add config for run_function imports
@@ -135,6 +135,7 @@ class EndpointResult:
     status: str = "pending"
     error: Optional[str] = None
     skipped_reason: Optional[str] = None
+    startup_phases: Optional[Dict[str, float]] = None
 
 # ==============================================================================
 # UTILITY FUNCTIONS
@@ -145,6 +146,18 @@ def get_endpoint_url(path: str) -> str:
     return SPLIT_APPS.get(path, f"https://{WORKSPACE}--ryla-comfyui-comfyui-fastapi-app.modal.run{path}")
 
 
+def fetch_startup_timings(url: str) -> Optional[dict]:
+    """Fetch the container startup breakdown (GET /startup/timings) for an endpoint's app."""
+    base_url = url.split(".modal.run", 1)[0] + ".modal.run"
+    try:
+        response = requests.get(f"{base_url}/startup/timings", timeout=30)
+        if response.status_code == 200:
+            return response.json()
+    except Exception:
+        pass
+    return None
+
+
 def encode_file_to_base64(file_path: Path, mime_type: str = None) -> str:
     """Encode a file to base64 data URI."""
     with open(file_path, "rb") as f:
@@ -466,6 +479,13 @@ def run_endpoint_test(path: str, resources: dict, run_cold: bool = True) -> Endp
             result.gpu_type = data["gpu_type"]
             result.size_kb = data["size_kb"]
             print(f"    ✅ Cold: {result.cold_time_sec:.1f}s, ${result.cost_usd:.4f}")
+            
+            # Startup phase breakdown of the container that served the cold run
+            timings = fetch_startup_timings(url)
+            if timings:
+                result.startup_phases = timings.get("phases")
+                breakdown = ", ".join(f"{name} {sec:.1f}s" for name, sec in result.startup_phases.items())
+                print(f"    ⏱️  Startup: {breakdown}")
         else:
             result.status = "failed"
             result.error = data["error"]
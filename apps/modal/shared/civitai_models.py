@@ -6,7 +6,13 @@ curated models for RYLA's image generation endpoints.
 """
 
 import os
+import re
+import json
+import time
+import hashlib
+import urllib.error
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from dataclasses import dataclass
 from enum import Enum
@@ -43,6 +49,7 @@ class CivitAIModel:
     trigger_word: Optional[str] = None
     recommended_strength: float = 0.8
     description: str = ""
+    sha256: Optional[str] = None  # Expected file hash (looked up from the CivitAI API if unset)
 
 
 # =============================================================================
@@ -542,6 +549,110 @@ def get_civitai_download_url(model_version_id: str, api_key: Optional[str] = Non
     return base_url
 
 
+# Streamed in chunks so multi-GB checkpoints never sit in memory
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Models downloaded at once by setup_civitai_models
+MAX_PARALLEL_DOWNLOADS = 4
+
+# Attempts per model; each retry resumes the .part file with an HTTP Range request
+DOWNLOAD_RETRIES = 3
+
+# Model version metadata (file hashes) for catalog entries without a pinned sha256
+CIVITAI_API_URL = "https://civitai.com/api/v1"
+
+_VERSION_ID_PATTERN = re.compile(r"/api/download/models/(\d+)")
+
+
+def get_civitai_sha256(model_version_id: str, api_key: Optional[str] = None) -> Optional[str]:
+    """
+    Look up the SHA256 CivitAI publishes for a model version's primary file.
+    
+    Args:
+        model_version_id: The CivitAI model version ID
+        api_key: Optional CivitAI API key for accessing restricted models
+    
+    Returns:
+        Lowercase hex digest, or None if the lookup fails or lists no hash
+    """
+    request = urllib.request.Request(f"{CIVITAI_API_URL}/model-versions/{model_version_id}")
+    request.add_header('User-Agent', 'RYLA-Modal/1.0')
+    if api_key:
+        request.add_header('Authorization', f'Bearer {api_key}')
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            files = json.load(response).get("files") or []
+    except Exception as e:
+        print(f"      Could not fetch hash for model version {model_version_id}: {e}")
+        return None
+    
+    primary = next((f for f in files if f.get("primary")), files[0] if files else {})
+    sha256 = (primary.get("hashes") or {}).get("SHA256")
+    return sha256.lower() if sha256 else None
+
+
+def _expected_sha256(model: CivitAIModel, api_key: Optional[str] = None) -> Optional[str]:
+    """Catalog hash if pinned, else the one CivitAI lists for the download's model version."""
+    if model.sha256:
+        return model.sha256.lower()
+    match = _VERSION_ID_PATTERN.search(model.download_url or "")
+    return get_civitai_sha256(match.group(1), api_key) if match else None
+
+
+def _sha256_file(path: Path) -> str:
+    """Hash an existing file in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _download_to_part(url: str, part_path: Path, api_key: Optional[str] = None) -> int:
+    """
+    Stream url into part_path, resuming from its current size.
+    
+    Args:
+        url: Download URL
+        part_path: Partial file to append to
+        api_key: Optional CivitAI API key
+    
+    Returns:
+        Number of bytes written by this call
+    """
+    offset = part_path.stat().st_size if part_path.exists() else 0
+    
+    request = urllib.request.Request(url)
+    request.add_header('User-Agent', 'RYLA-Modal/1.0')
+    if api_key:
+        request.add_header('Authorization', f'Bearer {api_key}')
+    if offset:
+        request.add_header('Range', f'bytes={offset}-')
+    
+    try:
+        response = urllib.request.urlopen(request, timeout=600)
+    except urllib.error.HTTPError as e:
+        if e.code == 416 and offset:
+            return 0  # Range starts at EOF: .part is already complete
+        raise
+    
+    with response:
+        # 206 = server honoured the Range; 200 = full body, start over
+        mode = "ab" if offset and response.status == 206 else "wb"
+        if offset and mode == "wb":
+            print(f"      Server ignored Range request, restarting download")
+        
+        written = 0
+        with open(part_path, mode) as f:
+            while True:
+                chunk = response.read(DOWNLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                f.write(chunk)
+                written += len(chunk)
+    return written
+
+
 def download_civitai_model(
     model: CivitAIModel,
     target_dir: Path,
@@ -550,6 +661,11 @@ def download_civitai_model(
     """
     Download a CivitAI model to the target directory.
     
+    Streams to ``<filename>.part`` in chunks, resumes interrupted downloads
+    with HTTP Range requests, verifies SHA256 (the catalog's, or the one the
+    CivitAI API lists for the model version), and only then renames the
+    file into place.
+    
     Args:
         model: CivitAIModel to download
         target_dir: Directory to save the model
@@ -558,59 +674,82 @@ def download_civitai_model(
     Returns:
         Path to downloaded file, or None if failed
     """
+    return _download_civitai_model(model, target_dir, api_key)[0]
+
+
+def _download_civitai_model(
+    model: CivitAIModel,
+    target_dir: Path,
+    api_key: Optional[str] = None,
+) -> tuple[Optional[Path], int]:
+    """download_civitai_model, also returning the bytes transferred by this call."""
     target_dir.mkdir(parents=True, exist_ok=True)
     target_path = target_dir / model.filename
+    part_path = target_dir / f"{model.filename}.part"
     
     if target_path.exists():
         print(f"   ✅ {model.name} already exists")
-        return target_path
+        return target_path, 0
     
     if not model.download_url:
         print(f"   ⚠️  No download URL for {model.name} - manual download required from:")
         print(f"      {model.civitai_url}")
-        return None
+        return None, 0
     
-    try:
+    if part_path.exists():
+        print(f"   📥 Resuming {model.name} from {part_path.stat().st_size / 1024 / 1024:.1f} MB...")
+    else:
         print(f"   📥 Downloading {model.name}...")
-        
-        # Build request with headers
-        request = urllib.request.Request(model.download_url)
-        request.add_header('User-Agent', 'RYLA-Modal/1.0')
-        if api_key:
-            request.add_header('Authorization', f'Bearer {api_key}')
-        
-        with urllib.request.urlopen(request, timeout=600) as response:
-            with open(target_path, 'wb') as f:
-                f.write(response.read())
-        
-        print(f"   ✅ {model.name} downloaded ({target_path.stat().st_size / 1024 / 1024:.1f} MB)")
-        return target_path
-        
-    except Exception as e:
-        print(f"   ❌ Failed to download {model.name}: {e}")
-        if target_path.exists():
-            target_path.unlink()
-        return None
+    
+    start = time.time()
+    downloaded = 0
+    for attempt in range(1, DOWNLOAD_RETRIES + 1):
+        try:
+            downloaded += _download_to_part(model.download_url, part_path, api_key)
+            break
+        except Exception as e:
+            print(f"   ⚠️  {model.name} attempt {attempt}/{DOWNLOAD_RETRIES} failed: {e}")
+            if attempt == DOWNLOAD_RETRIES:
+                # Keep the .part file so the next run resumes instead of starting over
+                print(f"   ❌ Failed to download {model.name} (partial file kept for resume)")
+                return None, downloaded
+    
+    elapsed = max(time.time() - start, 1e-6)
+    
+    expected = _expected_sha256(model, api_key)
+    digest = _sha256_file(part_path)
+    if expected and digest != expected:
+        print(f"   ❌ {model.name} checksum mismatch (expected {expected}, got {digest})")
+        part_path.unlink()
+        return None, downloaded
+    if not expected:
+        print(f"   ⚠️  {model.name} sha256={digest} (no published hash, unverified)")
+    
+    part_path.rename(target_path)
+    size_mb = target_path.stat().st_size / 1024 / 1024
+    print(f"   ✅ {model.name} downloaded ({size_mb:.1f} MB, {downloaded / 1024 / 1024 / elapsed:.1f} MB/s)")
+    return target_path, downloaded
 
 
 def setup_civitai_models(
     comfy_dir: Path,
     models: list[CivitAIModel],
     api_key: Optional[str] = None,
+    max_workers: int = MAX_PARALLEL_DOWNLOADS,
 ) -> dict[str, bool]:
     """
-    Download and setup multiple CivitAI models.
+    Download and setup multiple CivitAI models concurrently.
     
     Args:
         comfy_dir: ComfyUI directory
         models: List of models to download
         api_key: Optional CivitAI API key
+        max_workers: Models downloaded at once (default: 4)
     
     Returns:
         Dict mapping model ID to success status
     """
-    results = {}
-    
+    jobs = []
     for model in models:
         # Determine target directory based on model type
         if model.model_type == ModelType.CHECKPOINT:
@@ -619,9 +758,18 @@ def setup_civitai_models(
             target_dir = comfy_dir / "models" / "loras"
         else:
             continue
-        
-        result = download_civitai_model(model, target_dir, api_key)
-        results[model.id] = result is not None
+        jobs.append((model, target_dir))
+    
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        outcomes = list(pool.map(lambda job: _download_civitai_model(job[0], job[1], api_key), jobs))
+    elapsed = max(time.time() - start, 1e-6)
+    
+    results = {model.id: path is not None for (model, _), (path, _) in zip(jobs, outcomes)}
+    # Only bytes fetched by this run: files already present do not count toward MB/s
+    transferred_mb = sum(downloaded for _, downloaded in outcomes) / 1024 / 1024
+    print(f"📦 CivitAI models: {sum(results.values())}/{len(results)} ready "
+          f"({transferred_mb:.1f} MB downloaded in {elapsed:.1f}s, {transferred_mb / elapsed:.1f} MB/s)")
     
     return results
 
@@ -21,6 +21,7 @@ base_image = (
     .apt_install(["git", "wget", "curl", "libgl1", "libglib2.0-0"])  # libGL for OpenCV/cv2
     .uv_pip_install(f"fastapi[standard]=={FASTAPI_VERSION}")
     .uv_pip_install(f"comfy-cli=={COMFY_CLI_VERSION}")
+    .uv_pip_install("websocket-client>=1.6.0")  # ComfyUI /ws completion events
     # Add utils directory - USE ORIGINAL utils from apps/modal/utils (same as original working app)
     # This includes __init__.py to make it a proper Python package
     .add_local_dir("apps/modal/utils", "/root/utils", copy=True)
@@ -28,6 +29,8 @@ base_image = (
     .add_local_file("apps/modal/shared/config.py", "/root/config.py", copy=True)
     # Add image_base.py itself to /root/shared/ for imports from app image.py files
     .add_local_file("apps/modal/shared/image_base.py", "/root/shared/image_base.py", copy=True)
+    # CivitAI LoRA catalog (LoRA stacks resolve catalog ids at request time)
+    .add_local_file("apps/modal/shared/civitai_models.py", "/root/shared/civitai_models.py", copy=True)
     # Install ComfyUI
     .run_commands(
         f"comfy --skip-prompt install --fast-deps --nvidia --version {COMFYUI_VERSION}"
@@ -135,6 +138,8 @@ base_image = (
         "python install.py && "
         "echo '✅ ComfyUI-Impact-Pack (FaceDetailer) installed'"
     )
+    # RYLA custom nodes (cached text encoder)
+    .add_local_dir("apps/modal/comfy_nodes", "/root/comfy/ComfyUI/custom_nodes/ryla_nodes", copy=True)
     # Install HuggingFace Hub
     .uv_pip_install("huggingface-hub>=0.20.0")
     .env({"HF_XET_HIGH_PERFORMANCE": "1"})
@@ -0,0 +1,216 @@
+"""
+Cross-request micro-batching for unseeded text-to-image requests.
+
+Concurrent single-image requests that did not pick a seed and whose
+workflows are otherwise identical (endpoint, prompt, resolution, steps)
+are collected over a short window and run as one ComfyUI prompt with the
+latent's ``batch_size`` set to the number of requests. The sampler
+denoises the whole batch in one pass and each caller gets one image of it.
+
+ZImageSampler and KSampler take one prompt and one seed per latent batch,
+so only requests that can share both are batched. A request with an
+explicit seed must reproduce, and runs alone as before. The first image of
+a batch is exactly what the leader would have received alone (same seed,
+first slice of the batch noise); the other callers get further samples,
+which is fine since they did not ask for a particular seed.
+"""
+
+import copy
+import json
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Hashable, List, Optional
+
+from utils.cancellation import CANCEL_POLL_SECONDS, cancel_scope, current_cancel_token
+
+# How long the first request of a batch waits for companions
+BATCH_WINDOW_SECONDS = 0.1
+
+# Upper bound on requests run as one latent batch
+MAX_BATCH_SIZE = 4
+
+# Inputs that differ per request but do not change the output
+IGNORED_INPUTS = ("filename_prefix",)
+
+_batcher_lock = threading.Lock()
+
+
+def batch_size_node(workflow: dict) -> Optional[str]:
+    """ID of the node whose ``batch_size`` input sets the latent batch (e.g. EmptySD3LatentImage), if any."""
+    nodes = [node_id for node_id, node in workflow.items() if "batch_size" in node.get("inputs", {})]
+    return nodes[0] if len(nodes) == 1 else None
+
+
+def batch_key(workflow: dict) -> Optional[str]:
+    """
+    Key under which a workflow may share a latent batch.
+
+    Args:
+        workflow: ComfyUI workflow dictionary (API format)
+
+    Returns:
+        Canonical JSON of the workflow without per-request inputs, or None
+        if the workflow has no single-image latent batch to grow
+    """
+    node_id = batch_size_node(workflow)
+    if node_id is None or workflow[node_id]["inputs"]["batch_size"] != 1:
+        return None
+    canonical = {
+        nid: {**node, "inputs": {k: v for k, v in node.get("inputs", {}).items() if k not in IGNORED_INPUTS}}
+        for nid, node in workflow.items()
+    }
+    return json.dumps(canonical, sort_keys=True, default=str)
+
+
+class _Batch:
+    """Requests collected for one latent batch."""
+
+    def __init__(self):
+        self.futures: List[Future] = []
+        self.full = threading.Event()
+
+
+class MicroBatcher:
+    """Collects identical unseeded requests and runs them as one latent batch."""
+
+    def __init__(
+        self,
+        execute_images: Callable[[dict], Dict[str, List[bytes]]],
+        window_seconds: float = BATCH_WINDOW_SECONDS,
+        max_batch_size: int = MAX_BATCH_SIZE,
+    ):
+        """
+        Initialize batcher.
+
+        Args:
+            execute_images: Runs a workflow and returns images by output node ID
+            window_seconds: How long a new batch stays open for companions
+            max_batch_size: Batch is dispatched immediately once this full
+        """
+        self.execute_images = execute_images
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self._lock = threading.Lock()
+        self._open: Dict[Hashable, _Batch] = {}
+        self._batches_run = 0
+        self._requests_run = 0
+        self._largest_batch = 0
+
+    def submit(self, workflow: dict, run_single: Callable[[], bytes]) -> bytes:
+        """
+        Run a single-image workflow, possibly batched with identical requests.
+
+        Blocks the calling (worker) thread until the image is available. The
+        first request of a batch waits up to window_seconds, then runs it:
+        alone via ``run_single`` (the normal, cached path) if nobody joined,
+        otherwise as one prompt with ``batch_size`` = number of requests.
+
+        Args:
+            workflow: ComfyUI workflow dictionary (API format)
+            run_single: Runs this request alone and returns its image
+
+        Returns:
+            Bytes of this request's image
+        """
+        key = batch_key(workflow)
+        if key is None:
+            return run_single()
+
+        future: Future = Future()
+        with self._lock:
+            batch = self._open.get(key)
+            is_leader = batch is None
+            if is_leader:
+                batch = _Batch()
+                self._open[key] = batch
+            batch.futures.append(future)
+            if len(batch.futures) >= self.max_batch_size:
+                self._open.pop(key, None)
+                batch.full.set()
+
+        if is_leader:
+            batch.full.wait(self.window_seconds)
+            with self._lock:
+                if self._open.get(key) is batch:
+                    del self._open[key]
+            self._run(batch, workflow, run_single)
+            return future.result()
+
+        # Followers wait for the leader's render, but stop waiting if cancelled
+        token = current_cancel_token()
+        while True:
+            try:
+                return future.result(timeout=CANCEL_POLL_SECONDS)
+            except FutureTimeoutError:
+                if token is not None:
+                    token.raise_if_cancelled()
+
+    def _run(self, batch: _Batch, workflow: dict, run_single: Callable[[], bytes]):
+        """Execute a closed batch and resolve each request's future."""
+        size = len(batch.futures)
+        with self._lock:
+            self._batches_run += 1
+            self._requests_run += size
+            self._largest_batch = max(self._largest_batch, size)
+
+        if size == 1:
+            try:
+                batch.futures[0].set_result(run_single())
+            except BaseException as e:
+                batch.futures[0].set_exception(e)
+            return
+
+        try:
+            batched = copy.deepcopy(workflow)
+            batched[batch_size_node(batched)]["inputs"]["batch_size"] = size
+            print(f"📦 Running {size} requests as one latent batch")
+            # The prompt serves every request in the batch; cancelling the
+            # request that happens to run it must not stop the others
+            with cancel_scope(None):
+                outputs = self.execute_images(batched)
+            images = [image for node_images in outputs.values() for image in node_images]
+        except Exception as e:
+            for future in batch.futures:
+                future.set_exception(e)
+            return
+
+        for index, future in enumerate(batch.futures):
+            if index < len(images):
+                future.set_result(images[index])
+            else:
+                future.set_exception(Exception(f"Batch returned {len(images)} images for {size} requests"))
+
+    def stats(self) -> Dict:
+        """Get batching counters."""
+        with self._lock:
+            return {
+                "batches_run": self._batches_run,
+                "requests_run": self._requests_run,
+                "largest_batch": self._largest_batch,
+                "avg_batch_size": round(self._requests_run / self._batches_run, 2) if self._batches_run else 0.0,
+            }
+
+
+def get_batcher(comfyui_instance) -> MicroBatcher:
+    """
+    Get (or lazily create) the micro-batcher for a ComfyUI container instance.
+
+    Args:
+        comfyui_instance: ComfyUI class instance
+
+    Returns:
+        MicroBatcher shared by all handlers of the container
+    """
+    with _batcher_lock:
+        batcher = getattr(comfyui_instance, "_micro_batcher", None)
+        if batcher is None:
+            port = getattr(comfyui_instance, "port", 8000)
+
+            def execute_images(workflow: dict) -> Dict[str, List[bytes]]:
+                from utils.comfyui import poll_server_health, execute_workflow_images
+                poll_server_health(port)
+                return execute_workflow_images(workflow, port=port)
+
+            batcher = MicroBatcher(execute_images)
+            comfyui_instance._micro_batcher = batcher
+        return batcher
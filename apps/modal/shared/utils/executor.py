@@ -0,0 +1,235 @@
+"""
+Off-loop execution of handler implementations.
+
+Handler ``_*_impl`` methods are synchronous and block for the whole
+workflow run. Routes hand them to a per-container worker pool sized to the
+container's ``@modal.concurrent`` limit so the ASGI event loop stays free
+(health checks, diagnostics) and excess requests get a 503 instead of
+piling up. A slot is held until its worker thread returns, not until the
+request ends: a render still unwinding after its client went away keeps
+its slot, and new requests wait in a short queue behind it.
+
+Implementations run with the request's cancel token (utils.cancellation).
+Cancelled requests are counted with the GPU time they used and an estimate
+of the GPU time freed (the endpoint's average run time minus time spent).
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Tuple
+
+from fastapi import HTTPException
+
+from utils.cancellation import CancelOnDisconnectMiddleware, CancelToken, cancel_scope, current_cancel_token
+from utils.cost_tracker import MODAL_GPU_PRICING
+
+# Matches @modal.concurrent(max_inputs=5) used by most apps
+DEFAULT_MAX_WORKERS = 5
+
+# Requests a container's executor lets wait for a worker (e.g. behind
+# cancelled renders that have not stopped yet) before answering 503
+DEFAULT_MAX_QUEUE = 5
+
+# Seconds clients should wait before retrying a rejected request
+RETRY_AFTER_SECONDS = 10
+
+
+class ImplExecutor:
+    """Bounded worker pool for blocking handler implementations."""
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, max_queue: int = 0, gpu_type: str = "L40S"):
+        """
+        Initialize executor.
+
+        Args:
+            max_workers: Number of implementations that may run at once
+            max_queue: Extra requests allowed to wait for a worker before
+                new requests are rejected with 503 (default: 0)
+            gpu_type: Container GPU, for pricing freed GPU time
+        """
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.gpu_type = gpu_type
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="impl")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._cancelled = 0
+        self._cancelled_gpu_seconds = 0.0
+        self._freed_gpu_seconds = 0.0
+        # fn name -> (completed runs, total seconds), for freed-time estimates
+        self._durations: Dict[str, Tuple[int, float]] = {}
+
+    def _call(self, token: CancelToken, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn on a worker thread, tracking how many are running."""
+        name = getattr(fn, "__name__", "impl")
+        with self._lock:
+            self._running += 1
+        start = time.time()
+        succeeded = False
+        try:
+            token.raise_if_cancelled()  # cancelled while waiting for a worker
+            with cancel_scope(token):
+                result = fn(*args, **kwargs)
+            succeeded = True
+            return result
+        finally:
+            elapsed = time.time() - start
+            with self._lock:
+                self._running -= 1
+                if token.cancelled:
+                    self._record_cancelled(name, elapsed)
+                elif succeeded:
+                    count, total = self._durations.get(name, (0, 0.0))
+                    self._durations[name] = (count + 1, total + elapsed)
+
+    def _record_cancelled(self, name: str, elapsed: float):
+        """Count a cancelled run (caller holds the lock)."""
+        count, total = self._durations.get(name, (0, 0.0))
+        self._cancelled += 1
+        self._cancelled_gpu_seconds += elapsed
+        if count:
+            self._freed_gpu_seconds += max(0.0, total / count - elapsed)
+
+    def _release_slot(self, _future: Future):
+        """Free an admission slot once the worker thread is done (or the call never started)."""
+        with self._lock:
+            self._in_flight -= 1
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run a blocking implementation on the worker pool.
+
+        Args:
+            fn: Synchronous callable (e.g. ``handler._flux_impl``)
+            *args, **kwargs: Arguments passed to fn
+
+        Returns:
+            Return value of fn
+
+        Raises:
+            HTTPException: 503 with Retry-After if the pool and queue are full
+            RequestCancelled: If the request was cancelled while fn ran
+        """
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                print(f"⚠️  Executor full ({self._in_flight} in flight), rejecting request")
+                raise HTTPException(
+                    status_code=503,
+                    detail=(
+                        f"Server busy: {self._in_flight} requests in flight "
+                        f"(limit {self.max_workers + self.max_queue})"
+                    ),
+                    headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+                )
+            self._in_flight += 1
+
+        # The worker thread runs in this request's context (per-request state
+        # such as output cache hits) under its cancel token
+        token = current_cancel_token() or CancelToken()
+        context = contextvars.copy_context()
+        try:
+            future = self._pool.submit(context.run, self._call, token, fn, *args, **kwargs)
+        except BaseException:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+        # The slot is freed when the thread finishes, even if this request
+        # stops waiting for it first
+        future.add_done_callback(self._release_slot)
+        try:
+            result = await asyncio.wrap_future(future)
+            with self._lock:
+                self._completed += 1
+            return result
+        except asyncio.CancelledError:
+            # The awaiting task was cancelled (job deleted, input cancelled by
+            # Modal): stop the render instead of letting the thread finish it
+            token.cancel("request task cancelled")
+            raise
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+
+    def stats(self) -> Dict:
+        """Get current pool utilization and counters."""
+        price = MODAL_GPU_PRICING.get(self.gpu_type, MODAL_GPU_PRICING["L40S"])
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queue_depth": self._in_flight - self._running,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "cancelled": self._cancelled,
+                "cancelled_gpu_seconds": round(self._cancelled_gpu_seconds, 1),
+                "freed_gpu_seconds": round(self._freed_gpu_seconds, 1),
+                "freed_cost_usd": round(self._freed_gpu_seconds * price, 6),
+            }
+
+
+def get_executor(comfyui_instance) -> ImplExecutor:
+    """
+    Get (or lazily create) the executor for a ComfyUI container instance.
+
+    The pool is sized from the instance's ``max_concurrent_inputs`` attribute,
+    which each app sets to its ``@modal.concurrent(max_inputs=...)`` value,
+    with DEFAULT_MAX_QUEUE requests allowed to wait for a worker; freed GPU
+    time is priced from its ``gpu_type`` attribute.
+
+    Args:
+        comfyui_instance: ComfyUI class instance
+
+    Returns:
+        ImplExecutor shared by all routes of the container
+    """
+    executor = getattr(comfyui_instance, "_impl_executor", None)
+    if executor is None:
+        max_workers = getattr(comfyui_instance, "max_concurrent_inputs", DEFAULT_MAX_WORKERS)
+        gpu_type = getattr(comfyui_instance, "gpu_type", "L40S")
+        executor = ImplExecutor(max_workers=max_workers, max_queue=DEFAULT_MAX_QUEUE, gpu_type=gpu_type)
+        comfyui_instance._impl_executor = executor
+    return executor
+
+
+async def run_impl(comfyui_instance, fn: Callable, *args, **kwargs) -> Any:
+    """
+    Run a handler implementation off the event loop.
+
+    Args:
+        comfyui_instance: ComfyUI class instance (owns the executor)
+        fn: Synchronous handler implementation
+        *args, **kwargs: Arguments passed to fn
+
+    Returns:
+        Return value of fn
+    """
+    return await get_executor(comfyui_instance).run(fn, *args, **kwargs)
+
+
+def setup_executor_endpoints(fastapi, comfyui_instance):
+    """
+    Register executor stats endpoint and disconnect cancellation in FastAPI app.
+
+    Args:
+        fastapi: FastAPI app instance
+        comfyui_instance: ComfyUI class instance
+    """
+    # Stop renders whose client went away
+    fastapi.add_middleware(CancelOnDisconnectMiddleware)
+
+    @fastapi.get("/executor/stats")
+    async def executor_stats():
+        """Worker pool utilization, queue depth and cancelled/freed GPU time."""
+        return get_executor(comfyui_instance).stats()
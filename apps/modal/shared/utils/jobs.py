@@ -0,0 +1,701 @@
+"""
+Asynchronous job API for ComfyUI apps.
+
+``POST /jobs`` accepts ``{"endpoint": "/wan2.6", "input": {...}}`` and returns
+202 immediately. The job is spawned as a call of the app's ``run_job`` Modal
+method, so Modal counts it as load and does not scale its container down
+mid-job; that container runs the app's own route in-process (same handler,
+middleware and executor as a synchronous call) and the response body is
+written to the results store. Clients poll ``GET /jobs/{job_id}`` or pass a
+``callback_url`` webhook, then fetch ``GET /jobs/{job_id}/result``.
+``DELETE /jobs/{job_id}`` cancels a job (its Modal call) and stops its
+ComfyUI prompt.
+
+Job records and results live on the ``ryla-models`` volume (``JOB_RESULTS_DIR``)
+so any container of the app can answer status and result requests; set
+``JOB_RESULTS_S3_BUCKET`` to keep results in an S3-compatible store instead.
+Response bodies are written to local disk while a job runs and moved to the
+volume when it finishes, and volume commits and reloads run on worker
+threads, off the event loop.
+A client-supplied ``job_key`` makes submission idempotent: retrying returns
+the existing job rather than running it again (unless it failed or was
+cancelled). The queued record is committed before the job is spawned, and
+the first call to record its ID in the job's ``call_id`` file owns the job;
+a duplicate call spawned by a racing container is cancelled and never
+writes the record.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Job records and results (ryla-models volume is mounted at /root/models)
+JOB_RESULTS_DIR = os.environ.get("JOB_RESULTS_DIR", "/root/models/jobs")
+
+# Response bodies of running jobs (local disk; no open files on the volume)
+JOB_WORK_DIR = "/tmp/ryla-jobs"
+
+# Modal volume holding JOB_RESULTS_DIR (committed so other containers see results)
+JOB_VOLUME_NAME = "ryla-models"
+
+# Minimum seconds between volume reloads for status polls
+JOB_RELOAD_INTERVAL_SECONDS = 2
+
+# Locks serializing create/claim per job ID within a container (job_id hashes to one)
+JOB_LOCK_STRIPES = 64
+
+# Optional S3-compatible result store (credentials from the standard AWS env vars)
+JOB_RESULTS_S3_BUCKET = os.environ.get("JOB_RESULTS_S3_BUCKET")
+JOB_RESULTS_S3_ENDPOINT_URL = os.environ.get("JOB_RESULTS_S3_ENDPOINT_URL")
+
+# Presigned result URLs stay valid this long
+RESULT_URL_EXPIRY_SECONDS = 24 * 3600
+
+# Webhook delivery attempts (exponential backoff between attempts)
+WEBHOOK_RETRIES = 3
+
+# A job whose route answers 503 (executor full) waits and retries this many times
+MAX_BUSY_RETRIES = 120
+
+# Response headers kept with a job result (cost, model, frame counts, ...)
+RESULT_HEADER_PREFIX = "x-"
+
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+# Jobs in these states are run again when resubmitted with the same job_key
+RETRYABLE_STATUSES = ("failed", "cancelled")
+
+RESULT_EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "video/mp4": "mp4",
+    "application/json": "json",
+}
+
+
+def job_id_for_key(endpoint: str, job_key: str) -> str:
+    """Derive a stable job ID from a client-supplied idempotency key."""
+    digest = hashlib.sha256(f"{endpoint}\n{job_key}".encode("utf-8")).hexdigest()
+    return f"job-{digest[:24]}"
+
+
+def _volume_sync(action: str):
+    """Commit or reload the jobs volume so records are visible across containers."""
+    try:
+        import modal
+
+        getattr(modal.Volume.from_name(JOB_VOLUME_NAME), action)()
+    except Exception as e:
+        print(f"⚠️  Jobs volume {action} skipped: {e}")
+
+
+def cancel_function_call(call_id: str):
+    """Cancel a job's Modal function call (the job may run in another container)."""
+    import modal
+
+    modal.FunctionCall.from_id(call_id).cancel()
+
+
+async def call_app_route(app, path: str, payload: dict, output_path: str) -> Tuple[int, Dict[str, str]]:
+    """
+    POST a JSON payload to an ASGI app in-process and write the response body to a file.
+
+    Args:
+        app: ASGI app (the container's FastAPI app)
+        path: Route path, e.g. "/wan2.6"
+        payload: JSON request body
+        output_path: Where to write the response body
+
+    Returns:
+        Tuple of (status code, lower-cased response headers)
+    """
+    body = json.dumps(payload).encode("utf-8")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode("utf-8"),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("ascii")),
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": ("127.0.0.1", 80),
+    }
+    request_sent = False
+    never = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await never.wait()  # the in-process client never disconnects
+
+    response = {"status": 500, "headers": {}}
+    with open(output_path, "wb") as f:
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = {
+                    key.decode("latin-1").lower(): value.decode("latin-1")
+                    for key, value in message.get("headers", [])
+                }
+            elif message["type"] == "http.response.body":
+                f.write(message.get("body", b""))
+
+        try:
+            await app(scope, receive, send)
+        except Exception as e:
+            # ServerErrorMiddleware re-raises after sending the 500 response
+            if response["status"] < 500:
+                raise
+            print(f"⚠️  Job route {path} raised: {e}")
+
+    return response["status"], response["headers"]
+
+
+class S3ResultStore:
+    """Keeps job results in an S3-compatible bucket (boto3 is imported lazily)."""
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, prefix: str = "jobs"):
+        import boto3
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self._client = boto3.client("s3", endpoint_url=endpoint_url)
+
+    def save(self, job_id: str, local_path: str, media_type: str) -> str:
+        """Upload a result and return a presigned download URL."""
+        key = f"{self.prefix}/{job_id}/{os.path.basename(local_path)}"
+        self._client.upload_file(local_path, self.bucket, key, ExtraArgs={"ContentType": media_type})
+        os.remove(local_path)
+        return self._client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=RESULT_URL_EXPIRY_SECONDS,
+        )
+
+
+class JobTable:
+    """Job records in the results directory, plus the jobs running in this container."""
+
+    def __init__(
+        self,
+        results_dir: str = JOB_RESULTS_DIR,
+        store=None,
+        sync_volume: bool = True,
+        spawn: Optional[Callable[[dict, dict], Awaitable]] = None,
+        work_dir: str = JOB_WORK_DIR,
+    ):
+        """
+        Initialize job table.
+
+        Args:
+            results_dir: Directory for job records and results
+            store: Optional remote result store (e.g. S3ResultStore)
+            sync_volume: Commit/reload the Modal volume around record writes
+            spawn: Starts a job as a Modal function call (ComfyUI.run_job.spawn.aio);
+                None runs jobs as tasks on the serving event loop
+            work_dir: Local directory for response bodies of running jobs
+        """
+        self.results_dir = results_dir
+        self.store = store
+        self.sync_volume = sync_volume
+        self.spawn = spawn
+        self.work_dir = work_dir
+        self._jobs: Dict[str, dict] = {}  # jobs running in this container
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._reload_lock = threading.Lock()
+        self._job_locks = [threading.Lock() for _ in range(JOB_LOCK_STRIPES)]
+        self._last_reload = 0.0
+        self._counters = {"submitted": 0, "deduplicated": 0, "succeeded": 0, "failed": 0, "cancelled": 0}
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.results_dir, job_id)
+
+    def _job_lock(self, job_id: str) -> threading.Lock:
+        """Lock serializing record creation and call claims for a job ID in this container."""
+        return self._job_locks[int(hashlib.sha256(job_id.encode("utf-8")).hexdigest(), 16) % JOB_LOCK_STRIPES]
+
+    def _write(self, record: dict, commit: bool = False):
+        """Persist a job record (atomic replace)."""
+        job_dir = self.job_dir(record["job_id"])
+        os.makedirs(job_dir, exist_ok=True)
+        tmp_path = os.path.join(job_dir, "job.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(record, f)
+        os.replace(tmp_path, os.path.join(job_dir, "job.json"))
+        if commit and self.sync_volume:
+            _volume_sync("commit")
+
+    def _write_call_id(self, job_id: str, call_id: Optional[str], commit: bool = True):
+        with open(os.path.join(self.job_dir(job_id), "call_id"), "w") as f:
+            f.write(call_id or "")
+        if commit and self.sync_volume:
+            _volume_sync("commit")
+
+    def _read_call_id(self, job_id: str) -> Optional[str]:
+        path = os.path.join(self.job_dir(job_id), "call_id")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return f.read() or None
+
+    def _read(self, job_id: str) -> Optional[dict]:
+        path = os.path.join(self.job_dir(job_id), "job.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            record = json.load(f)
+        if not record.get("call_id"):
+            record["call_id"] = self._read_call_id(job_id)
+        return record
+
+    def _reload(self, force: bool = False):
+        """Reload the volume, at most once per JOB_RELOAD_INTERVAL_SECONDS unless forced."""
+        with self._reload_lock:
+            if not force and time.time() - self._last_reload < JOB_RELOAD_INTERVAL_SECONDS:
+                return
+            self._last_reload = time.time()
+        _volume_sync("reload")
+
+    def _claim_call_id(self, job_id: str, call_id: Optional[str]) -> Optional[str]:
+        """
+        Record a spawned call as the job's call unless another call claimed it first.
+
+        Blocking (volume commit/reload); call it from a worker thread.
+
+        Returns:
+            ID of the call that owns the job (call_id, or the call that won)
+        """
+        with self._job_lock(job_id):
+            if self.sync_volume:
+                self._reload(force=True)
+            winner = self._read_call_id(job_id)
+            if winner is None:
+                self._write_call_id(job_id, call_id)
+                if self.sync_volume:
+                    # Two containers may both have found the file empty; the last commit wins
+                    self._reload(force=True)
+                    winner = self._read_call_id(job_id)
+            return winner or call_id
+
+    def _superseded(self, record: dict) -> bool:
+        """
+        Whether another call owns the job this (duplicate, cancelled) call was spawned for.
+
+        Blocking (volume reload); call it from a worker thread.
+        """
+        call_id = record.get("call_id")
+        if not call_id:
+            return False
+        if self.sync_volume:
+            self._reload(force=True)
+        winner = self._read_call_id(record["job_id"])
+        return winner is not None and winner != call_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """
+        Get a job record (jobs running here first, then the results directory).
+
+        Blocking (volume reload); call it from a worker thread.
+        """
+        if job_id in self._jobs:
+            return self._jobs[job_id]
+        record = self._read(job_id)
+        if self.sync_volume and (record is None or record["status"] not in TERMINAL_STATUSES):
+            # Another container may run the job; pick up its latest commit
+            self._reload()
+            record = self._read(job_id)
+        return record
+
+    def create(
+        self,
+        endpoint: str,
+        job_key: Optional[str] = None,
+        callback_url: Optional[str] = None,
+    ) -> Tuple[dict, bool]:
+        """
+        Create and commit a queued job record, or return the existing job for a job_key.
+
+        Blocking (volume commit/reload); call it from a worker thread. The
+        lookup and the write hold the job's lock, so concurrent submissions
+        of a job_key in this container create one job; the record is
+        committed before ``start`` spawns it, so other containers see it.
+
+        Args:
+            endpoint: Route the job runs
+            job_key: Client idempotency key
+            callback_url: Webhook called when the job finishes
+
+        Returns:
+            Tuple of (job record, True if a new job was created)
+        """
+        job_id = job_id_for_key(endpoint, job_key) if job_key else f"job-{uuid.uuid4().hex[:24]}"
+        with self._job_lock(job_id):
+            if job_key:
+                if self.sync_volume:
+                    self._reload(force=True)
+                existing = self._jobs.get(job_id) or self._read(job_id)
+                if existing is not None and existing["status"] not in RETRYABLE_STATUSES:
+                    self._counters["deduplicated"] += 1
+                    return existing, False
+
+            record = self._new_record(job_id, endpoint, job_key, callback_url)
+            self._write(record)
+            # A retried job_key starts with no call; the first call spawned for it claims it
+            self._write_call_id(job_id, None)
+            self._counters["submitted"] += 1
+        return record, True
+
+    @staticmethod
+    def _new_record(job_id: str, endpoint: str, job_key: Optional[str], callback_url: Optional[str]) -> dict:
+        return {
+            "job_id": job_id,
+            "job_key": job_key,
+            "endpoint": endpoint,
+            "status": "queued",
+            "call_id": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "callback_url": callback_url,
+            "result": None,
+            "error": None,
+        }
+
+    async def start(self, record: dict, app, payload: dict):
+        """
+        Start a job: as a Modal function call when ``spawn`` is set (the call
+        may land on any container), otherwise as a task on this event loop.
+
+        The record was committed by ``create``, so the running container's
+        updates are never overwritten; the call ID goes in its own file.
+
+        Returns:
+            The Modal FunctionCall, or the asyncio task
+        """
+        if self.spawn is not None:
+            try:
+                call = await self.spawn(dict(record), payload)
+            except Exception as e:
+                record.update(status="failed", error=f"could not start job: {e}", finished_at=time.time())
+                self._counters["failed"] += 1
+                await asyncio.to_thread(self._write, record, True)
+                raise
+            call_id = getattr(call, "object_id", None)
+            record["call_id"] = await asyncio.to_thread(self._claim_call_id, record["job_id"], call_id)
+            if record["call_id"] != call_id:
+                # Another container submitted the same job_key first: keep its call
+                print(f"⚠️  Job {record['job_id']} already has call {record['call_id']}, cancelling {call_id}")
+                await asyncio.to_thread(cancel_function_call, call_id)
+                self._counters["submitted"] -= 1
+                self._counters["deduplicated"] += 1
+            return call
+
+        task = asyncio.create_task(self.run(record, app, payload))
+        self._tasks[record["job_id"]] = task
+        task.add_done_callback(lambda _: self._tasks.pop(record["job_id"], None))
+        return task
+
+    async def run(self, record: dict, app, payload: dict):
+        """Execute a job through the app's route and store its result."""
+        job_id = record["job_id"]
+        if await asyncio.to_thread(self._superseded, record):
+            # Duplicate call of a job another call already owns (it is being cancelled)
+            print(f"⚠️  Job {job_id} is owned by another call, not running {record['call_id']}")
+            return
+        job_dir = self.job_dir(job_id)
+        os.makedirs(self.work_dir, exist_ok=True)
+        body_path = os.path.join(self.work_dir, f"{job_id}.part")
+        self._jobs[job_id] = record
+        task = asyncio.current_task()
+        if task is not None:
+            self._tasks.setdefault(job_id, task)
+
+        try:
+            for _ in range(MAX_BUSY_RETRIES):
+                first_start = record["started_at"] is None
+                record["status"] = "running"
+                record["started_at"] = record["started_at"] or time.time()
+                # Commit the first transition so other containers stop showing "queued"
+                await asyncio.to_thread(self._write, record, first_start)
+                status, headers = await call_app_route(app, record["endpoint"], payload, body_path)
+                if status != 503:
+                    break
+                # Executor full: stay queued instead of failing the job
+                record["status"] = "queued"
+                await asyncio.to_thread(self._write, record)
+                await asyncio.sleep(float(headers.get("retry-after", 10)))
+
+            if status >= 400:
+                with open(body_path, "rb") as f:
+                    detail = f.read(2000).decode("utf-8", errors="replace")
+                os.remove(body_path)
+                raise Exception(f"{record['endpoint']} returned HTTP {status}: {detail}")
+
+            media_type = headers.get("content-type", "application/octet-stream").split(";")[0]
+            result_path = os.path.join(job_dir, f"result.{RESULT_EXTENSIONS.get(media_type, 'bin')}")
+            result = {
+                "media_type": media_type,
+                "size": os.path.getsize(body_path),
+                "headers": {k: v for k, v in headers.items() if k.startswith(RESULT_HEADER_PREFIX)},
+                "path": result_path,
+                "url": None,
+            }
+            if self.store is not None:
+                result["url"] = await asyncio.to_thread(self.store.save, job_id, body_path, media_type)
+                result["path"] = None
+            else:
+                await asyncio.to_thread(os.makedirs, job_dir, exist_ok=True)
+                await asyncio.to_thread(shutil.move, body_path, result_path)
+
+            record.update(status="succeeded", result=result)
+            self._counters["succeeded"] += 1
+            print(f"✅ Job {job_id} succeeded ({record['endpoint']}, {result['size'] / 1024:.1f} KB)")
+        except asyncio.CancelledError:
+            # DELETE /jobs/{id}: the executor stops the ComfyUI prompt
+            record.update(status="cancelled", error="cancelled by client")
+            self._counters["cancelled"] += 1
+            if os.path.exists(body_path):
+                os.remove(body_path)
+            print(f"🛑 Job {job_id} cancelled")
+        except Exception as e:
+            record.update(status="failed", error=str(e))
+            self._counters["failed"] += 1
+            print(f"❌ Job {job_id} failed: {e}")
+        finally:
+            record["finished_at"] = time.time()
+            superseded = await asyncio.to_thread(self._superseded, record)
+            if superseded:
+                # Duplicate call of a job owned by another call: leave its record alone
+                print(f"⚠️  Job {job_id} call {record['call_id']} was a duplicate, not recording it")
+            else:
+                await asyncio.to_thread(self._write, record, True)
+            self._jobs.pop(job_id, None)
+            self._tasks.pop(job_id, None)
+            if record.get("callback_url") and not superseded:
+                await asyncio.to_thread(send_webhook, record["callback_url"], public_record(record))
+
+    def cancel(self, job_id: str) -> Optional[asyncio.Task]:
+        """
+        Cancel a job running as a task in this container.
+
+        Returns:
+            The job's task (finishing its cancellation), or None if the job
+            is not running in this container
+        """
+        task = self._tasks.get(job_id)
+        if task is None or task.done():
+            return None
+        task.cancel()
+        return task
+
+    def stats(self) -> Dict:
+        """Get job counters for this container."""
+        return {**self._counters, "running": len(self._tasks)}
+
+
+def public_record(record: dict) -> dict:
+    """Job record as returned to clients (no container paths)."""
+    result = record.get("result")
+    if result is not None:
+        result = {k: v for k, v in result.items() if k != "path"}
+    return {
+        **{k: v for k, v in record.items() if k != "result"},
+        "result": result,
+        "status_url": f"/jobs/{record['job_id']}",
+        "result_url": f"/jobs/{record['job_id']}/result" if record["status"] == "succeeded" else None,
+    }
+
+
+def send_webhook(url: str, payload: dict) -> bool:
+    """
+    POST a finished job record to a client webhook.
+
+    Args:
+        url: Callback URL
+        payload: Public job record
+
+    Returns:
+        True if the webhook answered 2xx
+    """
+    import requests
+
+    for attempt in range(WEBHOOK_RETRIES):
+        try:
+            response = requests.post(url, json=payload, timeout=30)
+            if response.ok:
+                return True
+            print(f"⚠️  Webhook {url} returned HTTP {response.status_code}")
+        except requests.exceptions.RequestException as e:
+            print(f"⚠️  Webhook {url} failed: {e}")
+        if attempt < WEBHOOK_RETRIES - 1:
+            time.sleep(2 ** attempt)
+    return False
+
+
+def get_job_table(comfyui_instance) -> JobTable:
+    """
+    Get (or lazily create) the job table for a ComfyUI container instance.
+
+    Args:
+        comfyui_instance: ComfyUI class instance
+
+    Returns:
+        JobTable shared by all routes of the container
+    """
+    table = getattr(comfyui_instance, "_job_table", None)
+    if table is None:
+        store = None
+        if JOB_RESULTS_S3_BUCKET:
+            try:
+                store = S3ResultStore(JOB_RESULTS_S3_BUCKET, JOB_RESULTS_S3_ENDPOINT_URL)
+            except ImportError:
+                print("⚠️  boto3 not installed, keeping job results on the volume")
+        # Inside a Modal container, self.run_job is the deployed method
+        run_job = getattr(comfyui_instance, "run_job", None)
+        spawn = getattr(getattr(run_job, "spawn", None), "aio", None)
+        table = JobTable(store=store, spawn=spawn)
+        comfyui_instance._job_table = table
+    return table
+
+
+async def run_spawned_job(comfyui_instance, record: dict, payload: dict) -> dict:
+    """
+    Body of an app's ``run_job`` Modal method: run a job spawned by POST /jobs.
+
+    Args:
+        comfyui_instance: ComfyUI class instance (its FastAPI app serves the route)
+        record: Job record created by the submitting container
+        payload: Request body for the job's route
+
+    Returns:
+        Public job record
+    """
+    app = getattr(comfyui_instance, "_job_app", None)
+    if app is None:
+        raise RuntimeError("Job API is not set up in this container")
+    try:
+        import modal
+
+        record["call_id"] = modal.current_function_call_id()
+    except Exception:
+        pass
+    await get_job_table(comfyui_instance).run(record, app, payload)
+    return public_record(record)
+
+
+def setup_job_endpoints(fastapi, comfyui_instance):
+    """
+    Register the async job API in FastAPI app.
+
+    Args:
+        fastapi: FastAPI app instance
+        comfyui_instance: ComfyUI class instance
+    """
+    from fastapi import HTTPException, Request
+    from fastapi.responses import FileResponse, JSONResponse, RedirectResponse
+
+    table = get_job_table(comfyui_instance)
+    comfyui_instance._job_app = fastapi  # run_job calls the routes in-process
+
+    def job_routes() -> List[str]:
+        """POST routes of this app that can run as jobs."""
+        return sorted(
+            route.path for route in fastapi.routes
+            if "POST" in getattr(route, "methods", ()) and not route.path.startswith("/jobs")
+            and "{" not in route.path
+        )
+
+    @fastapi.post("/jobs")
+    async def submit_job(request: Request):
+        """
+        Submit a request to run in the background.
+
+        Request body:
+        - endpoint: str - Route to run, e.g. "/wan2.6" (required)
+        - input: dict - Request body for that route (required)
+        - job_key: str - Idempotency key; resubmitting returns the same job (optional,
+          also accepted as the Idempotency-Key header)
+        - callback_url: str - Webhook POSTed the job record when it finishes (optional)
+
+        Returns:
+        - 202 with the job record (status_url to poll)
+        """
+        body = await request.json()
+        endpoint = body.get("endpoint")
+        if endpoint not in job_routes():
+            raise HTTPException(status_code=400, detail=f"endpoint must be one of {job_routes()}")
+        if not isinstance(body.get("input"), dict):
+            raise HTTPException(status_code=400, detail="input is required (request body for the endpoint)")
+
+        job_key = body.get("job_key") or request.headers.get("idempotency-key")
+        record, created = await asyncio.to_thread(table.create, endpoint, job_key, body.get("callback_url"))
+        if created:
+            await table.start(record, fastapi, body["input"])
+        return JSONResponse(public_record(record), status_code=202 if created else 200)
+
+    @fastapi.get("/jobs/stats")
+    async def job_stats():
+        """Job counters for this container."""
+        return table.stats()
+
+    @fastapi.get("/jobs/{job_id}")
+    async def job_status(job_id: str):
+        """Job status: queued, running, succeeded or failed."""
+        record = await asyncio.to_thread(table.get, job_id)
+        if record is None:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+        return public_record(record)
+
+    @fastapi.delete("/jobs/{job_id}")
+    async def cancel_job(job_id: str):
+        """Cancel a queued or running job (its ComfyUI prompt is removed or interrupted)."""
+        record = await asyncio.to_thread(table.get, job_id)
+        if record is None:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+        if record["status"] in TERMINAL_STATUSES:
+            raise HTTPException(status_code=409, detail=f"Job {job_id} already {record['status']}")
+        task = table.cancel(job_id)
+        if task is not None:
+            await asyncio.wait([task], timeout=5)
+            return public_record(await asyncio.to_thread(table.get, job_id))
+        if not record.get("call_id"):
+            raise HTTPException(status_code=409, detail=f"Job {job_id} is running in another container")
+
+        # Cancel the Modal call; the container running it records the cancellation
+        await asyncio.to_thread(cancel_function_call, record["call_id"])
+        deadline = time.time() + 5
+        while record["status"] not in TERMINAL_STATUSES and time.time() < deadline:
+            await asyncio.sleep(JOB_RELOAD_INTERVAL_SECONDS)
+            record = await asyncio.to_thread(table.get, job_id) or record
+        return public_record(record)
+
+    @fastapi.get("/jobs/{job_id}/result")
+    async def job_result(job_id: str):
+        """Job output with the original X- headers (redirects to the result store URL if remote)."""
+        record = await asyncio.to_thread(table.get, job_id)
+        if record is None:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+        if record["status"] != "succeeded":
+            raise HTTPException(status_code=409, detail=f"Job {job_id} is {record['status']}")
+
+        result = record["result"]
+        if result.get("url"):
+            return RedirectResponse(result["url"], status_code=307)
+        return FileResponse(result["path"], media_type=result["media_type"], headers=result["headers"])
@@ -0,0 +1,154 @@
+"""
+LoRA stacks for character workflows.
+
+A request can combine its character LoRA with catalog LoRAs (realism,
+style, NSFW) from ``shared/civitai_models.py``:
+
+    {"lora_id": "123", "prompt": "...", "lora_stack": ["realistic-snapshot-zit"],
+     "style": "cinematic", "nsfw": false}
+
+Entries of ``lora_stack`` are catalog ids, or explicit
+``{"name": ..., "strength": ..., "trigger_word": ...}`` dicts. The stack is
+resolved with ``civitai_models.build_lora_stack`` and wired as a LoRA
+loader chain; the API collapses the chain into one cached stack node at
+queue time (see ``utils.comfyui.to_cached_lora_loaders``).
+"""
+
+import sys
+from pathlib import Path
+from typing import Optional
+
+# (lora_filename, strength, trigger_word), as returned by build_lora_stack
+LoraStack = list[tuple[str, float, Optional[str]]]
+
+# Most LoRAs a request may stack on top of its character LoRA
+MAX_STACK_LORAS = 6
+
+# Accepted strength range for explicit lora_stack entries
+MAX_LORA_STRENGTH = 2.0
+
+
+def _build_lora_stack(
+    lora_ids: list[str],
+    nsfw: bool,
+    style: Optional[str],
+    base_model: Optional[str],
+) -> LoraStack:
+    # shared/ sits next to utils/ in the repo and at /root/shared in the image
+    shared_dir = str(Path(__file__).resolve().parent.parent / "shared")
+    if shared_dir not in sys.path:
+        sys.path.insert(0, shared_dir)
+    from civitai_models import ALL_MODELS, ModelType, build_lora_stack, get_model
+
+    for lora_id in lora_ids:
+        model = get_model(lora_id)
+        if model is None or model.model_type != ModelType.LORA:
+            raise ValueError(f"Unknown LoRA in lora_stack: {lora_id}")
+    stack = build_lora_stack(lora_ids, nsfw=nsfw, style=style)
+
+    # Style and NSFW LoRAs are added by build_lora_stack; check them all
+    by_filename = {model.filename: model for model in ALL_MODELS.values() if model.filename}
+    for lora_filename, _, _ in stack:
+        model = by_filename.get(lora_filename)
+        if base_model and model and model.base_model.value != base_model:
+            raise ValueError(f"LoRA {model.id} is for {model.base_model.value}, not {base_model}")
+    return stack
+
+
+def resolve_lora_stack(item: dict, base_model: Optional[str] = None) -> LoraStack:
+    """
+    Resolve the extra LoRAs requested on top of the character LoRA.
+
+    Args:
+        item: Request payload (lora_stack, style, nsfw)
+        base_model: Catalog base model the LoRAs must match (e.g. "zit", "flux")
+
+    Returns:
+        List of (lora_filename, strength, trigger_word) tuples
+
+    Raises:
+        ValueError: If an entry is malformed or unknown (including names with path
+            separators and strengths outside +/-MAX_LORA_STRENGTH), or the stack is too long
+    """
+    entries = item.get("lora_stack") or []
+    if not isinstance(entries, list):
+        raise ValueError("lora_stack must be a list")
+
+    catalog_ids = [entry for entry in entries if isinstance(entry, str)]
+    stack: LoraStack = []
+    if catalog_ids or item.get("style") or item.get("nsfw"):
+        stack = _build_lora_stack(catalog_ids, bool(item.get("nsfw")), item.get("style"), base_model)
+
+    for entry in entries:
+        if isinstance(entry, str):
+            continue
+        if not isinstance(entry, dict) or not entry.get("name") or not isinstance(entry["name"], str):
+            raise ValueError(f"Invalid lora_stack entry: {entry!r}")
+        name = entry["name"]
+        # Names are resolved inside models/loras; no other directory
+        if "/" in name or "\\" in name or ".." in name:
+            raise ValueError(f"Invalid LoRA name in lora_stack: {name!r}")
+        if not name.endswith(".safetensors"):
+            name += ".safetensors"
+        try:
+            strength = float(entry.get("strength", 1.0))
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid strength for LoRA {name}: {entry.get('strength')!r}")
+        if not -MAX_LORA_STRENGTH <= strength <= MAX_LORA_STRENGTH:  # also rejects NaN
+            raise ValueError(f"strength for LoRA {name} must be between {-MAX_LORA_STRENGTH} and {MAX_LORA_STRENGTH}")
+        trigger_word = entry.get("trigger_word")
+        if trigger_word is not None and not isinstance(trigger_word, str):
+            raise ValueError(f"Invalid trigger_word for LoRA {name}: {trigger_word!r}")
+        stack.append((name, strength, trigger_word))
+
+    if len(stack) > MAX_STACK_LORAS:
+        raise ValueError(f"lora_stack has {len(stack)} LoRAs (max {MAX_STACK_LORAS})")
+    return stack
+
+
+def prepend_trigger_words(prompt: str, stack: LoraStack) -> str:
+    """Prepend the stack's trigger words that the prompt does not already contain."""
+    triggers = [trigger for _, _, trigger in stack if trigger and trigger.lower() not in prompt.lower()]
+    return " ".join(triggers + [prompt]).strip()
+
+
+def lora_chain_nodes(
+    loras: list[tuple[str, float]],
+    model: list,
+    clip: Optional[list] = None,
+    first_node_id: int = 50,
+) -> tuple[dict, list, Optional[list]]:
+    """
+    Build a chain of LoRA loader nodes.
+
+    Args:
+        loras: (lora_filename, strength) in application order
+        model: Link to the base MODEL (e.g. ["1", 0])
+        clip: Link to the base CLIP, or None for model-only loaders
+        first_node_id: Node id of the first loader; the rest follow
+
+    Returns:
+        (nodes, model link, clip link) where the links point at the chain's end
+    """
+    nodes = {}
+    for index, (lora_filename, strength) in enumerate(loras):
+        node_id = str(first_node_id + index)
+        if clip is None:
+            nodes[node_id] = {
+                "class_type": "LoraLoaderModelOnly",
+                "inputs": {"model": model, "lora_name": lora_filename, "strength_model": strength},
+            }
+        else:
+            nodes[node_id] = {
+                "class_type": "LoraLoader",
+                "inputs": {
+                    "model": model,
+                    "clip": clip,
+                    "lora_name": lora_filename,
+                    "strength_model": strength,
+                    "strength_clip": strength,
+                },
+            }
+            clip = [node_id, 1]
+        model = [node_id, 0]
+    return nodes, model, clip
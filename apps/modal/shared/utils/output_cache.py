@@ -0,0 +1,518 @@
+"""
+Content-addressed output cache for ComfyUI workflows.
+
+Deterministic requests (fixed seed, same prompt, same LoRA) are retried a
+lot, e.g. when a user re-opens a character. ``infer_workflow`` and friends
+look the workflow up here before queueing it in ComfyUI. The key is a hash
+of the canonicalized workflow graph:
+
+- ``filename_prefix`` inputs (random per request) are dropped;
+- files referenced from ComfyUI/input (uploads saved under random names)
+  are replaced by the hash of their contents;
+- model files (checkpoints, LoRAs, ...) are tagged with their size and
+  mtime, so a LoRA retrained under the same name gets new entries.
+
+Only image outputs are stored (video and other outputs still share
+in-flight renders, but never land on the volume); routes that render large
+frame batches pass ``cache=False``. Outputs are kept in an LRU on local disk and in a second LRU on the
+``ryla-models`` volume shared by all containers. An identical request that
+arrives while the first one is still rendering waits for its result instead
+of rendering again. Responses carry ``X-Cache: HIT | MISS | PARTIAL``; the
+handler's ``X-Cost-USD`` of a hit only covers the lookup.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Union
+
+# Set to "0" to disable the cache
+OUTPUT_CACHE_ENABLED = os.environ.get("OUTPUT_CACHE_ENABLED", "1") != "0"
+
+# Local-disk tier (fast, per container)
+LOCAL_CACHE_DIR = "/tmp/ryla-output-cache"
+LOCAL_CACHE_MAX_BYTES = 4 * 1024**3
+
+# Volume tier (shared; ryla-models is mounted at /root/models)
+VOLUME_CACHE_DIR = "/root/models/output-cache"
+VOLUME_CACHE_MAX_BYTES = 50 * 1024**3
+VOLUME_NAME = "ryla-models"
+
+# Volume tier eviction scans run every this many stores
+VOLUME_EVICT_EVERY = 50
+
+# Minimum seconds between volume commits
+VOLUME_COMMIT_INTERVAL_SECONDS = 60
+
+# Inputs that differ per request but do not change the output
+IGNORED_INPUTS = ("filename_prefix",)
+
+# ComfyUI input folder (uploaded images/videos are referenced by filename)
+COMFY_INPUT_DIR = "/root/comfy/ComfyUI/input"
+
+# ComfyUI model folders (checkpoints/, loras/, ...) for resolving model file references
+COMFY_MODELS_DIR = "/root/comfy/ComfyUI/models"
+MODEL_EXTENSIONS = (".safetensors", ".sft", ".ckpt", ".pt", ".pth", ".bin", ".gguf", ".onnx")
+
+# Output signatures that are cached (PNG, JPEG, WebP, GIF)
+IMAGE_SIGNATURES = (b"\x89PNG\r\n\x1a\n", b"\xff\xd8\xff", b"GIF8")
+
+# Single-output entries are stored as this file; multi-output entries as 000, 001, ...
+SINGLE_OUTPUT_FILE = "output"
+
+Output = Union[bytes, List[bytes]]
+
+_cache_lock = threading.Lock()
+
+# (path, size, mtime) -> SHA-256 of an input file
+_digest_memo: Dict[tuple, str] = {}
+
+# Per-request hit/miss counts, read by the X-Cache middleware
+_request_stats: ContextVar[Optional[Dict[str, int]]] = ContextVar("output_cache_stats", default=None)
+
+
+def _file_digest(path: str) -> str:
+    """SHA-256 of a file, memoized on (path, size, mtime)."""
+    stat = os.stat(path)
+    memo_key = (path, stat.st_size, stat.st_mtime)
+    if memo_key not in _digest_memo:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        _digest_memo[memo_key] = digest.hexdigest()
+    return _digest_memo[memo_key]
+
+
+def _model_file_tag(name: str, models_dir: str) -> Optional[str]:
+    """Size and mtime of a model file referenced by name, from the first model folder holding it."""
+    try:
+        folders = sorted(entry.path for entry in os.scandir(models_dir) if entry.is_dir())
+    except OSError:
+        return None
+    for folder in folders:
+        try:
+            stat = os.stat(os.path.join(folder, name))  # follows volume symlinks
+        except OSError:
+            continue
+        return f"model:{name}:{stat.st_size}:{stat.st_mtime_ns}"
+    return None
+
+
+def is_image_output(output: Output) -> bool:
+    """True if every output is an encoded image (only those are cached)."""
+    outputs = [output] if isinstance(output, bytes) else output
+    if not isinstance(outputs, list) or not outputs:
+        return False
+    for data in outputs:
+        if not isinstance(data, bytes):
+            return False
+        if not (data.startswith(IMAGE_SIGNATURES) or (data[:4] == b"RIFF" and data[8:12] == b"WEBP")):
+            return False
+    return True
+
+
+def canonicalize_workflow(
+    workflow: dict, input_dir: str = COMFY_INPUT_DIR, models_dir: str = COMFY_MODELS_DIR
+) -> dict:
+    """
+    Strip per-request noise from an API-format workflow.
+
+    Args:
+        workflow: ComfyUI workflow dictionary (API format)
+        input_dir: ComfyUI input folder for resolving uploaded file references
+        models_dir: ComfyUI models folder for resolving model file references
+
+    Returns:
+        Workflow with ignored inputs removed, input files replaced by content
+        hashes and model files tagged with their size and mtime
+    """
+    canonical = {}
+    for node_id, node in workflow.items():
+        inputs = {}
+        for key, value in node.get("inputs", {}).items():
+            if key in IGNORED_INPUTS:
+                continue
+            if isinstance(value, str) and value:
+                if value.lower().endswith(MODEL_EXTENSIONS):
+                    value = _model_file_tag(value, models_dir) or value
+                elif "/" not in value:
+                    path = os.path.join(input_dir, value)
+                    if os.path.isfile(path):
+                        value = f"sha256:{_file_digest(path)}"
+            inputs[key] = value
+        canonical[node_id] = {"class_type": node.get("class_type"), "inputs": inputs}
+    return canonical
+
+
+def workflow_cache_key(
+    workflow: dict, kind: str = "first", input_dir: str = COMFY_INPUT_DIR, models_dir: str = COMFY_MODELS_DIR
+) -> str:
+    """
+    Hash a workflow into an output cache key.
+
+    Args:
+        workflow: ComfyUI workflow dictionary (API format)
+        kind: Output shape ("first" output or "all" images); part of the key
+        input_dir: ComfyUI input folder
+        models_dir: ComfyUI models folder
+
+    Returns:
+        Hex SHA-256 key
+    """
+    canonical = json.dumps(
+        [kind, canonicalize_workflow(workflow, input_dir, models_dir)],
+        sort_keys=True, separators=(",", ":"), default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _dir_size(path: str) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+class _DiskTier:
+    """One LRU directory of cache entries (key -> directory of output files)."""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def read(self, key: str) -> Optional[Output]:
+        """Read an entry and mark it recently used."""
+        path = self.path(key)
+        try:
+            names = sorted(os.listdir(path))
+            outputs = []
+            for name in names:
+                with open(os.path.join(path, name), "rb") as f:
+                    outputs.append(f.read())
+            os.utime(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        if names == [SINGLE_OUTPUT_FILE]:
+            return outputs[0]
+        return outputs
+
+    def write(self, key: str, output: Output) -> int:
+        """Write an entry atomically; returns its size in bytes."""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(tmp_path)
+        files = {SINGLE_OUTPUT_FILE: output} if isinstance(output, bytes) else {
+            f"{index:03d}": data for index, data in enumerate(output)
+        }
+        for name, data in files.items():
+            with open(os.path.join(tmp_path, name), "wb") as f:
+                f.write(data)
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            shutil.rmtree(tmp_path, ignore_errors=True)  # another writer stored it first
+        return sum(len(data) for data in files.values())
+
+    def entries(self) -> List[tuple]:
+        """List (last_used, size, key) for every entry."""
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.is_dir() and not entry.name.endswith(".tmp"):
+                    entries.append((entry.stat().st_mtime, _dir_size(entry.path), entry.name))
+        return entries
+
+    def evict(self) -> int:
+        """Delete least recently used entries until under max_bytes; returns bytes freed."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        freed = 0
+        for _, size, key in entries:
+            if total - freed <= self.max_bytes:
+                break
+            shutil.rmtree(self.path(key), ignore_errors=True)
+            freed += size
+        return freed
+
+
+class OutputCache:
+    """Two-tier (local disk + volume) content-addressed cache of workflow outputs."""
+
+    def __init__(
+        self,
+        local_dir: str = LOCAL_CACHE_DIR,
+        volume_dir: Optional[str] = VOLUME_CACHE_DIR,
+        local_max_bytes: int = LOCAL_CACHE_MAX_BYTES,
+        volume_max_bytes: int = VOLUME_CACHE_MAX_BYTES,
+        input_dir: str = COMFY_INPUT_DIR,
+        models_dir: str = COMFY_MODELS_DIR,
+        commit_volume: bool = True,
+    ):
+        """
+        Initialize output cache.
+
+        Args:
+            local_dir: Local-disk tier directory
+            volume_dir: Volume tier directory (None disables the tier)
+            local_max_bytes: Local tier size limit
+            volume_max_bytes: Volume tier size limit
+            input_dir: ComfyUI input folder (for hashing uploaded inputs)
+            models_dir: ComfyUI models folder (for tagging model files)
+            commit_volume: Commit the Modal volume after stores
+        """
+        self.local = _DiskTier(local_dir, local_max_bytes)
+        self.volume = _DiskTier(volume_dir, volume_max_bytes) if volume_dir else None
+        self.input_dir = input_dir
+        self.models_dir = models_dir
+        self.commit_volume = commit_volume
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+        self._local_bytes = sum(size for _, size, _ in self.local.entries())
+        self._stores = 0
+        self._last_commit = 0.0
+        # key -> seconds the render took, to report time saved by hits
+        self._render_seconds: Dict[str, float] = {}
+        self._counters = {
+            "hits_local": 0, "hits_volume": 0, "hits_in_flight": 0, "misses": 0,
+            "stored": 0, "skipped": 0, "evicted_bytes": 0, "saved_seconds": 0.0,
+        }
+
+    def lookup(self, key: str) -> Optional[Output]:
+        """Find an entry in the local tier, then the volume tier (promoting it)."""
+        output = self.local.read(key)
+        if output is not None:
+            self._count("hits_local")
+            return output
+        if self.volume is not None:
+            output = self.volume.read(key)
+            if output is not None:
+                self._count("hits_volume")
+                self._store_local(key, output)
+                return output
+        return None
+
+    def store(self, key: str, output: Output):
+        """Store an entry in both tiers (volume errors are logged, not raised)."""
+        self._store_local(key, output)
+        if self.volume is None:
+            return
+        try:
+            self.volume.write(key, output)
+            with self._lock:
+                self._stores += 1
+                evict = self._stores % VOLUME_EVICT_EVERY == 0
+                commit = time.time() - self._last_commit > VOLUME_COMMIT_INTERVAL_SECONDS
+                if commit:
+                    self._last_commit = time.time()
+            if evict:
+                self._count("evicted_bytes", self.volume.evict())
+            if commit and self.commit_volume:
+                import modal
+
+                modal.Volume.from_name(VOLUME_NAME).commit()
+        except Exception as e:
+            print(f"⚠️  Output cache volume store failed: {e}")
+
+    def _store_local(self, key: str, output: Output):
+        size = self.local.write(key, output)
+        with self._lock:
+            self._local_bytes += size
+            over = self._local_bytes > self.local.max_bytes
+        if over:
+            freed = self.local.evict()
+            with self._lock:
+                self._local_bytes -= freed
+            self._count("evicted_bytes", freed)
+
+    def get_or_run(
+        self,
+        workflow: dict,
+        run: Callable[[], Output],
+        kind: str = "first",
+        on_event: Optional[Callable[[str, dict], None]] = None,
+    ) -> Output:
+        """
+        Return cached outputs for a workflow, or run it and cache the outputs.
+
+        Args:
+            workflow: ComfyUI workflow dictionary (API format)
+            run: Renders the workflow (e.g. execute_workflow_via_api)
+            kind: Output shape ("first" or "all"); different shapes never share entries
+            on_event: Progress listener; a hit sends ("cached", {"source": ...})
+                since no ComfyUI prompt is queued for it
+
+        Returns:
+            Output bytes, or list of output bytes, as returned by run
+            (only image outputs are stored)
+        """
+        from utils.cancellation import RequestCancelled
+
+        key = workflow_cache_key(workflow, kind, self.input_dir, self.models_dir)
+        while True:
+            output = self.lookup(key)
+            if output is not None:
+                self._record_hit(key, on_event, "cache")
+                return output
+
+            with self._lock:
+                pending = self._in_flight.get(key)
+                if pending is None:
+                    future: Future = Future()
+                    self._in_flight[key] = future
+            if pending is None:
+                break
+            # Same workflow is rendering for another request; share its result
+            try:
+                output = pending.result()
+            except RequestCancelled:
+                continue  # that request was cancelled, not this one: render it here
+            self._count("hits_in_flight")
+            self._record_hit(key, on_event, "in_flight")
+            return output
+
+        self._count("misses")
+        _note_request("misses")
+        start = time.time()
+        try:
+            output = run()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+        future.set_result(output)
+
+        if not is_image_output(output):
+            self._count("skipped")
+            return output
+        with self._lock:
+            self._render_seconds[key] = time.time() - start
+        try:
+            self.store(key, output)
+            self._count("stored")
+        except Exception as e:
+            print(f"⚠️  Output cache store failed: {e}")
+        return output
+
+    def _record_hit(self, key: str, on_event: Optional[Callable[[str, dict], None]] = None, source: str = "cache"):
+        _note_request("hits")
+        with self._lock:
+            self._counters["saved_seconds"] += self._render_seconds.get(key, 0.0)
+        if on_event is not None:
+            on_event("cached", {"source": source})
+
+    def _count(self, name: str, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def stats(self) -> Dict:
+        """Get hit/miss counters and local tier usage."""
+        with self._lock:
+            hits = self._counters["hits_local"] + self._counters["hits_volume"] + self._counters["hits_in_flight"]
+            lookups = hits + self._counters["misses"]
+            return {
+                **self._counters,
+                "saved_seconds": round(self._counters["saved_seconds"], 1),
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "local_bytes": self._local_bytes,
+                "local_max_bytes": self.local.max_bytes,
+            }
+
+
+def _note_request(outcome: str):
+    """Count a hit or miss for the request being served (for X-Cache)."""
+    stats = _request_stats.get()
+    if stats is not None:
+        stats[outcome] += 1
+
+
+def get_output_cache(comfyui_instance) -> Optional[OutputCache]:
+    """
+    Get (or lazily create) the output cache for a ComfyUI container instance.
+
+    Args:
+        comfyui_instance: ComfyUI class instance
+
+    Returns:
+        OutputCache shared by all handlers of the container, or None if disabled
+    """
+    if not OUTPUT_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        cache = getattr(comfyui_instance, "_output_cache", None)
+        if cache is None:
+            volume_dir = VOLUME_CACHE_DIR if os.path.isdir(os.path.dirname(VOLUME_CACHE_DIR)) else None
+            cache = OutputCache(volume_dir=volume_dir)
+            comfyui_instance._output_cache = cache
+        return cache
+
+
+def cached_output(
+    comfyui_instance,
+    workflow: dict,
+    run: Callable[[], Output],
+    kind: str = "first",
+    cache: bool = True,
+    on_event: Optional[Callable[[str, dict], None]] = None,
+) -> Output:
+    """
+    Run a workflow through the container's output cache.
+
+    Args:
+        comfyui_instance: ComfyUI class instance
+        workflow: ComfyUI workflow dictionary (API format)
+        run: Renders the workflow on a miss
+        kind: "first" (single output bytes) or "all" (list of images)
+        cache: False to bypass the cache (e.g. per-request frame batches)
+        on_event: Progress listener, told when the output comes from the cache
+
+    Returns:
+        Output of run (cached or fresh)
+    """
+    output_cache = get_output_cache(comfyui_instance) if cache else None
+    if output_cache is None:
+        return run()
+    return output_cache.get_or_run(workflow, run, kind, on_event)
+
+
+def setup_output_cache_endpoints(fastapi, comfyui_instance):
+    """
+    Register the X-Cache response header and cache stats endpoint in FastAPI app.
+
+    Args:
+        fastapi: FastAPI app instance
+        comfyui_instance: ComfyUI class instance
+    """
+
+    @fastapi.middleware("http")
+    async def output_cache_header(request, call_next):
+        stats = {"hits": 0, "misses": 0}
+        reset = _request_stats.set(stats)
+        try:
+            response = await call_next(request)
+        finally:
+            _request_stats.reset(reset)
+        if stats["hits"] or stats["misses"]:
+            response.headers["X-Cache"] = (
+                "HIT" if not stats["misses"] else "MISS" if not stats["hits"] else "PARTIAL"
+            )
+        return response
+
+    @fastapi.get("/cache/stats")
+    async def output_cache_stats():
+        """Output cache hit/miss counters, GPU seconds saved and disk usage."""
+        cache = get_output_cache(comfyui_instance)
+        return cache.stats() if cache is not None else {"enabled": False}
@@ -0,0 +1,506 @@
+"""
+Live progress and preview streaming for long-running renders.
+
+Video renders block for minutes before the response arrives. A client
+picks a ``progress_id``, opens ``GET /progress/{progress_id}`` (Server-Sent
+Events) and sends the render request with the same ``progress_id``. The
+handler's ComfyUI /ws listener relays ``progress`` / ``executing`` events
+and low-resolution sampler previews to every subscriber, and
+``POST /progress/{progress_id}/cancel`` cancels the render early.
+
+Channels live in the container serving the render, which mirrors each
+one to a ``modal.Dict`` (PROGRESS_DICT_NAME) keyed by progress_id. The
+stream, the render request and the cancel call may each land on a
+different replica: a stream whose render is elsewhere follows the shared
+snapshot, and a cancel sent elsewhere sets a flag in the Dict that the
+render's container polls. Outside Modal (no Dict) the stream only works on
+the render's replica. If no render with the progress_id shows up anywhere
+within ``UNKNOWN_ID_SECONDS`` the stream gets an ``unknown`` event and
+closes. Renders served from the output cache send a ``cached`` event in
+place of ``queued``.
+
+An open SSE stream holds one of the container's ``@modal.concurrent``
+input slots for as long as it runs (up to ``MAX_STREAM_SECONDS``), taking
+capacity from renders. Clients that do not need push updates should poll
+``GET /progress/{progress_id}/status`` instead, which returns the current
+snapshot and releases the slot at once.
+"""
+
+import asyncio
+import base64
+import io
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Longest preview edge sent to clients (latent2rgb previews are already small)
+PREVIEW_MAX_SIZE = 256
+
+# Minimum seconds between previews sent for one render
+PREVIEW_INTERVAL_SECONDS = 1.0
+
+# Events kept for subscribers that connect after the render started
+MAX_EVENT_HISTORY = 200
+
+# Finished channels are dropped after this many seconds
+CHANNEL_TTL_SECONDS = 600
+
+# SSE keep-alive comment interval (proxies close idle streams)
+KEEPALIVE_SECONDS = 15
+
+# A stream whose render has not started on this replica by then gets an "unknown" event
+UNKNOWN_ID_SECONDS = 60
+
+# Longest a stream stays open (the apps' function timeout)
+MAX_STREAM_SECONDS = 1800
+
+# modal.Dict shared by an app's replicas: progress snapshots and cancel requests
+PROGRESS_DICT_NAME = "ryla-progress"
+
+# Seconds between shared-store syncs of a render (snapshot writes, cancel polls)
+# and between snapshot reads by streams following a render on another replica
+SHARED_POLL_SECONDS = 1.0
+
+_hub_lock = threading.Lock()
+
+
+def encode_preview(image: bytes, image_format: str = "jpeg", max_size: int = PREVIEW_MAX_SIZE) -> str:
+    """
+    Downscale a sampler preview and encode it as a data URL.
+
+    Args:
+        image: Encoded preview image from ComfyUI
+        image_format: "jpeg" or "png"
+        max_size: Longest edge in pixels
+
+    Returns:
+        JPEG data URL (original format if PIL is unavailable)
+    """
+    try:
+        from PIL import Image
+
+        preview = Image.open(io.BytesIO(image)).convert("RGB")
+        preview.thumbnail((max_size, max_size))
+        buffer = io.BytesIO()
+        preview.save(buffer, format="JPEG", quality=70)
+        image, image_format = buffer.getvalue(), "jpeg"
+    except ImportError:
+        pass
+    return f"data:image/{image_format};base64,{base64.b64encode(image).decode('utf-8')}"
+
+
+def cancel_key(progress_id: str) -> str:
+    """Shared-store key flagging a cancel request for a render."""
+    return f"{progress_id}:cancel"
+
+
+def snapshot_events(snapshot: dict, delivered: int) -> List[dict]:
+    """Events of a shared snapshot after the first ``delivered`` ones."""
+    skip = max(0, delivered - snapshot["first_event"])
+    return snapshot["events"][skip:]
+
+
+def is_live_snapshot(snapshot: Optional[dict]) -> bool:
+    """False for missing snapshots and for ones left by an earlier render with the same ID."""
+    if not snapshot:
+        return False
+    finished_at = snapshot.get("finished_at")
+    return finished_at is None or time.time() - finished_at <= CHANNEL_TTL_SECONDS
+
+
+class ProgressChannel:
+    """Progress events of one render, fanned out to SSE subscribers."""
+
+    def __init__(self, progress_id: str, store: Any = None):
+        """
+        Initialize channel.
+
+        Args:
+            progress_id: Client-chosen render ID
+            store: Shared dict-like store (``modal.Dict``) mirrored while a
+                render runs here, or None
+        """
+        self.progress_id = progress_id
+        self.store = store
+        self.prompt_id: Optional[str] = None
+        self.cancel_token = None
+        self.cached = False
+        self.finished_at: Optional[float] = None
+        self._history: List[dict] = []
+        self._event_count = 0
+        self._latest_preview: Optional[dict] = None
+        self._last_preview_at = 0.0
+        self._subscribers: List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = []
+        self._lock = threading.Lock()
+        self._changed = threading.Event()
+        self._syncer: Optional[threading.Thread] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    @property
+    def started(self) -> bool:
+        """True once a render for this progress_id reached this container."""
+        with self._lock:
+            return bool(self._history) or self.prompt_id is not None
+
+    def snapshot(self) -> dict:
+        """State shared with other replicas (and returned by the status endpoint)."""
+        with self._lock:
+            return {
+                "progress_id": self.progress_id,
+                "prompt_id": self.prompt_id,
+                "cached": self.cached,
+                "finished_at": self.finished_at,
+                "first_event": self._event_count - len(self._history),
+                "events": list(self._history),
+                "preview": self._latest_preview,
+            }
+
+    def publish(self, event: dict):
+        """Record an event and deliver it to subscribers (thread-safe)."""
+        with self._lock:
+            if event["type"] == "preview":
+                self._latest_preview = event
+            else:
+                self._history.append(event)
+                self._event_count += 1
+                del self._history[:-MAX_EVENT_HISTORY]
+            if event["type"] in ("done", "error"):
+                self.finished_at = time.time()
+            subscribers = list(self._subscribers)
+            if self.store is not None and self._syncer is None:
+                self._syncer = threading.Thread(target=self._sync_loop, name="progress-sync", daemon=True)
+                self._syncer.start()
+        self._changed.set()
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    def _sync_loop(self):
+        """Mirror this render to the shared store and apply cancels sent to other replicas."""
+        while True:
+            changed = self._changed.wait(SHARED_POLL_SECONDS)
+            self._changed.clear()
+            finished = self.finished
+            try:
+                if changed:
+                    self.store.put(self.progress_id, self.snapshot())
+                if not finished and self.cancel_token is not None and self.store.get(cancel_key(self.progress_id)):
+                    self.cancel_token.cancel("cancelled by client")
+            except Exception as e:
+                print(f"⚠️  Progress sync failed for {self.progress_id}: {e}")
+            if finished:
+                return
+            time.sleep(SHARED_POLL_SECONDS / 2)  # batch bursts of progress events into one write
+
+    def on_comfy_event(self, event_type: str, data: dict):
+        """Listener for execute_workflow_via_api(on_event=...)."""
+        if event_type == "queued":
+            from utils.cancellation import current_cancel_token
+
+            # Called on the render's worker thread, so this is the render's token
+            self.prompt_id = data["prompt_id"]
+            self.cancel_token = current_cancel_token()
+            self.publish({"type": "queued", "prompt_id": self.prompt_id})
+        elif event_type == "progress":
+            self.publish({
+                "type": "progress",
+                "node": data.get("node"),
+                "value": data.get("value"),
+                "max": data.get("max"),
+            })
+        elif event_type == "cached":
+            # Served from the output cache (or another request's render): nothing to cancel
+            self.cached = True
+            self.publish({"type": "cached", "source": data.get("source")})
+        elif event_type == "executing":
+            self.publish({"type": "executing", "node": data.get("node")})
+        elif event_type == "preview":
+            now = time.monotonic()
+            if now - self._last_preview_at < PREVIEW_INTERVAL_SECONDS:
+                return
+            self._last_preview_at = now
+            self.publish({"type": "preview", "image": encode_preview(data["image"], data.get("format", "jpeg"))})
+
+    def subscribe(self) -> asyncio.Queue:
+        """Register an SSE subscriber on the running loop, replaying past events."""
+        queue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            for event in self._history:
+                queue.put_nowait(event)
+            if self._latest_preview is not None:
+                queue.put_nowait(self._latest_preview)
+            self._subscribers.append((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers = [(loop, q) for loop, q in self._subscribers if q is not queue]
+
+
+class ProgressHub:
+    """Progress channels of a container, keyed by progress_id."""
+
+    def __init__(self, store: Any = None):
+        """
+        Initialize hub.
+
+        Args:
+            store: Shared dict-like store (``modal.Dict``) for cross-replica
+                streams and cancels, or None to keep progress in this container
+        """
+        self.store = store
+        self._channels: Dict[str, ProgressChannel] = {}
+        self._lock = threading.Lock()
+
+    def channel(self, progress_id: str) -> ProgressChannel:
+        """Get or create a channel (subscribers may connect before the render starts)."""
+        with self._lock:
+            now = time.time()
+            for key in [k for k, c in self._channels.items() if c.finished and now - c.finished_at > CHANNEL_TTL_SECONDS]:
+                del self._channels[key]
+            if progress_id not in self._channels:
+                self._channels[progress_id] = ProgressChannel(progress_id, self.store)
+            return self._channels[progress_id]
+
+    def get(self, progress_id: str) -> Optional[ProgressChannel]:
+        with self._lock:
+            return self._channels.get(progress_id)
+
+    def discard_unused(self, progress_id: str):
+        """Drop a channel that never saw a render and has no subscribers."""
+        with self._lock:
+            channel = self._channels.get(progress_id)
+            if channel is not None and not channel.started and not channel._subscribers:
+                del self._channels[progress_id]
+
+    def shared_snapshot(self, progress_id: str) -> Optional[dict]:
+        """Snapshot of a render on any replica, from the shared store (blocking)."""
+        if self.store is None:
+            return None
+        try:
+            snapshot = self.store.get(progress_id)
+        except Exception as e:
+            print(f"⚠️  Progress store read failed for {progress_id}: {e}")
+            return None
+        return snapshot if is_live_snapshot(snapshot) else None
+
+
+def _shared_store():
+    """The app's shared progress Dict, or None outside a Modal container."""
+    try:
+        import modal
+
+        if modal.is_local():
+            return None
+        return modal.Dict.from_name(PROGRESS_DICT_NAME, create_if_missing=True)
+    except Exception as e:
+        print(f"⚠️  Shared progress store unavailable, progress stays on this replica: {e}")
+        return None
+
+
+def get_progress_hub(comfyui_instance) -> ProgressHub:
+    """
+    Get (or lazily create) the progress hub for a ComfyUI container instance.
+
+    Args:
+        comfyui_instance: ComfyUI class instance
+
+    Returns:
+        ProgressHub shared by all routes of the container
+    """
+    with _hub_lock:
+        hub = getattr(comfyui_instance, "_progress_hub", None)
+        if hub is None:
+            hub = ProgressHub(store=_shared_store())
+            comfyui_instance._progress_hub = hub
+        return hub
+
+
+def progress_listener(comfyui_instance, item: dict) -> Optional[Callable[[str, dict], None]]:
+    """
+    Get the /ws event listener for a request that asked for progress.
+
+    Args:
+        comfyui_instance: ComfyUI class instance
+        item: Request payload (``progress_id`` opts in)
+
+    Returns:
+        Listener for execute_workflow_via_api(on_event=...), or None
+    """
+    progress_id = item.get("progress_id")
+    if not progress_id:
+        return None
+    return get_progress_hub(comfyui_instance).channel(str(progress_id)).on_comfy_event
+
+
+def finish_progress(comfyui_instance, item: dict, error: Optional[str] = None):
+    """Publish the final done/error event for a request that asked for progress."""
+    progress_id = item.get("progress_id")
+    if not progress_id:
+        return
+    channel = get_progress_hub(comfyui_instance).channel(str(progress_id))
+    channel.publish({"type": "error", "error": error} if error else {"type": "done"})
+
+
+@contextmanager
+def track_progress(comfyui_instance, item: dict):
+    """
+    Publish done/error to progress subscribers when a route finishes.
+
+    Used around ``run_impl`` in routes, so multi-phase handlers report done
+    only once the whole request has finished.
+    """
+    try:
+        yield
+    except Exception as e:
+        finish_progress(comfyui_instance, item, error=str(getattr(e, "detail", None) or e))
+        raise
+    finish_progress(comfyui_instance, item)
+
+
+def format_sse(event: dict) -> str:
+    """Format an event as a Server-Sent Events message."""
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+def setup_progress_endpoints(fastapi, comfyui_instance):
+    """
+    Register progress streaming and cancel endpoints in FastAPI app.
+
+    Args:
+        fastapi: FastAPI app instance
+        comfyui_instance: ComfyUI class instance
+    """
+    from fastapi import HTTPException
+    from fastapi.responses import StreamingResponse
+
+    hub = get_progress_hub(comfyui_instance)
+
+    @fastapi.get("/progress/{progress_id}")
+    async def progress_stream(progress_id: str):
+        """
+        Stream render progress as Server-Sent Events.
+
+        Events: queued (or cached), executing, progress (value/max), preview
+        (data URL), then done or error. Open before (or while) sending the
+        render request with the same progress_id; the render may run on
+        another replica. If no render with this progress_id starts within
+        UNKNOWN_ID_SECONDS, an unknown event is sent and the stream closes.
+        The stream holds an input slot while open; see /status for polling.
+        """
+        channel = hub.channel(progress_id)
+        queue = channel.subscribe()
+        opened = time.monotonic()
+
+        async def remote_events(snapshot: dict):
+            """Follow a render on another replica through the shared store."""
+            delivered = 0
+            preview = None
+            while True:
+                for event in snapshot_events(snapshot, delivered):
+                    delivered += 1
+                    yield format_sse(event)
+                    if event["type"] in ("done", "error"):
+                        return
+                if snapshot.get("preview") and snapshot["preview"] != preview:
+                    preview = snapshot["preview"]
+                    yield format_sse(preview)
+                if time.monotonic() - opened > MAX_STREAM_SECONDS:
+                    yield format_sse({"type": "error", "error": "progress stream timed out"})
+                    return
+                await asyncio.sleep(SHARED_POLL_SECONDS)
+                snapshot = await asyncio.to_thread(hub.shared_snapshot, progress_id) or snapshot
+
+        async def events():
+            next_remote_check = 0.0
+            try:
+                while True:
+                    elapsed = time.monotonic() - opened
+                    if elapsed > MAX_STREAM_SECONDS:
+                        yield format_sse({"type": "error", "error": "progress stream timed out"})
+                        return
+                    if not channel.started and hub.store is not None and elapsed >= next_remote_check:
+                        next_remote_check = elapsed + SHARED_POLL_SECONDS
+                        snapshot = await asyncio.to_thread(hub.shared_snapshot, progress_id)
+                        if snapshot is not None and not channel.started:
+                            async for message in remote_events(snapshot):
+                                yield message
+                            return
+                    if elapsed > UNKNOWN_ID_SECONDS and not channel.started:
+                        yield format_sse({
+                            "type": "unknown",
+                            "error": f"No render with progress_id {progress_id} started",
+                        })
+                        return
+                    timeout = min(KEEPALIVE_SECONDS, UNKNOWN_ID_SECONDS)
+                    if hub.store is not None and not channel.started:
+                        timeout = min(timeout, SHARED_POLL_SECONDS)
+                    try:
+                        event = await asyncio.wait_for(queue.get(), timeout=timeout)
+                    except asyncio.TimeoutError:
+                        yield ": keep-alive\n\n"
+                        continue
+                    yield format_sse(event)
+                    if event["type"] in ("done", "error"):
+                        return
+            finally:
+                channel.unsubscribe(queue)
+                hub.discard_unused(progress_id)
+
+        return StreamingResponse(
+            events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @fastapi.get("/progress/{progress_id}/status")
+    async def progress_status(progress_id: str):
+        """
+        Current snapshot of a render on any replica (events so far, latest
+        preview, finished_at). Polling this does not hold an input slot.
+        """
+        channel = hub.get(progress_id)
+        if channel is not None and channel.started:
+            return channel.snapshot()
+        snapshot = await asyncio.to_thread(hub.shared_snapshot, progress_id)
+        if snapshot is None:
+            raise HTTPException(status_code=404, detail=f"No render started for progress_id {progress_id}")
+        return snapshot
+
+    @fastapi.post("/progress/{progress_id}/cancel")
+    async def progress_cancel(progress_id: str):
+        """
+        Cancel the render: its prompt is removed from the queue or interrupted.
+
+        A render on another replica is flagged in the shared store; its
+        container cancels it within SHARED_POLL_SECONDS.
+        """
+        from utils.comfyui import cancel_prompt
+
+        channel = hub.get(progress_id)
+        if channel is None or not channel.started:
+            snapshot = await asyncio.to_thread(hub.shared_snapshot, progress_id)
+            if snapshot is not None and (
+                snapshot["finished_at"] is not None or (snapshot["cached"] and snapshot["prompt_id"] is None)
+            ):
+                raise HTTPException(status_code=409, detail=f"Render for progress_id {progress_id} already finished")
+            if snapshot is None or snapshot["prompt_id"] is None:
+                raise HTTPException(status_code=404, detail=f"No render started for progress_id {progress_id}")
+            await asyncio.to_thread(hub.store.put, cancel_key(progress_id), True)
+            return {"progress_id": progress_id, "prompt_id": snapshot["prompt_id"], "cancelled": True}
+
+        if channel.finished or (channel.cached and channel.prompt_id is None):
+            raise HTTPException(status_code=409, detail=f"Render for progress_id {progress_id} already finished")
+        if channel.prompt_id is None:
+            raise HTTPException(status_code=404, detail=f"No render started for progress_id {progress_id}")
+        if channel.cancel_token is not None:
+            # The render's worker stops the prompt and fails the request
+            cancelled = channel.cancel_token.cancel("cancelled by client")
+            return {"progress_id": progress_id, "prompt_id": channel.prompt_id, "cancelled": cancelled}
+        port = getattr(comfyui_instance, "port", 8000)
+        outcome = await asyncio.to_thread(cancel_prompt, channel.prompt_id, port)
+        return {"progress_id": progress_id, "prompt_id": channel.prompt_id, "cancelled": outcome != "not_found"}
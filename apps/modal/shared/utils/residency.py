@@ -0,0 +1,291 @@
+"""
+Model-switch admission for the monolithic ComfyUI app.
+
+One L40S serves several model families (Flux, SDXL InstantID, Wan2,
+SeedVR2, Z-Image). ComfyUI evicts models from VRAM (to system RAM, then
+out entirely) whenever a request needs room, so interleaved traffic
+across families reloads multi-GB checkpoints over and over.
+
+``ModelResidency`` is an admission estimator, not a memory manager. It
+never loads, unloads or measures anything: ComfyUI's own model management
+still decides what stays in VRAM. It keeps an *estimate* of which families
+are resident, from a per-family size table (MODEL_FAMILY_VRAM_GB) against a
+fixed budget, and uses it to delay a request whose model would (by that
+estimate) displace a family that is still running, so a switch tends to
+happen once between bursts instead of on every request. "Pinned" families
+are only ranked last when the estimate picks what ComfyUI will displace.
+
+Per-family counters are served at ``GET /residency/stats``. "Hits" and
+"misses" there are estimates; the measured signal is the hit/miss request
+duration, whose difference approximates the load time. Only the
+monolithic app installs it: the split apps serve a single family each.
+"""
+
+import asyncio
+import time
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Set
+
+# Rough peak VRAM per family in GB (weights + text encoders + VAE at default precision)
+MODEL_FAMILY_VRAM_GB = {
+    "flux-schnell": 17.0,
+    "flux-dev": 33.0,
+    "sdxl-instantid": 12.0,
+    "wan2": 12.0,
+    "seedvr2": 18.0,
+    "z-image": 20.0,
+}
+
+# Route -> model family (routes not listed are not tracked)
+ROUTE_FAMILIES = {
+    "/flux": "flux-schnell",
+    "/flux-dev": "flux-dev",
+    "/flux-dev-lora": "flux-dev",
+    "/flux-dev-realism": "flux-dev",
+    "/flux-lora": "flux-dev",
+    "/flux-ipadapter-faceid": "flux-dev",
+    "/flux-instantid": "flux-dev",
+    "/sdxl-instantid": "sdxl-instantid",
+    "/wan2": "wan2",
+    "/seedvr2": "seedvr2",
+    "/z-image-simple": "z-image",
+    "/z-image-danrisi": "z-image",
+    "/z-image-instantid": "z-image",
+    "/z-image-pulid": "z-image",
+    "/z-image-lora": "z-image",
+    "/z-image-realism": "z-image",
+    "/z-image-nsfw": "z-image",
+    "/z-image-pulid-lora": "z-image",
+}
+
+# Budget the size estimates are checked against (L40S has 48 GB; headroom
+# for activations and VAE decode). Not read from the device.
+DEFAULT_VRAM_BUDGET_GB = 40.0
+
+# Most-requested families that fit the budget are pinned (estimated to be displaced last)
+MAX_PINNED_FAMILIES = 2
+
+# Longest a request waits for a busy family to drain before switching anyway
+MAX_SWITCH_WAIT_SECONDS = 30.0
+
+
+class ModelResidency:
+    """Estimates which model families are resident in VRAM and delays requests that would switch them."""
+
+    def __init__(
+        self,
+        family_vram_gb: Dict[str, float] = MODEL_FAMILY_VRAM_GB,
+        vram_budget_gb: float = DEFAULT_VRAM_BUDGET_GB,
+        max_wait_seconds: float = MAX_SWITCH_WAIT_SECONDS,
+    ):
+        """
+        Initialize residency tracker.
+
+        Args:
+            family_vram_gb: Estimated VRAM per model family in GB
+            vram_budget_gb: Budget the estimates are checked against, in GB
+            max_wait_seconds: Upper bound on delaying a request for a switch
+        """
+        self.family_vram_gb = dict(family_vram_gb)
+        self.vram_budget_gb = vram_budget_gb
+        self.max_wait_seconds = max_wait_seconds
+        self._vram: "OrderedDict[str, None]" = OrderedDict()  # LRU order, most recent last
+        self._ram: Set[str] = set()  # evicted from VRAM, still in system RAM
+        self._in_flight: Counter = Counter()
+        self._counters: Dict[str, Counter] = {}
+        self._cond: Optional[asyncio.Condition] = None
+
+    def _condition(self) -> asyncio.Condition:
+        """Create the condition lazily so it binds to the serving event loop."""
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    def _family_counters(self, family: str) -> Counter:
+        return self._counters.setdefault(family, Counter())
+
+    def pinned(self) -> Set[str]:
+        """Most-requested families that fit the VRAM budget together."""
+        pinned: Set[str] = set()
+        used = 0.0
+        ranked = sorted(self._counters, key=lambda f: self._counters[f]["requests"], reverse=True)
+        for family in ranked:
+            size = self.family_vram_gb.get(family, 0.0)
+            if len(pinned) < MAX_PINNED_FAMILIES and used + size <= self.vram_budget_gb:
+                pinned.add(family)
+                used += size
+        return pinned
+
+    def _victims(self, family: str) -> List[str]:
+        """Families that must leave VRAM for family to fit (unpinned, least requested, LRU first)."""
+        pinned = self.pinned()
+        needed = self.family_vram_gb.get(family, 0.0)
+        free = self.vram_budget_gb - sum(self.family_vram_gb.get(f, 0.0) for f in self._vram)
+        candidates = sorted(
+            (f for f in self._vram if f != family),
+            key=lambda f: (f in pinned, self._family_counters(f)["requests"]),
+        )
+        victims = []
+        for candidate in candidates:
+            if free >= needed:
+                break
+            victims.append(candidate)
+            free += self.family_vram_gb.get(candidate, 0.0)
+        return victims
+
+    async def acquire(self, family: str) -> str:
+        """
+        Wait until family can run without (by estimate) displacing a busy family,
+        then record it as resident.
+
+        Args:
+            family: Model family name
+
+        Returns:
+            Estimated location of the family before this request: "vram" (hit), "ram" or "cold"
+        """
+        cond = self._condition()
+        async with cond:
+            counters = self._family_counters(family)
+            counters["requests"] += 1
+            deadline = time.monotonic() + self.max_wait_seconds
+            wait_start = time.monotonic()
+            while family not in self._vram:
+                busy = [v for v in self._victims(family) if self._in_flight[v]]
+                remaining = deadline - time.monotonic()
+                if not busy or remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(cond.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+            waited = time.monotonic() - wait_start
+            if waited > 0.01:
+                counters["delayed"] += 1
+                counters["wait_ms"] += int(waited * 1000)
+
+            if family in self._vram:
+                source = "vram"
+                counters["hits"] += 1
+                self._vram.move_to_end(family)
+            else:
+                source = "ram" if family in self._ram else "cold"
+                counters["misses"] += 1
+                counters[f"misses_from_{source}"] += 1
+                for victim in self._victims(family):
+                    del self._vram[victim]
+                    self._ram.add(victim)
+                    self._family_counters(victim)["evictions"] += 1
+                self._ram.discard(family)
+                self._vram[family] = None
+
+            self._in_flight[family] += 1
+            return source
+
+    async def release(self, family: str, source: str, duration: float):
+        """
+        Record a finished request and wake requests waiting for a switch.
+
+        Args:
+            family: Model family name
+            source: Value returned by acquire()
+            duration: Request duration in seconds
+        """
+        cond = self._condition()
+        async with cond:
+            self._in_flight[family] -= 1
+            counters = self._family_counters(family)
+            bucket = "hit" if source == "vram" else "miss"
+            counters[f"{bucket}_ms"] += int(duration * 1000)
+            cond.notify_all()
+
+    @asynccontextmanager
+    async def track(self, family: str):
+        """Context manager wrapping acquire()/release() around a request."""
+        source = await self.acquire(family)
+        start = time.perf_counter()
+        try:
+            yield source
+        finally:
+            await self.release(family, source, time.perf_counter() - start)
+
+    def stats(self) -> Dict:
+        """Get per-family estimated residency state and counters."""
+        pinned = self.pinned()
+        families = {}
+        for family, counters in self._counters.items():
+            hits = counters["hits"]
+            misses = counters["misses"]
+            avg_hit = counters["hit_ms"] / hits / 1000 if hits else None
+            avg_miss = counters["miss_ms"] / misses / 1000 if misses else None
+            families[family] = {
+                "state": "vram" if family in self._vram else "ram" if family in self._ram else "cold",
+                "pinned": family in pinned,
+                "in_flight": self._in_flight[family],
+                "requests": counters["requests"],
+                "hits": hits,
+                "misses": misses,
+                "misses_from_ram": counters["misses_from_ram"],
+                "misses_from_cold": counters["misses_from_cold"],
+                "hit_rate": round(hits / counters["requests"], 3) if counters["requests"] else 0.0,
+                "evictions": counters["evictions"],
+                "delayed": counters["delayed"],
+                "wait_sec": counters["wait_ms"] / 1000,
+                "avg_hit_sec": round(avg_hit, 3) if avg_hit is not None else None,
+                "avg_miss_sec": round(avg_miss, 3) if avg_miss is not None else None,
+                # Extra time a miss costs over a hit, i.e. the model load time
+                "est_load_sec": round(avg_miss - avg_hit, 3) if avg_hit is not None and avg_miss is not None else None,
+            }
+        return {
+            "estimated": True,  # from MODEL_FAMILY_VRAM_GB, not measured on the device
+            "vram_budget_gb": self.vram_budget_gb,
+            "vram_estimated_gb": sum(self.family_vram_gb.get(f, 0.0) for f in self._vram),
+            "vram_resident": list(self._vram),
+            "ram_resident": sorted(self._ram),
+            "families": families,
+        }
+
+
+def get_residency(comfyui_instance) -> ModelResidency:
+    """
+    Get (or lazily create) the residency tracker for a ComfyUI container instance.
+
+    Args:
+        comfyui_instance: ComfyUI class instance
+
+    Returns:
+        ModelResidency shared by all routes of the container
+    """
+    residency = getattr(comfyui_instance, "_model_residency", None)
+    if residency is None:
+        residency = ModelResidency()
+        comfyui_instance._model_residency = residency
+    return residency
+
+
+def setup_residency_middleware(fastapi, comfyui_instance):
+    """
+    Delay model switches per request and register the residency stats endpoint.
+
+    Args:
+        fastapi: FastAPI app instance
+        comfyui_instance: ComfyUI class instance
+    """
+    residency = get_residency(comfyui_instance)
+
+    @fastapi.middleware("http")
+    async def model_residency(request, call_next):
+        family = ROUTE_FAMILIES.get(request.url.path) if request.method == "POST" else None
+        if family is None:
+            return await call_next(request)
+        async with residency.track(family) as source:
+            response = await call_next(request)
+        response.headers["X-Model-Residency"] = source
+        return response
+
+    @fastapi.get("/residency/stats")
+    async def residency_stats():
+        """Per-model-family estimated VRAM residency, hit/miss and load-time counters."""
+        return residency.stats()
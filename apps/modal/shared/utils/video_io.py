@@ -0,0 +1,261 @@
+"""
+Streaming video ingest and egress for video endpoints.
+
+Video endpoints used to hold several full copies of every video: the JSON
+body, the base64 string, the decoded bytes, and the output bytes in the
+response. This module keeps memory per request bounded:
+
+- Ingest: multipart uploads are spooled to disk by Starlette and copied
+  into ComfyUI/input in chunks. Base64 data URLs (JSON bodies) are decoded
+  to disk chunk by chunk instead of into one bytes object.
+- Egress: outputs already on disk are sent with a StreamingResponse and
+  removed once sent. Video passed to another app is uploaded as a
+  multipart file and its response is streamed to disk.
+"""
+
+import base64
+import binascii
+import json
+import os
+import shutil
+import uuid
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+# ComfyUI input folder (handlers reference inputs by filename)
+COMFY_INPUT_DIR = "/root/comfy/ComfyUI/input"
+
+# Read/write buffer for file copies and streamed responses
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Base64 characters decoded per step (multiple of 4 -> 3 MB of output)
+BASE64_CHUNK_CHARS = 4 * 1024 * 1024
+
+# MIME type -> file extension for video inputs
+VIDEO_EXTENSIONS = {
+    "video/mp4": "mp4",
+    "video/webm": "webm",
+    "video/quicktime": "mov",
+    "image/webp": "webp",
+    "image/gif": "gif",
+}
+
+# Multipart text fields decoded as JSON numbers/booleans; all others stay strings
+TYPED_FORM_FIELDS = frozenset({
+    "seed", "duration", "batch_size", "fps", "width", "height", "length",
+    "steps", "cfg", "lora_strength", "restore_face", "codeformer_weight",
+    "face_restore_visibility",
+})
+
+
+def parse_data_url(data: str) -> Tuple[Optional[str], int]:
+    """
+    Find the MIME type and payload offset of a data URL.
+
+    The payload is not sliced out, which would copy the whole string.
+
+    Args:
+        data: Data URL ("data:video/mp4;base64,...") or bare base64
+
+    Returns:
+        Tuple of (MIME type or None for bare base64, offset of the base64 payload)
+    """
+    if data.startswith("data:"):
+        comma = data.index(",")
+        return data[5:comma].split(";")[0], comma + 1
+    return None, 0
+
+
+def video_extension(mime_type: Optional[str], filename: Optional[str] = None, default: str = "mp4") -> str:
+    """Pick a file extension from a MIME type or upload filename."""
+    if mime_type in VIDEO_EXTENSIONS:
+        return VIDEO_EXTENSIONS[mime_type]
+    if filename and "." in filename:
+        return filename.rsplit(".", 1)[1].lower()
+    return default
+
+
+def write_base64_to_file(encoded: str, path: str, start: int = 0) -> int:
+    """
+    Decode base64 to a file without materializing the decoded bytes.
+
+    Args:
+        encoded: String holding the base64 payload
+        path: Destination path
+        start: Offset of the payload in encoded (e.g. after a data URL header)
+
+    Returns:
+        Number of bytes written
+    """
+    written = 0
+    try:
+        with open(path, "wb") as f:
+            for offset in range(start, len(encoded), BASE64_CHUNK_CHARS):
+                chunk = base64.b64decode(encoded[offset:offset + BASE64_CHUNK_CHARS], validate=True)
+                f.write(chunk)
+                written += len(chunk)
+    except binascii.Error:
+        # Line-wrapped or unpadded payloads break chunk alignment; decode in one go
+        data = base64.b64decode("".join(encoded[start:].split()) + "==")
+        with open(path, "wb") as f:
+            f.write(data)
+        written = len(data)
+    return written
+
+
+def save_video_to_input(video, input_dir: str = COMFY_INPUT_DIR, default_ext: str = "mp4") -> str:
+    """
+    Save an uploaded video to the ComfyUI input folder with bounded memory.
+
+    Args:
+        video: Base64 data URL / bare base64 string, or an upload (file-like
+            object or Starlette UploadFile from a multipart request)
+        input_dir: Destination folder
+        default_ext: Extension if the type cannot be determined
+
+    Returns:
+        Filename in the input folder
+    """
+    os.makedirs(input_dir, exist_ok=True)
+
+    if isinstance(video, str):
+        mime_type, start = parse_data_url(video)
+        filename = f"{uuid.uuid4().hex}.{video_extension(mime_type, default=default_ext)}"
+        write_base64_to_file(video, os.path.join(input_dir, filename), start)
+        return filename
+
+    # UploadFile exposes the spooled file as .file; plain file objects are used as-is
+    source = getattr(video, "file", video)
+    mime_type = getattr(video, "content_type", None)
+    filename = f"{uuid.uuid4().hex}.{video_extension(mime_type, getattr(video, 'filename', None), default_ext)}"
+    source.seek(0)
+    with open(os.path.join(input_dir, filename), "wb") as f:
+        shutil.copyfileobj(source, f, STREAM_CHUNK_SIZE)
+    return filename
+
+
+async def read_video_request(request, list_fields: Iterable[str] = ()) -> Dict:
+    """
+    Read a video endpoint request as JSON or multipart/form-data.
+
+    Multipart file fields stay as UploadFile objects spooled to disk. Text
+    fields in TYPED_FORM_FIELDS holding a number or boolean are decoded so
+    handlers see the same types as with a JSON body; every other text field
+    (prompts, IDs) is kept verbatim as a string.
+
+    Args:
+        request: FastAPI Request
+        list_fields: Fields that may repeat and are returned as lists
+
+    Returns:
+        Request payload dictionary
+    """
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith("multipart/form-data"):
+        return await request.json()
+
+    form = await request.form()
+    item = {}
+    for key in form.keys():
+        values = []
+        for value in form.getlist(key):
+            if isinstance(value, str) and key in TYPED_FORM_FIELDS:
+                try:
+                    decoded = json.loads(value)
+                except ValueError:
+                    decoded = None
+                # Anything else (null, lists, quoted text) is left for the handler to reject
+                if isinstance(decoded, (bool, int, float)):
+                    value = decoded
+            values.append(value)
+        item[key] = values if key in list_fields else values[0]
+    return item
+
+
+async def close_uploads(item: Dict):
+    """Close (and delete) spooled multipart uploads once a request is done."""
+    for value in item.values():
+        for upload in value if isinstance(value, list) else [value]:
+            if hasattr(upload, "close") and hasattr(upload, "file"):
+                await upload.close()
+
+
+def iter_file(path: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield a file's contents in chunks."""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _remove_paths(paths: Iterable[str]):
+    """Delete files or directories, ignoring ones already gone."""
+    for path in paths:
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+        except Exception as e:
+            print(f"Warning: Failed to cleanup {path}: {e}")
+
+
+def stream_file_response(path: str, media_type: str, cleanup: Iterable[str] = ()):
+    """
+    Build a StreamingResponse that sends a file in chunks.
+
+    Args:
+        path: File to send
+        media_type: Response media type
+        cleanup: Files or directories to delete after the response is sent
+
+    Returns:
+        StreamingResponse with Content-Length set
+    """
+    from starlette.background import BackgroundTask
+    from fastapi.responses import StreamingResponse
+
+    response = StreamingResponse(
+        iter_file(path),
+        media_type=media_type,
+        background=BackgroundTask(_remove_paths, list(cleanup)),
+    )
+    response.headers["Content-Length"] = str(os.path.getsize(path))
+    return response
+
+
+def post_video_to_file(
+    url: str,
+    fields: Dict,
+    files: Dict[str, Tuple[str, bytes, str]],
+    output_path: str,
+    timeout: int = 1200,
+) -> Dict[str, str]:
+    """
+    POST a multipart request and stream the response body to a file.
+
+    Args:
+        url: Endpoint URL
+        fields: Form fields (JSON-encoded so the receiver keeps their types)
+        files: Field name -> (filename, content, content type)
+        output_path: Where to write the response body
+        timeout: Request timeout in seconds
+
+    Returns:
+        Response headers
+
+    Raises:
+        requests.exceptions.RequestException: On connection errors or HTTP errors
+    """
+    import requests
+
+    data = {key: json.dumps(value) for key, value in fields.items()}
+    with requests.post(url, data=data, files=files, timeout=timeout, stream=True) as r:
+        if not r.ok:
+            r.content  # load the (small) error body so callers can read e.response.text
+        r.raise_for_status()
+        with open(output_path, "wb") as f:
+            for chunk in r.iter_content(STREAM_CHUNK_SIZE):
+                f.write(chunk)
+        return dict(r.headers)
@@ -0,0 +1,88 @@
+"""
+Test cross-request micro-batching.
+
+This test verifies that identical concurrent requests run as one latent
+batch (batch_size = number of requests) with one image per caller, and that
+different or already-batched workflows run alone, without a running server.
+"""
+
+import sys
+import threading
+from pathlib import Path
+
+# Add modal directory to path
+modal_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(modal_dir))
+
+from utils.batching import MicroBatcher, batch_key
+
+
+def build_workflow(prompt: str, width: int = 1024, batch_size: int = 1, prefix: str = "req") -> dict:
+    """Build a minimal text-to-image workflow."""
+    return {
+        "1": {"class_type": "UNETLoader", "inputs": {"unet_name": "flux.safetensors"}},
+        "2": {"class_type": "CLIPTextEncode", "inputs": {"text": prompt, "clip": ["1", 0]}},
+        "3": {"class_type": "EmptySD3LatentImage", "inputs": {"width": width, "height": 1024, "batch_size": batch_size}},
+        "4": {"class_type": "KSampler", "inputs": {"seed": 42, "model": ["1", 0], "latent_image": ["3", 0]}},
+        "5": {"class_type": "SaveImage", "inputs": {"images": ["4", 0], "filename_prefix": prefix}},
+    }
+
+
+def test_batch_key():
+    """Test that only the output prefix is ignored and multi-image workflows are not batched."""
+    assert batch_key(build_workflow("a cat", prefix="a")) == batch_key(build_workflow("a cat", prefix="b"))
+    assert batch_key(build_workflow("a cat")) != batch_key(build_workflow("a dog"))
+    assert batch_key(build_workflow("a cat")) != batch_key(build_workflow("a cat", width=768))
+    assert batch_key(build_workflow("a cat", batch_size=2)) is None
+    print("✅ Batch keys group identical workflows")
+
+
+def test_concurrent_requests_share_latent_batch():
+    """Test that requests in one window run as a single batch_size=N prompt."""
+    prompts = []
+
+    def execute_images(workflow):
+        prompts.append(workflow)
+        size = workflow["3"]["inputs"]["batch_size"]
+        return {"5": [f"image-{index}".encode() for index in range(size)]}
+
+    batcher = MicroBatcher(execute_images, window_seconds=1.0, max_batch_size=3)
+    results = {}
+
+    def submit(name):
+        results[name] = batcher.submit(build_workflow("a cat", prefix=name), lambda: b"alone")
+
+    threads = [threading.Thread(target=submit, args=(name,)) for name in ("a", "b", "c")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert len(prompts) == 1 and prompts[0]["3"]["inputs"]["batch_size"] == 3
+    assert sorted(results.values()) == [b"image-0", b"image-1", b"image-2"]
+    assert batcher.stats()["largest_batch"] == 3
+    print("✅ Concurrent requests shared one latent batch")
+
+
+def test_lone_and_different_requests_run_alone():
+    """Test that a request without companions takes the normal single path."""
+    prompts = []
+    batcher = MicroBatcher(lambda workflow: prompts.append(workflow) or {}, window_seconds=0.01)
+
+    assert batcher.submit(build_workflow("a cat"), lambda: b"cat") == b"cat"
+    assert batcher.submit(build_workflow("a dog"), lambda: b"dog") == b"dog"
+    assert batcher.submit(build_workflow("a cat", batch_size=2), lambda: b"two") == b"two"
+
+    assert prompts == []
+    assert batcher.stats()["batches_run"] == 2
+    print("✅ Lone and different requests run alone")
+
+
+if __name__ == "__main__":
+    print("Running batching tests...\n")
+
+    test_batch_key()
+    test_concurrent_requests_share_latent_batch()
+    test_lone_and_different_requests_run_alone()
+
+    print("\n✅ All batching tests passed!")
@@ -0,0 +1,70 @@
+"""
+Test aspect-ratio bucketing for the LoRA trainers.
+
+This test verifies bucket generation (constant pixel budget), nearest-bucket
+assignment, cover-and-crop sizing and the same-bucket batch sampler.
+"""
+
+import sys
+from pathlib import Path
+
+# Add lora-training app directory to path
+training_dir = Path(__file__).parent.parent / "apps" / "lora-training"
+sys.path.insert(0, str(training_dir))
+
+from bucketing import BucketBatchSampler, cover_and_crop, format_buckets_arg, make_buckets, nearest_bucket
+
+
+def test_make_buckets():
+    """Test that buckets keep the pixel budget, step and aspect limits."""
+    buckets = make_buckets(1024 * 1024, step=32)
+    assert (1024, 1024) in buckets
+    for height, width in buckets:
+        assert height % 32 == 0 and width % 32 == 0
+        assert 0.9 * 1024 * 1024 <= height * width <= 1024 * 1024
+        assert max(height, width) / min(height, width) <= 2.0
+    assert buckets[0][0] > buckets[0][1] and buckets[-1][0] < buckets[-1][1]
+    print("✅ Buckets keep a near-constant pixel count")
+
+
+def test_nearest_bucket_and_crop():
+    """Test that samples land in the closest aspect bucket and crop minimally."""
+    buckets = make_buckets(480 * 853, step=16)
+    portrait = buckets[nearest_bucket(buckets, 1920, 1080)]
+    landscape = buckets[nearest_bucket(buckets, 1080, 1920)]
+    assert portrait[0] > portrait[1] and landscape[0] < landscape[1]
+    assert abs(landscape[1] / landscape[0] - 16 / 9) < 0.1
+
+    (resized_h, resized_w), (top, left) = cover_and_crop(1080, 1920, landscape)
+    assert resized_h >= landscape[0] and resized_w >= landscape[1]
+    assert top + landscape[0] <= resized_h and left + landscape[1] <= resized_w
+    assert format_buckets_arg([(1024, 768), (768, 1024)]) == "1024,768;768,1024"
+    print("✅ Nearest bucket and cover crop")
+
+
+def test_bucket_batch_sampler():
+    """Test that batches never mix buckets and every sample is used each epoch."""
+    bucket_ids = [0, 1, 0, 1, 0, 2, 1, 0]
+    sampler = BucketBatchSampler(bucket_ids, batch_size=2, seed=1)
+    batches = list(sampler)
+    assert len(batches) == len(sampler) == 5
+    for batch in batches:
+        assert len({bucket_ids[i] for i in batch}) == 1
+    assert sorted(i for batch in batches for i in batch) == list(range(len(bucket_ids)))
+    assert list(sampler) != batches or len(batches) == 1  # reshuffled per epoch
+
+    report = sampler.utilization([(1024, 1024), (1152, 896), (896, 1152)])
+    assert report["buckets_used"] == 3
+    assert report["samples_per_bucket"] == {"1024x1024": 4, "1152x896": 3, "896x1152": 1}
+    assert report["batch_fill"] == 8 / 10
+
+    # drop_last trims short batches, but never drops a whole bucket
+    dropped = BucketBatchSampler(bucket_ids, batch_size=2, drop_last=True)
+    assert sorted(len(batch) for batch in dropped) == [1, 2, 2, 2]
+    print("✅ Same-bucket batches")
+
+
+if __name__ == "__main__":
+    test_make_buckets()
+    test_nearest_bucket_and_crop()
+    test_bucket_batch_sampler()
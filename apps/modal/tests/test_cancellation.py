@@ -0,0 +1,187 @@
+"""
+Test request cancellation.
+
+This test verifies that cancelling a request's task or disconnecting its
+client stops the blocking implementation, that cancelled and freed GPU
+time are counted, and that a cancelled render is never re-run through the
+infer / comfy run fallbacks, without a ComfyUI server.
+"""
+
+import sys
+import json
+import time
+import asyncio
+import tempfile
+import threading
+from pathlib import Path
+from unittest import mock
+
+# Add modal directory to path
+modal_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(modal_dir))
+
+from utils.cancellation import RequestCancelled, current_cancel_token
+from utils.executor import ImplExecutor, get_executor, run_impl, setup_executor_endpoints
+
+
+class FakeComfyUI:
+    """Stands in for the ComfyUI container instance."""
+
+    max_concurrent_inputs = 2
+    gpu_type = "L40S"
+
+
+def render(seconds: float, started: threading.Event = None) -> str:
+    """Blocking stand-in for a handler impl that waits on ComfyUI."""
+    token = current_cancel_token()
+    if started is not None:
+        started.set()
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        token.raise_if_cancelled()
+        time.sleep(0.01)
+    return "done"
+
+
+def wait_for_cancelled(executor: ImplExecutor) -> dict:
+    """Wait for the worker thread to notice the cancellation."""
+    for _ in range(200):
+        stats = executor.stats()
+        if stats["cancelled"] and not stats["running"]:
+            return stats
+        time.sleep(0.01)
+    raise AssertionError("Impl was not cancelled")
+
+
+def test_cancelled_task_frees_worker():
+    """Test that cancelling the awaiting task stops the impl and counts freed time."""
+    executor = ImplExecutor(max_workers=1)
+    started = threading.Event()
+
+    async def main():
+        assert await executor.run(render, 0.5) == "done"  # sets the expected run time
+        task = asyncio.create_task(executor.run(render, 5, started))
+        await asyncio.to_thread(started.wait)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(main())
+
+    stats = wait_for_cancelled(executor)
+    assert stats["cancelled"] == 1
+    assert stats["completed"] == 1
+    assert stats["cancelled_gpu_seconds"] < 1
+    assert stats["freed_gpu_seconds"] > 0
+    assert stats["freed_cost_usd"] > 0
+    print("✅ Cancelled task stops the impl")
+
+
+def test_client_disconnect_cancels():
+    """Test that a client disconnect before the response cancels the request."""
+    from fastapi import FastAPI
+
+    instance = FakeComfyUI()
+    fastapi = FastAPI()
+    setup_executor_endpoints(fastapi, instance)
+
+    @fastapi.post("/render")
+    async def render_route(item: dict):
+        return {"result": await run_impl(instance, render, item.get("seconds", 5))}
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/render",
+        "raw_path": b"/render",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", b"2")],
+        "client": ("127.0.0.1", 0),
+        "server": ("127.0.0.1", 80),
+    }
+    messages = [{"type": "http.request", "body": b"{}", "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(0.2)  # client goes away mid-render
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        pass
+
+    async def main():
+        try:
+            await fastapi(scope, receive, send)
+        except Exception:
+            pass  # ServerErrorMiddleware re-raises the cancelled request's error
+
+    start = time.time()
+    asyncio.run(main())
+
+    assert time.time() - start < 2
+    assert wait_for_cancelled(get_executor(instance))["cancelled"] == 1
+    print("✅ Client disconnect cancels the request")
+
+
+def test_cancelled_render_not_rerun():
+    """Test that a cancelled API render skips the infer.local and comfy run fallbacks."""
+    import utils.comfyui as comfyui
+    from handlers import instantid, ipadapter_faceid
+
+    class FallbackComfyUI(FakeComfyUI):
+        port = 8000
+
+        def __init__(self):
+            self.infer = mock.Mock()
+
+    cancelled = mock.Mock(side_effect=RequestCancelled("Request cancelled"))
+    nodes_ok = lambda nodes, port=8000: {node: True for node in nodes}
+    item = {"prompt": "a portrait", "reference_image": "data:image/png;base64,AAAA"}
+
+    with mock.patch.object(comfyui, "execute_workflow_via_api", cancelled), \
+            mock.patch.object(comfyui, "verify_nodes_available", nodes_ok), \
+            mock.patch.object(comfyui.subprocess, "run") as comfy_run, \
+            mock.patch.object(instantid, "_save_reference_image", return_value="ref.jpg"), \
+            mock.patch.object(ipadapter_faceid, "_save_reference_image", return_value="ref.jpg"):
+        instance = FallbackComfyUI()
+        for impl in (
+            instantid.InstantIDHandler(instance)._flux_instantid_impl,
+            instantid.InstantIDHandler(instance)._sdxl_instantid_impl,
+            ipadapter_faceid.IPAdapterFaceIDHandler(instance)._flux_ipadapter_faceid_impl,
+        ):
+            try:
+                impl(dict(item))
+            except RequestCancelled:
+                continue
+            raise AssertionError(f"{impl.__name__} did not raise RequestCancelled")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            workflow_path = Path(tmp) / "workflow.json"
+            workflow_path.write_text(json.dumps({"1": {"class_type": "SaveImage", "inputs": {}}}))
+            try:
+                comfyui.execute_workflow(str(workflow_path))
+            except RequestCancelled:
+                pass
+            else:
+                raise AssertionError("execute_workflow did not raise RequestCancelled")
+
+    assert not instance.infer.local.called
+    assert not comfy_run.called
+    print("✅ Cancelled renders are not re-run by the fallbacks")
+
+
+if __name__ == "__main__":
+    print("Running cancellation tests...\n")
+
+    test_cancelled_task_frees_worker()
+    test_client_disconnect_cancels()
+    test_cancelled_render_not_rerun()
+
+    print("\n✅ All cancellation tests passed!")
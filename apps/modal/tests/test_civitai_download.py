@@ -0,0 +1,135 @@
+"""
+Test CivitAI model downloader.
+
+This test verifies Range resume, SHA256 verification (pinned or looked up
+from the model-version API) and transferred-byte accounting against a local
+HTTP server.
+"""
+
+import sys
+import json
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+
+import pytest
+
+# Add modal directory to path
+modal_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(modal_dir / "shared"))
+
+import civitai_models
+from civitai_models import BaseModel, CivitAIModel, ModelType, download_civitai_model, setup_civitai_models
+
+PAYLOAD = bytes(range(256)) * 4096  # 1 MB
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves PAYLOAD, honouring "Range: bytes=N-", and model-version metadata."""
+
+    def do_GET(self):
+        if self.path.startswith("/api/v1/model-versions/"):
+            body = json.dumps({"files": [{"primary": True, "hashes": {"SHA256": self.server.published}}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        start = 0
+        if self.headers.get("Range"):
+            start = int(self.headers["Range"].split("=")[1].rstrip("-"))
+            self.send_response(206)
+        else:
+            self.send_response(200)
+        body = PAYLOAD[start:]
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.requests.append(self.headers.get("Range"))
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = HTTPServer(("127.0.0.1", 0), RangeHandler)
+    httpd.requests = []
+    httpd.published = hashlib.sha256(PAYLOAD).hexdigest().upper()
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+
+
+def make_model(server, filename, sha256=None):
+    return CivitAIModel(
+        id=filename,
+        name=filename,
+        model_type=ModelType.LORA,
+        base_model=BaseModel.Z_IMAGE_TURBO,
+        civitai_url="https://civitai.com/models/0",
+        download_url=f"http://127.0.0.1:{server.server_port}/{filename}",
+        filename=filename,
+        sha256=sha256,
+    )
+
+
+def test_resume_from_part(server, tmp_path):
+    """Test that an existing .part file is resumed with a Range request."""
+    (tmp_path / "model.safetensors.part").write_bytes(PAYLOAD[:1000])
+    model = make_model(server, "model.safetensors", hashlib.sha256(PAYLOAD).hexdigest())
+
+    path = download_civitai_model(model, tmp_path)
+
+    assert path == tmp_path / "model.safetensors"
+    assert path.read_bytes() == PAYLOAD
+    assert server.requests == ["bytes=1000-"]
+    assert not (tmp_path / "model.safetensors.part").exists()
+    print("✅ Download resumed from .part file")
+
+
+def test_checksum_mismatch(server, tmp_path):
+    """Test that a hash mismatch discards the download."""
+    model = make_model(server, "bad.safetensors", "0" * 64)
+
+    assert download_civitai_model(model, tmp_path) is None
+    assert not (tmp_path / "bad.safetensors").exists()
+    assert not (tmp_path / "bad.safetensors.part").exists()
+    print("✅ Checksum mismatch rejected")
+
+
+def test_parallel_setup(server, tmp_path):
+    """Test that setup downloads several models and reports each result."""
+    models = [make_model(server, f"lora-{i}.safetensors") for i in range(3)]
+
+    results = setup_civitai_models(tmp_path, models)
+
+    assert results == {model.id: True for model in models}
+    assert len(list((tmp_path / "models" / "loras").glob("*.safetensors"))) == 3
+    print("✅ Parallel setup downloaded all models")
+
+
+def test_published_hash_verified(server, tmp_path, monkeypatch):
+    """Test that models without a pinned hash are checked against the API's."""
+    monkeypatch.setattr(civitai_models, "CIVITAI_API_URL", f"http://127.0.0.1:{server.server_port}/api/v1")
+    model = make_model(server, "api/download/models/42")
+    model.filename = "published.safetensors"
+
+    assert download_civitai_model(model, tmp_path) == tmp_path / "published.safetensors"
+
+    server.published = "0" * 64
+    model.filename = "tampered.safetensors"
+    assert download_civitai_model(model, tmp_path) is None
+    assert not (tmp_path / "tampered.safetensors").exists()
+    print("✅ Published hash verified")
+
+
+def test_transferred_bytes(server, tmp_path):
+    """Test that files already present count as zero bytes transferred."""
+    model = make_model(server, "counted.safetensors")
+
+    assert civitai_models._download_civitai_model(model, tmp_path)[1] == len(PAYLOAD)
+    assert civitai_models._download_civitai_model(model, tmp_path)[1] == 0
+    print("✅ Only transferred bytes counted")
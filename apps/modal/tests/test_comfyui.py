@@ -0,0 +1,284 @@
+"""
+Test ComfyUI execution utilities.
+
+This test verifies WebSocket completion handling without a running server.
+"""
+
+import sys
+import json
+from pathlib import Path
+
+import pytest
+
+# Add modal directory to path
+modal_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(modal_dir))
+
+import utils.comfyui as comfyui
+from utils.comfyui import (
+    _wait_for_prompt_ws,
+    to_cached_face_analysis,
+    to_cached_lora_loaders,
+    to_cached_text_encoders,
+    to_websocket_outputs,
+    verify_nodes_available,
+)
+
+
+class FakeWebSocket:
+    """Replays a fixed list of ComfyUI /ws messages."""
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+
+    def settimeout(self, timeout):
+        pass
+
+    def recv(self):
+        if not self.messages:
+            raise ConnectionError("closed")
+        message = self.messages.pop(0)
+        return message if isinstance(message, bytes) else json.dumps(message)
+
+
+def test_ws_completion():
+    """Test that executing node=None for our prompt resolves the wait."""
+    ws = FakeWebSocket([
+        {"type": "status", "data": {"status": {"exec_info": {"queue_remaining": 1}}}},
+        {"type": "executing", "data": {"node": None, "prompt_id": "other"}},
+        {"type": "executing", "data": {"node": "7", "prompt_id": "abc"}},
+        b"\x00\x00\x00\x01preview",
+        {"type": "progress", "data": {"value": 1, "max": 9, "prompt_id": "abc"}},
+        {"type": "executing", "data": {"node": None, "prompt_id": "abc"}},
+    ])
+
+    assert _wait_for_prompt_ws(ws, "abc", timeout=5) == {}
+    print("✅ WebSocket completion detected")
+
+
+def test_ws_image_frames():
+    """Test that only frames sent by SaveImageWebsocket nodes are collected."""
+    ws = FakeWebSocket([
+        {"type": "executing", "data": {"node": "7", "prompt_id": "abc"}},
+        b"\x00\x00\x00\x01\x00\x00\x00\x01latent-preview",
+        {"type": "executing", "data": {"node": "9", "prompt_id": "abc"}},
+        b"\x00\x00\x00\x01\x00\x00\x00\x02png-bytes",
+        {"type": "executing", "data": {"node": None, "prompt_id": "abc"}},
+    ])
+
+    images = _wait_for_prompt_ws(ws, "abc", timeout=5, image_nodes={"9"})
+    assert images == {"9": [b"png-bytes"]}
+    print("✅ WebSocket image frames collected")
+
+
+def test_to_websocket_outputs():
+    """Test SaveImage rewrite to SaveImageWebsocket."""
+    workflow = {
+        "8": {"class_type": "VAEDecode", "inputs": {"samples": ["7", 0], "vae": ["3", 0]}},
+        "9": {"class_type": "SaveImage", "inputs": {"filename_prefix": "abc", "images": ["8", 0]}},
+    }
+
+    rewritten, image_nodes = to_websocket_outputs(workflow)
+    assert image_nodes == {"9"}
+    assert rewritten["9"] == {"class_type": "SaveImageWebsocket", "inputs": {"images": ["8", 0]}}
+    assert workflow["9"]["class_type"] == "SaveImage"  # original untouched
+
+    workflow["10"] = {"class_type": "SaveAnimatedWEBP", "inputs": {"images": ["8", 0]}}
+    rewritten, image_nodes = to_websocket_outputs(workflow)
+    assert image_nodes == set()
+    assert rewritten is workflow
+    print("✅ SaveImage rewrite works")
+
+
+def test_to_cached_text_encoders():
+    """Test CLIPTextEncode rewrite keyed on the encoder chain feeding it."""
+    def workflow(lora_strength):
+        return {
+            "2": {"class_type": "DualCLIPLoader", "inputs": {"clip_name1": "t5xxl_fp16.safetensors", "type": "flux"}},
+            "3": {"class_type": "LoraLoader", "inputs": {"clip": ["2", 0], "strength_clip": lora_strength}},
+            "4": {"class_type": "CLIPTextEncode", "inputs": {"text": "a portrait", "clip": ["3", 1]}},
+            "5": {"class_type": "CLIPTextEncode", "inputs": {"text": "blurry", "clip": ["2", 0]}},
+        }
+
+    original = workflow(1.0)
+    rewritten = to_cached_text_encoders(original)
+    assert rewritten["4"]["class_type"] == "RylaCachedCLIPTextEncode"
+    assert rewritten["4"]["inputs"]["text"] == "a portrait"
+    assert original["4"]["class_type"] == "CLIPTextEncode"  # original untouched
+
+    other_lora = to_cached_text_encoders(workflow(0.5))
+    assert rewritten["4"]["inputs"]["encoder_key"] != rewritten["5"]["inputs"]["encoder_key"]
+    assert rewritten["4"]["inputs"]["encoder_key"] != other_lora["4"]["inputs"]["encoder_key"]
+    assert rewritten["5"]["inputs"]["encoder_key"] == other_lora["5"]["inputs"]["encoder_key"]
+    print("✅ Text encoders rewritten with encoder keys")
+
+
+def test_to_cached_face_analysis():
+    """Test that InsightFace loaders are routed through the face cache node."""
+    original = {
+        "6": {"class_type": "InstantIDFaceAnalysis", "inputs": {"provider": "CPU"}},
+        "8": {"class_type": "ApplyInstantID", "inputs": {"insightface": ["6", 0], "image": ["7", 0]}},
+    }
+    rewritten = to_cached_face_analysis(original)
+    cache_id = rewritten["8"]["inputs"]["insightface"][0]
+    assert rewritten[cache_id]["class_type"] == "RylaCachedFaceAnalysis"
+    assert rewritten[cache_id]["inputs"]["insightface"] == ["6", 0]
+    assert "CPU" in rewritten[cache_id]["inputs"]["loader_key"]
+    assert rewritten["8"]["inputs"]["image"] == ["7", 0]
+    assert original["8"]["inputs"]["insightface"] == ["6", 0]  # original untouched
+    assert to_cached_face_analysis({"1": {"class_type": "KSampler", "inputs": {}}}) == {"1": {"class_type": "KSampler", "inputs": {}}}
+    print("✅ Face analysis routed through cache node")
+
+
+def test_to_cached_lora_loaders():
+    """Test that LoRA loaders are swapped only for nodes the server has."""
+    workflow = {
+        "30": {"class_type": "LoraLoader", "inputs": {"lora_name": "character-1.safetensors", "strength_model": 1.0}},
+        "50": {"class_type": "LoraLoaderModelOnly", "inputs": {"lora_name": "character-2.safetensors"}},
+    }
+    rewritten = to_cached_lora_loaders(workflow, {"RylaCachedLoraLoader": {}})
+    assert rewritten["30"]["class_type"] == "RylaCachedLoraLoader"
+    assert rewritten["30"]["inputs"] == workflow["30"]["inputs"]
+    assert rewritten["50"]["class_type"] == "LoraLoaderModelOnly"
+    assert workflow["30"]["class_type"] == "LoraLoader"  # original untouched
+    print("✅ LoRA loaders swapped for cached nodes")
+
+
+def test_lora_chain_collapsed_to_stack():
+    """Test that a LoRA chain becomes one stack node keeping the tail id."""
+    import json
+
+    workflow = {
+        "1": {"class_type": "UNETLoader", "inputs": {"unet_name": "z_image_turbo_bf16.safetensors"}},
+        "50": {"class_type": "LoraLoaderModelOnly", "inputs": {"model": ["1", 0], "lora_name": "character-1.safetensors", "strength_model": 1.0}},
+        "51": {"class_type": "LoraLoaderModelOnly", "inputs": {"model": ["50", 0], "lora_name": "realistic-snapshot-zit.safetensors", "strength_model": 0.85}},
+        "7": {"class_type": "KSampler", "inputs": {"model": ["51", 0]}},
+    }
+    rewritten = to_cached_lora_loaders(workflow, {"RylaCachedLoraStack": {}, "RylaCachedLoraLoaderModelOnly": {}})
+    assert "50" not in rewritten
+    assert rewritten["51"]["class_type"] == "RylaCachedLoraStack"
+    assert rewritten["51"]["inputs"]["model"] == ["1", 0]
+    assert json.loads(rewritten["51"]["inputs"]["stack"]) == [
+        ["character-1.safetensors", 1.0, 0.0],
+        ["realistic-snapshot-zit.safetensors", 0.85, 0.0],
+    ]
+
+    # A loader whose output is also used elsewhere ends the chain
+    workflow["8"] = {"class_type": "ModelSamplingAuraFlow", "inputs": {"model": ["50", 0]}}
+    rewritten = to_cached_lora_loaders(workflow, {"RylaCachedLoraStack": {}, "RylaCachedLoraLoaderModelOnly": {}})
+    assert rewritten["50"]["class_type"] == rewritten["51"]["class_type"] == "RylaCachedLoraLoaderModelOnly"
+    print("✅ LoRA chain collapsed to one stack node")
+
+
+def test_ws_execution_error():
+    """Test that execution_error raises with node details."""
+    ws = FakeWebSocket([
+        {"type": "execution_error", "data": {
+            "prompt_id": "abc",
+            "node_id": "7",
+            "node_type": "KSampler",
+            "exception_message": "CUDA out of memory",
+        }},
+    ])
+
+    with pytest.raises(Exception, match="node 7 \\(KSampler\\)"):
+        _wait_for_prompt_ws(ws, "abc", timeout=5)
+    print("✅ WebSocket execution_error raised")
+
+
+def test_ws_dropped_falls_back():
+    """Test that a dropped stream returns None so callers poll history."""
+    ws = FakeWebSocket([
+        {"type": "executing", "data": {"node": "7", "prompt_id": "abc"}},
+    ])
+
+    assert _wait_for_prompt_ws(ws, "abc", timeout=5) is None
+    print("✅ Dropped WebSocket falls back to polling")
+
+
+def test_ws_progress_events():
+    """Test that progress events and latent previews reach the listener."""
+    ws = FakeWebSocket([
+        {"type": "executing", "data": {"node": "7", "prompt_id": "abc"}},
+        {"type": "progress", "data": {"value": 1, "max": 20, "node": "7", "prompt_id": "abc"}},
+        {"type": "progress", "data": {"value": 1, "max": 20, "node": "3", "prompt_id": "other"}},
+        b"\x00\x00\x00\x01\x00\x00\x00\x01jpeg-preview",
+        {"type": "executing", "data": {"node": "9", "prompt_id": "abc"}},
+        b"\x00\x00\x00\x01\x00\x00\x00\x02png-bytes",
+        {"type": "executing", "data": {"node": None, "prompt_id": "abc"}},
+    ])
+    events = []
+
+    images = _wait_for_prompt_ws(
+        ws, "abc", timeout=5, image_nodes={"9"}, on_event=lambda kind, data: events.append((kind, data)),
+    )
+    assert images == {"9": [b"png-bytes"]}
+    assert [kind for kind, _ in events] == ["executing", "progress", "preview", "executing", "executing"]
+    assert events[1][1]["value"] == 1
+    assert events[2][1] == {"image": b"jpeg-preview", "format": "jpeg", "node": "7"}
+    print("✅ Progress events and previews forwarded")
+
+
+def test_ws_cancel_removes_queued_prompt(monkeypatch):
+    """Test that a cancelled request removes its prompt from the queue."""
+    from utils.cancellation import CancelToken, RequestCancelled
+
+    posts = []
+
+    class FakeResponse:
+        def json(self):
+            return {"queue_running": [[1, "other", {}, {}, []]], "queue_pending": [[2, "abc", {}, {}, []]]}
+
+    monkeypatch.setattr(comfyui.requests, "get", lambda url, timeout=None: FakeResponse())
+    monkeypatch.setattr(comfyui.requests, "post", lambda url, json=None, timeout=None: posts.append((url, json)))
+
+    token = CancelToken()
+    token.cancel("client disconnected")
+    ws = FakeWebSocket([{"type": "executing", "data": {"node": None, "prompt_id": "abc"}}])
+    with pytest.raises(RequestCancelled):
+        _wait_for_prompt_ws(ws, "abc", timeout=5, port=9999, cancel_token=token)
+    assert posts == [("http://127.0.0.1:9999/queue", {"delete": ["abc"]})]
+    print("✅ Cancelled prompt removed from queue")
+
+
+def test_object_info_cached(monkeypatch):
+    """Test that node checks fetch /object_info once and answer from memory."""
+    calls = []
+
+    class FakeResponse:
+        status_code = 200
+
+        def json(self):
+            return {"KSampler": {}, "SeedVR2VideoUpscaler": {}}
+
+    def fake_get(url, timeout=None):
+        calls.append(url)
+        return FakeResponse()
+
+    monkeypatch.setattr(comfyui.requests, "get", fake_get)
+    monkeypatch.setattr(comfyui, "_object_info_cache", {})
+
+    first = verify_nodes_available(["SeedVR2VideoUpscaler", "ApplyInstantID"], port=9999)
+    second = verify_nodes_available(["KSampler"], port=9999)
+
+    assert first == {"SeedVR2VideoUpscaler": True, "ApplyInstantID": False}
+    assert second == {"KSampler": True}
+    assert len(calls) == 1
+    print("✅ object_info fetched once and cached")
+
+
+if __name__ == "__main__":
+    print("Running ComfyUI utility tests...\n")
+
+    test_ws_completion()
+    test_ws_image_frames()
+    test_to_websocket_outputs()
+    test_ws_execution_error()
+    test_ws_dropped_falls_back()
+    test_ws_progress_events()
+    test_to_cached_text_encoders()
+    test_to_cached_face_analysis()
+    test_to_cached_lora_loaders()
+    test_lora_chain_collapsed_to_stack()
+
+    print("\n✅ All ComfyUI utility tests passed!")
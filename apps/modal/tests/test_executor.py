@@ -0,0 +1,141 @@
+"""
+Test handler executor.
+
+This test verifies that blocking implementations run off the event loop,
+that a full pool rejects requests with 503, and that slots are held until
+the worker thread returns (queued requests show up in queue_depth).
+"""
+
+import sys
+import time
+import asyncio
+import threading
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+
+# Add modal directory to path
+modal_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(modal_dir))
+
+from utils.executor import ImplExecutor, get_executor
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_runs_off_loop():
+    """Test that impls run on worker threads and the loop stays responsive."""
+    executor = ImplExecutor(max_workers=2)
+    loop_thread = threading.get_ident()
+
+    def slow_impl(item):
+        time.sleep(0.2)
+        return threading.get_ident(), item["prompt"]
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        tick_task = asyncio.create_task(ticker())
+        result = await executor.run(slow_impl, {"prompt": "hi"})
+        tick_task.cancel()
+        return result, ticks
+
+    (worker_thread, prompt), ticks = asyncio.run(main())
+
+    assert prompt == "hi"
+    assert worker_thread != loop_thread
+    assert ticks > 5  # loop kept running while impl blocked
+    assert executor.stats()["completed"] == 1
+    print("✅ Impl runs off the event loop")
+
+
+def test_rejects_when_full():
+    """Test 503 backpressure once all workers are busy."""
+    executor = ImplExecutor(max_workers=1)
+    release = threading.Event()
+
+    async def main():
+        first = asyncio.create_task(executor.run(release.wait))
+        await asyncio.sleep(0.05)
+        assert executor.stats()["running"] == 1
+
+        with pytest.raises(HTTPException) as exc_info:
+            await executor.run(lambda: None)
+
+        release.set()
+        await first
+        return exc_info.value
+
+    error = asyncio.run(main())
+
+    assert error.status_code == 503
+    assert "Retry-After" in error.headers
+    stats = executor.stats()
+    assert stats["rejected"] == 1
+    assert stats["in_flight"] == 0
+    print("✅ Full executor rejects with 503")
+
+
+def test_slot_held_until_thread_returns():
+    """Test that a cancelled request keeps its slot while its thread runs, and later ones queue."""
+    executor = ImplExecutor(max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def main():
+        first = asyncio.create_task(executor.run(release.wait))
+        await asyncio.sleep(0.05)
+        first.cancel()  # client went away; the thread is still blocked
+        await asyncio.sleep(0.05)
+        assert executor.stats()["in_flight"] == 1
+
+        second = asyncio.create_task(executor.run(lambda: "done"))
+        await asyncio.sleep(0.05)
+        stats = executor.stats()
+        assert stats["running"] == 1 and stats["queue_depth"] == 1
+
+        with pytest.raises(HTTPException):
+            await executor.run(lambda: None)
+
+        release.set()
+        return await second
+
+    assert asyncio.run(main()) == "done"
+    assert wait_until(lambda: executor.stats()["in_flight"] == 0)
+    print("✅ Slots held until the worker thread returns")
+
+
+def test_sized_from_instance():
+    """Test pool size comes from the app's concurrency limit."""
+    class MockComfyUI:
+        max_concurrent_inputs = 3
+
+    instance = MockComfyUI()
+    executor = get_executor(instance)
+
+    assert executor.max_workers == 3
+    assert executor.max_queue > 0
+    assert get_executor(instance) is executor
+    print("✅ Executor sized from max_concurrent_inputs")
+
+
+if __name__ == "__main__":
+    print("Running executor tests...\n")
+
+    test_runs_off_loop()
+    test_rejects_when_full()
+    test_slot_held_until_thread_returns()
+    test_sized_from_instance()
+
+    print("\n✅ All executor tests passed!")
@@ -13,7 +13,12 @@ import tempfile
 modal_dir = Path(__file__).parent.parent
 sys.path.insert(0, str(modal_dir))
 
-from utils.image_utils import encode_base64, decode_base64, save_base64_to_file
+import json
+
+from utils.image_utils import (
+    encode_base64, decode_base64, save_base64_to_file, build_images_response, parse_num_images, prune_reference_images,
+    save_reference_image,
+)
 
 
 def test_encode_base64():
@@ -32,6 +37,52 @@ def test_encode_base64():
         Path(temp_path).unlink()
 
 
+def test_save_reference_image():
+    """Test that reference images are named by content and written once."""
+    from io import BytesIO
+    from PIL import Image
+    
+    buffer = BytesIO()
+    Image.new("RGBA", (8, 8), (255, 0, 0, 255)).save(buffer, "PNG")
+    data_url = f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode('utf-8')}"
+    
+    with tempfile.TemporaryDirectory() as input_dir:
+        first = save_reference_image(data_url, "instantid_ref", input_dir=input_dir)
+        assert first.startswith("instantid_ref_") and first.endswith(".jpg")
+        inode = (Path(input_dir) / first).stat().st_ino
+        assert save_reference_image(data_url, "instantid_ref", input_dir=input_dir) == first
+        assert (Path(input_dir) / first).stat().st_ino == inode
+        assert not list(Path(input_dir).glob(".*.tmp"))
+        
+        raw = save_reference_image(data_url, "z_image_ref", as_jpeg=False, input_dir=input_dir)
+        assert raw.endswith(".png")
+        assert (Path(input_dir) / raw).read_bytes() == buffer.getvalue()
+    print("✅ save_reference_image reuses content-addressed files")
+
+
+def test_prune_reference_images():
+    """Test that least recently used reference images are pruned beyond the budget."""
+    import os
+    import time
+    
+    with tempfile.TemporaryDirectory() as input_dir:
+        now = time.time()
+        names = [f"instantid_ref_{i:016x}.jpg" for i in range(4)]
+        for age, name in zip((4000, 3000, 2000, 60), names):
+            path = Path(input_dir) / name
+            path.write_bytes(b"x" * 100)
+            os.utime(path, (now - age, now - age))
+        (Path(input_dir) / "upload.png").write_bytes(b"x" * 1000)  # not a reference image
+        
+        assert prune_reference_images(input_dir, max_bytes=250, min_age_seconds=600) == 200
+        assert sorted(path.name for path in Path(input_dir).iterdir()) == sorted([names[2], names[3], "upload.png"])
+        
+        # The recently used one is kept even though it is over budget
+        assert prune_reference_images(input_dir, max_bytes=0, min_age_seconds=600) == 100
+        assert sorted(path.name for path in Path(input_dir).iterdir()) == sorted([names[3], "upload.png"])
+    print("✅ prune_reference_images drops least recently used references")
+
+
 def test_decode_base64():
     """Test base64 decoding."""
     # Create base64 data URL
@@ -66,11 +117,42 @@ def test_save_base64_to_file():
         Path(temp_path).unlink()
 
 
+def test_build_images_response():
+    """Test multi-image JSON response round-trips through decode_base64."""
+    images = [b'first_image', b'second_image']
+    
+    response = build_images_response(images)
+    body = json.loads(response.body)
+    
+    assert response.media_type == "application/json"
+    assert body["count"] == 2
+    assert [decode_base64(image) for image in body["images"]] == images
+    print("✅ build_images_response works")
+
+
+def test_parse_num_images():
+    """Test num_images parsing and the 1-8 range."""
+    assert parse_num_images({}) == 1
+    assert parse_num_images({"num_images": 4}) == 4
+    assert parse_num_images({"num_images": "2"}) == 2
+    for bad in (0, 9, -1, 2.5, "many", None, True, [2]):
+        try:
+            parse_num_images({"num_images": bad})
+        except ValueError:
+            continue
+        raise AssertionError(f"num_images={bad!r} was accepted")
+    print("✅ parse_num_images works")
+
+
 if __name__ == "__main__":
     print("Running image utility tests...\n")
     
     test_encode_base64()
     test_decode_base64()
     test_save_base64_to_file()
+    test_save_reference_image()
+    test_prune_reference_images()
+    test_build_images_response()
+    test_parse_num_images()
     
     print("\n✅ All image utility tests passed!")
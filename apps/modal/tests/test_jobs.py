@@ -0,0 +1,248 @@
+"""
+Test the async job API.
+
+This test verifies submit/poll/fetch, idempotent resubmission on a job key,
+busy (503) retries, failed and cancelled jobs, jobs spawned as function
+calls that run in another container, and job_key races between containers,
+using a small FastAPI app in place of the ComfyUI routes.
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# Add modal directory to path
+modal_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(modal_dir))
+
+from utils.cancellation import current_cancel_token
+from utils.executor import get_executor, run_impl
+import utils.jobs as jobs
+from utils.jobs import JobTable, job_id_for_key, setup_job_endpoints
+
+
+class FakeComfyUI:
+    """Stands in for the ComfyUI container instance."""
+
+
+@pytest.fixture
+def client(tmp_path):
+    """TestClient for an app with one image route and the job API."""
+    from fastapi import FastAPI, HTTPException, Request
+    from fastapi.responses import Response
+    from fastapi.testclient import TestClient
+
+    fastapi = FastAPI()
+    instance = FakeComfyUI()
+    calls = {"render": 0, "busy": 0}
+
+    @fastapi.post("/render")
+    async def render(request: Request):
+        item = await request.json()
+        calls["render"] += 1
+        if item.get("fail"):
+            raise HTTPException(status_code=400, detail="bad prompt")
+        if calls["busy"] < item.get("busy", 0):
+            calls["busy"] += 1
+            raise HTTPException(status_code=503, detail="busy", headers={"Retry-After": "0"})
+        return Response(
+            content=item["prompt"].encode("utf-8"),
+            media_type="image/png",
+            headers={"X-Cost-USD": "0.001", "X-GPU-Type": "L40S"},
+        )
+
+    def wait_for_cancel(item):
+        """Blocking impl that only ends when its request is cancelled."""
+        token = current_cancel_token()
+        while True:
+            token.raise_if_cancelled()
+            time.sleep(0.01)
+
+    @fastapi.post("/slow")
+    async def slow(item: dict):
+        return {"result": await run_impl(instance, wait_for_cancel, item)}
+
+    instance._job_table = JobTable(results_dir=str(tmp_path), sync_volume=False)
+    setup_job_endpoints(fastapi, instance)
+
+    with TestClient(fastapi) as test_client:
+        test_client.calls = calls
+        test_client.instance = instance
+        yield test_client
+
+
+def wait_for_job(client, job_id: str) -> dict:
+    """Poll a job until it finishes."""
+    for _ in range(100):
+        record = client.get(f"/jobs/{job_id}").json()
+        if record["status"] in ("succeeded", "failed", "cancelled"):
+            return record
+        time.sleep(0.02)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def test_submit_poll_fetch(client):
+    """Test that a job runs the route and its result keeps the X- headers."""
+    response = client.post("/jobs", json={"endpoint": "/render", "input": {"prompt": "a cat", "busy": 2}})
+    assert response.status_code == 202
+    record = wait_for_job(client, response.json()["job_id"])
+
+    assert record["status"] == "succeeded"
+    assert client.calls["busy"] == 2  # 503s were retried, not failed
+    result = client.get(record["result_url"])
+    assert result.status_code == 200
+    assert result.content == b"a cat"
+    assert result.headers["content-type"] == "image/png"
+    assert result.headers["x-cost-usd"] == "0.001"
+    print("✅ Job submit/poll/fetch works")
+
+
+def test_job_key_is_idempotent(client):
+    """Test that resubmitting with the same job key returns the same job."""
+    body = {"endpoint": "/render", "input": {"prompt": "a dog"}, "job_key": "order-42"}
+    first = client.post("/jobs", json=body)
+    wait_for_job(client, first.json()["job_id"])
+
+    second = client.post("/jobs", json=body, headers={"Idempotency-Key": "ignored"})
+    assert first.json()["job_id"] == second.json()["job_id"] == job_id_for_key("/render", "order-42")
+    assert second.status_code == 200
+    assert client.calls["render"] == 1
+    print("✅ Job keys deduplicate submissions")
+
+
+def test_failed_job_and_errors(client):
+    """Test failed jobs, unknown endpoints and unknown job IDs."""
+    response = client.post("/jobs", json={"endpoint": "/render", "input": {"fail": True}})
+    record = wait_for_job(client, response.json()["job_id"])
+    assert record["status"] == "failed"
+    assert "bad prompt" in record["error"]
+    assert client.get(f"/jobs/{record['job_id']}/result").status_code == 409
+
+    assert client.post("/jobs", json={"endpoint": "/jobs", "input": {}}).status_code == 400
+    assert client.get("/jobs/job-missing").status_code == 404
+    print("✅ Job failures and errors are reported")
+
+
+def test_delete_cancels_job(client):
+    """Test that DELETE /jobs/{id} cancels the job and stops its impl."""
+    response = client.post("/jobs", json={"endpoint": "/slow", "input": {}, "job_key": "slow-1"})
+    job_id = response.json()["job_id"]
+    executor = get_executor(client.instance)
+    for _ in range(100):
+        if executor.stats()["running"]:
+            break
+        time.sleep(0.01)
+
+    record = client.delete(f"/jobs/{job_id}").json()
+    assert record["status"] == "cancelled"
+    assert client.delete(f"/jobs/{job_id}").status_code == 409
+    for _ in range(100):
+        if executor.stats()["cancelled"]:
+            break
+        time.sleep(0.01)
+    assert executor.stats()["running"] == 0
+
+    # A cancelled job runs again when resubmitted with its job key
+    again = client.post("/jobs", json={"endpoint": "/slow", "input": {}, "job_key": "slow-1"})
+    assert again.status_code == 202
+    client.delete(f"/jobs/{job_id}")
+    print("✅ Deleting a job cancels it")
+
+
+def test_spawned_job_runs_in_another_container(tmp_path):
+    """Test that jobs started through spawn are polled from the shared results directory."""
+    from fastapi import FastAPI
+    from fastapi.responses import Response
+    from fastapi.testclient import TestClient
+
+    fastapi = FastAPI()
+
+    @fastapi.post("/render")
+    async def render(item: dict):
+        return Response(content=item["prompt"].encode("utf-8"), media_type="image/png")
+
+    # The container the Modal call lands on: its own table, same results directory
+    runner = JobTable(results_dir=str(tmp_path), sync_volume=False, work_dir=str(tmp_path / "work"))
+    spawned = []
+
+    async def spawn(record, payload):
+        spawned.append(record["job_id"])
+        asyncio.get_running_loop().create_task(runner.run(record, fastapi, payload))
+        return SimpleNamespace(object_id="fc-test")
+
+    instance = FakeComfyUI()
+    instance._job_table = JobTable(results_dir=str(tmp_path), sync_volume=False, spawn=spawn)
+    setup_job_endpoints(fastapi, instance)
+    assert instance._job_app is fastapi
+
+    with TestClient(fastapi) as client:
+        response = client.post("/jobs", json={"endpoint": "/render", "input": {"prompt": "a fox"}})
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        record = wait_for_job(client, job_id)
+        assert record["status"] == "succeeded"
+        assert client.get(record["result_url"]).content == b"a fox"
+        assert record["call_id"] == "fc-test"
+
+    assert spawned == [job_id]
+    assert instance._job_table.stats()["running"] == 0
+    print("✅ Spawned jobs are visible to every container")
+
+
+def test_job_key_race_between_containers(tmp_path, monkeypatch):
+    """Test that a job_key submitted on two containers at once runs one call."""
+    from fastapi import FastAPI
+    from fastapi.responses import Response
+
+    syncs, cancelled = [], []
+    monkeypatch.setattr(jobs, "_volume_sync", syncs.append)
+    monkeypatch.setattr(jobs, "cancel_function_call", cancelled.append)
+
+    fastapi = FastAPI()
+    seen_at_render = []
+
+    @fastapi.post("/render")
+    async def render(item: dict):
+        seen_at_render.append(syncs.count("commit"))
+        return Response(content=item["prompt"].encode("utf-8"), media_type="image/png")
+
+    def container(call_id):
+        async def spawn(record, payload):
+            return SimpleNamespace(object_id=call_id)
+        return JobTable(results_dir=str(tmp_path), spawn=spawn, work_dir=str(tmp_path / call_id))
+
+    first, second = container("fc-a"), container("fc-b")
+
+    # The queued record is committed on create, so a later submission finds it
+    record, created = first.create("/render", "order-7")
+    assert created and syncs[-1] == "commit"
+    duplicate, created = second.create("/render", "order-7")
+    assert not created and duplicate["job_id"] == record["job_id"]
+
+    async def race():
+        # Both containers got past create before either spawned: the first claim wins
+        await first.start(record, fastapi, {"prompt": "a cat"})
+        loser = dict(record, call_id=None)
+        await second.start(loser, fastapi, {"prompt": "a cat"})
+        assert loser["call_id"] == "fc-a"
+
+        # The cancelled duplicate never writes the job record
+        await second.run(dict(record, call_id="fc-b"), fastapi, {"prompt": "a cat"})
+        assert first.get(record["job_id"])["status"] == "queued"
+
+        # The owning call commits "running" before the route runs, and the result
+        commits = syncs.count("commit")
+        await first.run(dict(record, call_id="fc-a"), fastapi, {"prompt": "a cat"})
+        assert seen_at_render[-1] == commits + 1
+        assert syncs.count("commit") == commits + 2
+
+    asyncio.run(race())
+    assert cancelled == ["fc-b"]
+    assert second.stats()["deduplicated"] == 2
+    final = first.get(record["job_id"])
+    assert final["status"] == "succeeded" and final["call_id"] == "fc-a"
+    print("✅ job_key races between containers run one call")
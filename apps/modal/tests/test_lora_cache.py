@@ -0,0 +1,115 @@
+"""
+Test the LoRA hot cache.
+
+This test verifies local copies and ComfyUI links, LRU eviction back to the
+volume, decayed-frequency prefetch and the shared hot list, using temporary
+directories instead of the Modal volume.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# Add modal directory to path
+modal_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(modal_dir))
+
+from utils.lora_cache import LoraCache
+
+
+def make_cache(tmp_path, **kwargs) -> LoraCache:
+    volume_dir = tmp_path / "volume" / "loras"
+    volume_dir.mkdir(parents=True, exist_ok=True)
+    for name, size in {"character-a.safetensors": 10, "character-b.safetensors": 10, "character-c.safetensors": 10}.items():
+        (volume_dir / name).write_bytes(name[10].encode() * size)
+    kwargs.setdefault("hot_list_path", str(tmp_path / "volume" / "lora-cache" / "hot.json"))
+    return LoraCache(
+        volume_dir=str(volume_dir),
+        comfy_dir=str(tmp_path / "comfy" / "loras"),
+        local_dir=str(tmp_path / "local"),
+        **kwargs,
+    )
+
+
+def test_ensure_copies_and_links(tmp_path):
+    """Test that a LoRA is copied to local disk once and linked for ComfyUI."""
+    cache = make_cache(tmp_path, prefetch_top_k=0)
+    assert cache.ensure("character-a.safetensors")
+    assert cache.ensure("character-a.safetensors")
+    link = tmp_path / "comfy" / "loras" / "character-a.safetensors"
+    assert os.readlink(link) == str(tmp_path / "local" / "character-a.safetensors")
+    assert link.read_bytes() == b"a" * 10
+    assert not cache.ensure("character-missing.safetensors")
+
+    stats = cache.stats()
+    assert (stats["misses"], stats["hits_local"], stats["not_found"]) == (1, 1, 1)
+    print("✅ LoRA copied to local disk and linked")
+
+
+def test_builtin_loras_untouched(tmp_path):
+    """Test that LoRAs baked into the image are left as they are."""
+    cache = make_cache(tmp_path, prefetch_top_k=0)
+    comfy_dir = tmp_path / "comfy" / "loras"
+    comfy_dir.mkdir(parents=True)
+    (comfy_dir / "flux-realism-lora.safetensors").write_bytes(b"realism")
+    assert cache.ensure("flux-realism-lora.safetensors")
+    assert not (comfy_dir / "flux-realism-lora.safetensors").is_symlink()
+    assert cache.stats()["local_loras"] == 0
+    print("✅ Built-in LoRAs untouched")
+
+
+def test_eviction_relinks_volume(tmp_path):
+    """Test that evicted LoRAs fall back to the volume copy."""
+    cache = make_cache(tmp_path, max_local_bytes=20, prefetch_top_k=0)
+    for name in ("character-a.safetensors", "character-b.safetensors", "character-c.safetensors"):
+        assert cache.ensure(name)
+
+    comfy_dir = tmp_path / "comfy" / "loras"
+    assert os.readlink(comfy_dir / "character-a.safetensors") == str(tmp_path / "volume" / "loras" / "character-a.safetensors")
+    assert (comfy_dir / "character-a.safetensors").read_bytes() == b"a" * 10
+    assert not (tmp_path / "local" / "character-a.safetensors").exists()
+    assert cache.stats()["local_bytes"] == 20
+    assert cache.stats()["evicted"] == 1
+    print("✅ Evicted LoRAs relinked to the volume")
+
+
+def test_prefetch_and_hot_list(tmp_path):
+    """Test that hot LoRAs are prefetched and shared with new containers."""
+    cache = make_cache(tmp_path, max_local_bytes=20, prefetch_top_k=1)
+    for _ in range(3):
+        cache.record("character-b.safetensors")
+    cache.ensure("character-a.safetensors")
+    cache.warm(wait=True)  # runs after the prefetch scheduled by ensure()
+    assert cache.ranking()[0] == "character-b.safetensors"
+    assert (tmp_path / "local" / "character-b.safetensors").exists()
+    assert cache.stats()["prefetched"] == 1
+
+    # A new container warms up with the fleet's hottest LoRA
+    fresh = LoraCache(
+        volume_dir=str(tmp_path / "volume" / "loras"),
+        comfy_dir=str(tmp_path / "comfy2" / "loras"),
+        local_dir=str(tmp_path / "local2"),
+        hot_list_path=str(tmp_path / "volume" / "lora-cache" / "hot.json"),
+        prefetch_top_k=1,
+    )
+    fresh.warm(wait=True)
+    assert (tmp_path / "local2" / "character-b.safetensors").exists()
+    assert os.readlink(tmp_path / "comfy2" / "loras" / "character-b.safetensors") == str(tmp_path / "local2" / "character-b.safetensors")
+    print("✅ Hot LoRAs prefetched and shared")
+
+
+def test_retrained_lora_is_recopied(tmp_path):
+    """Test that a LoRA overwritten on the volume replaces the local copy."""
+    cache = make_cache(tmp_path, prefetch_top_k=0)
+    assert cache.ensure("character-a.safetensors")
+    source = tmp_path / "volume" / "loras" / "character-a.safetensors"
+    source.write_bytes(b"retrained!!")
+    os.utime(source, ns=(source.stat().st_atime_ns, source.stat().st_mtime_ns + 10**9))
+
+    assert cache.ensure("character-a.safetensors")
+    assert (tmp_path / "comfy" / "loras" / "character-a.safetensors").read_bytes() == b"retrained!!"
+    assert cache.ensure("character-a.safetensors")
+    stats = cache.stats()
+    assert (stats["misses"], stats["refreshed"], stats["hits_local"]) == (1, 1, 1)
+    assert stats["local_bytes"] == 11
+    print("✅ Retrained LoRAs copied again")
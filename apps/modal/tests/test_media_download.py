@@ -0,0 +1,120 @@
+"""
+Test the concurrent training-media downloader.
+
+This test verifies parallel downloads, retry on transient errors, content
+deduplication (a duplicate is dropped only once the first copy saved) and
+image/video validation against a local HTTP server.
+"""
+
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image
+
+# Add lora-training app directory to path
+training_dir = Path(__file__).parent.parent / "apps" / "lora-training"
+sys.path.insert(0, str(training_dir))
+
+import media_download
+from media_download import download_media
+
+
+def png_bytes(color) -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", (8, 6), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def serve(routes: dict):
+    """Start a local server; a route value that is a list is served in turn (status, body)."""
+    hits = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits[self.path] = hits.get(self.path, 0) + 1
+            response = routes.get(self.path, (404, b"missing"))
+            if isinstance(response, list):
+                response = response[min(hits[self.path], len(response)) - 1]
+            status, body = response
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}", hits
+
+
+def test_download_images(tmp_path):
+    """Test that images are fetched, retried, deduplicated and validated."""
+    red, blue = png_bytes("red"), png_bytes("blue")
+    server, base, hits = serve({
+        "/a.png": (200, red),
+        "/a-copy.png": (200, red),
+        "/b.png": [(503, b"busy"), (200, blue)],
+        "/broken.png": (200, b"<html>not an image</html>"),
+    })
+    try:
+        urls = [f"{base}/a.png", f"{base}/a-copy.png", f"{base}/b.png", f"{base}/broken.png", f"{base}/gone.png"]
+        result = download_media(urls, tmp_path, kind="image", max_workers=4, backoff=0.01)
+    finally:
+        server.shutdown()
+
+    assert [path.suffix for path in result.paths] == [".png", ".png"]
+    assert len(result.duplicates) == 1 and result.duplicates[0] in urls[:2]
+    assert set(result.failed) == {urls[3], urls[4]}
+    assert hits["/b.png"] == 2 and hits["/gone.png"] == 1  # 503 retried, 404 not
+    colors = sorted(Image.open(path).getpixel((0, 0)) for path in result.paths)
+    assert colors == [(0, 0, 255), (255, 0, 0)]
+    print("✅ Images downloaded, retried and deduplicated")
+
+
+def test_duplicate_kept_when_first_copy_fails(tmp_path, monkeypatch):
+    """Test that a duplicate is saved in place of a first copy whose save failed."""
+    red = png_bytes("red")
+    server, base, _ = serve({"/a.png": (200, red), "/a-copy.png": (200, red)})
+    save_image = media_download._save_image
+    calls = []
+
+    def flaky_save(download, path):
+        calls.append(path)
+        if len(calls) == 1:
+            raise OSError("disk full")
+        return save_image(download, path)
+
+    monkeypatch.setattr(media_download, "_save_image", flaky_save)
+    try:
+        urls = [f"{base}/a.png", f"{base}/a-copy.png"]
+        result = download_media(urls, tmp_path, kind="image", max_workers=2, backoff=0.01)
+    finally:
+        server.shutdown()
+
+    assert len(result.paths) == 1 and len(result.failed) == 1
+    assert result.duplicates == []
+    assert not list(tmp_path.glob(".*.part"))
+    print("✅ Duplicate saved when the first copy failed")
+
+
+def test_download_videos(tmp_path):
+    """Test that videos keep their bytes and get the container's extension."""
+    mp4 = b"\x00\x00\x00\x18ftypisom" + b"\x00" * 32
+    webm = b"\x1a\x45\xdf\xa3" + b"\x00" * 32
+    server, base, _ = serve({"/clip": (200, mp4), "/clip2.mp4": (200, webm), "/page.mp4": (200, b"<!doctype html>")})
+    try:
+        result = download_media(
+            [f"{base}/clip", f"{base}/clip2.mp4", f"{base}/page.mp4"], tmp_path, kind="video", prefix="video_",
+        )
+    finally:
+        server.shutdown()
+
+    assert [path.name for path in result.paths] == ["video_000.mp4", "video_001.webm"]
+    assert result.paths[0].read_bytes() == mp4
+    assert list(result.failed) == [f"{base}/page.mp4"]
+    print("✅ Videos validated by container signature")
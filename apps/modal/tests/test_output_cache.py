@@ -0,0 +1,185 @@
+"""
+Test the content-addressed output cache.
+
+This test verifies workflow canonicalization (including model file
+changes), local/volume tier hits, LRU eviction, images-only storage,
+in-flight deduplication and the X-Cache header, without a ComfyUI server.
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add modal directory to path
+modal_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(modal_dir))
+
+from utils.output_cache import OutputCache, cached_output, setup_output_cache_endpoints, workflow_cache_key
+
+PNG = b"\x89PNG\r\n\x1a\n"
+
+
+def make_workflow(seed: int, prefix: str, image: str = "face.png") -> dict:
+    return {
+        "1": {"class_type": "LoadImage", "inputs": {"image": image}},
+        "3": {"class_type": "KSampler", "inputs": {"seed": seed, "steps": 9, "model": ["4", 0]}},
+        "4": {"class_type": "LoraLoader", "inputs": {"lora_name": "character-1.safetensors"}},
+        "9": {"class_type": "SaveImage", "inputs": {"filename_prefix": prefix, "images": ["8", 0]}},
+    }
+
+
+def make_cache(tmp_path, **kwargs) -> OutputCache:
+    input_dir = tmp_path / "input"
+    input_dir.mkdir(exist_ok=True)
+    return OutputCache(
+        local_dir=str(tmp_path / "local"),
+        volume_dir=str(tmp_path / "volume"),
+        input_dir=str(input_dir),
+        models_dir=str(tmp_path / "models"),
+        commit_volume=False,
+        **kwargs,
+    )
+
+
+def test_cache_key_canonicalization(tmp_path):
+    """Test that filename prefixes are ignored and uploads are keyed by content."""
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    (input_dir / "a1b2.png").write_bytes(b"same face")
+    (input_dir / "c3d4.png").write_bytes(b"same face")
+    (input_dir / "e5f6.png").write_bytes(b"other face")
+
+    def key(workflow, kind="first"):
+        return workflow_cache_key(workflow, kind, str(input_dir))
+
+    base = key(make_workflow(42, "z_image_0001", "a1b2.png"))
+    assert base == key(make_workflow(42, "z_image_9f3c", "c3d4.png"))
+    assert base != key(make_workflow(42, "z_image_0001", "e5f6.png"))
+    assert base != key(make_workflow(43, "z_image_0001", "a1b2.png"))
+    assert base != key(make_workflow(42, "z_image_0001", "a1b2.png"), kind="all")
+    print("✅ Cache keys ignore per-request noise")
+
+
+def test_cache_key_tracks_model_files(tmp_path):
+    """Test that retraining a LoRA under the same name changes the key."""
+    lora = tmp_path / "models" / "loras" / "character-1.safetensors"
+    lora.parent.mkdir(parents=True)
+    lora.write_bytes(b"v1")
+
+    def key():
+        return workflow_cache_key(make_workflow(42, "x"), "first", str(tmp_path), str(tmp_path / "models"))
+
+    first = key()
+    assert first == key()
+    lora.write_bytes(b"v2 retrained")
+    assert key() != first
+    print("✅ Cache keys track model file changes")
+
+
+def test_tiers_and_eviction(tmp_path):
+    """Test local hits, volume hits in a fresh container, and LRU eviction."""
+    cache = make_cache(tmp_path, local_max_bytes=25)
+    renders = []
+
+    def render(seed):
+        renders.append(seed)
+        return PNG + f"{seed:02d}".encode()  # 10 bytes
+
+    assert cache.get_or_run(make_workflow(1, "a"), lambda: render(1)) == PNG + b"01"
+    assert cache.get_or_run(make_workflow(1, "b"), lambda: render(1)) == PNG + b"01"
+    assert renders == [1]
+
+    images = cache.get_or_run(make_workflow(2, "a"), lambda: [PNG, PNG], kind="all")
+    assert cache.get_or_run(make_workflow(2, "b"), lambda: [], kind="all") == images == [PNG, PNG]
+
+    for seed in (3, 4, 5):
+        time.sleep(0.01)
+        cache.get_or_run(make_workflow(seed, "a"), lambda: render(seed))
+    assert cache.stats()["local_bytes"] <= 25
+    assert cache.stats()["evicted_bytes"] > 0
+
+    # A new container (empty local tier) finds evicted entries on the volume
+    fresh = OutputCache(
+        local_dir=str(tmp_path / "local2"), volume_dir=str(tmp_path / "volume"),
+        input_dir=str(tmp_path / "input"), models_dir=str(tmp_path / "models"), commit_volume=False,
+    )
+    assert fresh.get_or_run(make_workflow(1, "c"), lambda: render(99)) == PNG + b"01"
+    assert fresh.stats()["hits_volume"] == 1
+    assert 99 not in renders
+    print("✅ Local and volume tiers serve hits")
+
+
+def test_in_flight_requests_share_render(tmp_path):
+    """Test that an identical request waits for the running render."""
+    cache = make_cache(tmp_path)
+    started = threading.Event()
+    renders = []
+
+    def render():
+        renders.append(1)
+        started.set()
+        time.sleep(0.2)
+        return b"video"
+
+    results = []
+    first = threading.Thread(target=lambda: results.append(cache.get_or_run(make_workflow(7, "a"), render)))
+    first.start()
+    started.wait()
+    results.append(cache.get_or_run(make_workflow(7, "b"), render))
+    first.join()
+
+    assert results == [b"video", b"video"]
+    assert renders == [1]
+    assert cache.stats()["hits_in_flight"] == 1
+    print("✅ In-flight duplicates share one render")
+
+
+def test_only_images_are_stored(tmp_path):
+    """Test that video outputs and cache=False routes never reach the tiers."""
+    cache = make_cache(tmp_path)
+    mp4 = b"\x00\x00\x00\x18ftypisom"
+    assert cache.get_or_run(make_workflow(8, "a"), lambda: mp4) == mp4
+    assert cache.get_or_run(make_workflow(8, "b"), lambda: mp4 + b"!") == mp4 + b"!"
+    assert cache.stats()["stored"] == 0 and cache.stats()["skipped"] == 2
+
+    class FakeComfyUI:
+        pass
+
+    instance = FakeComfyUI()
+    instance._output_cache = cache
+    cached_output(instance, make_workflow(9, "a"), lambda: [PNG], kind="all", cache=False)
+    assert cache.stats()["misses"] == 2
+    assert not (tmp_path / "volume").exists()
+    print("✅ Only image outputs are cached")
+
+
+def test_x_cache_header(tmp_path):
+    """Test that responses report cache hits through the executor's worker threads."""
+    from fastapi import FastAPI
+    from fastapi.responses import Response
+    from fastapi.testclient import TestClient
+
+    from utils.executor import run_impl
+
+    class FakeComfyUI:
+        pass
+
+    instance = FakeComfyUI()
+    instance._output_cache = make_cache(tmp_path)
+    fastapi = FastAPI()
+    setup_output_cache_endpoints(fastapi, instance)
+
+    def impl(item):
+        image = cached_output(instance, make_workflow(item["seed"], "x"), lambda: PNG)
+        return Response(image, media_type="image/png")
+
+    @fastapi.post("/render")
+    async def render(item: dict):
+        return await run_impl(instance, impl, item)
+
+    client = TestClient(fastapi)
+    assert client.post("/render", json={"seed": 5}).headers["x-cache"] == "MISS"
+    assert client.post("/render", json={"seed": 5}).headers["x-cache"] == "HIT"
+    assert client.get("/cache/stats").json()["hit_rate"] == 0.5
+    print("✅ X-Cache header reports hits")
@@ -0,0 +1,186 @@
+"""
+Test render progress streaming.
+
+This test verifies progress fan-out to SSE subscribers, preview throttling,
+done/error events, the unknown-id deadline, cache-hit events, and streams
+and cancels served by another replica through the shared store, without a
+ComfyUI server.
+"""
+
+import asyncio
+import io
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# Add modal directory to path
+modal_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(modal_dir))
+
+import utils.progress
+from utils.progress import (
+    ProgressHub, format_sse, get_progress_hub, progress_listener, setup_progress_endpoints, track_progress,
+)
+
+
+class FakeComfyUI:
+    """Stands in for the ComfyUI container instance."""
+
+
+class FakeStore(dict):
+    """Stands in for the modal.Dict shared by an app's replicas."""
+
+    def put(self, key, value):
+        self[key] = value
+
+
+def preview_jpeg() -> bytes:
+    """Build a small JPEG like a latent2rgb preview."""
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (832, 480), (200, 30, 30)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def test_events_fan_out_to_subscribers():
+    """Test that worker-thread events reach subscribers, including late ones."""
+    instance = FakeComfyUI()
+    item = {"progress_id": "render-1"}
+
+    async def run():
+        early = get_progress_hub(instance).channel("render-1").subscribe()
+
+        def render():
+            listener = progress_listener(instance, item)
+            listener("queued", {"prompt_id": "p1"})
+            listener("executing", {"node": "5"})
+            for step in (1, 2):
+                listener("progress", {"node": "5", "value": step, "max": 2})
+            listener("preview", {"image": preview_jpeg(), "format": "jpeg"})
+            listener("preview", {"image": preview_jpeg(), "format": "jpeg"})  # throttled
+
+        thread = threading.Thread(target=render)
+        thread.start()
+        thread.join()
+        with track_progress(instance, item):
+            pass
+
+        events = []
+        while True:
+            event = await asyncio.wait_for(early.get(), timeout=1)
+            events.append(event)
+            if event["type"] == "done":
+                break
+
+        late = get_progress_hub(instance).channel("render-1").subscribe()
+        return events, [late.get_nowait() for _ in range(late.qsize())]
+
+    events, replayed = asyncio.run(run())
+
+    assert [e["type"] for e in events] == ["queued", "executing", "progress", "progress", "preview", "done"]
+    assert events[3]["value"] == 2
+    assert events[4]["image"].startswith("data:image/jpeg;base64,")
+    assert [e["type"] for e in replayed] == ["queued", "executing", "progress", "progress", "done", "preview"]
+    assert get_progress_hub(instance).get("render-1").prompt_id == "p1"
+    print("✅ Progress fanned out and replayed")
+
+
+def test_errors_and_opt_out():
+    """Test that failures publish an error event and requests without progress_id are untouched."""
+    instance = FakeComfyUI()
+    assert progress_listener(instance, {"prompt": "a cat"}) is None
+
+    item = {"progress_id": "render-2"}
+    with pytest.raises(ValueError):
+        with track_progress(instance, item):
+            raise ValueError("prompt is required")
+
+    channel = get_progress_hub(instance).get("render-2")
+    assert channel.finished
+    assert channel._history[-1] == {"type": "error", "error": "prompt is required"}
+    assert format_sse({"type": "done"}) == 'event: done\ndata: {"type": "done"}\n\n'
+    print("✅ Errors reported to progress subscribers")
+
+
+def test_unknown_id_and_cache_hits(tmp_path, monkeypatch):
+    """Test that streams for renders on other replicas end, and cache hits can't be cancelled."""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from utils.output_cache import OutputCache, cached_output
+
+    monkeypatch.setattr(utils.progress, "UNKNOWN_ID_SECONDS", 0.1)
+    monkeypatch.setattr(utils.progress, "KEEPALIVE_SECONDS", 0.05)
+    instance = FakeComfyUI()
+    fastapi = FastAPI()
+    setup_progress_endpoints(fastapi, instance)
+    client = TestClient(fastapi)
+
+    stream = client.get("/progress/elsewhere").text
+    assert "event: unknown" in stream
+    assert get_progress_hub(instance).get("elsewhere") is None
+
+    instance._output_cache = OutputCache(
+        local_dir=str(tmp_path / "local"), volume_dir=None, input_dir=str(tmp_path), models_dir=str(tmp_path),
+    )
+    workflow = {"1": {"class_type": "SaveImage", "inputs": {"filename_prefix": "x"}}}
+    png = b"\x89PNG\r\n\x1a\n"
+    cached_output(instance, workflow, lambda: png)
+
+    item = {"progress_id": "render-3"}
+    assert cached_output(instance, workflow, lambda: b"", on_event=progress_listener(instance, item)) == png
+    channel = get_progress_hub(instance).get("render-3")
+    assert channel._history == [{"type": "cached", "source": "cache"}]
+    assert client.post("/progress/render-3/cancel").status_code == 409
+    assert client.post("/progress/never-seen/cancel").status_code == 404
+    print("✅ Unknown progress IDs and cache hits reported")
+
+
+def test_stream_and_cancel_on_another_replica(monkeypatch):
+    """Test that a render on one replica is streamed and cancelled through another."""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from utils.cancellation import CancelToken, cancel_scope
+
+    monkeypatch.setattr(utils.progress, "SHARED_POLL_SECONDS", 0.02)
+    store = FakeStore()
+    render_replica, stream_replica = FakeComfyUI(), FakeComfyUI()
+    render_replica._progress_hub = ProgressHub(store=store)
+    stream_replica._progress_hub = ProgressHub(store=store)
+    fastapi = FastAPI()
+    setup_progress_endpoints(fastapi, stream_replica)
+    client = TestClient(fastapi)
+
+    item = {"progress_id": "render-4"}
+    token = CancelToken()
+    with cancel_scope(token):
+        listener = progress_listener(render_replica, item)
+        listener("queued", {"prompt_id": "p4"})
+        listener("progress", {"node": "5", "value": 1, "max": 2})
+
+    def wait_for(condition):
+        for _ in range(200):
+            if condition():
+                return True
+            time.sleep(0.01)
+        return False
+
+    assert wait_for(lambda: len(store.get("render-4", {}).get("events", [])) == 2)
+    assert client.get("/progress/render-4/status").json()["prompt_id"] == "p4"
+
+    assert client.post("/progress/render-4/cancel").json()["cancelled"] is True
+    assert wait_for(lambda: token.cancelled)
+
+    with track_progress(render_replica, item):
+        pass
+    stream = client.get("/progress/render-4").text
+    assert [line.split(": ")[1] for line in stream.splitlines() if line.startswith("event:")] == [
+        "queued", "progress", "done",
+    ]
+    assert client.post("/progress/render-4/cancel").status_code == 409
+    print("✅ Progress streamed and cancelled across replicas")
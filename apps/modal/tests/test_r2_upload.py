@@ -0,0 +1,170 @@
+"""
+Test the R2 uploader for trained LoRAs.
+
+This test verifies background checkpoint uploads (only finished checkpoint
+dirs, never an earlier job's), that the final upload drops queued
+checkpoints and that closing aborts running ones, using an in-memory client. With R2_TEST_ENDPOINT_URL set (e.g.
+a local MinIO) it also round-trips a multipart upload:
+
+    docker run -p 9000:9000 minio/minio server /data
+    R2_TEST_ENDPOINT_URL=http://localhost:9000 pytest tests/test_r2_upload.py
+"""
+
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# Add lora-training app directory to path
+training_dir = Path(__file__).parent.parent / "apps" / "lora-training"
+sys.path.insert(0, str(training_dir))
+
+from r2_upload import R2Uploader
+
+
+class FakeS3Client:
+    """Records upload_file calls; optionally blocks (as an open multipart upload) until released."""
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}  # upload id -> (bucket, key) of uploads in progress
+        self.release = threading.Event()
+        self.release.set()
+
+    def upload_file(self, filename, bucket, key, ExtraArgs=None, Config=None):
+        upload_id = f"upload-{len(self.objects) + len(self.uploads)}-{key}"
+        self.uploads[upload_id] = (bucket, key)
+        deadline = time.monotonic() + 5
+        while not self.release.wait(0.01) and time.monotonic() < deadline:
+            if upload_id not in self.uploads:
+                raise RuntimeError("NoSuchUpload")
+        self.uploads.pop(upload_id, None)
+        self.objects[(bucket, key)] = Path(filename).read_bytes()
+
+    def list_multipart_uploads(self, Bucket, Prefix):
+        return {"Uploads": [
+            {"Key": key, "UploadId": upload_id}
+            for upload_id, (bucket, key) in list(self.uploads.items())
+            if bucket == Bucket and key.startswith(Prefix)
+        ]}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId, None)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_checkpoint_uploads(tmp_path):
+    """Test that finished checkpoint dirs upload in the background."""
+    old = tmp_path / "checkpoint-50"
+    old.mkdir()
+    (old / "adapter_model.safetensors").write_bytes(b"old job")
+    os.utime(old / "adapter_model.safetensors", (time.time() - 3600, time.time() - 3600))
+
+    client = FakeS3Client()
+    uploader = R2Uploader(client=client, bucket="test", public_url="https://cdn.example")
+    uploader.watch_checkpoints(tmp_path, "loras/job", poll_seconds=0.05)
+
+    checkpoint = tmp_path / "checkpoint-100"
+    checkpoint.mkdir()
+    (checkpoint / "adapter_model.safetensors").write_bytes(b"step 100")
+    assert wait_for(lambda: ("test", "loras/job/checkpoint-100/adapter_model.safetensors") in client.objects)
+    uploader.close(wait=True)
+
+    assert not any("checkpoint-50" in key for _, key in client.objects)
+    assert uploader.stats()["checkpoints_uploaded"] == 1
+    print("✅ Checkpoints uploaded in the background")
+
+
+def test_final_upload_drops_queued_checkpoints(tmp_path):
+    """Test that the final LoRA does not wait behind checkpoint uploads."""
+    client = FakeS3Client()
+    uploader = R2Uploader(client=client, bucket="test", public_url="", max_workers=1)
+    uploader._watch_started = time.time() - 1
+    for step in (100, 200):
+        checkpoint = tmp_path / f"checkpoint-{step}"
+        checkpoint.mkdir()
+        (checkpoint / "adapter_model.safetensors").write_bytes(b"x")
+
+    client.release.clear()  # first checkpoint upload blocks the single worker
+    uploader.scan_checkpoints(tmp_path, "loras/job")
+    uploader.scan_checkpoints(tmp_path, "loras/job")
+    assert len(uploader.checkpoint_futures) == 2
+
+    final = tmp_path / "final.safetensors"
+    final.write_bytes(b"final")
+    future = uploader.upload_final(final, "loras/job.safetensors")
+    client.release.set()
+    assert future.result(timeout=5) == ("loras/job.safetensors", None)
+    assert uploader.checkpoint_futures["checkpoint-200"].cancelled()
+    uploader.close()
+    print("✅ Final upload ahead of queued checkpoints")
+
+
+def test_close_aborts_running_checkpoints(tmp_path):
+    """Test that close() without wait aborts running checkpoint uploads instead of abandoning them."""
+    client = FakeS3Client()
+    uploader = R2Uploader(client=client, bucket="test", public_url="", max_workers=1)
+    uploader._watch_started = time.time() - 1
+    for step in (100, 200):
+        checkpoint = tmp_path / f"checkpoint-{step}"
+        checkpoint.mkdir()
+        (checkpoint / "adapter_model.safetensors").write_bytes(b"x")
+
+    client.release.clear()  # checkpoint-100 stays mid-upload
+    uploader.scan_checkpoints(tmp_path, "loras/job")
+    uploader.scan_checkpoints(tmp_path, "loras/job")
+    assert wait_for(lambda: len(client.uploads) == 1)
+
+    start = time.monotonic()
+    uploader.close()
+    assert time.monotonic() - start < 2
+    assert client.uploads == {} and client.objects == {}
+    assert uploader.checkpoint_futures["checkpoint-100"].done()
+    assert uploader.checkpoint_futures["checkpoint-200"].cancelled()
+    assert uploader.stats()["failed"] == 1
+    print("✅ Running checkpoint uploads aborted on close")
+
+
+def test_multipart_round_trip(tmp_path, monkeypatch):
+    """Test a multipart upload against an S3-compatible store (MinIO)."""
+    endpoint = os.environ.get("R2_TEST_ENDPOINT_URL")
+    if not endpoint:
+        pytest.skip("R2_TEST_ENDPOINT_URL not set")
+    pytest.importorskip("boto3")
+    import r2_upload
+
+    monkeypatch.setattr(r2_upload, "_client", None)
+    monkeypatch.setenv("R2_ENDPOINT_URL", endpoint)
+    monkeypatch.setenv("R2_REGION", "us-east-1")
+    monkeypatch.setenv("CLOUDFLARE_R2_ACCESS_KEY_ID", os.environ.get("R2_TEST_ACCESS_KEY", "minioadmin"))
+    monkeypatch.setenv("CLOUDFLARE_R2_SECRET_ACCESS_KEY", os.environ.get("R2_TEST_SECRET_KEY", "minioadmin"))
+    monkeypatch.setattr(r2_upload, "MULTIPART_THRESHOLD", 5 * 1024 * 1024)
+    monkeypatch.setattr(r2_upload, "MULTIPART_CHUNKSIZE", 5 * 1024 * 1024)
+
+    bucket = "ryla-upload-test"
+    client = r2_upload.get_r2_client()
+    try:
+        client.create_bucket(Bucket=bucket)
+    except client.exceptions.BucketAlreadyOwnedByYou:
+        pass
+
+    payload = os.urandom(12 * 1024 * 1024)  # three parts
+    lora = tmp_path / "lora.safetensors"
+    lora.write_bytes(payload)
+    uploader = R2Uploader(bucket=bucket, public_url="")
+    assert uploader.upload_final(lora, "loras/test.safetensors").result()[0] == "loras/test.safetensors"
+    uploader.close()
+
+    head = client.head_object(Bucket=bucket, Key="loras/test.safetensors")
+    assert head["ContentLength"] == len(payload)
+    assert head["ETag"].strip('"').endswith("-3")  # multipart
+    print("✅ Multipart upload round trip")
@@ -0,0 +1,91 @@
+"""
+Test model residency tracking.
+
+This test verifies hit/miss accounting, eviction order and that a model
+switch waits for the busy family to finish.
+"""
+
+import sys
+import asyncio
+from pathlib import Path
+
+# Add modal directory to path
+modal_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(modal_dir))
+
+from utils.residency import ModelResidency
+
+SIZES = {"flux-dev": 30.0, "z-image": 20.0, "wan2": 10.0}
+
+
+def test_hits_and_misses():
+    """Test that repeat requests hit and evicted families come back from RAM."""
+    residency = ModelResidency(SIZES, vram_budget_gb=40.0, max_wait_seconds=0)
+
+    async def main():
+        sources = []
+        for family in ["flux-dev", "flux-dev", "z-image", "flux-dev"]:
+            async with residency.track(family) as source:
+                sources.append(source)
+        return sources
+
+    sources = asyncio.run(main())
+
+    assert sources == ["cold", "vram", "cold", "ram"]
+    stats = residency.stats()["families"]
+    assert stats["flux-dev"]["hits"] == 1
+    assert stats["flux-dev"]["misses_from_ram"] == 1
+    assert stats["z-image"]["evictions"] == 1
+    print("✅ Hits, misses and RAM residency tracked")
+
+
+def test_pinned_evicted_last():
+    """Test that the most-requested family is not the first eviction victim."""
+    residency = ModelResidency(SIZES, vram_budget_gb=50.0, max_wait_seconds=0)
+
+    async def main():
+        for family in ["flux-dev", "flux-dev", "flux-dev", "wan2", "z-image"]:
+            async with residency.track(family):
+                pass
+
+    asyncio.run(main())
+
+    stats = residency.stats()
+    assert "flux-dev" in stats["vram_resident"]
+    assert stats["families"]["flux-dev"]["pinned"]
+    assert stats["families"]["wan2"]["state"] == "ram"
+    assert stats["estimated"] and stats["vram_estimated_gb"] <= 50.0
+    print("✅ Pinned family evicted last")
+
+
+def test_switch_waits_for_busy_family():
+    """Test that a request needing eviction waits for in-flight requests."""
+    residency = ModelResidency(SIZES, vram_budget_gb=40.0, max_wait_seconds=5)
+    order = []
+
+    async def run(family, hold):
+        async with residency.track(family):
+            order.append(f"start {family}")
+            await asyncio.sleep(hold)
+            order.append(f"end {family}")
+
+    async def main():
+        first = asyncio.create_task(run("flux-dev", 0.1))
+        await asyncio.sleep(0.01)
+        await asyncio.gather(first, run("z-image", 0))
+
+    asyncio.run(main())
+
+    assert order == ["start flux-dev", "end flux-dev", "start z-image", "end z-image"]
+    assert residency.stats()["families"]["z-image"]["delayed"] == 1
+    print("✅ Model switch delayed until busy family drained")
+
+
+if __name__ == "__main__":
+    print("Running residency tests...\n")
+
+    test_hits_and_misses()
+    test_pinned_evicted_last()
+    test_switch_waits_for_busy_family()
+
+    print("\n✅ All residency tests passed!")
@@ -0,0 +1,68 @@
+"""
+Test container startup helpers.
+
+This test verifies phase timing and that a failed pre-warm does not raise.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+# Add modal directory to path
+modal_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(modal_dir))
+
+from utils.startup import StartupTimer, prewarm_models
+
+
+def test_phase_timing():
+    """Test that phases are recorded and summed."""
+    timer = StartupTimer("test")
+    with timer.phase("launch_server"):
+        time.sleep(0.05)
+    with timer.phase("prewarm_models"):
+        pass
+    timer.mark_snapshot()
+    timer.mark_restored()
+
+    summary = timer.summary()
+    assert list(summary["phases"]) == ["launch_server", "prewarm_models"]
+    assert summary["phases"]["launch_server"] >= 0.05
+    assert summary["total_sec"] == round(sum(summary["phases"].values()), 3)
+    assert summary["snapshot_age_sec"] >= 0
+    print("✅ Startup phases timed")
+
+
+def test_prewarm_failure_is_logged():
+    """Test that a failing warmup workflow returns False instead of raising."""
+    import utils.comfyui
+
+    class MockComfyUI:
+        port = 8000
+
+        def infer_workflow(self, workflow):
+            raise AssertionError("pre-warm must bypass the output cache")
+
+    calls = []
+
+    def execute(workflow, port):
+        calls.append(port)
+        raise Exception("model not found")
+
+    original = utils.comfyui.execute_workflow_via_api
+    utils.comfyui.execute_workflow_via_api = execute
+    try:
+        assert prewarm_models(MockComfyUI(), {}) is False
+    finally:
+        utils.comfyui.execute_workflow_via_api = original
+    assert calls == [8000]
+    print("✅ Pre-warm failure does not stop startup")
+
+
+if __name__ == "__main__":
+    print("Running startup tests...\n")
+
+    test_phase_timing()
+    test_prewarm_failure_is_logged()
+
+    print("\n✅ All startup tests passed!")
@@ -0,0 +1,128 @@
+"""
+Test video frame pipes.
+
+This test verifies raw frame reading, batching and multi-frame packing used
+by the batched video face swap, and that chatty stderr cannot stall a
+pipe, without ffmpeg or a ComfyUI server.
+"""
+
+import io
+import subprocess
+import sys
+from pathlib import Path
+
+# Add modal directory to path
+modal_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(modal_dir))
+
+from utils.video_frames import (
+    StderrTail,
+    build_decode_command,
+    build_encode_command,
+    iter_batches,
+    pack_frames,
+    parse_frame_batch_size,
+    read_frames,
+    unpack_frame,
+)
+
+
+def solid_frame(width: int, height: int, value: int) -> bytes:
+    """Build a raw RGB frame filled with one value."""
+    return bytes([value]) * (width * height * 3)
+
+
+def test_read_frames_and_batches():
+    """Test that a raw stream splits into frames and batches in order."""
+    frames = [solid_frame(4, 2, value) for value in range(5)]
+    # Trailing partial frame (ffmpeg killed mid-write) is dropped
+    stream = io.BytesIO(b"".join(frames) + b"\x00" * 7)
+
+    decoded = list(read_frames(stream, 4, 2))
+    assert decoded == frames
+
+    batches = list(iter_batches(decoded, 2))
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert batches[2][0] == frames[4]
+    print("✅ Raw frames read and batched in order")
+
+
+def test_pack_frames_round_trip():
+    """Test that a batch packs into one multi-frame image LoadImage can split."""
+    from PIL import Image, ImageSequence
+
+    frames = [solid_frame(8, 6, value) for value in (10, 120, 250)]
+    packed = Image.open(io.BytesIO(pack_frames(frames, 8, 6)))
+    unpacked = [frame.convert("RGB").tobytes() for frame in ImageSequence.Iterator(packed)]
+    assert unpacked == frames
+
+    # Output PNGs come back as raw frames of the video size
+    png = io.BytesIO()
+    Image.frombytes("RGB", (8, 6), frames[1]).save(png, format="PNG")
+    assert unpack_frame(png.getvalue(), 8, 6) == frames[1]
+    assert len(unpack_frame(png.getvalue(), 4, 4)) == 4 * 4 * 3
+    print("✅ Frame batch packed into one multi-frame image")
+
+
+def test_ffmpeg_commands_use_pipes():
+    """Test that decode/encode commands stream raw frames over stdout/stdin."""
+    decode = build_decode_command("/tmp/in.mp4", 24)
+    assert decode[-1] == "pipe:1"
+    assert "rawvideo" in decode and "fps=24" in decode
+
+    encode = build_encode_command("/tmp/out.mp4", 1280, 720, 24, audio_source="/tmp/in.mp4")
+    assert encode[encode.index("-s") + 1] == "1280x720"
+    assert "pipe:0" in encode and "1:a:0?" in encode
+    assert encode[-1] == "/tmp/out.mp4"
+    assert "-map" not in build_encode_command("/tmp/out.mp4", 1280, 720, 24)
+    print("✅ ffmpeg commands pipe raw frames")
+
+
+
+def test_stderr_is_drained_while_running():
+    """Test that a process writing more than a pipe buffer to stderr does not block."""
+    script = (
+        "import sys\n"
+        "sys.stderr.write('progress line\\n' * 20000)\n"
+        "sys.stderr.write('fatal: bad input')\n"
+        "sys.stdout.write(sys.stdin.read())\n"
+        "sys.exit(1)\n"
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-c", script], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    stderr = StderrTail(process.stderr, max_bytes=1024)
+    process.stdin.write(b"frames")
+    process.stdin.close()
+    assert process.stdout.read() == b"frames"  # blocks forever if stderr is not drained
+    assert process.wait(timeout=10) == 1
+    process.stdout.close()
+    assert stderr.text().endswith("fatal: bad input")
+    assert len(stderr._tail) <= 1024
+    stderr.close()
+    print("✅ ffmpeg stderr drained into a bounded tail")
+
+
+def test_parse_frame_batch_size():
+    """Test batch_size parsing and the 1-64 range."""
+    assert parse_frame_batch_size({}) == 16
+    assert parse_frame_batch_size({"batch_size": 8}) == 8
+    assert parse_frame_batch_size({"batch_size": "4"}) == 4
+    for bad in (0, 65, -1, 2.5, "abc", None, True, [2]):
+        try:
+            parse_frame_batch_size({"batch_size": bad})
+        except ValueError:
+            continue
+        raise AssertionError(f"batch_size={bad!r} was accepted")
+    print("✅ parse_frame_batch_size works")
+
+if __name__ == "__main__":
+    print("Running video frame tests...\n")
+
+    test_read_frames_and_batches()
+    test_pack_frames_round_trip()
+    test_ffmpeg_commands_use_pipes()
+    test_stderr_is_drained_while_running()
+    test_parse_frame_batch_size()
+
+    print("\n✅ All video frame tests passed!")
@@ -0,0 +1,120 @@
+"""
+Test streaming video ingest and egress.
+
+This test verifies chunked base64 decode to disk, upload copies, multipart
+field types and streamed file responses without a ComfyUI server.
+"""
+
+import base64
+import io
+import os
+import sys
+from pathlib import Path
+
+# Add modal directory to path
+modal_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(modal_dir))
+
+import utils.video_io as video_io
+from utils.video_io import parse_data_url, read_video_request, save_video_to_input, stream_file_response
+
+
+def test_base64_decoded_in_chunks(tmp_path, monkeypatch):
+    """Test that data URLs decode to disk chunk by chunk."""
+    monkeypatch.setattr(video_io, "BASE64_CHUNK_CHARS", 8)
+    video_bytes = os.urandom(1000)
+    data_url = "data:video/webm;base64," + base64.b64encode(video_bytes).decode()
+
+    assert parse_data_url(data_url) == ("video/webm", len("data:video/webm;base64,"))
+
+    filename = save_video_to_input(data_url, input_dir=str(tmp_path))
+    assert filename.endswith(".webm")
+    assert (tmp_path / filename).read_bytes() == video_bytes
+
+    # Line-wrapped payloads fall back to a single decode
+    wrapped = base64.encodebytes(video_bytes).decode()
+    filename = save_video_to_input(wrapped, input_dir=str(tmp_path))
+    assert filename.endswith(".mp4")
+    assert (tmp_path / filename).read_bytes() == video_bytes
+    print("✅ Base64 video decoded to disk in chunks")
+
+
+def test_upload_copied_to_input(tmp_path):
+    """Test that multipart uploads are copied to the input folder."""
+
+    class Upload:
+        filename = "clip.mov"
+        content_type = "application/octet-stream"
+        file = io.BytesIO(b"movie-bytes")
+
+    filename = save_video_to_input(Upload(), input_dir=str(tmp_path))
+    assert filename.endswith(".mov")
+    assert (tmp_path / filename).read_bytes() == b"movie-bytes"
+    print("✅ Uploaded video copied to input folder")
+
+
+def test_multipart_text_fields_keep_types():
+    """Test that only known numeric/boolean form fields are JSON-decoded."""
+    import asyncio
+    from starlette.datastructures import FormData, UploadFile
+
+    upload = UploadFile(io.BytesIO(b"bytes"), filename="clip.mp4")
+    form = FormData([
+        ("prompt", "123"),
+        ("negative_prompt", '"quoted"'),
+        ("trigger_word", "null"),
+        ("lora_id", "[1, 2]"),
+        ("seed", "42"),
+        ("cfg", "6.5"),
+        ("restore_face", "false"),
+        ("fps", "abc"),
+        ("width", "null"),
+        ("source_video", upload),
+    ])
+
+    class Request:
+        headers = {"content-type": "multipart/form-data; boundary=x"}
+
+        async def form(self):
+            return form
+
+    item = asyncio.run(read_video_request(Request()))
+    assert item["prompt"] == "123"
+    assert item["negative_prompt"] == '"quoted"'
+    assert item["trigger_word"] == "null"
+    assert item["lora_id"] == "[1, 2]"
+    assert item["seed"] == 42 and type(item["seed"]) is int
+    assert item["cfg"] == 6.5
+    assert item["restore_face"] is False
+    assert item["fps"] == "abc"
+    assert item["width"] == "null"
+    assert item["source_video"] is upload
+    print("✅ Multipart text fields keep their types")
+
+
+def test_stream_file_response_cleans_up(tmp_path):
+    """Test that streamed outputs are sent in full and deleted afterwards."""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    output_dir = tmp_path / "job"
+    output_dir.mkdir()
+    output_path = output_dir / "output.mp4"
+    output_path.write_bytes(b"x" * (3 * 1024 * 1024 + 5))
+
+    app = FastAPI()
+
+    @app.get("/video")
+    def video():
+        response = stream_file_response(str(output_path), "video/mp4", cleanup=[str(output_dir)])
+        response.headers["X-Model"] = "test"
+        return response
+
+    response = TestClient(app).get("/video")
+    assert response.status_code == 200
+    assert response.headers["content-length"] == str(3 * 1024 * 1024 + 5)
+    assert response.headers["x-model"] == "test"
+    assert len(response.content) == 3 * 1024 * 1024 + 5
+    assert not output_dir.exists()
+    print("✅ Output streamed and cleaned up")
+
@@ -12,10 +12,11 @@ import json
 modal_dir = Path(__file__).parent.parent
 sys.path.insert(0, str(modal_dir))
 
-from handlers.flux import build_flux_workflow, build_flux_dev_workflow
+from handlers.flux import build_flux_workflow, build_flux_dev_workflow, build_flux_dev_lora_workflow
 from handlers.instantid import build_flux_instantid_workflow
 from handlers.lora import build_flux_lora_workflow
 from handlers.wan2 import build_wan2_workflow
+from utils.lora_stack import resolve_lora_stack
 
 
 def test_flux_workflow():
@@ -78,6 +79,71 @@ def test_flux_dev_workflow():
     print("✅ Flux Dev workflow builder works")
 
 
+def test_flux_dev_lora_stack():
+    """Test that stacked LoRAs are chained after the character LoRA."""
+    item = {
+        "prompt": "A portrait",
+        "trigger_word": "ohwx",
+        "lora_stack": [{"name": "flux-realism-lora", "strength": 0.6, "trigger_word": "realistic"}],
+    }
+    stack = resolve_lora_stack(item, base_model="flux")
+    assert stack == [("flux-realism-lora.safetensors", 0.6, "realistic")]
+    
+    workflow = build_flux_dev_lora_workflow(item, "character-1.safetensors", stack)
+    assert workflow["10"]["inputs"]["lora_name"] == "character-1.safetensors"
+    assert workflow["11"]["inputs"]["model"] == ["10", 0]
+    assert workflow["11"]["inputs"]["strength_model"] == 0.6
+    assert workflow["4"]["inputs"]["clip"] == ["11", 1]
+    assert workflow["7"]["inputs"]["model"] == ["11", 0]
+    assert workflow["4"]["inputs"]["text"] == "realistic ohwx A portrait"
+    
+    # Without a stack the single-LoRA workflow is unchanged
+    single = build_flux_dev_lora_workflow(item, "character-1.safetensors")
+    assert "11" not in single and single["7"]["inputs"]["model"] == ["10", 0]
+    print("✅ Flux Dev LoRA stack chained")
+
+
+def test_resolve_catalog_lora_stack():
+    """Test catalog ids, style presets, base model checks and explicit entry validation."""
+    stack = resolve_lora_stack({"lora_stack": ["realistic-snapshot-zit"], "style": "cinematic"}, base_model="zit")
+    assert [name for name, _, _ in stack] == ["realistic-snapshot-zit.safetensors", "cinematic-kodak.safetensors"]
+    assert resolve_lora_stack({}) == []
+    assert resolve_lora_stack({"lora_stack": [{"name": "mine", "strength": "-0.5"}]}) == [("mine.safetensors", -0.5, None)]
+    
+    for item, base_model in [
+        ({"lora_stack": ["realistic-snapshot-zit"]}, "flux"),
+        ({"lora_stack": ["no-such-lora"]}, "zit"),
+        ({"lora_stack": [{"strength": 1.0}]}, "zit"),
+        ({"lora_stack": [{"name": "x", "strength": [1]}]}, "zit"),
+        ({"lora_stack": [{"name": "x", "strength": "strong"}]}, "zit"),
+        ({"lora_stack": [{"name": "x", "strength": 5}]}, "zit"),
+        ({"lora_stack": [{"name": "x", "strength": "nan"}]}, "zit"),
+        ({"lora_stack": [{"name": "../checkpoints/x"}]}, "zit"),
+        ({"lora_stack": [{"name": "sub/x"}]}, "zit"),
+        ({"lora_stack": [{"name": "sub\\x"}]}, "zit"),
+    ]:
+        try:
+            resolve_lora_stack(item, base_model=base_model)
+        except ValueError:
+            continue
+        raise AssertionError(f"{item} should be rejected")
+    print("✅ Catalog LoRA stacks resolved and validated")
+
+
+def test_num_images_batch_size():
+    """Test num_images sets the latent batch size."""
+    item = {
+        "prompt": "A beautiful landscape",
+        "num_images": 3,
+    }
+    
+    assert build_flux_workflow(item)["3"]["inputs"]["batch_size"] == 3
+    assert build_flux_dev_workflow(item)["6"]["inputs"]["batch_size"] == 3
+    assert build_flux_dev_workflow({"prompt": "Test"})["6"]["inputs"]["batch_size"] == 1
+    
+    print("✅ num_images maps to latent batch size")
+
+
 def test_wan2_workflow():
     """Test Wan2.1 workflow builder."""
     item = {
@@ -140,6 +206,9 @@ if __name__ == "__main__":
     
     test_flux_workflow()
     test_flux_dev_workflow()
+    test_flux_dev_lora_stack()
+    test_resolve_catalog_lora_stack()
+    test_num_images_batch_size()
     test_wan2_workflow()
     test_workflow_json_valid()
     
@@ -0,0 +1,143 @@
+"""
+Request cancellation for ComfyUI renders.
+
+Every request gets a ``CancelToken``, held in a context variable so it
+follows the request from the route into the executor's worker thread and
+down to ``execute_workflow_via_api``. The token is cancelled when the
+client disconnects, when an async job is deleted (``DELETE /jobs/{id}``) or
+on ``POST /progress/{id}/cancel``. The worker thread waiting on the prompt
+then removes it from ComfyUI's queue (or interrupts it if it is already
+running) and raises ``RequestCancelled``, so the GPU is free for the next
+request instead of finishing a render nobody will receive.
+"""
+
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# How often a waiting worker thread checks its token
+CANCEL_POLL_SECONDS = 1.0
+
+
+class RequestCancelled(Exception):
+    """Raised in the worker thread when its request was cancelled."""
+
+
+class CancelToken:
+    """Thread-safe cancellation flag for one request."""
+
+    def __init__(self):
+        self.reason: Optional[str] = None
+        self.cancelled_at: Optional[float] = None
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> bool:
+        """
+        Cancel the request (safe to call from the event loop; never blocks).
+
+        Returns:
+            True if this call cancelled it, False if it was already cancelled
+        """
+        if self._event.is_set():
+            return False
+        self.reason = reason
+        self.cancelled_at = time.time()
+        self._event.set()
+        print(f"🛑 Request cancelled: {reason}")
+        return True
+
+    def raise_if_cancelled(self):
+        """Raise RequestCancelled if the request was cancelled."""
+        if self._event.is_set():
+            raise RequestCancelled(f"Request cancelled: {self.reason}")
+
+
+_current_token: ContextVar[Optional[CancelToken]] = ContextVar("cancel_token", default=None)
+
+
+def current_cancel_token() -> Optional[CancelToken]:
+    """Get the cancel token of the request being served (None outside a request)."""
+    return _current_token.get()
+
+
+@contextmanager
+def cancel_scope(token: Optional[CancelToken]):
+    """
+    Run a block under a different cancel token.
+
+    ``cancel_scope(None)`` shields work shared by several requests (e.g. a
+    micro-batched prompt) from the cancellation of the request running it.
+    """
+    reset = _current_token.set(token)
+    try:
+        yield
+    finally:
+        _current_token.reset(reset)
+
+
+class CancelOnDisconnectMiddleware:
+    """
+    ASGI middleware that gives each request a token and cancels it on disconnect.
+
+    Once the request body has been read, the connection is watched for
+    ``http.disconnect``. A disconnect after the response has started is a
+    normal end of the request and does not cancel anything.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = CancelToken()
+        disconnected = asyncio.Event()
+        response_started = False
+        watcher: Optional[asyncio.Task] = None
+
+        def on_disconnect():
+            disconnected.set()
+            if not response_started:
+                token.cancel("client disconnected")
+
+        async def watch():
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    on_disconnect()
+                    return
+
+        async def receive_wrapper():
+            nonlocal watcher
+            if watcher is not None:
+                # The watcher owns receive() now; hand out its result
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request" and not message.get("more_body", False):
+                watcher = asyncio.create_task(watch())
+            elif message["type"] == "http.disconnect":
+                on_disconnect()
+            return message
+
+        async def send_wrapper(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        with cancel_scope(token):
+            try:
+                await self.app(scope, receive_wrapper, send_wrapper)
+            finally:
+                if watcher is not None:
+                    watcher.cancel()
@@ -11,17 +11,25 @@ import requests
 import urllib.request
 import urllib.error
 import socket
+import threading
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Callable, Optional, Dict
 
+# /object_info per port, fetched once the server is ready and kept for the
+# container's lifetime (node classes cannot change without a restart)
+_object_info_cache: Dict[int, dict] = {}
+_object_info_lock = threading.Lock()
 
-def launch_comfy_server(port: int = 8000, timeout: int = 60) -> None:
+
+def launch_comfy_server(port: int = 8000, timeout: int = 60, preview_method: Optional[str] = None) -> None:
     """
     Launch ComfyUI server in background.
     
     Args:
         port: Port number for ComfyUI server (default: 8000)
         timeout: Timeout in seconds for server startup (default: 60)
+        preview_method: Sampler preview method sent over /ws (e.g. "latent2rgb");
+            None keeps ComfyUI's default (no previews)
     """
     import os
     from pathlib import Path
@@ -57,7 +65,8 @@ def launch_comfy_server(port: int = 8000, timeout: int = 60) -> None:
     
     # Launch ComfyUI with output capture
     print(f"🚀 Launching ComfyUI server on port {port}...")
-    cmd = f"cd {comfy_dir} && comfy launch --background -- --port {port} 2>&1 | tee /tmp/comfyui_startup.log"
+    extra_args = f" --preview-method {preview_method}" if preview_method else ""
+    cmd = f"cd {comfy_dir} && comfy launch --background -- --port {port}{extra_args} 2>&1 | tee /tmp/comfyui_startup.log"
     result = subprocess.run(cmd, shell=True, check=False, capture_output=True, text=True)
     
     if result.returncode != 0:
@@ -67,9 +76,9 @@ def launch_comfy_server(port: int = 8000, timeout: int = 60) -> None:
     else:
         print(f"✅ ComfyUI server launch command executed")
     
-    # Wait for server to be ready
-    if not check_comfy_health(port, timeout):
-        print(f"⚠️  ComfyUI server health check failed, but continuing...")
+    # Gate on real readiness: the HTTP server only starts once custom nodes are imported
+    if not wait_for_comfy_ready(port, timeout):
+        print(f"⚠️  ComfyUI server readiness check failed, but continuing...")
         # Try to read startup log if available
         startup_log = Path("/tmp/comfyui_startup.log")
         if startup_log.exists():
@@ -80,33 +89,25 @@ def launch_comfy_server(port: int = 8000, timeout: int = 60) -> None:
                     if "error" in line.lower() or "exception" in line.lower() or "traceback" in line.lower():
                         print(f"      {line[:200]}")
     else:
-        # Server is healthy, check loaded nodes
-        print(f"✅ ComfyUI server is healthy")
-        try:
-            import requests
-            response = requests.get(f"http://127.0.0.1:{port}/object_info", timeout=5)
-            if response.status_code == 200:
-                object_info = response.json()
-                node_count = len(object_info)
-                print(f"   📊 ComfyUI loaded {node_count} node types")
-                
-                # Check for InstantID nodes
-                instantid_nodes = ["InsightFaceLoader", "InstantIDModelLoader", "InstantIDControlNetLoader", "ApplyInstantID"]
-                found_nodes = [node for node in instantid_nodes if node in object_info]
-                if found_nodes:
-                    print(f"   ✅ Found InstantID nodes: {', '.join(found_nodes)}")
-                else:
-                    print(f"   ❌ InstantID nodes not found in loaded nodes")
-                
-                # Check for SeedVR2 nodes
-                seedvr2_nodes = ["SeedVR2VideoUpscaler", "SeedVR2LoadDiTModel", "SeedVR2LoadVAEModel"]
-                found_seedvr2 = [node for node in seedvr2_nodes if node in object_info]
-                if found_seedvr2:
-                    print(f"   ✅ Found SeedVR2 nodes: {', '.join(found_seedvr2)}")
-                else:
-                    print(f"   ❌ SeedVR2 nodes not found in loaded nodes")
-        except Exception as e:
-            print(f"   ⚠️  Could not check loaded nodes: {e}")
+        # Server is ready, report loaded nodes from the cached /object_info
+        object_info = get_object_info(port)
+        print(f"   📊 ComfyUI loaded {len(object_info)} node types")
+        
+        # Check for InstantID nodes
+        instantid_nodes = ["InsightFaceLoader", "InstantIDModelLoader", "InstantIDControlNetLoader", "ApplyInstantID"]
+        found_nodes = [node for node in instantid_nodes if node in object_info]
+        if found_nodes:
+            print(f"   ✅ Found InstantID nodes: {', '.join(found_nodes)}")
+        else:
+            print(f"   ❌ InstantID nodes not found in loaded nodes")
+        
+        # Check for SeedVR2 nodes
+        seedvr2_nodes = ["SeedVR2VideoUpscaler", "SeedVR2LoadDiTModel", "SeedVR2LoadVAEModel"]
+        found_seedvr2 = [node for node in seedvr2_nodes if node in object_info]
+        if found_seedvr2:
+            print(f"   ✅ Found SeedVR2 nodes: {', '.join(found_seedvr2)}")
+        else:
+            print(f"   ❌ SeedVR2 nodes not found in loaded nodes")
 
 
 def check_comfy_health(port: int = 8000, timeout: int = 60) -> bool:
@@ -132,12 +133,68 @@ def check_comfy_health(port: int = 8000, timeout: int = 60) -> bool:
         except requests.exceptions.RequestException:
             pass
         
-        time.sleep(1)
+        time.sleep(0.5)
     
     print("⚠️  ComfyUI server health check timeout")
     return False
 
 
+def get_object_info(port: int = 8000, refresh: bool = False) -> Optional[dict]:
+    """
+    Get ComfyUI /object_info, fetched once and cached for the container's lifetime.
+    
+    Args:
+        port: ComfyUI server port (default: 8000)
+        refresh: Re-fetch even if cached (default: False)
+    
+    Returns:
+        Node info dictionary keyed by node class_type, or None if the server
+        could not be reached (failures are not cached)
+    """
+    with _object_info_lock:
+        if not refresh and port in _object_info_cache:
+            return _object_info_cache[port]
+        
+        try:
+            response = requests.get(f"http://127.0.0.1:{port}/object_info", timeout=30)
+            if response.status_code != 200:
+                print(f"⚠️  Failed to get object_info: HTTP {response.status_code}")
+                return None
+            _object_info_cache[port] = response.json()
+            return _object_info_cache[port]
+        except requests.exceptions.RequestException as e:
+            print(f"⚠️  Failed to get object_info: {e}")
+            return None
+
+
+def wait_for_comfy_ready(port: int = 8000, timeout: int = 60) -> bool:
+    """
+    Wait until ComfyUI is ready to accept prompts.
+    
+    Ready means /system_stats answers (ComfyUI imports custom nodes before it
+    starts serving HTTP) and /object_info has been fetched into the cache.
+    
+    Args:
+        port: ComfyUI server port (default: 8000)
+        timeout: Timeout in seconds (default: 60)
+    
+    Returns:
+        True if the server is ready, False on timeout
+    """
+    start_time = time.time()
+    if not check_comfy_health(port, timeout):
+        return False
+    
+    while time.time() - start_time < timeout:
+        if get_object_info(port, refresh=True) is not None:
+            print(f"✅ ComfyUI ready in {time.time() - start_time:.1f}s")
+            return True
+        time.sleep(0.5)
+    
+    print("⚠️  ComfyUI readiness timeout (object_info unavailable)")
+    return False
+
+
 def poll_server_health(port: int = 8000) -> dict:
     """
     Poll ComfyUI server health (raises exception if unhealthy).
@@ -166,10 +223,64 @@ def poll_server_health(port: int = 8000) -> dict:
         raise Exception("ComfyUI server is not healthy, stopping container")
 
 
+def interrupt_prompt(prompt_id: str, port: int = 8000) -> bool:
+    """
+    Interrupt a prompt if it is the one ComfyUI is currently running.
+    
+    Args:
+        prompt_id: Prompt to stop
+        port: ComfyUI server port (default: 8000)
+    
+    Returns:
+        True if the prompt was running and an interrupt was sent
+    """
+    queue = requests.get(f"http://127.0.0.1:{port}/queue", timeout=10).json()
+    # Queue entries are [number, prompt_id, prompt, extra_data, outputs]
+    running = [entry[1] for entry in queue.get("queue_running", [])]
+    if prompt_id not in running:
+        return False
+    # prompt_id scopes the interrupt on ComfyUI versions that support it
+    requests.post(f"http://127.0.0.1:{port}/interrupt", json={"prompt_id": prompt_id}, timeout=10)
+    print(f"🛑 Interrupted prompt {prompt_id}")
+    return True
+
+
+def cancel_prompt(prompt_id: str, port: int = 8000) -> str:
+    """
+    Stop a prompt: remove it from the queue, or interrupt it if it is running.
+    
+    Args:
+        prompt_id: Prompt to stop
+        port: ComfyUI server port (default: 8000)
+    
+    Returns:
+        "removed", "interrupted", or "not_found" if it already finished
+    """
+    queue = requests.get(f"http://127.0.0.1:{port}/queue", timeout=10).json()
+    if prompt_id in [entry[1] for entry in queue.get("queue_pending", [])]:
+        requests.post(f"http://127.0.0.1:{port}/queue", json={"delete": [prompt_id]}, timeout=10)
+        print(f"🛑 Removed queued prompt {prompt_id}")
+        return "removed"
+    if interrupt_prompt(prompt_id, port):
+        return "interrupted"
+    return "not_found"
+
+
+def _stop_cancelled_prompt(prompt_id: str, port: int, token) -> None:
+    """Stop a prompt whose request was cancelled, then raise RequestCancelled."""
+    try:
+        cancel_prompt(prompt_id, port)
+    except requests.exceptions.RequestException as e:
+        print(f"⚠️  Failed to stop prompt {prompt_id}: {e}")
+    token.raise_if_cancelled()
+
+
 def verify_nodes_available(required_nodes: list[str], port: int = 8000) -> dict[str, bool]:
     """
     Verify that required ComfyUI nodes are available.
     
+    Answered from the cached /object_info (no request per call once cached).
+    
     Args:
         required_nodes: List of node class_type names to check
         port: ComfyUI server port (default: 8000)
@@ -177,30 +288,540 @@ def verify_nodes_available(required_nodes: list[str], port: int = 8000) -> dict[
     Returns:
         Dictionary mapping node names to availability (True/False)
     """
+    object_info = get_object_info(port)
+    if object_info is None:
+        return {node: False for node in required_nodes}
+    
+    result = {node: node in object_info for node in required_nodes}
+    
+    # Log results
+    available_count = sum(1 for v in result.values() if v)
+    print(f"📊 Node verification: {available_count}/{len(required_nodes)} nodes available")
+    for node, available in result.items():
+        status = "✅" if available else "❌"
+        print(f"   {status} {node}")
+    
+    return result
+
+
+def _raise_execution_error(msg_data: dict) -> None:
+    """
+    Raise a detailed exception for a ComfyUI ``execution_error`` message.
+    
+    Used for both history ``messages`` entries and WebSocket events, which
+    carry the same payload.
+    
+    Args:
+        msg_data: The ``execution_error`` payload
+    
+    Raises:
+        Exception: Always, with node, exception and traceback details
+    """
+    # Log the raw msg_data structure for debugging
+    print(f"🔍 Raw execution_error msg_data structure:")
+    print(json.dumps(msg_data, indent=2, default=str))
+
+    # Extract error info - ComfyUI may nest it differently
+    error_info = msg_data.get("error", {}) if isinstance(msg_data, dict) else msg_data
+
+    # If error_info is not a dict, try to extract from msg_data directly
+    if not isinstance(error_info, dict):
+        error_info = msg_data if isinstance(msg_data, dict) else {}
+
+    # Extract node_id and node_type - check multiple possible locations
+    node_id = (
+        error_info.get("node_id") or 
+        msg_data.get("node_id") or 
+        "unknown"
+    )
+    node_type = (
+        error_info.get("node_type") or 
+        msg_data.get("node_type") or 
+        "unknown"
+    )
+
+    print(f"🔍 Extracted node_id: {node_id}, node_type: {node_type}")
+    error_msg = error_info.get("message", error_info.get("error", "Workflow execution failed")) if isinstance(error_info, dict) else str(error_info)
+    error_details = error_info.get("details", "") if isinstance(error_info, dict) else ""
+    error_trace = error_info.get("traceback", []) if isinstance(error_info, dict) else []
+    exception_type = error_info.get("exception_type", "") if isinstance(error_info, dict) else ""
+    exception_message = error_info.get("exception_message", "") if isinstance(error_info, dict) else ""
+    current_inputs = error_info.get("current_inputs", {}) if isinstance(error_info, dict) else {}
+
+    # Format traceback (can be list or string)
+    traceback_str = ""
+    if error_trace:
+        if isinstance(error_trace, list):
+            traceback_str = "\n".join(str(line) for line in error_trace)
+        else:
+            traceback_str = str(error_trace)
+
+    full_error = f"Workflow failed at node {node_id} ({node_type}): {error_msg}"
+    if exception_type:
+        full_error += f"\nException Type: {exception_type}"
+    if exception_message:
+        full_error += f"\nException Message: {exception_message}"
+    if error_details:
+        full_error += f"\nDetails: {error_details}"
+    if traceback_str:
+        full_error += f"\nTraceback:\n{traceback_str}"
+    if current_inputs:
+        # Log current_inputs for debugging (especially useful for KSampler)
+        inputs_str = json.dumps(current_inputs, indent=2, default=str)
+        full_error += f"\nCurrent Inputs: {inputs_str}"
+
+    # Special handling for KSampler errors (common failure point)
+    if node_type == "KSampler":
+        print(f"🔍 KSampler error detected - detailed debugging:")
+        print(f"   Node ID: {node_id}")
+        print(f"   Error Message: {error_msg}")
+        if exception_type:
+            print(f"   Exception Type: {exception_type}")
+        if exception_message:
+            print(f"   Exception Message: {exception_message}")
+        if current_inputs:
+            print(f"   KSampler Inputs:")
+            for input_key, input_value in current_inputs.items():
+                # Log input type and shape if tensor
+                if isinstance(input_value, list) and len(input_value) >= 2:
+                    # ComfyUI connection format: [node_id, output_index]
+                    print(f"      {input_key}: {input_value} (connection to node {input_value[0]}, output {input_value[1]})")
+                else:
+                    print(f"      {input_key}: {input_value}")
+        if error_details:
+            print(f"   Details: {error_details}")
+        if traceback_str:
+            print(f"   Full Traceback:\n{traceback_str}")
+
+    # Log full error message data without truncation
+    print(f"❌ Execution error found in messages:")
+    print(f"   Node ID: {node_id}")
+    print(f"   Node Type: {node_type}")
+    print(f"   Error Message: {error_msg}")
+    if exception_type:
+        print(f"   Exception Type: {exception_type}")
+    if exception_message:
+        print(f"   Exception Message: {exception_message}")
+    if error_details:
+        print(f"   Details: {error_details}")
+    if traceback_str:
+        print(f"   Traceback:\n{traceback_str}")
+    if current_inputs:
+        print(f"   Current Inputs: {json.dumps(current_inputs, indent=2, default=str)}")
+
+    # Log full msg_data for complete context
+    print(f"❌ Full error message data (no truncation):")
+    print(json.dumps(msg_data, indent=2, default=str))
+
+    raise Exception(full_error)
+
+
+def _connect_comfy_ws(port: int, client_id: str):
+    """
+    Open a WebSocket to ComfyUI's ``/ws`` event stream.
+    
+    Must be connected before the prompt is queued so no events are missed.
+    
+    Args:
+        port: ComfyUI server port
+        client_id: Client ID the prompt will be queued with
+    
+    Returns:
+        Connected WebSocket, or None if unavailable (caller falls back to polling)
+    """
     try:
-        response = requests.get(f"http://127.0.0.1:{port}/object_info", timeout=10)
-        if response.status_code == 200:
-            object_info = response.json()
-            available_nodes = set(object_info.keys())
-            result = {node: node in available_nodes for node in required_nodes}
-            
-            # Log results
-            available_count = sum(1 for v in result.values() if v)
-            print(f"📊 Node verification: {available_count}/{len(required_nodes)} nodes available")
-            for node, available in result.items():
-                status = "✅" if available else "❌"
-                print(f"   {status} {node}")
-            
-            return result
+        import websocket  # websocket-client (ships with comfy-cli)
+    except ImportError:
+        print("⚠️  websocket-client not installed, falling back to history polling")
+        return None
+    
+    try:
+        ws = websocket.WebSocket()
+        ws.connect(f"ws://127.0.0.1:{port}/ws?clientId={client_id}", timeout=10)
+        return ws
+    except Exception as e:
+        print(f"⚠️  ComfyUI WebSocket connect failed ({e}), falling back to history polling")
+        return None
+
+
+# Output nodes that can be swapped for SaveImageWebsocket (image bytes over /ws)
+WS_IMAGE_OUTPUT_NODES = ("SaveImage", "PreviewImage")
+
+# Output nodes whose files must come from disk via /view
+FILE_OUTPUT_NODES = ("SaveAnimatedWEBP", "SaveAnimatedPNG", "SaveVideo", "SaveWEBM", "VHS_VideoCombine")
+
+# Binary /ws event type for sampler previews (4-byte image format follows)
+PREVIEW_IMAGE_EVENT = 1
+
+# ComfyUI ships SaveImageWebsocket as a bundled custom node
+WS_IMAGE_SAVE_NODE_FILE = Path("/root/comfy/ComfyUI/custom_nodes/websocket_image_save.py")
+
+
+# Drop-in CLIPTextEncode with a cross-request conditioning cache (apps/modal/comfy_nodes)
+TEXT_ENCODE_CACHE_NODE = "RylaCachedCLIPTextEncode"
+
+
+def _node_signature(workflow: dict, node_id: str, memo: dict) -> str:
+    """Canonical JSON of a node and everything upstream of it."""
+    if node_id not in memo:
+        node = workflow[node_id]
+        inputs = {}
+        for key, value in node.get("inputs", {}).items():
+            if isinstance(value, list) and len(value) == 2 and isinstance(value[0], str) and value[0] in workflow:
+                value = [_node_signature(workflow, value[0], memo), value[1]]
+            inputs[key] = value
+        memo[node_id] = json.dumps([node.get("class_type"), inputs], sort_keys=True, default=str)
+    return memo[node_id]
+
+
+def to_cached_text_encoders(workflow: dict) -> dict:
+    """
+    Rewrite CLIPTextEncode nodes to RylaCachedCLIPTextEncode.
+    
+    Each node gets an ``encoder_key``: a hash of the loader/LoRA chain that
+    feeds its ``clip`` input. Identical prompts through the same encoder
+    then reuse cached conditioning across requests.
+    
+    Args:
+        workflow: ComfyUI workflow dictionary (API format)
+    
+    Returns:
+        Workflow to queue (the input is not modified)
+    """
+    import hashlib
+    
+    rewritten = dict(workflow)
+    memo: dict = {}
+    for node_id, node in workflow.items():
+        if not isinstance(node, dict) or node.get("class_type") != "CLIPTextEncode":
+            continue
+        inputs = node.get("inputs", {})
+        clip = inputs.get("clip")
+        if not isinstance(inputs.get("text"), str) or not isinstance(clip, list) or clip[0] not in workflow:
+            continue
+        signature = json.dumps([_node_signature(workflow, clip[0], memo), clip[1]])
+        rewritten[node_id] = {
+            **node,
+            "class_type": TEXT_ENCODE_CACHE_NODE,
+            "inputs": {**inputs, "encoder_key": hashlib.sha256(signature.encode("utf-8")).hexdigest()[:32]},
+        }
+    return rewritten
+
+
+# FACEANALYSIS proxy with a cross-request face embedding cache (apps/modal/comfy_nodes)
+FACE_ANALYSIS_CACHE_NODE = "RylaCachedFaceAnalysis"
+
+# Nodes that load InsightFace (antelopev2) for InstantID / PuLID
+FACE_ANALYSIS_LOADERS = ("InstantIDFaceAnalysis", "InsightFaceLoader", "PulidFluxInsightFaceLoader")
+
+
+def to_cached_face_analysis(workflow: dict) -> dict:
+    """
+    Route InsightFace loaders through RylaCachedFaceAnalysis.
+    
+    A cache node is inserted after each face analysis loader and its
+    consumers are re-pointed to it, so the reference face's detection,
+    keypoints and embedding are computed once and reused across requests.
+    
+    Args:
+        workflow: ComfyUI workflow dictionary (API format)
+    
+    Returns:
+        Workflow to queue (the input is not modified)
+    """
+    loaders = {
+        node_id: node for node_id, node in workflow.items()
+        if isinstance(node, dict) and node.get("class_type") in FACE_ANALYSIS_LOADERS
+    }
+    if not loaders:
+        return workflow
+    
+    cache_ids = {node_id: f"{node_id}_face_cache" for node_id in loaders}
+    rewritten = {}
+    for node_id, node in workflow.items():
+        inputs = node.get("inputs", {}) if isinstance(node, dict) else {}
+        if any(isinstance(v, list) and len(v) == 2 and v[0] in cache_ids and v[1] == 0 for v in inputs.values()):
+            node = {
+                **node,
+                "inputs": {
+                    key: [cache_ids[value[0]], 0]
+                    if isinstance(value, list) and len(value) == 2 and value[0] in cache_ids and value[1] == 0
+                    else value
+                    for key, value in inputs.items()
+                },
+            }
+        rewritten[node_id] = node
+    for node_id, loader in loaders.items():
+        rewritten[cache_ids[node_id]] = {
+            "class_type": FACE_ANALYSIS_CACHE_NODE,
+            "inputs": {
+                "insightface": [node_id, 0],
+                "loader_key": json.dumps([loader["class_type"], loader.get("inputs", {})], sort_keys=True, default=str),
+            },
+        }
+    return rewritten
+
+
+# Drop-in LoRA loaders with RAM-cached LoRAs and patched models (apps/modal/comfy_nodes)
+LORA_CACHE_NODES = {
+    "LoraLoader": "RylaCachedLoraLoader",
+    "LoraLoaderModelOnly": "RylaCachedLoraLoaderModelOnly",
+}
+
+
+# One node applying a whole LoRA chain, cached per stack signature (apps/modal/comfy_nodes)
+LORA_STACK_NODE = "RylaCachedLoraStack"
+
+
+def _is_link(value) -> bool:
+    return isinstance(value, list) and len(value) == 2 and isinstance(value[0], str)
+
+
+def _lora_chains(workflow: dict) -> list[list[str]]:
+    """
+    Chains of LoRA loaders, head first.
+    
+    A loader continues a chain when its parent is a loader of the same class
+    whose outputs feed nothing else.
+    """
+    from collections import Counter
+    
+    references = Counter(
+        value[0]
+        for node in workflow.values() if isinstance(node, dict)
+        for value in node.get("inputs", {}).values() if _is_link(value)
+    )
+    loaders = [
+        node_id for node_id, node in workflow.items()
+        if isinstance(node, dict) and node.get("class_type") in LORA_CACHE_NODES
+    ]
+    
+    def parent(node_id: str) -> Optional[str]:
+        node = workflow[node_id]
+        model = node["inputs"].get("model")
+        if not _is_link(model) or model[0] not in workflow or model[1] != 0:
+            return None
+        parent_id = model[0]
+        if workflow[parent_id].get("class_type") != node["class_type"]:
+            return None
+        if node["class_type"] == "LoraLoader":
+            if node["inputs"].get("clip") != [parent_id, 1] or references[parent_id] != 2:
+                return None
+        elif references[parent_id] != 1:
+            return None
+        return parent_id
+    
+    children = {}
+    for node_id in loaders:
+        parent_id = parent(node_id)
+        if parent_id is not None:
+            children[parent_id] = node_id
+    chained = set(children.values())
+    chains = []
+    for node_id in loaders:
+        if node_id in chained:
+            continue
+        chain = [node_id]
+        while chain[-1] in children:
+            chain.append(children[chain[-1]])
+        chains.append(chain)
+    return chains
+
+
+def to_cached_lora_loaders(workflow: dict, available) -> dict:
+    """
+    Rewrite LoRA loaders to their RAM-cached drop-in replacements.
+    
+    A chain of two or more loaders (e.g. character + realism + style LoRAs)
+    is collapsed into one RylaCachedLoraStack node that keeps the tail's
+    node id, so consumers are unchanged and the stack is loaded and patched
+    once per stack signature.
+    
+    Args:
+        workflow: ComfyUI workflow dictionary (API format)
+        available: Node class names the server provides (e.g. /object_info)
+    
+    Returns:
+        Workflow to queue (the input is not modified)
+    """
+    rewritten = dict(workflow)
+    for chain in _lora_chains(workflow):
+        nodes = [workflow[node_id] for node_id in chain]
+        class_type = nodes[0]["class_type"]
+        scalar = all(
+            not _is_link(node["inputs"].get(key))
+            for node in nodes for key in ("lora_name", "strength_model", "strength_clip")
+        )
+        if len(chain) > 1 and scalar and LORA_STACK_NODE in available:
+            with_clip = class_type == "LoraLoader"
+            stack = [
+                [
+                    node["inputs"]["lora_name"],
+                    node["inputs"].get("strength_model", 1.0),
+                    node["inputs"].get("strength_clip", 1.0) if with_clip else 0.0,
+                ]
+                for node in nodes
+            ]
+            inputs = {"model": nodes[0]["inputs"]["model"], "stack": json.dumps(stack)}
+            if with_clip:
+                inputs["clip"] = nodes[0]["inputs"]["clip"]
+            for node_id in chain[:-1]:
+                del rewritten[node_id]
+            rewritten[chain[-1]] = {"class_type": LORA_STACK_NODE, "inputs": inputs}
+            continue
+        cached_class = LORA_CACHE_NODES[class_type]
+        if cached_class in available:
+            for node_id, node in zip(chain, nodes):
+                rewritten[node_id] = {**node, "class_type": cached_class}
+    return rewritten
+
+
+def to_websocket_outputs(workflow: dict) -> tuple[dict, set[str]]:
+    """
+    Rewrite image save nodes to SaveImageWebsocket.
+    
+    The final images are then sent as binary /ws frames straight from memory,
+    skipping the PNG write to ComfyUI/output and the /view download.
+    Workflows with video/animation outputs are left unchanged.
+    
+    Args:
+        workflow: ComfyUI workflow dictionary (API format)
+    
+    Returns:
+        Tuple of (workflow to queue, IDs of the rewritten nodes). The node set
+        is empty if the workflow was not rewritten.
+    """
+    class_types = [node.get("class_type") for node in workflow.values() if isinstance(node, dict)]
+    if any(class_type in FILE_OUTPUT_NODES for class_type in class_types):
+        return workflow, set()
+    
+    rewritten = {}
+    image_nodes = set()
+    for node_id, node in workflow.items():
+        if isinstance(node, dict) and node.get("class_type") in WS_IMAGE_OUTPUT_NODES:
+            rewritten[node_id] = {
+                "class_type": "SaveImageWebsocket",
+                "inputs": {"images": node["inputs"]["images"]},
+            }
+            image_nodes.add(node_id)
         else:
-            print(f"⚠️  Failed to get object_info: HTTP {response.status_code}")
-            return {node: False for node in required_nodes}
+            rewritten[node_id] = node
+    
+    return (rewritten, image_nodes) if image_nodes else (workflow, set())
+
+
+def _emit(on_event: Optional[Callable[[str, dict], None]], event_type: str, data: dict) -> None:
+    """Call a progress listener; listener errors never fail the workflow."""
+    if on_event is None:
+        return
+    try:
+        on_event(event_type, data)
     except Exception as e:
-        print(f"⚠️  Failed to check node availability: {e}")
-        return {node: False for node in required_nodes}
+        print(f"⚠️  Progress listener failed: {e}")
 
 
-def execute_workflow_via_api(workflow: dict, port: int = 8000, timeout: int = 1200) -> bytes:
+def _wait_for_prompt_ws(
+    ws,
+    prompt_id: str,
+    timeout: float,
+    image_nodes: Optional[set[str]] = None,
+    on_event: Optional[Callable[[str, dict], None]] = None,
+    port: int = 8000,
+    cancel_token=None,
+) -> Optional[dict[str, list[bytes]]]:
+    """
+    Block until ComfyUI reports that a prompt finished executing.
+    
+    Completion is signalled by an ``executing`` event with ``node=None`` (or
+    ``execution_success``) for our prompt_id. ``execution_error`` is raised
+    with the same details as the history-based error extraction.
+    
+    Args:
+        ws: WebSocket from _connect_comfy_ws
+        prompt_id: Prompt to wait for
+        timeout: Timeout in seconds
+        image_nodes: SaveImageWebsocket node IDs whose binary frames to collect
+        on_event: Optional listener called with ("progress" | "executing", data)
+            for our prompt and ("preview", {"image": bytes, "format": ...}) for
+            sampler latent previews
+        port: ComfyUI server port (to stop the prompt on cancellation)
+        cancel_token: Optional CancelToken; checked every CANCEL_POLL_SECONDS
+    
+    Returns:
+        Dictionary mapping node ID to image bytes received (in arrival order),
+        or None if the stream dropped (caller should fall back to history polling)
+    
+    Raises:
+        Exception: On execution error, interruption or timeout
+        RequestCancelled: If cancel_token was cancelled (prompt is stopped first)
+    """
+    import websocket
+    from utils.cancellation import CANCEL_POLL_SECONDS
+    
+    image_nodes = image_nodes or set()
+    images: dict[str, list[bytes]] = {}
+    current_node = None
+    
+    deadline = time.time() + timeout
+    while True:
+        if cancel_token is not None and cancel_token.cancelled:
+            _stop_cancelled_prompt(prompt_id, port, cancel_token)
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise Exception(f"Workflow execution timeout after {timeout} seconds")
+        ws.settimeout(min(remaining, CANCEL_POLL_SECONDS if cancel_token is not None else 30))
+        try:
+            message = ws.recv()
+        except websocket.WebSocketTimeoutException:
+            continue
+        except Exception as e:
+            print(f"⚠️  ComfyUI WebSocket closed ({e}), falling back to history polling")
+            return None
+        
+        # Binary frame: 4-byte event type + 4-byte image format + encoded image.
+        # Only frames sent while a SaveImageWebsocket node runs are outputs;
+        # the rest are sampler latent previews.
+        if not isinstance(message, str):
+            if current_node in image_nodes:
+                images.setdefault(current_node, []).append(message[8:])
+            elif on_event is not None and int.from_bytes(message[:4], "big") == PREVIEW_IMAGE_EVENT:
+                image_format = "png" if int.from_bytes(message[4:8], "big") == 2 else "jpeg"
+                _emit(on_event, "preview", {"image": message[8:], "format": image_format, "node": current_node})
+            continue
+        
+        event = json.loads(message)
+        event_type = event.get("type")
+        data = event.get("data", {})
+        if data.get("prompt_id") != prompt_id:
+            continue
+        
+        if event_type in ("progress", "executing"):
+            _emit(on_event, event_type, data)
+        if event_type == "executing":
+            current_node = data.get("node")
+            if current_node is None:
+                print(f"✅ Workflow {prompt_id} finished executing")
+                return images
+        if event_type == "execution_success":
+            print(f"✅ Workflow {prompt_id} finished executing")
+            return images
+        if event_type == "execution_error":
+            _raise_execution_error(data)
+        if event_type == "execution_interrupted":
+            node_id = data.get("node_id", "unknown")
+            node_type = data.get("node_type", "unknown")
+            raise Exception(f"Workflow interrupted at node {node_id} ({node_type})")
+
+
+def execute_workflow_via_api(
+    workflow: dict,
+    port: int = 8000,
+    timeout: int = 1200,
+    wait_mode: str = "websocket",
+    output_mode: str = "auto",
+    all_outputs: bool = False,
+    on_event: Optional[Callable[[str, dict], None]] = None,
+):
     """
     Execute a ComfyUI workflow via API endpoint (more reliable than comfy run).
     
@@ -208,54 +829,123 @@ def execute_workflow_via_api(workflow: dict, port: int = 8000, timeout: int = 12
         workflow: ComfyUI workflow dictionary (API format)
         port: ComfyUI server port (default: 8000)
         timeout: Timeout in seconds (default: 1200)
+        wait_mode: "websocket" waits on ComfyUI's /ws event stream and resolves
+            as soon as the prompt finishes; "poll" polls /history every second.
+            WebSocket mode falls back to polling if the stream is unavailable.
+        output_mode: "websocket" takes image bytes from SaveImageWebsocket
+            binary frames (no disk write or /view fetch); "history" downloads
+            the saved file via /view; "auto" uses websocket for image-only
+            workflows when the stream is connected.
+        all_outputs: Return every output image instead of only the first
+        on_event: Optional progress listener, called with ("queued",
+            {"prompt_id": ...}) and the /ws events described in
+            _wait_for_prompt_ws (websocket wait mode only)
+    
+    CLIPTextEncode nodes are swapped for the cached text encoder when the
+    ryla_nodes custom node is installed (see to_cached_text_encoders).
+    
+    The request's cancel token (utils.cancellation) is honoured while waiting:
+    a cancelled request's prompt is removed from the queue or interrupted.
     
     Returns:
-        Bytes of the output file (image or video)
+        Bytes of the output file (image or video), or if all_outputs is set,
+        a dictionary mapping output node ID to a list of image bytes
     
     Raises:
         Exception: If workflow execution fails or no output found
+        RequestCancelled: If the request was cancelled
     """
     import time
+    import uuid
+    from utils.cancellation import current_cancel_token
     
-    # Queue the workflow
-    url = f"http://127.0.0.1:{port}/prompt"
-    response = requests.post(url, json={"prompt": workflow}, timeout=30)
-    
-    if response.status_code != 200:
-        error_text = response.text[:500]
-        raise Exception(f"Failed to queue workflow: HTTP {response.status_code} - {error_text}")
-    
-    result = response.json()
-    
-    # Check for node errors
-    if result.get("node_errors"):
-        error_details = json.dumps(result['node_errors'], indent=2)
-        print(f"❌ ComfyUI node errors: {error_details}")
-        raise Exception(f"ComfyUI node errors: {error_details}")
-    
-    # Check for error in response
-    if result.get("error"):
-        error_info = result.get("error", {})
-        error_msg = error_info.get("message", str(error_info))
-        error_type = error_info.get("type", "unknown")
-        error_details = error_info.get("details", "")
-        full_error = f"{error_type}: {error_msg}"
-        if error_details:
-            full_error += f" - {error_details}"
-        print(f"❌ ComfyUI workflow error: {full_error}")
-        raise Exception(f"ComfyUI workflow error: {full_error}")
+    cancel_token = current_cancel_token()
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
     
-    prompt_id = result.get("prompt_id")
-    if not prompt_id:
-        raise Exception(f"No prompt_id returned: {result}")
+    # Connect to the event stream before queueing so no events are missed
+    client_id = uuid.uuid4().hex
+    use_ws = wait_mode == "websocket" or output_mode == "websocket"
+    ws = _connect_comfy_ws(port, client_id) if use_ws else None
     
-    print(f"📊 Workflow queued with prompt_id: {prompt_id}")
+    object_info = get_object_info(port)
+    if object_info and TEXT_ENCODE_CACHE_NODE in object_info:
+        workflow = to_cached_text_encoders(workflow)
+    if object_info and FACE_ANALYSIS_CACHE_NODE in object_info:
+        workflow = to_cached_face_analysis(workflow)
+    if object_info:
+        workflow = to_cached_lora_loaders(workflow, object_info)
     
-    # Wait for completion
-    start_time = time.time()
+    image_nodes: set[str] = set()
+    if ws is not None and output_mode in ("auto", "websocket") and WS_IMAGE_SAVE_NODE_FILE.exists():
+        workflow, image_nodes = to_websocket_outputs(workflow)
+    elif output_mode == "websocket":
+        print("⚠️  WebSocket image output unavailable, using /view download")
+    
+    try:
+        # Queue the workflow
+        url = f"http://127.0.0.1:{port}/prompt"
+        response = requests.post(url, json={"prompt": workflow, "client_id": client_id}, timeout=30)
+        
+        if response.status_code != 200:
+            error_text = response.text[:500]
+            raise Exception(f"Failed to queue workflow: HTTP {response.status_code} - {error_text}")
+        
+        result = response.json()
+        
+        # Check for node errors
+        if result.get("node_errors"):
+            error_details = json.dumps(result['node_errors'], indent=2)
+            print(f"❌ ComfyUI node errors: {error_details}")
+            raise Exception(f"ComfyUI node errors: {error_details}")
+        
+        # Check for error in response
+        if result.get("error"):
+            error_info = result.get("error", {})
+            error_msg = error_info.get("message", str(error_info))
+            error_type = error_info.get("type", "unknown")
+            error_details = error_info.get("details", "")
+            full_error = f"{error_type}: {error_msg}"
+            if error_details:
+                full_error += f" - {error_details}"
+            print(f"❌ ComfyUI workflow error: {full_error}")
+            raise Exception(f"ComfyUI workflow error: {full_error}")
+        
+        prompt_id = result.get("prompt_id")
+        if not prompt_id:
+            raise Exception(f"No prompt_id returned: {result}")
+        
+        print(f"📊 Workflow queued with prompt_id: {prompt_id}")
+        _emit(on_event, "queued", {"prompt_id": prompt_id})
+        
+        # Event-driven wait: history is ready as soon as this returns
+        start_time = time.time()
+        ws_images = None
+        if ws is not None:
+            ws_images = _wait_for_prompt_ws(ws, prompt_id, timeout, image_nodes, on_event, port, cancel_token)
+    finally:
+        if ws is not None:
+            ws.close()
+    
+    if image_nodes:
+        if all_outputs and any(ws_images or {}):
+            outputs = {node_id: node_images for node_id, node_images in ws_images.items() if node_images}
+            print(f"✅ Received {sum(len(v) for v in outputs.values())} image(s) over WebSocket")
+            return outputs
+        for node_id, node_images in (ws_images or {}).items():
+            if node_images:
+                print(f"✅ Received image from node {node_id} over WebSocket ({len(node_images[0])} bytes)")
+                return node_images[0]
+        if ws_images is None:
+            raise Exception("ComfyUI WebSocket closed before output images were received")
+        raise Exception("No output images received over WebSocket")
+    
+    # Fetch results from history (polls until done if no WebSocket)
     history_url = f"http://127.0.0.1:{port}/history/{prompt_id}"
     
     while time.time() - start_time < timeout:
+        if cancel_token is not None and cancel_token.cancelled:
+            _stop_cancelled_prompt(prompt_id, port, cancel_token)
         try:
             history_response = requests.get(history_url, timeout=10)
             if history_response.status_code == 200:
@@ -290,103 +980,7 @@ def execute_workflow_via_api(workflow: dict, port: int = 8000, timeout: int = 12
                             msg_type = msg[0]
                             msg_data = msg[1] if len(msg) > 1 else {}
                             if msg_type == "execution_error":
-                                # Log the raw msg_data structure for debugging
-                                print(f"🔍 Raw execution_error msg_data structure:")
-                                print(json.dumps(msg_data, indent=2, default=str))
-                                
-                                # Extract error info - ComfyUI may nest it differently
-                                error_info = msg_data.get("error", {}) if isinstance(msg_data, dict) else msg_data
-                                
-                                # If error_info is not a dict, try to extract from msg_data directly
-                                if not isinstance(error_info, dict):
-                                    error_info = msg_data if isinstance(msg_data, dict) else {}
-                                
-                                # Extract node_id and node_type - check multiple possible locations
-                                node_id = (
-                                    error_info.get("node_id") or 
-                                    msg_data.get("node_id") or 
-                                    "unknown"
-                                )
-                                node_type = (
-                                    error_info.get("node_type") or 
-                                    msg_data.get("node_type") or 
-                                    "unknown"
-                                )
-                                
-                                print(f"🔍 Extracted node_id: {node_id}, node_type: {node_type}")
-                                error_msg = error_info.get("message", error_info.get("error", "Workflow execution failed")) if isinstance(error_info, dict) else str(error_info)
-                                error_details = error_info.get("details", "") if isinstance(error_info, dict) else ""
-                                error_trace = error_info.get("traceback", []) if isinstance(error_info, dict) else []
-                                exception_type = error_info.get("exception_type", "") if isinstance(error_info, dict) else ""
-                                exception_message = error_info.get("exception_message", "") if isinstance(error_info, dict) else ""
-                                current_inputs = error_info.get("current_inputs", {}) if isinstance(error_info, dict) else {}
-                                
-                                # Format traceback (can be list or string)
-                                traceback_str = ""
-                                if error_trace:
-                                    if isinstance(error_trace, list):
-                                        traceback_str = "\n".join(str(line) for line in error_trace)
-                                    else:
-                                        traceback_str = str(error_trace)
-                                
-                                full_error = f"Workflow failed at node {node_id} ({node_type}): {error_msg}"
-                                if exception_type:
-                                    full_error += f"\nException Type: {exception_type}"
-                                if exception_message:
-                                    full_error += f"\nException Message: {exception_message}"
-                                if error_details:
-                                    full_error += f"\nDetails: {error_details}"
-                                if traceback_str:
-                                    full_error += f"\nTraceback:\n{traceback_str}"
-                                if current_inputs:
-                                    # Log current_inputs for debugging (especially useful for KSampler)
-                                    inputs_str = json.dumps(current_inputs, indent=2, default=str)
-                                    full_error += f"\nCurrent Inputs: {inputs_str}"
-                                
-                                # Special handling for KSampler errors (common failure point)
-                                if node_type == "KSampler":
-                                    print(f"🔍 KSampler error detected - detailed debugging:")
-                                    print(f"   Node ID: {node_id}")
-                                    print(f"   Error Message: {error_msg}")
-                                    if exception_type:
-                                        print(f"   Exception Type: {exception_type}")
-                                    if exception_message:
-                                        print(f"   Exception Message: {exception_message}")
-                                    if current_inputs:
-                                        print(f"   KSampler Inputs:")
-                                        for input_key, input_value in current_inputs.items():
-                                            # Log input type and shape if tensor
-                                            if isinstance(input_value, list) and len(input_value) >= 2:
-                                                # ComfyUI connection format: [node_id, output_index]
-                                                print(f"      {input_key}: {input_value} (connection to node {input_value[0]}, output {input_value[1]})")
-                                            else:
-                                                print(f"      {input_key}: {input_value}")
-                                    if error_details:
-                                        print(f"   Details: {error_details}")
-                                    if traceback_str:
-                                        print(f"   Full Traceback:\n{traceback_str}")
-                                
-                                # Log full error message data without truncation
-                                print(f"❌ Execution error found in messages:")
-                                print(f"   Node ID: {node_id}")
-                                print(f"   Node Type: {node_type}")
-                                print(f"   Error Message: {error_msg}")
-                                if exception_type:
-                                    print(f"   Exception Type: {exception_type}")
-                                if exception_message:
-                                    print(f"   Exception Message: {exception_message}")
-                                if error_details:
-                                    print(f"   Details: {error_details}")
-                                if traceback_str:
-                                    print(f"   Traceback:\n{traceback_str}")
-                                if current_inputs:
-                                    print(f"   Current Inputs: {json.dumps(current_inputs, indent=2, default=str)}")
-                                
-                                # Log full msg_data for complete context
-                                print(f"❌ Full error message data (no truncation):")
-                                print(json.dumps(msg_data, indent=2, default=str))
-                                
-                                raise Exception(full_error)
+                                _raise_execution_error(msg_data)
                     
                     print(f"📊 Status: {json.dumps(status, indent=2) if status else 'None'}")
                     
@@ -484,11 +1078,12 @@ def execute_workflow_via_api(workflow: dict, port: int = 8000, timeout: int = 12
                         print(f"📊 First output structure: {json.dumps(list(outputs.values())[0] if outputs else {}, indent=2)[:500]}")
                     
                     # Find SaveImage or SaveAnimatedWEBP node
+                    collected = {}
                     for node_id, node_output in outputs.items():
                         images = node_output.get("images", [])
-                        if images:
+                        # Only the first image unless every output was requested
+                        for image_info in (images if all_outputs else images[:1]):
                             # Get the image
-                            image_info = images[0]
                             filename = image_info["filename"]
                             subfolder = image_info.get("subfolder", "")
                             image_type = image_info.get("type", "output")
@@ -505,10 +1100,15 @@ def execute_workflow_via_api(workflow: dict, port: int = 8000, timeout: int = 12
                             img_response = requests.get(image_url, params=params, timeout=30)
                             if img_response.status_code == 200:
                                 print(f"✅ Image downloaded successfully ({len(img_response.content)} bytes)")
-                                return img_response.content
+                                if not all_outputs:
+                                    return img_response.content
+                                collected.setdefault(node_id, []).append(img_response.content)
                             else:
                                 print(f"⚠️  Image download failed: HTTP {img_response.status_code}")
                     
+                    if collected:
+                        return collected
+                    
                     # If no images but no error, check if there are node errors
                     if output_data.get("node_errors"):
                         node_errors = output_data["node_errors"]
@@ -547,6 +1147,39 @@ def execute_workflow_via_api(workflow: dict, port: int = 8000, timeout: int = 12
     raise Exception(f"Workflow execution timeout after {timeout} seconds")
 
 
+def execute_workflow_images(workflow: dict, port: int = 8000, timeout: int = 1200) -> dict[str, list[bytes]]:
+    """
+    Execute a ComfyUI workflow and return every output image.
+    
+    Args:
+        workflow: ComfyUI workflow dictionary (API format)
+        port: ComfyUI server port (default: 8000)
+        timeout: Timeout in seconds (default: 1200)
+    
+    Returns:
+        Dictionary mapping output node ID to a list of image bytes
+    
+    Raises:
+        Exception: If workflow execution fails or no output found
+    """
+    return execute_workflow_via_api(workflow, port=port, timeout=timeout, all_outputs=True)
+
+
+def is_api_format(workflow) -> bool:
+    """
+    Check if a workflow is in API format (dict with numeric string keys).
+    
+    Args:
+        workflow: Parsed workflow JSON
+    
+    Returns:
+        True if the workflow can be queued directly via /prompt
+    """
+    return isinstance(workflow, dict) and all(
+        isinstance(k, str) and k.isdigit() for k in workflow.keys()
+    )
+
+
 def execute_workflow(workflow_path: str, timeout: int = 1200) -> bytes:
     """
     Execute a ComfyUI workflow and return output file bytes.
@@ -566,12 +1199,7 @@ def execute_workflow(workflow_path: str, timeout: int = 1200) -> bytes:
     # Load workflow
     workflow = json.loads(Path(workflow_path).read_text())
     
-    # Check if it's API format (dict with numeric string keys)
-    is_api_format = isinstance(workflow, dict) and all(
-        isinstance(k, str) and k.isdigit() for k in workflow.keys()
-    )
-    
-    if not is_api_format:
+    if not is_api_format(workflow):
         # Try comfy run (supports both formats but less reliable)
         cmd = f"comfy run --workflow {workflow_path} --wait --timeout {timeout} --verbose"
         result = subprocess.run(cmd, shell=True, capture_output=True, text=True, check=False)
@@ -607,9 +1235,13 @@ def execute_workflow(workflow_path: str, timeout: int = 1200) -> bytes:
         
         raise Exception(f"No output file found with prefix '{file_prefix}' in {output_dir}")
     else:
+        from utils.cancellation import RequestCancelled
+        
         # Use API endpoint (more reliable for API format)
         try:
             return execute_workflow_via_api(workflow, port=8000, timeout=timeout)
+        except RequestCancelled:
+            raise  # never re-run a cancelled render via comfy run
         except Exception as e:
             # Fallback to comfy run if API fails
             print(f"⚠️  API execution failed: {e}. Falling back to comfy run...")
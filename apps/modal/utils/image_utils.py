@@ -5,10 +5,17 @@ Handles base64 encoding/decoding, image validation, and format conversion.
 """
 
 import base64
+import os
+import re
+import threading
+import time
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 from io import BytesIO
 
+# Most images one request may generate (latent batch size of one sampler pass)
+MAX_NUM_IMAGES = 8
+
 
 def encode_base64(image_path: str) -> str:
     """
@@ -80,6 +87,67 @@ def decode_base64(base64_string: str, output_path: Optional[str] = None) -> byte
     return image_bytes
 
 
+def encode_image_bytes(image_bytes: bytes, mime_type: str = "image/png") -> str:
+    """
+    Encode image bytes to a base64 data URL.
+    
+    Args:
+        image_bytes: Raw image bytes (ComfyUI outputs are PNG)
+        mime_type: MIME type for the data URI prefix (default: image/png)
+    
+    Returns:
+        Base64 encoded string (with data URI prefix)
+    """
+    base64_str = base64.b64encode(image_bytes).decode("utf-8")
+    return f"data:{mime_type};base64,{base64_str}"
+
+
+def parse_num_images(item: dict) -> int:
+    """
+    Read and validate a request's num_images (latent batch size).
+    
+    Args:
+        item: Request payload
+    
+    Returns:
+        num_images as an int between 1 and MAX_NUM_IMAGES (default: 1)
+    
+    Raises:
+        ValueError: If num_images is not an integer in range (handlers return 400)
+    """
+    value = item.get("num_images", 1)
+    try:
+        if isinstance(value, bool) or float(value) != int(value):
+            raise ValueError
+        num_images = int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"num_images must be an integer, got {value!r}")
+    if not 1 <= num_images <= MAX_NUM_IMAGES:
+        raise ValueError(f"num_images must be between 1 and {MAX_NUM_IMAGES}, got {num_images}")
+    return num_images
+
+
+def build_images_response(images: List[bytes]):
+    """
+    Build a JSON response carrying several output images.
+    
+    Used when a request asks for num_images > 1 so all images from one
+    sampler pass are returned together.
+    
+    Args:
+        images: Raw image bytes, in output order
+    
+    Returns:
+        JSONResponse with {"images": [data URLs], "count": N}
+    """
+    from fastapi.responses import JSONResponse
+    
+    return JSONResponse({
+        "images": [encode_image_bytes(image_bytes) for image_bytes in images],
+        "count": len(images),
+    })
+
+
 def validate_image(image_path: str, max_size_mb: float = 10.0) -> bool:
     """
     Validate an image file.
@@ -132,3 +200,146 @@ def save_base64_to_file(base64_string: str, output_path: str) -> Path:
         f.write(image_bytes)
     
     return output_path
+
+
+# ComfyUI LoadImage reads from here
+COMFY_INPUT_DIR = "/root/comfy/ComfyUI/input"
+
+# Reference images kept in the input dir (least recently used are deleted beyond this)
+REFERENCE_IMAGES_MAX_BYTES = 2 * 1024**3
+
+# Reference images used this recently are never pruned (renders may still read them)
+REFERENCE_IMAGE_MIN_AGE_SECONDS = 600
+
+# Minimum seconds between prune scans of the input dir
+REFERENCE_PRUNE_INTERVAL_SECONDS = 60
+
+# Files written by save_reference_image: {prefix}_{16 hex digits}.{ext}
+REFERENCE_IMAGE_PATTERN = re.compile(r"^\w+_[0-9a-f]{16}\.(jpg|png|webp)$")
+
+_prune_lock = threading.Lock()
+_last_prune = {}
+
+
+def prune_reference_images(
+    input_dir: str = COMFY_INPUT_DIR,
+    max_bytes: int = REFERENCE_IMAGES_MAX_BYTES,
+    min_age_seconds: float = REFERENCE_IMAGE_MIN_AGE_SECONDS,
+) -> int:
+    """
+    Delete least recently used reference images beyond max_bytes.
+    
+    Only content-addressed files written by save_reference_image are
+    considered; a file's mtime is refreshed each time it is reused.
+    
+    Args:
+        input_dir: ComfyUI input directory
+        max_bytes: Size budget for reference images
+        min_age_seconds: Files used more recently than this are kept
+    
+    Returns:
+        Number of bytes freed
+    """
+    entries = []
+    try:
+        with os.scandir(input_dir) as scan:
+            for entry in scan:
+                if entry.is_file() and REFERENCE_IMAGE_PATTERN.match(entry.name):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+    except FileNotFoundError:
+        return 0
+    
+    total = sum(size for _, size, _ in entries)
+    freed = 0
+    cutoff = time.time() - min_age_seconds
+    for mtime, size, path in sorted(entries):
+        if total - freed <= max_bytes or mtime > cutoff:
+            break
+        try:
+            os.remove(path)
+            freed += size
+        except FileNotFoundError:
+            pass
+    if freed:
+        print(f"🧹 Pruned {freed / 1024 / 1024:.1f} MB of reference images")
+    return freed
+
+
+def _maybe_prune_reference_images(input_dir: str):
+    """Run prune_reference_images at most once per REFERENCE_PRUNE_INTERVAL_SECONDS per dir."""
+    with _prune_lock:
+        now = time.monotonic()
+        if now - _last_prune.get(input_dir, float("-inf")) < REFERENCE_PRUNE_INTERVAL_SECONDS:
+            return
+        _last_prune[input_dir] = now
+    prune_reference_images(input_dir)
+
+
+def save_reference_image(
+    reference_image: str,
+    prefix: str,
+    as_jpeg: bool = True,
+    input_dir: str = COMFY_INPUT_DIR,
+) -> str:
+    """
+    Save a reference image to the ComfyUI input directory, named by content.
+    
+    The filename is derived from a hash of the image, so the same character
+    reference sent again maps to the same file. The write is skipped and
+    ComfyUI's LoadImage cache, the face embedding cache and the output
+    cache all see an unchanged input. Reuse refreshes the file's mtime, and
+    the least recently used references are pruned beyond
+    REFERENCE_IMAGES_MAX_BYTES.
+    
+    Args:
+        reference_image: Base64 string (with or without data URI prefix)
+        prefix: Filename prefix (e.g., "instantid_ref")
+        as_jpeg: Validate and re-encode as RGB JPEG; otherwise keep the bytes
+        input_dir: Directory to save into
+    
+    Returns:
+        Image filename for use in LoadImage node
+    
+    Raises:
+        ValueError: If the image is invalid
+    """
+    import hashlib
+    
+    image_bytes = decode_base64(reference_image)
+    digest = hashlib.sha256(image_bytes).hexdigest()[:16]
+    if as_jpeg:
+        ext = "jpg"
+    else:
+        mime_type = reference_image.split(";", 1)[0] if reference_image.startswith("data:") else "image/png"
+        ext = "jpg" if "jpeg" in mime_type else "png" if "png" in mime_type else "webp"
+    image_filename = f"{prefix}_{digest}.{ext}"
+    image_path = Path(input_dir) / image_filename
+    try:
+        os.utime(image_path)  # mark recently used for pruning
+        return image_filename
+    except FileNotFoundError:
+        pass
+    
+    image_path.parent.mkdir(parents=True, exist_ok=True)
+    # Unique per writer: concurrent requests may save the same reference
+    tmp_path = image_path.with_name(f".{image_filename}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        if as_jpeg:
+            from PIL import Image
+            
+            try:
+                img = Image.open(BytesIO(image_bytes))
+                if img.mode != "RGB":
+                    img = img.convert("RGB")
+                img.save(tmp_path, "JPEG")
+            except Exception as e:
+                raise ValueError(f"Invalid image format: {e}")
+        else:
+            tmp_path.write_bytes(image_bytes)
+        tmp_path.replace(image_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    print(f"✅ Saved reference image: {image_filename}")
+    _maybe_prune_reference_images(str(input_dir))
+    return image_filename
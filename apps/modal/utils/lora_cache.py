@@ -0,0 +1,374 @@
+"""
+LoRA hot cache for ComfyUI containers.
+
+Character LoRAs live on the network-mounted ``ryla-models`` volume
+(``/root/models/loras``), and there are thousands of them. Symlinking every
+file at startup and letting ComfyUI read them over the network on each
+request makes the first load of a LoRA slow and the startup scale with the
+catalog size.
+
+``LoraCache`` keeps the hot LoRAs on local SSD instead:
+
+- ``ensure(name)`` copies a LoRA from the volume to local disk (once, shared
+  by concurrent requests) and points ComfyUI's ``models/loras`` entry at the
+  local copy.
+- Each local copy remembers the volume file's size and mtime; when a LoRA
+  is retrained under the same name, the next request copies it again.
+- Local copies are evicted least recently used beyond a size limit; an
+  evicted entry is re-pointed at the volume, so it keeps working.
+- Request counts decay over time; the LoRAs recent traffic ranks highest are
+  prefetched in the background, and the ranking is kept on the volume so new
+  containers warm up with the fleet's hot set.
+
+Patched weights are kept in RAM by the ``RylaCachedLoraLoader`` nodes
+(apps/modal/comfy_nodes/lora_cache.py); see ``to_cached_lora_loaders``.
+Stats are served at ``GET /lora-cache/stats``.
+"""
+
+import json
+import math
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# LoRAs on the shared volume
+VOLUME_LORA_DIR = "/root/models/loras"
+
+# ComfyUI resolves lora_name here
+COMFY_LORA_DIR = "/root/comfy/ComfyUI/models/loras"
+
+# Local SSD copies (container disk, not the network volume)
+LOCAL_LORA_DIR = os.environ.get("LORA_CACHE_DIR", "/tmp/ryla-loras")
+LOCAL_MAX_BYTES = int(float(os.environ.get("LORA_CACHE_MAX_GB", "20")) * 1024**3)
+
+# Fleet-wide ranking of hot LoRAs (read at startup, rewritten after prefetches)
+HOT_LIST_PATH = "/root/models/lora-cache/hot.json"
+HOT_LIST_SIZE = 64
+
+# Request counts halve every this many seconds
+SCORE_HALF_LIFE_SECONDS = 30 * 60
+
+# Hottest LoRAs kept on local disk ahead of requests
+PREFETCH_TOP_K = int(os.environ.get("LORA_PREFETCH_TOP_K", "16"))
+
+_cache_lock = threading.Lock()
+
+
+class LoraCache:
+    """Local-SSD LRU of LoRA files with decayed-frequency prefetch."""
+
+    def __init__(
+        self,
+        volume_dir: str = VOLUME_LORA_DIR,
+        comfy_dir: str = COMFY_LORA_DIR,
+        local_dir: str = LOCAL_LORA_DIR,
+        max_local_bytes: int = LOCAL_MAX_BYTES,
+        hot_list_path: Optional[str] = HOT_LIST_PATH,
+        prefetch_top_k: int = PREFETCH_TOP_K,
+    ):
+        """
+        Initialize LoRA cache.
+
+        Args:
+            volume_dir: Directory with all LoRAs (network volume)
+            comfy_dir: ComfyUI loras directory (entries are symlinks)
+            local_dir: Local disk directory for hot copies
+            max_local_bytes: Size limit of local copies
+            hot_list_path: Shared ranking file on the volume (None to disable)
+            prefetch_top_k: Number of top-ranked LoRAs to keep local
+        """
+        self.volume_dir = Path(volume_dir)
+        self.comfy_dir = Path(comfy_dir)
+        self.local_dir = Path(local_dir)
+        self.max_local_bytes = max_local_bytes
+        self.hot_list_path = Path(hot_list_path) if hot_list_path else None
+        self.prefetch_top_k = prefetch_top_k
+
+        self._lock = threading.Lock()
+        self._file_locks: Dict[str, threading.Lock] = {}
+        self._local: "OrderedDict[str, int]" = OrderedDict()  # name -> bytes, LRU order
+        self._sources: Dict[str, tuple] = {}  # name -> volume (size, mtime) the copy was made from
+        self._scores: Dict[str, float] = {}
+        self._scored_at: Dict[str, float] = {}
+        self._prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lora-prefetch")
+        self._prefetch_pending = False
+        self.counters = {
+            "hits_local": 0,
+            "misses": 0,
+            "refreshed": 0,
+            "not_found": 0,
+            "prefetched": 0,
+            "evicted": 0,
+            "copied_bytes": 0,
+            "copy_seconds": 0.0,
+        }
+
+        # Copies survive a snapshot restore, pick them up oldest first
+        if self.local_dir.exists():
+            files = sorted(self.local_dir.glob("*.safetensors"), key=lambda p: p.stat().st_mtime)
+            for path in files:
+                stat = path.stat()  # copy2 kept the volume file's mtime
+                self._local[path.name] = stat.st_size
+                self._sources[path.name] = (stat.st_size, stat.st_mtime_ns)
+
+    def _file_lock(self, name: str) -> threading.Lock:
+        with self._lock:
+            return self._file_locks.setdefault(name, threading.Lock())
+
+    def _decayed(self, name: str, now: float) -> float:
+        elapsed = now - self._scored_at.get(name, now)
+        return self._scores.get(name, 0.0) * math.pow(0.5, elapsed / SCORE_HALF_LIFE_SECONDS)
+
+    def record(self, name: str, weight: float = 1.0):
+        """Count a request for a LoRA."""
+        now = time.time()
+        with self._lock:
+            self._scores[name] = self._decayed(name, now) + weight
+            self._scored_at[name] = now
+
+    def ranking(self) -> List[str]:
+        """LoRA names by decayed request count, hottest first."""
+        now = time.time()
+        with self._lock:
+            scores = {name: self._decayed(name, now) for name in self._scores}
+        return sorted(scores, key=scores.get, reverse=True)
+
+    def _link(self, name: str, target: Path):
+        """Point ComfyUI's entry for a LoRA at target (atomic replace)."""
+        self.comfy_dir.mkdir(parents=True, exist_ok=True)
+        link = self.comfy_dir / name
+        if link.is_symlink() and os.readlink(link) == str(target):
+            return
+        tmp_link = self.comfy_dir / f".{name}.{threading.get_ident()}.tmp"
+        if tmp_link.is_symlink():
+            tmp_link.unlink()
+        os.symlink(str(target), str(tmp_link))
+        os.replace(tmp_link, link)
+
+    def _volume_stat(self, name: str) -> Optional[tuple]:
+        try:
+            stat = (self.volume_dir / name).stat()
+        except OSError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def _is_stale(self, name: str) -> bool:
+        """True if the volume file changed since the local copy was made."""
+        source = self._volume_stat(name)
+        with self._lock:
+            return source is not None and source != self._sources.get(name)
+
+    def _copy_local(self, name: str) -> bool:
+        """Copy a LoRA from the volume to local disk. Returns False if missing."""
+        source = self.volume_dir / name
+        source_stat = self._volume_stat(name)
+        if source_stat is None:
+            return False
+        self.local_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.local_dir / f".{name}.tmp"
+        started = time.time()
+        shutil.copy2(source, tmp_path)
+        os.replace(tmp_path, self.local_dir / name)
+        size = (self.local_dir / name).stat().st_size
+        with self._lock:
+            self._local[name] = size
+            self._local.move_to_end(name)
+            self._sources[name] = source_stat
+            self.counters["copied_bytes"] += size
+            self.counters["copy_seconds"] += time.time() - started
+        self._evict(keep=name)
+        return True
+
+    def _evict(self, keep: str):
+        """Drop least recently used local copies beyond max_local_bytes."""
+        while True:
+            with self._lock:
+                if sum(self._local.values()) <= self.max_local_bytes:
+                    return
+                victim = next((name for name in self._local if name != keep), None)
+                if victim is None:
+                    return
+                del self._local[victim]
+                self._sources.pop(victim, None)
+                self.counters["evicted"] += 1
+            # Keep the ComfyUI entry valid by pointing it back at the volume
+            if (self.comfy_dir / victim).is_symlink():
+                self._link(victim, self.volume_dir / victim)
+            (self.local_dir / victim).unlink(missing_ok=True)
+
+    def _is_builtin(self, name: str) -> bool:
+        """Entries not managed by the cache (baked into the image)."""
+        link = self.comfy_dir / name
+        if not link.exists():
+            return False
+        if not link.is_symlink():
+            return True
+        target = os.readlink(link)
+        return not (target.startswith(str(self.local_dir)) or target.startswith(str(self.volume_dir)))
+
+    def ensure(self, name: str) -> bool:
+        """
+        Make a LoRA available to ComfyUI from local disk.
+
+        Args:
+            name: LoRA filename (e.g., "character-123.safetensors")
+
+        Returns:
+            True if the LoRA is available, False if it does not exist
+        """
+        if self._is_builtin(name):
+            return True
+        self.record(name)
+
+        stale = name in self._local and self._is_stale(name)
+        with self._lock:
+            local = name in self._local and not stale
+            if local:
+                self._local.move_to_end(name)
+                self.counters["hits_local"] += 1
+        if not local:
+            with self._file_lock(name):
+                # A concurrent request or the prefetcher may have copied it meanwhile
+                if name not in self._local or self._is_stale(name):
+                    if not self._copy_local(name):
+                        self.counters["not_found"] += 1
+                        return False
+                    self.counters["refreshed" if stale else "misses"] += 1
+        self._link(name, self.local_dir / name)
+        self.schedule_prefetch()
+        return True
+
+    def schedule_prefetch(self):
+        """Prefetch the hottest LoRAs in the background (one pass at a time)."""
+        with self._lock:
+            if self._prefetch_pending:
+                return
+            self._prefetch_pending = True
+        self._prefetcher.submit(self._prefetch_pass)
+
+    def _prefetch_pass(self):
+        with self._lock:
+            self._prefetch_pending = False
+        hot = self.ranking()[: self.prefetch_top_k]
+        budget = self.max_local_bytes
+        for name in hot:
+            if name in self._local:
+                budget -= self._local.get(name, 0)
+                continue
+            source = self.volume_dir / name
+            if not source.exists() or source.stat().st_size > budget:
+                continue
+            with self._file_lock(name):
+                if name not in self._local and self._copy_local(name):
+                    self.counters["prefetched"] += 1
+                    self._link(name, self.local_dir / name)
+            budget -= self._local.get(name, 0)
+        self._save_hot_list()
+
+    def _save_hot_list(self):
+        """Merge this container's ranking into the shared hot list on the volume."""
+        if self.hot_list_path is None or not self.hot_list_path.parent.parent.exists():
+            return
+        now = time.time()
+        merged = self._load_hot_list()
+        with self._lock:
+            for name in self._scores:
+                merged[name] = max(merged.get(name, 0.0), self._decayed(name, now))
+        top = dict(sorted(merged.items(), key=lambda item: item[1], reverse=True)[:HOT_LIST_SIZE])
+        try:
+            self.hot_list_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.hot_list_path.with_name(f".{self.hot_list_path.name}.{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps({"saved_at": now, "scores": top}))
+            os.replace(tmp_path, self.hot_list_path)
+        except OSError as e:
+            print(f"⚠️  Failed to save LoRA hot list: {e}")
+
+    def _load_hot_list(self) -> Dict[str, float]:
+        if self.hot_list_path is None or not self.hot_list_path.exists():
+            return {}
+        try:
+            data = json.loads(self.hot_list_path.read_text())
+        except (OSError, ValueError):
+            return {}
+        decay = math.pow(0.5, (time.time() - data.get("saved_at", 0)) / SCORE_HALF_LIFE_SECONDS)
+        return {name: score * decay for name, score in data.get("scores", {}).items()}
+
+    def warm(self, wait: bool = False):
+        """
+        Seed the ranking from the shared hot list and prefetch it.
+
+        Args:
+            wait: Block until the prefetch pass finishes
+        """
+        now = time.time()
+        with self._lock:
+            for name, score in self._load_hot_list().items():
+                if score > self._decayed(name, now):
+                    self._scores[name] = score
+                    self._scored_at[name] = now
+        # Re-link copies restored from a snapshot
+        for name in list(self._local):
+            if (self.local_dir / name).exists():
+                self._link(name, self.local_dir / name)
+            else:
+                with self._lock:
+                    self._local.pop(name, None)
+                    self._sources.pop(name, None)
+        with self._lock:
+            self._prefetch_pending = True
+        future = self._prefetcher.submit(self._prefetch_pass)
+        if wait:
+            future.result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            local_bytes = sum(self._local.values())
+            local_count = len(self._local)
+        requests = counters["hits_local"] + counters["misses"] + counters["refreshed"]
+        return {
+            **counters,
+            "copy_seconds": round(counters["copy_seconds"], 2),
+            "hit_rate": round(counters["hits_local"] / requests, 3) if requests else None,
+            "local_loras": local_count,
+            "local_bytes": local_bytes,
+            "max_local_bytes": self.max_local_bytes,
+            "hot": self.ranking()[: self.prefetch_top_k],
+        }
+
+
+def get_lora_cache(comfyui_instance) -> LoraCache:
+    """
+    Get (or lazily create) the LoRA cache for a ComfyUI container instance.
+
+    Args:
+        comfyui_instance: ComfyUI class instance
+
+    Returns:
+        LoraCache shared by all handlers of the container
+    """
+    with _cache_lock:
+        cache = getattr(comfyui_instance, "_lora_cache", None)
+        if cache is None:
+            cache = LoraCache()
+            comfyui_instance._lora_cache = cache
+        return cache
+
+
+def setup_lora_cache_endpoints(fastapi, comfyui_instance):
+    """
+    Register the LoRA cache stats endpoint in FastAPI app.
+
+    Args:
+        fastapi: FastAPI app instance
+        comfyui_instance: ComfyUI class instance
+    """
+
+    @fastapi.get("/lora-cache/stats")
+    async def lora_cache_stats():
+        return get_lora_cache(comfyui_instance).stats()
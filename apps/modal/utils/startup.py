@@ -0,0 +1,123 @@
+"""
+Container startup helpers: phase timing and model pre-warming.
+
+Apps with memory snapshots launch ComfyUI and pre-warm their default models
+in ``@modal.enter(snap=True)``; new replicas restore from the snapshot and
+only run the ``snap=False`` phase. Every phase is timed so cold-start
+regressions show up in logs and at ``GET /startup/timings``.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# Small, cheap request used to pull the default models into VRAM
+WARMUP_ITEM = {
+    "prompt": "warmup",
+    "width": 512,
+    "height": 512,
+    "steps": 1,
+    "seed": 0,
+}
+
+
+class StartupTimer:
+    """Records how long each container startup phase takes."""
+
+    def __init__(self, app_name: str):
+        """
+        Initialize timer.
+
+        Args:
+            app_name: App name used in log lines
+        """
+        self.app_name = app_name
+        self.phases: Dict[str, float] = {}
+        self.snapshot_at: Optional[float] = None
+        self.restored_at: Optional[float] = None
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a startup phase (used as ``with timer.phase("launch_server"):``)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(time.perf_counter() - start, 3)
+            print(f"⏱️  [{self.app_name}] {name}: {self.phases[name]:.2f}s")
+
+    def mark_snapshot(self):
+        """Record the end of the snap=True phase (state captured by the snapshot)."""
+        self.snapshot_at = time.time()
+
+    def mark_restored(self):
+        """Record the start of the snap=False phase."""
+        self.restored_at = time.time()
+
+    def summary(self) -> Dict:
+        """Get the startup breakdown."""
+        snapshot_age = None
+        if self.snapshot_at is not None and self.restored_at is not None:
+            snapshot_age = round(self.restored_at - self.snapshot_at, 1)
+        return {
+            "app": self.app_name,
+            "phases": dict(self.phases),
+            "total_sec": round(sum(self.phases.values()), 3),
+            # Seconds between snapshot and this replica's restore phase; a large
+            # value means the replica restored from an earlier snapshot
+            "snapshot_age_sec": snapshot_age,
+        }
+
+    def report(self):
+        """Print the startup breakdown."""
+        summary = self.summary()
+        breakdown = ", ".join(f"{name}={sec:.2f}s" for name, sec in summary["phases"].items())
+        print(f"⏱️  [{self.app_name}] startup total {summary['total_sec']:.2f}s ({breakdown})")
+        if summary["snapshot_age_sec"] is not None:
+            print(f"   snapshot age at restore: {summary['snapshot_age_sec']:.1f}s")
+
+
+def prewarm_models(comfyui_instance, workflow: dict) -> bool:
+    """
+    Run a small workflow so the app's default models are loaded into VRAM.
+
+    ComfyUI keeps loaded models cached between prompts, so the first real
+    request (or every replica restored from the snapshot) skips model loading.
+    The workflow goes straight to ComfyUI, not through the output cache: a
+    cache hit would return without loading anything.
+    Failures are logged, not raised - a cold model is slower, not broken.
+
+    Args:
+        comfyui_instance: ComfyUI class instance (provides port)
+        workflow: Cheap API-format workflow using the default models
+
+    Returns:
+        True if the warmup workflow completed
+    """
+    from utils.comfyui import execute_workflow_via_api
+
+    try:
+        execute_workflow_via_api(workflow, port=comfyui_instance.port)
+        print("🔥 Default models pre-warmed")
+        return True
+    except Exception as e:
+        print(f"⚠️  Model pre-warm failed (first request will load models): {e}")
+        return False
+
+
+def setup_startup_endpoints(fastapi, comfyui_instance):
+    """
+    Register startup timing endpoint in FastAPI app.
+
+    Args:
+        fastapi: FastAPI app instance
+        comfyui_instance: ComfyUI class instance
+    """
+
+    @fastapi.get("/startup/timings")
+    async def startup_timings():
+        """Startup phase breakdown for this container."""
+        timer = getattr(comfyui_instance, "startup_timer", None)
+        if timer is None:
+            return {"phases": {}, "total_sec": 0.0, "snapshot_age_sec": None}
+        return timer.summary()
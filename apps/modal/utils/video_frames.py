@@ -0,0 +1,376 @@
+"""
+Frame pipes for per-frame video handlers.
+
+Videos are decoded by ffmpeg to raw RGB frames on stdout and re-encoded by
+ffmpeg from raw RGB frames on stdin, so a video is never unpacked into
+per-frame image files. Frames go to ComfyUI in batches packed into a single
+multi-frame TIFF: ComfyUI's LoadImage returns every frame of a multi-frame
+image as one IMAGE batch, so one prompt processes the whole batch.
+
+ffmpeg's stderr is drained on a thread into a bounded buffer while it runs;
+a full stderr pipe would otherwise block ffmpeg mid-stream and deadlock
+the pipes.
+"""
+
+import io
+import json
+import subprocess
+import threading
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# Frames per ComfyUI prompt (16 x 1080p RGB is ~100 MB per batch)
+FRAME_BATCH_SIZE = 16
+
+# Upper bound for the per-request batch size override
+MAX_FRAME_BATCH_SIZE = 64
+
+# ffmpeg stderr kept for error messages (the rest is discarded as it arrives)
+STDERR_TAIL_BYTES = 8192
+
+
+def parse_frame_batch_size(item: dict) -> int:
+    """
+    Read and validate a request's frame batch_size.
+
+    Args:
+        item: Request payload
+
+    Returns:
+        batch_size as an int between 1 and MAX_FRAME_BATCH_SIZE (default: FRAME_BATCH_SIZE)
+
+    Raises:
+        ValueError: If batch_size is not an integer in range (handlers return 400)
+    """
+    value = item.get("batch_size", FRAME_BATCH_SIZE)
+    try:
+        if isinstance(value, bool) or float(value) != int(value):
+            raise ValueError
+        batch_size = int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"batch_size must be an integer, got {value!r}")
+    if not 1 <= batch_size <= MAX_FRAME_BATCH_SIZE:
+        raise ValueError(f"batch_size must be between 1 and {MAX_FRAME_BATCH_SIZE}, got {batch_size}")
+    return batch_size
+
+def probe_video_size(video_path: str) -> Tuple[int, int]:
+    """
+    Get the display size of a video's first video stream.
+
+    ffmpeg auto-rotates on decode, so a 90/270 degree rotation swaps
+    width and height.
+
+    Args:
+        video_path: Path to video file
+
+    Returns:
+        Tuple of (width, height)
+    """
+    result = subprocess.run(
+        [
+            "ffprobe", "-v", "error", "-select_streams", "v:0",
+            "-show_entries", "stream=width,height:stream_tags=rotate:stream_side_data=rotation",
+            "-of", "json", video_path,
+        ],
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    if result.returncode != 0:
+        raise Exception(f"ffprobe failed: {result.stderr[-400:]}")
+
+    streams = json.loads(result.stdout or "{}").get("streams", [])
+    if not streams:
+        raise Exception("No video stream found")
+    stream = streams[0]
+    width, height = int(stream["width"]), int(stream["height"])
+
+    rotation = stream.get("tags", {}).get("rotate", 0)
+    for side_data in stream.get("side_data_list", []):
+        rotation = side_data.get("rotation", rotation)
+    if abs(int(float(rotation))) % 180 == 90:
+        width, height = height, width
+    return width, height
+
+
+def build_decode_command(video_path: str, fps: float) -> List[str]:
+    """
+    Build the ffmpeg command that writes raw RGB frames to stdout.
+
+    Args:
+        video_path: Path to source video
+        fps: Frame rate to resample to
+
+    Returns:
+        ffmpeg argument list
+    """
+    return [
+        "ffmpeg", "-nostdin", "-v", "error",
+        "-i", video_path,
+        "-vf", f"fps={fps}",
+        "-f", "rawvideo", "-pix_fmt", "rgb24",
+        "pipe:1",
+    ]
+
+
+def build_encode_command(
+    output_path: str,
+    width: int,
+    height: int,
+    fps: float,
+    audio_source: Optional[str] = None,
+    crf: int = 18,
+) -> List[str]:
+    """
+    Build the ffmpeg command that encodes raw RGB frames from stdin to H.264.
+
+    Args:
+        output_path: Path of the MP4 to write
+        width: Frame width
+        height: Frame height
+        fps: Output frame rate
+        audio_source: Optional file whose first audio stream is copied in
+        crf: x264 quality (lower = better)
+
+    Returns:
+        ffmpeg argument list
+    """
+    command = [
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "rawvideo", "-pix_fmt", "rgb24",
+        "-s", f"{width}x{height}", "-r", str(fps),
+        "-i", "pipe:0",
+    ]
+    if audio_source:
+        command += ["-i", audio_source, "-map", "0:v:0", "-map", "1:a:0?", "-c:a", "aac", "-shortest"]
+    command += [
+        # yuv420p needs even dimensions
+        "-vf", "scale=trunc(iw/2)*2:trunc(ih/2)*2",
+        "-c:v", "libx264", "-pix_fmt", "yuv420p", "-crf", str(crf),
+        "-movflags", "+faststart",
+        output_path,
+    ]
+    return command
+
+
+def read_frames(stream, width: int, height: int) -> Iterator[bytes]:
+    """
+    Yield raw RGB frames from a byte stream.
+
+    Args:
+        stream: Readable binary stream (e.g. ffmpeg stdout)
+        width: Frame width
+        height: Frame height
+
+    Yields:
+        Frame bytes (width * height * 3); a truncated last frame is dropped
+    """
+    frame_size = width * height * 3
+    while True:
+        chunks = []
+        remaining = frame_size
+        while remaining:
+            chunk = stream.read(remaining)
+            if not chunk:
+                return
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        yield b"".join(chunks)
+
+
+def iter_batches(frames: Iterable[bytes], batch_size: int) -> Iterator[List[bytes]]:
+    """Group frames into lists of at most batch_size."""
+    batch = []
+    for frame in frames:
+        batch.append(frame)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def pack_frames(frames: List[bytes], width: int, height: int) -> bytes:
+    """
+    Pack raw RGB frames into one uncompressed multi-frame TIFF.
+
+    Args:
+        frames: Raw RGB frames
+        width: Frame width
+        height: Frame height
+
+    Returns:
+        TIFF file bytes
+    """
+    from PIL import Image
+
+    images = [Image.frombytes("RGB", (width, height), frame) for frame in frames]
+    buffer = io.BytesIO()
+    images[0].save(buffer, format="TIFF", save_all=True, append_images=images[1:])
+    return buffer.getvalue()
+
+
+def unpack_frame(image_bytes: bytes, width: int, height: int) -> bytes:
+    """
+    Convert an encoded output image back to a raw RGB frame of the video size.
+
+    Args:
+        image_bytes: Encoded image (PNG/JPEG)
+        width: Frame width
+        height: Frame height
+
+    Returns:
+        Raw RGB frame bytes
+    """
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    if image.size != (width, height):
+        image = image.resize((width, height), Image.LANCZOS)
+    return image.tobytes()
+
+
+def iter_image_frames(image_path: str) -> Tuple[Tuple[int, int], Iterator[bytes]]:
+    """
+    Decode an animated image (e.g. WebP, which ffmpeg cannot decode) to raw RGB frames.
+
+    Args:
+        image_path: Path to animated image
+
+    Returns:
+        Tuple of ((width, height), frame iterator)
+    """
+    from PIL import Image, ImageSequence
+
+    image = Image.open(image_path)
+
+    def frames():
+        with image:
+            for frame in ImageSequence.Iterator(image):
+                yield frame.convert("RGB").tobytes()
+
+    return image.size, frames()
+
+
+class StderrTail:
+    """Reads a process's stderr on a thread, keeping only the last STDERR_TAIL_BYTES."""
+
+    def __init__(self, stream, max_bytes: int = STDERR_TAIL_BYTES):
+        self._stream = stream
+        self._max_bytes = max_bytes
+        self._tail = bytearray()
+        self._thread = threading.Thread(target=self._drain, name="ffmpeg-stderr", daemon=True)
+        self._thread.start()
+
+    def _drain(self):
+        try:
+            for chunk in iter(lambda: self._stream.read1(65536), b""):
+                self._tail += chunk
+                del self._tail[:-self._max_bytes]
+        except (OSError, ValueError):
+            pass  # stream closed
+
+    def text(self, limit: int = 400) -> str:
+        """Last ``limit`` characters of stderr (waits for the process to close it)."""
+        self._thread.join(timeout=5)
+        return bytes(self._tail).decode(errors="replace")[-limit:]
+
+    def close(self):
+        self._thread.join(timeout=5)
+        self._stream.close()
+
+
+class FrameDecoder:
+    """Runs ffmpeg and yields decoded raw RGB frames (use as a context manager)."""
+
+    def __init__(self, video_path: str, fps: float):
+        """
+        Initialize decoder.
+
+        Args:
+            video_path: Path to source video
+            fps: Frame rate to resample to
+        """
+        self.video_path = video_path
+        self.fps = fps
+        self.width, self.height = probe_video_size(video_path)
+        self.frame_count = 0
+        self._process: Optional[subprocess.Popen] = None
+        self._stderr: Optional[StderrTail] = None
+
+    def __enter__(self):
+        self._process = subprocess.Popen(
+            build_decode_command(self.video_path, self.fps),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        self._stderr = StderrTail(self._process.stderr)
+        return self
+
+    def frames(self) -> Iterator[bytes]:
+        """Yield frames until the video ends; raise if ffmpeg failed."""
+        for frame in read_frames(self._process.stdout, self.width, self.height):
+            self.frame_count += 1
+            yield frame
+        if self._process.wait() != 0:
+            raise Exception(f"Failed to decode video: {self._stderr.text()}")
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+        self._process.stdout.close()
+        self._stderr.close()
+
+
+class FrameEncoder:
+    """Runs ffmpeg and encodes raw RGB frames written to it (use as a context manager)."""
+
+    def __init__(
+        self,
+        output_path: str,
+        width: int,
+        height: int,
+        fps: float,
+        audio_source: Optional[str] = None,
+    ):
+        """
+        Initialize encoder.
+
+        Args:
+            output_path: Path of the MP4 to write
+            width: Frame width
+            height: Frame height
+            fps: Output frame rate
+            audio_source: Optional file whose audio track is copied in
+        """
+        self.command = build_encode_command(output_path, width, height, fps, audio_source)
+        self.frame_count = 0
+        self._process: Optional[subprocess.Popen] = None
+        self._stderr: Optional[StderrTail] = None
+
+    def __enter__(self):
+        self._process = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        self._stderr = StderrTail(self._process.stderr)
+        return self
+
+    def write(self, frame: bytes):
+        """Send one raw RGB frame to ffmpeg."""
+        self._process.stdin.write(frame)
+        self.frame_count += 1
+
+    def finish(self):
+        """Close stdin and wait for ffmpeg to write the file."""
+        self._process.stdin.close()
+        if self._process.wait() != 0:
+            raise Exception(f"Failed to encode video: {self._stderr.text()}")
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+        self._stderr.close()
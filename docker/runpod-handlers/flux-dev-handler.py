@@ -67,31 +67,35 @@ def upload_to_supabase(images: List[Image.Image]) -> List[str]:
 
 
 def generate_base_image(input_data: Dict[str, Any]) -> Dict[str, Any]:
-    """Generate 3 base image variations"""
+    """Generate base image variations (default 3) in a single pipeline pass"""
     prompt = input_data["prompt"]
     nsfw = input_data.get("nsfw", False)
     seed = input_data.get("seed", -1)
+    num_images = input_data.get("num_images", 3)
     
     pipe = load_pipeline()
     
     # Use uncensored checkpoint if NSFW
     # TODO: Load uncensored model if nsfw=True
     
-    images = []
-    for i in range(3):
+    # All variations in one batched pipeline call (one generator per image)
+    generators = []
+    for i in range(num_images):
         generator = torch.Generator(device="cuda")
         if seed != -1:
             generator.manual_seed(seed + i)
         else:
             generator.seed()
-        
-        result = pipe(
-            prompt=prompt,
-            num_inference_steps=20,
-            guidance_scale=7.0,
-            generator=generator,
-        )
-        images.append(result.images[0])
+        generators.append(generator)
+    
+    result = pipe(
+        prompt=prompt,
+        num_inference_steps=20,
+        guidance_scale=7.0,
+        num_images_per_prompt=num_images,
+        generator=generators,
+    )
+    images = result.images
     
     image_urls = upload_to_supabase(images)
     
@@ -60,10 +60,11 @@ def upload_to_supabase(images: List[Image.Image]) -> List[str]:
 
 
 def generate_base_image(input_data: Dict[str, Any]) -> Dict[str, Any]:
-    """Generate 3 base image variations (fast)"""
+    """Generate base image variations (default 3) in a single pipeline pass (fast)"""
     prompt = input_data["prompt"]
     nsfw = input_data.get("nsfw", False)
     seed = input_data.get("seed", -1)
+    num_images = input_data.get("num_images", 3)
     
     pipe = load_pipeline()
     
@@ -76,24 +77,27 @@ def generate_base_image(input_data: Dict[str, Any]) -> Dict[str, Any]:
         # TODO: Test if uncensored checkpoint available
         nsfw_supported = False  # Will be updated after testing
     
-    images = []
-    for i in range(3):
+    # All variations in one batched pipeline call (one generator per image)
+    generators = []
+    for i in range(num_images):
         generator = torch.Generator(device="cuda")
         if seed != -1:
             generator.manual_seed(seed + i)
         else:
             generator.seed()
-        
-        # Z-Image-Turbo: 9 steps (results in 8 DiT forwards), guidance_scale=0.0
-        result = pipe(
-            prompt=prompt,
-            height=1024,
-            width=1024,
-            num_inference_steps=9,  # Results in 8 DiT forwards
-            guidance_scale=0.0,  # Turbo models use 0.0
-            generator=generator,
-        )
-        images.append(result.images[0])
+        generators.append(generator)
+    
+    # Z-Image-Turbo: 9 steps (results in 8 DiT forwards), guidance_scale=0.0
+    result = pipe(
+        prompt=prompt,
+        height=1024,
+        width=1024,
+        num_inference_steps=9,  # Results in 8 DiT forwards
+        guidance_scale=0.0,  # Turbo models use 0.0
+        num_images_per_prompt=num_images,
+        generator=generators,
+    )
+    images = result.images
     
     image_urls = upload_to_supabase(images)
     